@@ -4,7 +4,7 @@ import os
 import sys
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 
 from fastapi import FastAPI, HTTPException, Body, Query, Form
 from fastapi.responses import JSONResponse, StreamingResponse
@@ -15,14 +15,28 @@ from fastapi.middleware.cors import CORSMiddleware
 
 sys.path.insert(0, str(Path(__file__).parent))
 
-from busqa.batch_evaluator import evaluate_conversations_high_speed
-from tools.bulk_list_evaluate import evaluate_conversation_from_raw, fetch_conversations_with_messages, select_conversations, FetchConfig
+from busqa.batch_evaluator import evaluate_conversations_high_speed, stream_evaluate_conversations
+from tools.bulk_list_evaluate import evaluate_raw_conversation, evaluate_many_raw_conversations
+from busqa.list_fetcher import FetchConfig, AsyncListFetcher
+from busqa.conversation_store import ConversationStore, sync_bot
+from busqa.selection import SelectionQuery, stream_select
+from busqa.decode import DecodedConversation
 from busqa.models import Conversation as BusQAConversation
 from busqa.llm_client import LLMClient
-from busqa.prompt_loader import load_unified_rubrics, load_diagnostics_config
-from busqa.brand_specs import load_brand_prompt, get_available_brands, get_brand_prompt_path
+from busqa.config_registry import get_config_registry, current_rubrics, current_diagnostics, brand_prompt
+from busqa.brand_specs import get_available_brands, get_brand_prompt_path
 from busqa.brand_resolver import BrandResolver
+from busqa.brand_artifacts import get_brand_artifacts
 from busqa.aggregate import make_summary, generate_insights
+from busqa.journal import RunJournal
+from busqa.result_store import ResultStore
+from busqa.near_duplicate import NearDuplicateConfig
+from busqa.triage import TriageConfig
+from busqa.affinity import AffinityConfig
+from busqa.dispatch import DispatchConfig, FIFO
+from busqa.admission import (get_admission_controller, AdmissionRejected,
+                             INTERACTIVE, STREAMING, BATCH, PROMPT_DOCTOR)
+from busqa.live import IncrementalAnalyzer, LiveSession, LiveSessionStore
 
 app = FastAPI(
     title="BusQA LLM API",
@@ -39,14 +53,48 @@ app.add_middleware(
 )
 
 try:
-    rubrics_cfg = load_unified_rubrics()
-    diagnostics_cfg = load_diagnostics_config()
+    # Load + validate lúc khởi động; endpoint lấy snapshot hiện tại qua registry (file đổi thì tự reload)
+    current_rubrics()
+    current_diagnostics()
+    configs_loaded = True
     brand_resolver = BrandResolver(bot_map_path="config/bot_map.yaml")
     llm_client = LLMClient()
     available_brands = get_available_brands()
 except Exception as e:
     print(f"FATAL: Could not load initial configurations. {e}")
-    rubrics_cfg = diagnostics_cfg = brand_resolver = llm_client = available_brands = None
+    configs_loaded = False
+    brand_resolver = llm_client = available_brands = None
+
+try:
+    result_store = ResultStore()
+except Exception as e:
+    # Không có result store vẫn chạy được, chỉ là luôn chấm lại
+    print(f"WARNING: Result store disabled. {e}")
+    result_store = None
+
+try:
+    conversation_store = ConversationStore()
+except Exception as e:
+    # Không có conversation store thì mỗi request fetch thẳng list API
+    print(f"WARNING: Conversation store disabled. {e}")
+    conversation_store = None
+
+# Conversation đang diễn ra: metrics/diagnostics cập nhật theo từng message append
+live_sessions = LiveSessionStore()
+
+
+async def _select_bot_conversations(fetch_config: FetchConfig, query: SelectionQuery) -> Tuple[List[Any], int]:
+    """
+    Sync conversation mới của bot vào conversation store rồi chọn bằng SQL trên index;
+    không có store thì chọn ngay trên các trang list API đang về. Trả về (selected, số conversation có để chọn).
+    """
+    if conversation_store is None:
+        # Chọn trong lúc fetch: reservoir giới hạn, dừng fetch khi mẫu đã đủ
+        selected, stats = await stream_select(AsyncListFetcher(fetch_config), query)
+        return selected, stats["seen"]
+    await sync_bot(conversation_store, fetch_config)
+    selected = await asyncio.to_thread(conversation_store.select, query, fetch_config.bot_id)
+    return selected, await asyncio.to_thread(conversation_store.count, fetch_config.bot_id)
 
 
 class Message(BaseModel):
@@ -67,6 +115,7 @@ class SingleEvaluationRequest(BaseModel):
     )
     model: str = Field(default="gemini-1.5-flash", description="The model to use for evaluation.")
     temperature: float = Field(default=0.2, description="The temperature to use for evaluation.")
+    force_refresh: bool = Field(default=False, description="Ignore stored results and re-evaluate.")
 
 
 class BatchEvaluationRequest(BaseModel):
@@ -79,6 +128,44 @@ class BatchEvaluationRequest(BaseModel):
         default=10,
         description="Maximum number of concurrent evaluation tasks."
     )
+    model: str = Field(default="gemini-2.5-flash", description="The model to use for evaluation.")
+    run_id: Optional[str] = Field(
+        default=None,
+        description="Result journal run ID. If the run exists, conversations already evaluated are skipped (resume)."
+    )
+    force_refresh: bool = Field(default=False, description="Ignore stored results and re-evaluate.")
+    verify_content: bool = Field(
+        default=False,
+        description="For conversations fetched by ID: always fetch and compare content before reusing a stored "
+                    "result (otherwise a stored result is served by conversation ID, even if the conversation "
+                    "has changed upstream since)."
+    )
+    near_duplicate_threshold: Optional[float] = Field(
+        default=None, ge=0.5, le=1.0,
+        description="Reuse the LLM evaluation of an already evaluated conversation at least this similar (MinHash Jaccard)."
+    )
+    triage: bool = Field(
+        default=False,
+        description="Skip the LLM for conversations that are not evaluable (hang-ups, empty) or already decided by rules. "
+                    "Includes the score-ceiling rule: conversations whose best possible score after deterministic "
+                    "caps is below 50 get that score without the LLM."
+    )
+    triage_auto_fail: List[str] = Field(
+        default_factory=list,
+        description="Diagnostics keys scored as an automatic fail without the LLM (e.g. forbidden_phone_collect). Implies triage."
+    )
+    brand_affinity: bool = Field(
+        default=False,
+        description="Group LLM calls by brand (auto-by-botid) within a bounded reorder window for prompt cache locality."
+    )
+    dispatch_policy: Optional[str] = Field(
+        default=None,
+        description="LLM dispatch order by estimated tokens: 'sjf' (shortest first), 'ljf' (longest first) or 'fifo'."
+    )
+    max_inflight_tokens: Optional[int] = Field(
+        default=None, ge=1000,
+        description="Cap on the total estimated tokens of in-flight LLM calls (in addition to max_concurrency)."
+    )
 
 class BulkListRequest(BaseModel):
     start_date: str = Field(..., description="Start date in YYYY-MM-DD format.")
@@ -101,11 +188,15 @@ class SingleEvaluationKBRequest(BaseModel):
     kb_json: Dict[str, Any] = Field(..., description="Structured brand KB JSON to use for evaluation")
     model: str = Field(default="gemini-1.5-flash", description="The model to use for evaluation.")
     temperature: float = Field(default=0.2, description="The temperature to use for evaluation.")
+    force_refresh: bool = Field(default=False, description="Ignore stored results and re-evaluate.")
 
 @app.on_event("startup")
 async def startup_event():
-    if not all([rubrics_cfg, diagnostics_cfg, brand_resolver, llm_client, available_brands]):
+    if not all([configs_loaded, brand_resolver, llm_client, available_brands]):
         raise RuntimeError("API cannot start due to missing initial configurations.")
+    # Compile trước brand artifact cho mọi bot trong bot_map -> request đầu không phải chờ
+    report = await asyncio.to_thread(brand_resolver.warm_up, current_rubrics())
+    print(f"Warmed up {len(report['brands'])} brands in {report['elapsed_ms']}ms")
     print("API started successfully with all configurations loaded.")
 
 @app.get("/health", summary="Health Check")
@@ -125,7 +216,17 @@ async def get_bearer_token():
 @app.get("/configs/brands", summary="Get Available Brands")
 async def get_brands():
     """Returns a list of all available brand IDs for evaluation."""
-    return {"brands": available_brands}
+    return {"brands": get_available_brands()}
+
+@app.get("/configs/brand-artifacts", summary="Compiled Brand Artifacts")
+async def get_brand_artifact_stats():
+    """Brand artifact đã compile (policy, token size, dữ liệu detector) và kết quả warm-up"""
+    return get_brand_artifacts().stats()
+
+@app.get("/configs/status", summary="Loaded Config Snapshots")
+async def get_config_status():
+    """Rubrics/diagnostics/brand prompt snapshots đang dùng (content hash) và số lần reload"""
+    return get_config_registry().stats()
 
 @app.post("/evaluate/single", summary="Evaluate a Single Conversation")
 async def evaluate_single(request: SingleEvaluationRequest):
@@ -151,12 +252,16 @@ async def evaluate_single(request: SingleEvaluationRequest):
         if not brand_prompt_path:
             raise HTTPException(status_code=404, detail=f"Brand '{brand_id}' not found.")
 
-        result = await asyncio.to_thread(
-            evaluate_conversation_from_raw,
-            raw_conv=conversation_data,
-            brand_prompt_path=brand_prompt_path,
+        _admit(INTERACTIVE)
+        result = await evaluate_raw_conversation(
+            conversation_data,
+            brand_prompt_path,
             model=request.model,
             temperature=request.temperature,
+            rubrics_cfg=current_rubrics(),
+            diagnostics_cfg=current_diagnostics(),
+            result_store=result_store,
+            force_refresh=request.force_refresh,
         )
         return result
     except HTTPException as he:
@@ -177,13 +282,17 @@ async def evaluate_single_kb(request: SingleEvaluationKBRequest):
 
         conversation_data = request.conversation.dict()
 
-        result = await asyncio.to_thread(
-            evaluate_conversation_from_raw,
-            raw_conv=conversation_data,
-            brand_prompt_path="",  # Unused when kb_json is provided
+        _admit(INTERACTIVE)
+        result = await evaluate_raw_conversation(
+            conversation_data,
+            "",  # Unused when kb_json is provided
             model=request.model,
             temperature=request.temperature,
-            kb_json=request.kb_json
+            kb_json=request.kb_json,
+            rubrics_cfg=current_rubrics(),
+            diagnostics_cfg=current_diagnostics(),
+            result_store=result_store,
+            force_refresh=request.force_refresh
         )
         return result
     except HTTPException as he:
@@ -191,10 +300,122 @@ async def evaluate_single_kb(request: SingleEvaluationKBRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
+def _open_run_journal(run_id: Optional[str], conversation_ids: List[str], params: Dict[str, Any]) -> RunJournal:
+    """Mở journal của run cũ (resume) hoặc tạo run mới"""
+    try:
+        if run_id:
+            try:
+                return RunJournal.open(run_id, fsync=False)
+            except FileNotFoundError:
+                pass
+        # fsync=False: append chạy trên event loop, fsync định kỳ + khi close
+        return RunJournal.create(conversation_ids, params=params, run_id=run_id, fsync=False)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _raw_max_concurrency(value: Any) -> int:
+    """max_concurrency của các endpoint bulk-raw: trần AIMD của engine, mặc định 10, kẹp trong 1-50"""
+    try:
+        value = int(value) if value is not None else 10
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="max_concurrency must be an integer.")
+    return max(1, min(value, 50))
+
+
+def _near_duplicate_config(threshold: Optional[float]) -> Optional[NearDuplicateConfig]:
+    return NearDuplicateConfig(threshold=threshold) if threshold is not None and result_store is not None else None
+
+
+def _admit(lane: str, demand: int = 1, flow: Optional[str] = None) -> None:
+    """
+    Nhận request vào lane LLM của process (flow = brand/job cho fair queuing trong lane);
+    hàng chờ quá ngân sách -> 429 + Retry-After ngay
+    """
+    try:
+        get_admission_controller().admit(lane, demand, flow)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(int(e.retry_after))})
+
+
+def _triage_config(enabled: bool, auto_fail: Optional[List[str]] = None) -> Optional[TriageConfig]:
+    return TriageConfig(auto_fail_hits=tuple(auto_fail or ())) if enabled or auto_fail else None
+
+
+def _dispatch_config(policy: Optional[str], max_inflight_tokens: Optional[int] = None) -> Optional[DispatchConfig]:
+    if not policy and not max_inflight_tokens:
+        return None
+    try:
+        return DispatchConfig(policy=policy or FIFO, max_inflight_tokens=max_inflight_tokens)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def _evaluate_journaled_batch(journal: RunJournal, conversation_ids: List[str], brand_id: str,
+                                    model: str, max_concurrency: int,
+                                    force_refresh: bool = False,
+                                    verify_content: bool = False,
+                                    near_duplicate_threshold: Optional[float] = None,
+                                    triage: Optional[TriageConfig] = None,
+                                    brand_affinity: bool = False,
+                                    dispatch: Optional[DispatchConfig] = None,
+                                    conversations: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    Chấm các conversation chưa xong của run, ghi từng result vào journal, summary dựng từ journal.
+    Conversation inline (từ request) không fetch lại; resume chỉ có ID nên mới phải fetch.
+    """
+    brand_prompt_path = get_brand_prompt_path(brand_id)
+    if not brand_prompt_path:
+        raise HTTPException(status_code=404, detail=f"Brand '{brand_id}' not found.")
+    
+    brand_prompt_text, brand_policy = brand_prompt(brand_prompt_path)
+    
+    done = journal.completed_ids()
+    inline = {c["conversation_id"]: c for c in conversations or []}
+    remaining = [inline.get(cid, cid) for cid in conversation_ids if cid not in done]
+    try:
+        if remaining:
+            await evaluate_conversations_high_speed(
+                conversation_ids=remaining,
+                base_url=os.getenv("API_BASE_URL", "http://103.141.140.243:14496"),  # Single conversation URL
+                rubrics_cfg=current_rubrics(),
+                brand_policy=brand_policy,
+                brand_prompt_text=brand_prompt_text,
+                llm_api_key=os.getenv("GEMINI_API_KEY"),
+                llm_model=model,
+                temperature=0.2,
+                llm_base_url=os.getenv("LLM_BASE_URL"),
+                apply_diagnostics=True,
+                diagnostics_cfg=current_diagnostics(),
+                max_concurrency=max_concurrency,
+                stream_callback=journal.append,
+                brand_resolver=brand_resolver,
+                result_store=result_store,
+                force_refresh=force_refresh,
+                verify_content=verify_content,
+                near_duplicate=_near_duplicate_config(near_duplicate_threshold),
+                triage=triage,
+                brand_affinity=AffinityConfig() if brand_affinity else None,
+                dispatch=dispatch
+            )
+    finally:
+        await asyncio.to_thread(journal.close)
+    
+    results = journal.results()
+    report = journal.summary(results)
+    return {
+        "run": report["run"],
+        "summary": report["summary"],
+        "insights": report["insights"],
+        "results": results
+    }
+
 @app.post("/evaluate/batch", summary="Evaluate a Batch of Conversations")
 async def evaluate_batch_conversations(request: BatchEvaluationRequest):
     """
     Evaluates a batch of conversations concurrently for high throughput.
+    Every result is appended to the run journal as it completes; pass an existing
+    `run_id` to resume an interrupted run.
     """
     try:
         if not request.conversations:
@@ -203,43 +424,213 @@ async def evaluate_batch_conversations(request: BatchEvaluationRequest):
         if request.max_concurrency < 1 or request.max_concurrency > 50:
             raise HTTPException(status_code=400, detail="max_concurrency must be between 1 and 50.")
         
+        dispatch = _dispatch_config(request.dispatch_policy, request.max_inflight_tokens)
+        _admit(BATCH, request.max_concurrency, request.brand_id)
         conversation_ids = [c.conversation_id for c in request.conversations]
-        
-        brand_prompt_path = get_brand_prompt_path(request.brand_id)
-        if not brand_prompt_path:
-            raise HTTPException(status_code=404, detail=f"Brand '{request.brand_id}' not found.")
-        
-        brand_prompt_text, brand_policy = load_brand_prompt(brand_prompt_path)
-        
-        results = await evaluate_conversations_high_speed(
-            conversation_ids=conversation_ids,
-            base_url=os.getenv("API_BASE_URL", "http://103.141.140.243:14496"),  # Single conversation URL
-            rubrics_cfg=rubrics_cfg,
-            brand_policy=brand_policy,
-            brand_prompt_text=brand_prompt_text,
-            llm_api_key=os.getenv("GEMINI_API_KEY"),
-            llm_model=request.model,
-            temperature=0.2,
-            llm_base_url=os.getenv("LLM_BASE_URL"),
-            apply_diagnostics=True,
-            diagnostics_cfg=diagnostics_cfg,
-            max_concurrency=request.max_concurrency,
-            brand_resolver=brand_resolver
+        journal = _open_run_journal(request.run_id, conversation_ids, {
+            "brand_id": request.brand_id, "model": request.model, "max_concurrency": request.max_concurrency,
+            "near_duplicate_threshold": request.near_duplicate_threshold,
+            "triage": request.triage, "triage_auto_fail": request.triage_auto_fail,
+            "brand_affinity": request.brand_affinity,
+            "dispatch_policy": request.dispatch_policy, "max_inflight_tokens": request.max_inflight_tokens,
+            "verify_content": request.verify_content
+        })
+        return await _evaluate_journaled_batch(
+            journal, conversation_ids, request.brand_id, request.model, request.max_concurrency,
+            force_refresh=request.force_refresh,
+            verify_content=request.verify_content,
+            near_duplicate_threshold=request.near_duplicate_threshold,
+            triage=_triage_config(request.triage, request.triage_auto_fail),
+            brand_affinity=request.brand_affinity,
+            dispatch=dispatch,
+            conversations=[c.dict() for c in request.conversations]
         )
-        
-        summary = make_summary(results)
-        insights = generate_insights(summary)
-        
-        return {
-            "summary": summary,
-            "insights": insights,
-            "results": results
-        }
     except HTTPException as he:
         raise he
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred during batch evaluation: {str(e)}")
 
+@app.post("/evaluate/batch/resume/{run_id}", summary="Resume an Interrupted Batch Run")
+async def resume_batch_run(run_id: str, max_concurrency: Optional[int] = Query(None, ge=1, le=50)):
+    """
+    Continues a journaled run with its original settings, evaluating only conversations
+    that have no successful result yet.
+    """
+    try:
+        journal = RunJournal.open(run_id, fsync=False)
+    except (FileNotFoundError, ValueError) as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    try:
+        params = journal.params
+        _admit(BATCH, max_concurrency or params.get("max_concurrency", 10), params.get("brand_id"))
+        return await _evaluate_journaled_batch(
+            journal, journal.conversation_ids, params.get("brand_id"),
+            params.get("model", "gemini-2.5-flash"), max_concurrency or params.get("max_concurrency", 10),
+            verify_content=params.get("verify_content", False),
+            near_duplicate_threshold=params.get("near_duplicate_threshold"),
+            triage=_triage_config(params.get("triage", False), params.get("triage_auto_fail")),
+            brand_affinity=params.get("brand_affinity", False),
+            dispatch=_dispatch_config(params.get("dispatch_policy"), params.get("max_inflight_tokens"))
+        )
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred during batch evaluation: {str(e)}")
+
+@app.get("/runs/{run_id}", summary="Run Progress and Summary from the Result Journal")
+async def get_run_summary(run_id: str, include_results: bool = Query(False)):
+    """
+    Progress and summary of a journaled run (a partial summary if the run is unfinished).
+    """
+    try:
+        journal = RunJournal.open(run_id)
+    except (FileNotFoundError, ValueError) as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    results = await asyncio.to_thread(journal.results)
+    report = journal.summary(results)
+    if include_results:
+        report["results"] = results
+    return report
+
+@app.get("/result-store/stats", summary="Result Store Hit Rate")
+async def get_result_store_stats():
+    """
+    Hit/miss counters of the evaluation result store since startup, plus stored entries.
+    """
+    if result_store is None:
+        raise HTTPException(status_code=503, detail="Result store is disabled.")
+    return await asyncio.to_thread(result_store.stats)
+
+@app.get("/conversation-store/stats", summary="Local Conversation Store")
+async def get_conversation_store_stats():
+    """
+    Conversations stored per bot and the last incremental sync of each bot.
+    """
+    if conversation_store is None:
+        raise HTTPException(status_code=503, detail="Conversation store is disabled.")
+    return await asyncio.to_thread(conversation_store.stats)
+
+@app.get("/admission/stats", summary="LLM Admission Control")
+async def get_admission_stats():
+    """
+    Process-wide LLM slots per lane: in flight, queue depth, wait times, admitted/rejected requests.
+    """
+    return get_admission_controller().stats()
+
+
+class LiveAppendRequest(BaseModel):
+    messages: List[Message]
+    brand_id: Optional[str] = Field(
+        default=None,
+        description="Brand ID or 'auto-by-botid' - required for the first append, ignored once the session exists."
+    )
+    bot_id: Optional[str] = Field(default=None, description="Bot ID for 'auto-by-botid' mode.")
+    model: str = Field(default="gemini-1.5-flash", description="The model to use for LLM re-evaluation.")
+    evaluate: bool = Field(
+        default=True,
+        description="Schedule an LLM re-evaluation once enough new turns or new diagnostics hits have accumulated."
+    )
+
+
+def _open_live_session(conversation_id: str, request: LiveAppendRequest) -> LiveSession:
+    brand_id = request.brand_id
+    if not brand_id:
+        raise HTTPException(status_code=400, detail="brand_id is required to open a live session.")
+    if brand_id == "auto-by-botid":
+        if not request.bot_id:
+            raise HTTPException(status_code=400, detail="bot_id is required for 'auto-by-botid' mode.")
+        brand_id = brand_resolver.resolve(request.bot_id)
+        if not brand_id:
+            raise HTTPException(status_code=404, detail=f"No brand mapping found for bot_id: {request.bot_id}")
+
+    brand_prompt_path = get_brand_prompt_path(brand_id)
+    if not brand_prompt_path:
+        raise HTTPException(status_code=404, detail=f"Brand '{brand_id}' not found.")
+
+    artifact = get_brand_artifacts().from_prompt_file(brand_prompt_path, brand_id)
+    analyzer = IncrementalAnalyzer(artifact.brand_policy, artifact.brand_prompt_text, artifact.allowed_positions)
+    session = LiveSession(conversation_id, analyzer, live_sessions.config, brand_id=brand_id,
+                          context={"brand_prompt_path": brand_prompt_path, "model": request.model})
+    return live_sessions.add(session)
+
+
+async def _reevaluate_live(session: LiveSession, payload: Dict[str, Any]) -> None:
+    """Chấm lại snapshot của session live (chạy nền, lane streaming)"""
+    try:
+        get_admission_controller().admit(STREAMING, 1, session.brand_id)
+    except AdmissionRejected as e:
+        print(f"Live re-evaluation of {session.conversation_id} deferred: {e}")
+        session.abort_evaluation()
+        return
+
+    try:
+        result = await evaluate_raw_conversation(
+            payload,
+            session.context["brand_prompt_path"],
+            model=session.context["model"],
+            rubrics_cfg=current_rubrics(),
+            diagnostics_cfg=current_diagnostics(),
+            result_store=None,  # snapshot dở dang - không lưu, không dùng lại
+        )
+    except Exception as e:
+        result = {"conversation_id": session.conversation_id, "error": str(e)}
+    session.finish_evaluation(result)
+
+
+@app.post("/live/{conversation_id}/messages", summary="Append Messages to a Live Conversation")
+async def append_live_messages(conversation_id: str, request: LiveAppendRequest):
+    """
+    Appends messages to a still-growing conversation and returns its current metrics and diagnostics.
+    An LLM re-evaluation runs in the background only after enough new turns or new diagnostics hits.
+    """
+    try:
+        session = live_sessions.get(conversation_id) or _open_live_session(conversation_id, request)
+        new_hits = session.append([m.dict() for m in request.messages])
+
+        reason = session.reevaluation_due()
+        if request.evaluate and reason:
+            # Snapshot lấy ngay -> append tiếp theo thấy evaluating, không tạo task chấm trùng
+            live_sessions.track(asyncio.create_task(_reevaluate_live(session, session.begin_evaluation())))
+
+        state = session.state()
+        state["new_hits"] = new_hits
+        state["reevaluation"]["scheduled"] = reason if request.evaluate else None
+        return state
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
+
+
+@app.get("/live/{conversation_id}", summary="Current State of a Live Conversation")
+async def get_live_conversation(conversation_id: str):
+    """
+    Current incremental metrics, diagnostics and the latest LLM evaluation of a live conversation.
+    """
+    session = live_sessions.get(conversation_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"No live session for conversation: {conversation_id}")
+    return session.state()
+
+
+@app.delete("/live/{conversation_id}", summary="End a Live Conversation")
+async def end_live_conversation(conversation_id: str):
+    """
+    Ends the live session and returns its final state (use /evaluate/single for a final full evaluation).
+    """
+    session = live_sessions.pop(conversation_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"No live session for conversation: {conversation_id}")
+    return session.state()
+
+
+@app.get("/live", summary="Live Session Stats")
+async def get_live_stats():
+    """
+    Number of live sessions and created/expired/evicted/closed counters.
+    """
+    return live_sessions.get_stats()
+
 @app.post("/evaluate/batch/stream", summary="Stream batch evaluation results (SSE)")
 async def evaluate_batch_stream(request: BatchEvaluationRequest):
     """
@@ -253,25 +644,33 @@ async def evaluate_batch_stream(request: BatchEvaluationRequest):
             raise HTTPException(status_code=400, detail="max_concurrency must be between 1 and 50.")
         
         queue: asyncio.Queue = asyncio.Queue()
-
-        async def stream_callback(result: Dict[str, Any]):
-            await queue.put({"type": "item", "data": result})
+        dispatch = _dispatch_config(request.dispatch_policy, request.max_inflight_tokens)
+        _admit(STREAMING, request.max_concurrency, request.brand_id)
+        conversation_ids = [c.conversation_id for c in request.conversations]
+        journal = _open_run_journal(request.run_id, conversation_ids, {
+            "brand_id": request.brand_id, "model": request.model, "max_concurrency": request.max_concurrency,
+            "near_duplicate_threshold": request.near_duplicate_threshold,
+            "triage": request.triage, "triage_auto_fail": request.triage_auto_fail,
+            "brand_affinity": request.brand_affinity,
+            "dispatch_policy": request.dispatch_policy, "max_inflight_tokens": request.max_inflight_tokens
+        })
 
         async def run_evaluation():
             try:
-                conversation_ids = [c.conversation_id for c in request.conversations]
-                
                 brand_prompt_path = get_brand_prompt_path(request.brand_id)
                 if not brand_prompt_path:
                     await queue.put({"type": "error", "error": f"Brand '{request.brand_id}' not found."})
                     return
                 
-                brand_prompt_text, brand_policy = load_brand_prompt(brand_prompt_path)
+                brand_prompt_text, brand_policy = brand_prompt(brand_prompt_path)
                 
-                results = await evaluate_conversations_high_speed(
-                    conversation_ids=conversation_ids,
+                # Async iterator: mỗi result được ghi journal và đẩy ra ngay khi conversation đó xong.
+                # Conversation inline từ request - không fetch lại
+                done = journal.completed_ids()
+                async for result in stream_evaluate_conversations(
+                    conversation_ids=[c.dict() for c in request.conversations if c.conversation_id not in done],
                     base_url=os.getenv("API_BASE_URL", "http://103.141.140.243:14496"),  # Single conversation URL
-                    rubrics_cfg=rubrics_cfg,
+                    rubrics_cfg=current_rubrics(),
                     brand_policy=brand_policy,
                     brand_prompt_text=brand_prompt_text,
                     llm_api_key=os.getenv("GEMINI_API_KEY"),
@@ -279,17 +678,27 @@ async def evaluate_batch_stream(request: BatchEvaluationRequest):
                     temperature=0.2,
                     llm_base_url=os.getenv("LLM_BASE_URL"),
                     apply_diagnostics=True,
-                    diagnostics_cfg=diagnostics_cfg,
+                    diagnostics_cfg=current_diagnostics(),
                     max_concurrency=request.max_concurrency,
                     brand_resolver=brand_resolver,
-                    stream_callback=stream_callback
-                )
-                summary = make_summary(results)
-                insights = generate_insights(summary)
-                await queue.put({"type": "summary", "data": {"summary": summary, "insights": insights}})
+                    result_store=result_store,
+                    force_refresh=request.force_refresh,
+                    near_duplicate=_near_duplicate_config(request.near_duplicate_threshold),
+                    triage=_triage_config(request.triage, request.triage_auto_fail),
+                    brand_affinity=AffinityConfig() if request.brand_affinity else None,
+                    dispatch=dispatch
+                ):
+                    journal.append(result)
+                    await queue.put({"type": "item", "data": result})
+                await asyncio.to_thread(journal.close)
+                report = journal.summary()
+                await queue.put({"type": "summary", "data": {
+                    "run": report["run"], "summary": report["summary"], "insights": report["insights"]
+                }})
             except Exception as e:
                 await queue.put({"type": "error", "error": str(e)})
             finally:
+                await asyncio.to_thread(journal.close)
                 await queue.put({"type": "done"})
 
         async def sse_event_generator():
@@ -318,9 +727,16 @@ async def evaluate_bulk_conversations(
     bot_id: str = Form(..., description="Bot ID to fetch conversations from"),
     bearer_token: str = Form(..., description="Bearer token for API authentication"),
     limit: int = Form(10, description="Number of conversations to evaluate (1-100)"),
-    strategy: str = Form("random", description="Selection strategy: random, newest, oldest, head, tail"),
+    strategy: str = Form("random", description="Selection strategy: random, newest, oldest, head, tail, stratified"),
     brand_id: str = Form("long_van", description="Brand ID for evaluation"),
-          max_concurrency: int = Form(2, description="Maximum concurrency for evaluation (1-20)")
+    model: str = Form("gemini-2.5-flash", description="The model to use for evaluation"),
+          max_concurrency: int = Form(2, description="Maximum concurrency for evaluation (1-20)"),
+    since: Optional[str] = Form(None, description="Only conversations created at/after this date/datetime"),
+    until: Optional[str] = Form(None, description="Only conversations created before this date/datetime"),
+    min_turns: int = Form(0, description="Minimum number of messages"),
+    max_turns: Optional[int] = Form(None, description="Maximum number of messages"),
+    stratify_by: str = Form("day", description="Stratum for strategy=stratified: day, flow, turns"),
+    seed: Optional[int] = Form(None, description="Seed for random/stratified sampling")
 ):
     """
     Simple bulk evaluation endpoint:
@@ -341,6 +757,8 @@ async def evaluate_bulk_conversations(
         if max_concurrency < 1 or max_concurrency > 20:
             raise HTTPException(status_code=400, detail="max_concurrency must be between 1 and 20.")
         
+        _admit(BATCH, max_concurrency, brand_id)
+        
         list_base_url = os.getenv("LIST_API_BASE_URL", "https://live-demo.agenticai.pro.vn")
         
         fetch_config = FetchConfig(
@@ -349,51 +767,55 @@ async def evaluate_bulk_conversations(
             bearer_token=bearer_token,
             page_size=min(limit, 50),  # Chỉ fetch đúng số lượng cần thiết
             max_pages=2,
-            limit=limit
+            limit=limit,
+            typed_decode=True  # DecodedConversation: messages đã decode, dùng inline khi chấm
         )
         
         try:
-            all_conversations = await asyncio.to_thread(fetch_conversations_with_messages, fetch_config)
+            query = SelectionQuery(take=limit, strategy=strategy, since=since, until=until, min_turns=min_turns,
+                                   max_turns=max_turns, stratify_by=stratify_by, seed=seed)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        try:
+            selected_conversations, total_available = await _select_bot_conversations(fetch_config, query)
         except Exception as fetch_error:
             raise HTTPException(status_code=400, detail=f"Failed to fetch conversations: {str(fetch_error)}")
 
-        if not all_conversations:
+        if not total_available:
             return {"message": "No conversations found for the given bot_id.", "results": []}
 
-        selected_conversations = select_conversations(
-            conversations=all_conversations,
-            take=limit,
-            strategy=strategy
-        )
-
         if not selected_conversations:
             return {"message": "No conversations selected after filtering.", "results": []}
 
-        conversation_ids = [conv.get("conversation_id") for conv in selected_conversations]
-        
         brand_prompt_path = get_brand_prompt_path(brand_id)
         if not brand_prompt_path:
             raise HTTPException(status_code=404, detail=f"Brand '{brand_id}' not found.")
         
-        brand_prompt_text, brand_policy = load_brand_prompt(brand_prompt_path)
+        brand_prompt_text, brand_policy = brand_prompt(brand_prompt_path)
         
         single_base_url = os.getenv("API_BASE_URL", "http://103.141.140.243:14496")
         
+        # list API đã trả đủ messages -> truyền inline, không fetch lại từng conversation
         results = await evaluate_conversations_high_speed(
-            conversation_ids=conversation_ids,
+            conversation_ids=selected_conversations,
             base_url=single_base_url,
-            rubrics_cfg=rubrics_cfg,
+            rubrics_cfg=current_rubrics(),
             brand_policy=brand_policy,
             brand_prompt_text=brand_prompt_text,
             llm_api_key=os.getenv("GEMINI_API_KEY"),
-            llm_model=request.model,
+            llm_model=model,
             temperature=0.2,
             llm_base_url=os.getenv("LLM_BASE_URL"),
             apply_diagnostics=True,
-            diagnostics_cfg=diagnostics_cfg,
+            diagnostics_cfg=current_diagnostics(),
             max_concurrency=max_concurrency,
-            brand_resolver=brand_resolver
+            brand_resolver=brand_resolver,
+            result_store=result_store
         )
+        if conversation_store is not None:
+            # detected_flow cho stratify_by="flow" ở lần chọn sau
+            await asyncio.to_thread(conversation_store.record_flows, results)
         
         try:
             summary = make_summary(results)
@@ -426,7 +848,7 @@ async def evaluate_bulk_conversations(
                 "bot_id": bot_id,
                 "brand_id": brand_id,
                 "strategy": strategy,
-                "total_fetched": len(all_conversations),
+                "total_fetched": total_available,
                 "selected_count": len(selected_conversations),
                 "evaluated_count": len(results)
             }
@@ -466,6 +888,18 @@ async def fetch_conversations_endpoint(request: dict = Body(...)):
         if not bot_id or not bearer_token:
             raise HTTPException(status_code=400, detail="bot_id and bearer_token are required")
         
+        # Truy vấn chọn: since/until, min_turns/max_turns, sort_by/order, stratify_by, seed, skip
+        try:
+            query = SelectionQuery(
+                take=limit, skip=request.get("skip", 0), strategy=strategy,
+                sort_by=request.get("sort_by", "created_at"), order=request.get("order", "desc"),
+                min_turns=request.get("min_turns", 0), max_turns=request.get("max_turns"),
+                since=request.get("since"), until=request.get("until"),
+                stratify_by=request.get("stratify_by", "day"), allocation=request.get("allocation", "proportional"),
+                seed=request.get("seed"))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
         list_base_url = os.getenv("LIST_API_BASE_URL", "https://live-demo.agenticai.pro.vn")
         
         fetch_config = FetchConfig(
@@ -477,23 +911,20 @@ async def fetch_conversations_endpoint(request: dict = Body(...)):
             limit=limit
         )
         
-        all_conversations = await asyncio.to_thread(fetch_conversations_with_messages, fetch_config)
+        selected_conversations, total_available = await _select_bot_conversations(fetch_config, query)
         
-        if not all_conversations:
+        if not total_available:
             return {"conversations": [], "message": "No conversations found"}
         
-        selected_conversations = select_conversations(
-            conversations=all_conversations,
-            take=limit,
-            strategy=strategy
-        )
-        
         return {
-            "conversations": selected_conversations,
-            "total_fetched": len(all_conversations),
+            "conversations": [c.to_dict() if isinstance(c, DecodedConversation) else c
+                              for c in selected_conversations],
+            "total_fetched": total_available,
             "selected_count": len(selected_conversations)
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch conversations: {str(e)}")
 
@@ -503,7 +934,7 @@ async def evaluate_bulk_raw(request: dict = Body(...)):
     try:
         conversations = request.get("conversations", [])
         brand_id = request.get("brand_id", "long_van")
-        max_concurrency = request.get("max_concurrency", 2)
+        max_concurrency = _raw_max_concurrency(request.get("max_concurrency"))
         model = request.get("model", "gemini-1.5-flash")
         
         if not conversations:
@@ -513,9 +944,7 @@ async def evaluate_bulk_raw(request: dict = Body(...)):
         if not brand_prompt_path:
             raise HTTPException(status_code=404, detail=f"Brand '{brand_id}' not found.")
         
-        brand_prompt_text, brand_policy = load_brand_prompt(brand_prompt_path)
-        
-        from tools.bulk_list_evaluate import evaluate_many_raw_conversations
+        brand_prompt_text, brand_policy = brand_prompt(brand_prompt_path)
         
         if model.startswith("gpt"):
             llm_api_key = os.getenv("OPENAI_API_KEY")
@@ -526,6 +955,7 @@ async def evaluate_bulk_raw(request: dict = Body(...)):
         
         if not llm_api_key:
             raise HTTPException(status_code=400, detail=f"API key not found for model {model}")
+        _admit(BATCH, max_concurrency, brand_id)
         
         results = await evaluate_many_raw_conversations(
             raw_conversations=conversations,
@@ -533,7 +963,13 @@ async def evaluate_bulk_raw(request: dict = Body(...)):
             max_concurrency=max_concurrency,
             model=model,
             llm_api_key=llm_api_key,
-            llm_base_url=llm_base_url
+            llm_base_url=llm_base_url,
+            override_brand_prompt_text=brand_prompt_text,
+            override_brand_policy=brand_policy,
+            rubrics_cfg=current_rubrics(),
+            diagnostics_cfg=current_diagnostics(),
+            result_store=result_store,
+            force_refresh=bool(request.get("force_refresh", False))
         )
         
         try:
@@ -582,7 +1018,7 @@ async def evaluate_bulk_raw_kb(request: dict = Body(...)):
     try:
         conversations = request.get("conversations", [])
         kb_json = request.get("kb_json")
-        max_concurrency = request.get("max_concurrency", 2)
+        max_concurrency = _raw_max_concurrency(request.get("max_concurrency"))
         model = request.get("model", "gemini-1.5-flash")
 
         if not conversations:
@@ -590,8 +1026,6 @@ async def evaluate_bulk_raw_kb(request: dict = Body(...)):
         if not kb_json:
             raise HTTPException(status_code=400, detail="kb_json is required")
 
-        from tools.bulk_list_evaluate import evaluate_many_raw_conversations
-
         if model.startswith("gpt"):
             llm_api_key = os.getenv("OPENAI_API_KEY")
             llm_base_url = "https://api.openai.com/v1"
@@ -601,6 +1035,7 @@ async def evaluate_bulk_raw_kb(request: dict = Body(...)):
 
         if not llm_api_key:
             raise HTTPException(status_code=400, detail=f"API key not found for model {model}")
+        _admit(BATCH, max_concurrency, request.get("brand_id", "kb"))
 
         results = await evaluate_many_raw_conversations(
             raw_conversations=conversations,
@@ -609,7 +1044,11 @@ async def evaluate_bulk_raw_kb(request: dict = Body(...)):
             model=model,
             llm_api_key=llm_api_key,
             llm_base_url=llm_base_url,
-            kb_json=kb_json
+            kb_json=kb_json,
+            rubrics_cfg=current_rubrics(),
+            diagnostics_cfg=current_diagnostics(),
+            result_store=result_store,
+            force_refresh=bool(request.get("force_refresh", False))
         )
 
         try:
@@ -656,7 +1095,7 @@ async def evaluate_bulk_raw_kb_stream(request: dict = Body(...)):
     try:
         conversations = request.get("conversations", [])
         kb_json = request.get("kb_json")
-        max_concurrency = request.get("max_concurrency", 2)
+        max_concurrency = _raw_max_concurrency(request.get("max_concurrency"))
         model = request.get("model", "gemini-1.5-flash")
 
         if not conversations:
@@ -673,6 +1112,7 @@ async def evaluate_bulk_raw_kb_stream(request: dict = Body(...)):
 
         if not llm_api_key:
             raise HTTPException(status_code=400, detail=f"API key not found for model {model}")
+        _admit(STREAMING, max_concurrency, request.get("brand_id", "kb"))
 
         queue: asyncio.Queue = asyncio.Queue()
 
@@ -681,7 +1121,6 @@ async def evaluate_bulk_raw_kb_stream(request: dict = Body(...)):
 
         async def run_evaluation():
             try:
-                from tools.bulk_list_evaluate import evaluate_many_raw_conversations
                 results = await evaluate_many_raw_conversations(
                     raw_conversations=conversations,
                     brand_prompt_path="",
@@ -690,7 +1129,11 @@ async def evaluate_bulk_raw_kb_stream(request: dict = Body(...)):
                     llm_api_key=llm_api_key,
                     llm_base_url=llm_base_url,
                     kb_json=kb_json,
-                    stream_callback=stream_callback
+                    stream_callback=stream_callback,
+                    rubrics_cfg=current_rubrics(),
+                    diagnostics_cfg=current_diagnostics(),
+                    result_store=result_store,
+                    force_refresh=bool(request.get("force_refresh", False))
                 )
                 summary = make_summary(results)
                 insights = generate_insights(summary)
@@ -727,7 +1170,7 @@ async def evaluate_bulk_raw_stream(request: dict = Body(...)):
     try:
         conversations = request.get("conversations", [])
         brand_id = request.get("brand_id", "long_van")
-        max_concurrency = request.get("max_concurrency", 2)
+        max_concurrency = _raw_max_concurrency(request.get("max_concurrency"))
         model = request.get("model", "gemini-1.5-flash")
         
         if not conversations:
@@ -737,7 +1180,7 @@ async def evaluate_bulk_raw_stream(request: dict = Body(...)):
         if not brand_prompt_path:
             raise HTTPException(status_code=404, detail=f"Brand '{brand_id}' not found.")
         
-        brand_prompt_text, brand_policy = load_brand_prompt(brand_prompt_path)
+        brand_prompt_text, brand_policy = brand_prompt(brand_prompt_path)
         
         if model.startswith("gpt"):
             llm_api_key = os.getenv("OPENAI_API_KEY")
@@ -748,8 +1191,7 @@ async def evaluate_bulk_raw_stream(request: dict = Body(...)):
         
         if not llm_api_key:
             raise HTTPException(status_code=400, detail=f"API key not found for model {model}")
-        
-        from tools.bulk_list_evaluate import evaluate_many_raw_conversations
+        _admit(STREAMING, max_concurrency, brand_id)
         
         async def stream_callback(result: Dict[str, Any]):
             await result_queue.put({
@@ -768,7 +1210,13 @@ async def evaluate_bulk_raw_stream(request: dict = Body(...)):
                     model=model,
                     llm_api_key=llm_api_key,
                     llm_base_url=llm_base_url,
-                    stream_callback=stream_callback
+                    stream_callback=stream_callback,
+                    override_brand_prompt_text=brand_prompt_text,
+                    override_brand_policy=brand_policy,
+                    rubrics_cfg=current_rubrics(),
+                    diagnostics_cfg=current_diagnostics(),
+                    result_store=result_store,
+                    force_refresh=bool(request.get("force_refresh", False))
                 )
                 
                 try:
@@ -876,6 +1324,57 @@ async def run_benchmark(
         raise HTTPException(status_code=500, detail=f"An error occurred during benchmarking: {str(e)}")
 
 
+class RescoreRequest(BaseModel):
+    results: List[Dict[str, Any]] = Field(..., description="Per-conversation results that carry llm_raw and diagnostics_hits")
+    rubrics_config: Optional[str] = Field(None, description="Rubrics config name under config/ to re-score with (default: loaded config)")
+    diagnostics_config: Optional[str] = Field(None, description="Diagnostics config name under config/ to re-score with (default: loaded config)")
+    apply_diagnostics: bool = Field(default=True, description="Apply diagnostics penalties")
+    update_notes: bool = Field(default=True, description="Rebuild criterion notes (slower on very large sets)")
+
+_CONFIG_DIR = Path(__file__).parent / "config"
+
+
+def _named_config_path(name: str) -> str:
+    """Tên config (vd. 'rubrics_unified') -> path trong config/; không nhận path tùy ý từ client"""
+    filename = name if name.endswith((".yaml", ".yml")) else f"{name}.yaml"
+    if Path(filename).name != filename or not (_CONFIG_DIR / filename).is_file():
+        raise HTTPException(status_code=404, detail=f"Config '{name}' not found.")
+    return f"config/{filename}"
+
+
+@app.post("/evaluate/rescore", summary="Re-score Stored Results without calling the LLM")
+async def rescore_stored_results(request: RescoreRequest):
+    """
+    Re-applies rubric weights and penalties to stored results (no LLM calls).
+    """
+    try:
+        from busqa.rescoring import rescore_results
+
+        rescore_rubrics = (current_rubrics(_named_config_path(request.rubrics_config))
+                           if request.rubrics_config else current_rubrics())
+        rescore_diagnostics = None
+        if request.apply_diagnostics:
+            rescore_diagnostics = (current_diagnostics(_named_config_path(request.diagnostics_config))
+                                   if request.diagnostics_config else current_diagnostics())
+
+        results, stats = await asyncio.to_thread(
+            rescore_results, request.results, rescore_rubrics, rescore_diagnostics, request.update_notes
+        )
+        summary = make_summary(results)
+        return {
+            "rescore_stats": stats,
+            "summary": summary,
+            "insights": generate_insights(summary),
+            "results": results
+        }
+    except HTTPException as he:
+        raise he
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid config: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An error occurred during re-scoring: {str(e)}")
+
+
 # Prompt Doctor API
 
 class PromptAnalysisRequest(BaseModel):
@@ -893,14 +1392,13 @@ async def analyze_prompt_suggestions(request: PromptAnalysisRequest):
     """
     try:
         from busqa.prompt_doctor import analyze_prompt_suggestions
-        from busqa.brand_specs import load_brand_prompt
 
         current_prompt_text: Optional[str] = None
         brand_policy_text: str = request.brand_policy or ""
 
         if request.brand_id:
             brand_prompt_path = get_brand_prompt_path(request.brand_id)
-            brand_prompt_text, brand_policy_default = load_brand_prompt(brand_prompt_path)
+            brand_prompt_text, brand_policy_default = brand_prompt(brand_prompt_path)
             if not brand_prompt_text:
                 raise HTTPException(status_code=404, detail=f"Brand prompt not found for brand: {request.brand_id}")
             current_prompt_text = brand_prompt_text
@@ -911,6 +1409,7 @@ async def analyze_prompt_suggestions(request: PromptAnalysisRequest):
         else:
             raise HTTPException(status_code=400, detail="Either brand_id or current_prompt must be provided")
 
+        _admit(PROMPT_DOCTOR)
         result = await analyze_prompt_suggestions(
             evaluation_summary=request.evaluation_summary,
             current_prompt=current_prompt_text,
@@ -4,5 +4,8 @@ __all__ = [
     "brand_specs", "diagnostics", "prompt_loader",
     "batch_evaluator", "brand_resolver", "bot_map",
     "high_performance_api", "performance_monitor", "aggregate",
-    "parsers"
+    "parsers", "cpu_stage", "frame", "decode", "rescoring", "pipeline",
+    "concurrency", "journal", "result_store", "near_duplicate", "config_registry",
+    "brand_artifacts", "list_fetcher", "conversation_store", "selection",
+    "sequential_audit", "triage", "admission", "affinity", "dispatch", "live"
 ]
\ No newline at end of file
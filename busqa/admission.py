@@ -0,0 +1,382 @@
+"""
+Admission control cho LLM trong cả process: pool slot dùng chung + bulkhead theo loại tải.
+
+Mỗi request /evaluate/* tự mang max_concurrency riêng, nên 10 người chạy batch cùng lúc
+là 10 x 50 call LLM. Ở đây mọi call_llm_async đi qua một controller chung:
+
+- total_slots: trần số call LLM đang bay của cả process
+- bulkhead (lane) theo lớp ưu tiên: interactive (single evaluation) > prompt_doctor >
+  streaming (UI SSE) > batch (backfill, CLI) - mỗi lane có trần riêng nên batch không
+  chiếm hết slot của interactive
+- trong lane: weighted fair queuing theo flow (brand_id hoặc job ID) - brand lớn không
+  bỏ đói brand nhỏ; flow_weights đổi tỉ lệ chia
+- chống đói: waiter chờ quá max_starvation_seconds của lane được cấp slot trước lớp ưu
+  tiên cao hơn và trước thứ tự WFQ (đếm vào promotions)
+- hàng chờ có giới hạn: request mới bị từ chối ngay (429 + Retry-After) khi hàng chờ của
+  lane đã quá max_queue hoặc thời gian chờ ước lượng vượt max_wait_seconds, thay vì
+  timeout sau vài phút
+
+Lane và flow của call lấy từ contextvar do endpoint đặt (admit) - task con của pipeline kế
+thừa context nên không phải truyền qua từng hàm; evaluator multi-brand đặt flow theo brand
+của từng conversation (llm_flow). slot() lồng nhau trong cùng context không lấy slot thứ hai:
+pipeline lấy slot trước stage LLM (ngoài timeout của stage), call_llm_async bên trong dùng luôn.
+
+    admission = get_admission_controller()
+    admission.admit("batch", demand=max_concurrency, flow=brand_id)  # AdmissionRejected nếu quá tải
+    async with admission.slot():                                       # trong call_llm_async
+        ...
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import math
+import os
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+PROMPT_DOCTOR = "prompt_doctor"
+STREAMING = "streaming"
+BATCH = "batch"
+DEFAULT_FLOW = "default"
+_MAX_FLOWS = 1000
+
+_current_lane: contextvars.ContextVar[str] = contextvars.ContextVar("busqa_llm_lane", default=BATCH)
+_current_flow: contextvars.ContextVar[str] = contextvars.ContextVar("busqa_llm_flow", default=DEFAULT_FLOW)
+_holding_slot: contextvars.ContextVar[bool] = contextvars.ContextVar("busqa_llm_slot_held", default=False)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+@dataclass
+class LaneConfig:
+    """Bulkhead của một lớp ưu tiên"""
+    max_slots: int
+    max_queue: int  # số call chờ tối đa trước khi từ chối request mới
+    max_wait_seconds: float  # thời gian chờ ước lượng tối đa
+    max_starvation_seconds: float = 60.0  # chờ lâu hơn -> được cấp trước lớp cao hơn / thứ tự WFQ
+
+
+def _default_lanes() -> Dict[str, LaneConfig]:
+    # Thứ tự = ưu tiên khi slot chung trống
+    return {
+        INTERACTIVE: LaneConfig(_env_int("BUSQA_LLM_SLOTS_INTERACTIVE", 8), 32, 15.0, 5.0),
+        PROMPT_DOCTOR: LaneConfig(_env_int("BUSQA_LLM_SLOTS_PROMPT_DOCTOR", 4), 8, 60.0, 20.0),
+        STREAMING: LaneConfig(_env_int("BUSQA_LLM_SLOTS_STREAMING", 16), 128, 120.0, 30.0),
+        BATCH: LaneConfig(_env_int("BUSQA_LLM_SLOTS_BATCH", 24), 256, 300.0, 120.0),
+    }
+
+
+@dataclass
+class AdmissionConfig:
+    """Pool slot LLM của process"""
+    total_slots: int = field(default_factory=lambda: _env_int("BUSQA_LLM_SLOTS", 32))
+    lanes: Dict[str, LaneConfig] = field(default_factory=_default_lanes)
+    flow_weights: Dict[str, float] = field(default_factory=dict)  # flow -> weight (mặc định 1)
+    default_latency_seconds: float = 5.0  # ước lượng chờ khi chưa đo được latency
+    latency_alpha: float = 0.2  # EWMA latency mỗi call
+    wait_samples: int = 500
+
+
+class AdmissionRejected(RuntimeError):
+    """Hàng chờ quá ngân sách - request nên thử lại sau retry_after giây"""
+
+    def __init__(self, lane: str, retry_after: float, reason: str):
+        super().__init__(f"LLM capacity exhausted for lane '{lane}' ({reason}); retry after {retry_after:.0f}s")
+        self.lane = lane
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class _Waiter:
+    __slots__ = ("tag", "seq", "future", "flow", "enqueued", "active")
+
+    def __init__(self, tag: float, seq: int, future: asyncio.Future, flow: "_Flow", enqueued: float):
+        self.tag = tag
+        self.seq = seq
+        self.future = future
+        self.flow = flow
+        self.enqueued = enqueued
+        self.active = True  # False: đã cấp slot hoặc bị hủy (xóa lười khỏi heap/deque)
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.tag, self.seq) < (other.tag, other.seq)
+
+
+class _Flow:
+    __slots__ = ("key", "weight", "finish", "waiting", "served", "wait_total")
+
+    def __init__(self, key: str, weight: float):
+        self.key = key
+        self.weight = weight
+        self.finish = 0.0  # virtual finish time của waiter cuối
+        self.waiting = 0
+        self.served = 0
+        self.wait_total = 0.0
+
+
+class _Lane:
+    __slots__ = ("name", "config", "in_flight", "heap", "fifo", "waiting", "vtime", "flows", "latency",
+                 "waits", "admitted", "rejected", "calls", "max_waiting", "promotions")
+
+    def __init__(self, name: str, config: LaneConfig, wait_samples: int):
+        self.name = name
+        self.config = config
+        self.in_flight = 0
+        self.heap: List[_Waiter] = []  # WFQ theo virtual finish time
+        self.fifo: Deque[_Waiter] = deque()  # thứ tự đến - cho starvation guard
+        self.waiting = 0
+        self.vtime = 0.0
+        self.flows: Dict[str, _Flow] = {}
+        self.latency: Optional[float] = None
+        self.waits: Deque[float] = deque(maxlen=wait_samples)
+        self.admitted = 0
+        self.rejected = 0
+        self.calls = 0
+        self.max_waiting = 0
+        self.promotions = 0
+
+    def oldest(self) -> Optional[_Waiter]:
+        while self.fifo and not self.fifo[0].active:
+            self.fifo.popleft()
+        return self.fifo[0] if self.fifo else None
+
+    def next_fair(self) -> Optional[_Waiter]:
+        while self.heap and not self.heap[0].active:
+            heapq.heappop(self.heap)
+        return self.heap[0] if self.heap else None
+
+
+class AdmissionController:
+    """Semaphore hai tầng (lane + process) cấp slot bằng future, như AIMDLimiter"""
+
+    def __init__(self, config: AdmissionConfig = None):
+        self.config = config or AdmissionConfig()
+        if self.config.total_slots < 1:
+            raise ValueError("total_slots must be >= 1")
+        self._lanes = {name: _Lane(name, cfg, self.config.wait_samples)
+                       for name, cfg in self.config.lanes.items()}
+        self._in_flight = 0
+        self._seq = itertools.count()
+
+    def _lane(self, name: Optional[str]) -> _Lane:
+        name = name or _current_lane.get()
+        if name not in self._lanes:
+            raise ValueError(f"Unknown LLM lane '{name}' (expected one of {list(self._lanes)})")
+        return self._lanes[name]
+
+    def _flow(self, lane: _Lane, key: Optional[str]) -> _Flow:
+        key = str(key or _current_flow.get())
+        flow = lane.flows.get(key)
+        if flow is None:
+            if len(lane.flows) >= _MAX_FLOWS:
+                # Job ID tích lũy theo thời gian: bỏ flow rảnh đã tụt sau virtual time (không đổi thứ tự WFQ)
+                for idle in [k for k, f in lane.flows.items() if not f.waiting and f.finish <= lane.vtime]:
+                    del lane.flows[idle]
+            flow = lane.flows[key] = _Flow(key, max(1e-6, float(self.config.flow_weights.get(key, 1.0))))
+        return flow
+
+    # Admission (mức request)
+
+    def estimated_wait(self, lane_name: str, demand: int = 1) -> float:
+        """Giây chờ ước lượng cho `demand` call mới của lane: (chờ + demand) / slot x latency"""
+        lane = self._lane(lane_name)
+        slots = max(1, min(lane.config.max_slots, self.config.total_slots))
+        latency = lane.latency if lane.latency is not None else self.config.default_latency_seconds
+        ahead = lane.waiting + max(0, lane.in_flight + demand - slots)
+        return ahead / slots * latency if ahead > 0 else 0.0
+
+    def admit(self, lane_name: str, demand: int = 1, flow: Optional[str] = None) -> str:
+        """
+        Nhận request vào lane (đặt lane/flow cho mọi call LLM trong context hiện tại)
+        hoặc raise AdmissionRejected.
+        """
+        lane = self._lane(lane_name)
+        wait = self.estimated_wait(lane_name, demand)
+        reason = None
+        if lane.waiting >= lane.config.max_queue:
+            reason = f"queue {lane.waiting}/{lane.config.max_queue}"
+        elif wait > lane.config.max_wait_seconds:
+            reason = f"estimated wait {wait:.0f}s > {lane.config.max_wait_seconds:.0f}s"
+        if reason is not None:
+            lane.rejected += 1
+            logger.warning(f"[admission] rejected {lane_name} request: {reason}")
+            raise AdmissionRejected(lane_name, max(1.0, math.ceil(wait)), reason)
+        lane.admitted += 1
+        _current_lane.set(lane_name)
+        if flow is not None:
+            _current_flow.set(str(flow))
+        return lane_name
+
+    # Slot (mức call LLM)
+
+    def _can_start(self, lane: _Lane) -> bool:
+        return self._in_flight < self.config.total_slots and lane.in_flight < lane.config.max_slots
+
+    async def acquire(self, lane_name: Optional[str] = None, flow_key: Optional[str] = None) -> Tuple[_Lane, float]:
+        lane = self._lane(lane_name)
+        started = time.monotonic()
+        if lane.waiting or not self._can_start(lane):
+            flow = self._flow(lane, flow_key)
+            # WFQ: virtual finish = max(virtual time của lane, finish của flow) + 1/weight
+            tag = max(lane.vtime, flow.finish) + 1.0 / flow.weight
+            flow.finish = tag
+            waiter = _Waiter(tag, next(self._seq), asyncio.get_running_loop().create_future(), flow, started)
+            heapq.heappush(lane.heap, waiter)
+            lane.fifo.append(waiter)
+            lane.waiting += 1
+            flow.waiting += 1
+            lane.max_waiting = max(lane.max_waiting, lane.waiting)
+            try:
+                await waiter.future
+            except asyncio.CancelledError:
+                if waiter.future.done() and not waiter.future.cancelled():
+                    self._release(lane)  # slot đã cấp đúng lúc bị hủy -> trả lại
+                elif waiter.active:
+                    waiter.active = False
+                    lane.waiting -= 1
+                    flow.waiting -= 1
+                raise
+        else:
+            self._in_flight += 1
+            lane.in_flight += 1
+            self._flow(lane, flow_key).served += 1
+        acquired = time.monotonic()
+        lane.waits.append(acquired - started)
+        lane.calls += 1
+        return lane, acquired
+
+    def release(self, lane: _Lane, acquired: float) -> None:
+        latency = time.monotonic() - acquired
+        alpha = self.config.latency_alpha
+        lane.latency = latency if lane.latency is None else (1 - alpha) * lane.latency + alpha * latency
+        self._release(lane)
+
+    def _release(self, lane: _Lane) -> None:
+        self._in_flight -= 1
+        lane.in_flight -= 1
+        self._wake()
+
+    def _next(self, now: float) -> Optional[Tuple[_Lane, _Waiter, bool]]:
+        """Waiter kế tiếp: waiter bị đói trước, rồi lane theo ưu tiên, trong lane theo WFQ"""
+        startable = [lane for lane in self._lanes.values() if lane.waiting and self._can_start(lane)]
+        if not startable:
+            return None
+        starving = []
+        for lane in startable:
+            oldest = lane.oldest()
+            if oldest is not None and now - oldest.enqueued >= lane.config.max_starvation_seconds:
+                starving.append((oldest.enqueued, lane, oldest))
+        if starving:
+            _, lane, waiter = min(starving, key=lambda item: item[0])
+            return lane, waiter, lane.next_fair() is not waiter or lane is not startable[0]
+        lane = startable[0]
+        return lane, lane.next_fair(), False
+
+    def _wake(self) -> None:
+        now = time.monotonic()
+        while self._in_flight < self.config.total_slots:
+            picked = self._next(now)
+            if picked is None:
+                return
+            lane, waiter, promoted = picked
+            waiter.active = False
+            lane.waiting -= 1
+            waiter.flow.waiting -= 1
+            if waiter.future.done():
+                continue
+            if promoted:
+                lane.promotions += 1
+            # Virtual time của lane tiến tới tag vừa phục vụ
+            lane.vtime = max(lane.vtime, waiter.tag)
+            waiter.flow.served += 1
+            waiter.flow.wait_total += now - waiter.enqueued
+            self._in_flight += 1
+            lane.in_flight += 1
+            waiter.future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, lane_name: Optional[str] = None, flow_key: Optional[str] = None) -> AsyncIterator[None]:
+        if _holding_slot.get():
+            yield  # caller đã giữ slot
+            return
+        lane, acquired = await self.acquire(lane_name, flow_key)
+        token = _holding_slot.set(True)
+        try:
+            yield
+        finally:
+            _holding_slot.reset(token)
+            self.release(lane, acquired)
+
+    # Metrics
+
+    def stats(self) -> Dict[str, Any]:
+        lanes = {}
+        for name, lane in self._lanes.items():
+            waits = sorted(lane.waits)
+
+            def pct(q: float) -> float:
+                return round(waits[max(0, math.ceil(q * len(waits)) - 1)] * 1000, 1) if waits else 0.0
+
+            lanes[name] = {
+                "max_slots": lane.config.max_slots,
+                "in_flight": lane.in_flight,
+                "queue_depth": lane.waiting,
+                "max_queue_depth": lane.max_waiting,
+                "max_queue": lane.config.max_queue,
+                "admitted": lane.admitted,
+                "rejected": lane.rejected,
+                "calls": lane.calls,
+                "promotions": lane.promotions,
+                "avg_wait_ms": round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+                "p50_wait_ms": pct(0.5),
+                "p95_wait_ms": pct(0.95),
+                "max_wait_ms": round(waits[-1] * 1000, 1) if waits else 0.0,
+                "latency_ewma_ms": round(lane.latency * 1000, 1) if lane.latency is not None else None,
+                "estimated_wait_seconds": round(self.estimated_wait(name), 2),
+                "flows": {key: {"weight": flow.weight, "waiting": flow.waiting, "served": flow.served,
+                                "avg_wait_ms": round(flow.wait_total / flow.served * 1000, 1)
+                                if flow.served else 0.0}
+                          for key, flow in lane.flows.items()},
+            }
+        return {"total_slots": self.config.total_slots, "in_flight": self._in_flight, "lanes": lanes}
+
+
+@contextmanager
+def llm_flow(key: Optional[str]) -> Iterator[None]:
+    """Đặt flow (brand_id / job ID) cho call LLM trong block - evaluator multi-brand dùng theo conversation"""
+    if not key:
+        yield
+        return
+    token = _current_flow.set(str(key))
+    try:
+        yield
+    finally:
+        _current_flow.reset(token)
+
+
+_default_controller: Optional[AdmissionController] = None
+_default_lock = threading.Lock()
+
+
+def get_admission_controller() -> AdmissionController:
+    """Controller dùng chung trong process"""
+    global _default_controller
+    if _default_controller is None:
+        with _default_lock:
+            if _default_controller is None:
+                _default_controller = AdmissionController()
+    return _default_controller
@@ -0,0 +1,73 @@
+"""
+Brand affinity trước LLM: gom conversation cùng brand thành run liên tiếp để system
+prompt (phần prefix lớn, giống hệt nhau trong một brand) còn nằm trong prefix cache.
+
+auto-by-botid đưa conversation các brand tới LLM xen kẽ theo thứ tự đến -> mỗi call đẩy
+system prompt của brand khác ra khỏi cache (local lẫn phía provider). Brand đã resolve
+ở fetch stage nên hàng chờ trước LLM stage sắp lại được theo brand (pipeline.Stage
+order_key) trong một cửa sổ giới hạn - result vẫn stream đều.
+
+Provider không trả số token cache, nên hit ratio đo bằng mô hình cache: LRU `cache_slots`
+system prompt gần nhất; call có system prompt còn trong LRU là hit.
+"""
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class AffinityConfig:
+    """Sắp xếp theo brand trước LLM stage (chỉ có tác dụng khi multi-brand)"""
+    reorder_window: int = 32  # số lần tối đa một conversation bị conversation đến sau vượt
+    cache_slots: int = 4  # số system prompt mô hình cache giữ được
+
+    def __post_init__(self):
+        if self.reorder_window < 0:
+            raise ValueError("reorder_window must be >= 0")
+        if self.cache_slots < 1:
+            raise ValueError("cache_slots must be >= 1")
+
+
+class PrefixCacheModel:
+    """LRU system prompt theo thứ tự dispatch LLM; đếm hit theo brand"""
+
+    def __init__(self, cache_slots: int = 4):
+        self.cache_slots = max(1, cache_slots)
+        self._lru: "OrderedDict[Any, None]" = OrderedDict()
+        self._brands: Dict[str, list] = {}  # brand_id -> [calls, hits]
+        self._last = None
+        self.runs = 0
+
+    def dispatch(self, prompt_key: Any, brand_id: str) -> bool:
+        """Ghi nhận một call LLM; True nếu system prompt còn trong cache"""
+        hit = prompt_key in self._lru
+        if hit:
+            self._lru.move_to_end(prompt_key)
+        else:
+            self._lru[prompt_key] = None
+            if len(self._lru) > self.cache_slots:
+                self._lru.popitem(last=False)
+        if prompt_key != self._last:
+            self.runs += 1
+            self._last = prompt_key
+        counts = self._brands.setdefault(brand_id, [0, 0])
+        counts[0] += 1
+        counts[1] += hit
+        return hit
+
+    def stats(self) -> Dict[str, Any]:
+        calls = sum(c for c, _ in self._brands.values())
+        hits = sum(h for _, h in self._brands.values())
+        return {
+            "cache_slots": self.cache_slots,
+            "calls": calls,
+            "hits": hits,
+            "hit_ratio": round(hits / calls, 4) if calls else 0.0,
+            "runs": self.runs,
+            "avg_run_length": round(calls / self.runs, 2) if self.runs else 0.0,
+            "brands": {brand: {"calls": c, "hits": h, "hit_ratio": round(h / c, 4) if c else 0.0}
+                       for brand, (c, h) in self._brands.items()},
+        }
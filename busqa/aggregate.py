@@ -5,6 +5,8 @@ import statistics
 from typing import Dict, List, Any
 from collections import Counter
 
+from .triage import summarize_triage
+
 def make_summary(results: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
     Create summary statistics from batch evaluation results.
@@ -18,6 +20,8 @@ def make_summary(results: List[Dict[str, Any]]) -> Dict[str, Any]:
     if not results:
         return {
             "count": 0,
+            "successful_count": 0,
+            "error_count": 0,
             "errors": [],
             "avg_total_score": 0,
             "median_total_score": 0,
@@ -30,19 +34,26 @@ def make_summary(results: List[Dict[str, Any]]) -> Dict[str, Any]:
             "latency_stats": {}
         }
     
-    # Separate successful results from errors
+    # Separate successful results from errors (và conversation triage đánh dấu không chấm được)
     successful_results = []
     errors = []
+    not_evaluable_count = 0
     
     for result in results:
         if "error" in result:
             errors.append(result)
+        elif "not_evaluable" in result:
+            not_evaluable_count += 1
         else:
             successful_results.append(result)
+    # Chỉ khi có triage: tỉ lệ traffic bỏ qua LLM
+    triage = summarize_triage(results) if any("triage" in r for r in results) else None
     
     if not successful_results:
-        return {
+        summary = {
             "count": len(results),
+            "successful_count": 0,
+            "error_count": len(errors),
             "errors": errors,
             "avg_total_score": 0,
             "median_total_score": 0,
@@ -54,6 +65,7 @@ def make_summary(results: List[Dict[str, Any]]) -> Dict[str, Any]:
             "metrics_overview": {},
             "latency_stats": {}
         }
+        return _with_triage(summary, not_evaluable_count, triage)
     
     # Extract scores and basic stats
     total_scores = [r["result"]["total_score"] for r in successful_results]
@@ -116,7 +128,7 @@ def make_summary(results: List[Dict[str, Any]]) -> Dict[str, Any]:
             latency_stats[f"avg_{key}"] = statistics.mean(values)
             latency_stats[f"median_{key}"] = statistics.median(values)
     
-    return {
+    summary = {
         "count": len(results),
         "successful_count": len(successful_results),
         "error_count": len(errors),
@@ -131,6 +143,13 @@ def make_summary(results: List[Dict[str, Any]]) -> Dict[str, Any]:
         "metrics_overview": metrics_overview,
         "latency_stats": latency_stats
     }
+    return _with_triage(summary, not_evaluable_count, triage)
+
+def _with_triage(summary: Dict[str, Any], not_evaluable_count: int, triage: Dict[str, Any]) -> Dict[str, Any]:
+    if triage is not None:
+        summary["not_evaluable_count"] = not_evaluable_count
+        summary["triage"] = triage
+    return summary
 
 def generate_insights(summary: Dict[str, Any]) -> List[str]:
     """
@@ -1,7 +1,7 @@
 import asyncio
 import time
 import traceback
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterable, AsyncIterator, List, Dict, Any, Optional, Union
 from datetime import datetime
 from dataclasses import dataclass
 
@@ -17,14 +17,25 @@ from .high_performance_api import HighPerformanceAPIClient, APIClientConfig
 from .normalize import normalize_messages, build_transcript
 from .metrics import compute_latency_metrics, compute_additional_metrics, compute_policy_violations_count, filter_non_null_metrics
 from .brand_specs import BrandPolicy
-from .prompting import build_system_prompt_unified, build_user_instruction
+from .prompting import build_user_instruction
 from .llm_client import call_llm, call_llm_async
 from .evaluator import coerce_llm_json_unified
 from .utils import cleanup_memory, monitor_memory_usage, get_memory_pressure
 from .performance_monitor import get_performance_monitor
 from .diagnostics import detect_operational_readiness, detect_risk_compliance
-from .parsers import extract_bot_id
+from .decode import conversation_from_dict, DecodedConversation
 from .brand_resolver import BrandResolver
+from .brand_artifacts import BrandArtifact, get_brand_artifacts
+from .cpu_stage import MicroBatchCPUStage, CPUStageConfig
+from .pipeline import StagedPipeline, Stage
+from .concurrency import AIMDLimiter, AIMDConfig
+from .result_store import eval_fingerprint, fingerprint
+from .near_duplicate import NearDuplicateConfig, NearDuplicateIndex
+from .triage import TriageConfig, TriageDecision, triage_conversation, NOT_EVALUABLE
+from .admission import get_admission_controller, llm_flow
+from .affinity import AffinityConfig, PrefixCacheModel
+from .dispatch import DispatchConfig, TokenBudget
+from .brand_artifacts import estimate_tokens
 
 logger = logging.getLogger(__name__)
 
@@ -45,20 +56,168 @@ class BatchConfig:
     use_high_performance_api: bool = True
     redis_url: Optional[str] = None
     api_rate_limit: int = 100
+    use_cpu_micro_batching: bool = True
+    cpu_batch_window_ms: float = 5.0
+    cpu_max_batch_size: int = 64
+    # Continuous pipeline thay cho progressive batching
+    use_streaming_pipeline: bool = True
+    fetch_concurrency: Optional[int] = None  # None -> 2 x max_concurrency
+    cpu_concurrency: Optional[int] = None  # None -> max_concurrency
+    pipeline_queue_size: Optional[int] = None  # None -> max_concurrency
+    # AIMD: tự điều chỉnh concurrency LLM/fetch trong lúc chạy (streaming pipeline)
+    adaptive_concurrency: bool = True
+    min_concurrency: int = 1
+    adaptive_max_concurrency: Optional[int] = None  # None -> max_concurrency (trần)
+    aimd_window_size: int = 20
+    aimd_latency_spike_ratio: float = 2.0
+    # Result store (busqa.result_store.ResultStore): trả result đã lưu khi không có gì liên quan thay đổi
+    result_store: Optional[Any] = None
+    force_refresh: bool = False  # bỏ qua store, chấm lại và ghi đè
+    verify_content: bool = False  # luôn fetch rồi so content_hash thay vì tin result theo conversation_id
+    # Near-duplicate (cần result_store): dùng lại output LLM của conversation gần giống đã chấm
+    near_duplicate: Optional[NearDuplicateConfig] = None
+    # Triage trước LLM: conversation không chấm được / đã rõ kết quả thì không gọi LLM
+    triage: Optional[TriageConfig] = None
+    # Multi-brand: gom conversation cùng brand thành run liên tiếp trước LLM (prefix cache)
+    brand_affinity: Optional[AffinityConfig] = None
+    # Thứ tự vào LLM theo token ước lượng (sjf / ljf) + trần token in-flight
+    dispatch: Optional[DispatchConfig] = None
+    # Field gắn vào mỗi result thành công trước khi lưu store / stream (vd brand_id của caller)
+    result_fields: Optional[Dict[str, Any]] = None
+    transcript_preview_chars: Optional[int] = None  # None -> không kèm transcript_preview (tiết kiệm memory)
+
+
+def analyze_conversation(messages, brand_policy, brand_prompt_text, apply_diagnostics: bool = False, diagnostics_cfg: dict = None,
+                         allowed_positions=None):
+    """Transcript + metrics + diagnostics trong một job CPU (module-level để picklable)"""
+    transcript = build_transcript(messages)
+    metrics = {}
+
+    latency_metrics = compute_latency_metrics(messages)
+    additional_metrics = compute_additional_metrics(messages, brand_policy, brand_prompt_text, allowed_positions)
+    policy_violations = compute_policy_violations_count(messages, brand_policy)
+
+    metrics.update(latency_metrics)
+    metrics.update(additional_metrics)
+    metrics["policy_violations"] = policy_violations
+
+    # compute_additional_metrics đã tính diagnostics khi có brand_policy - không tính lại
+    if apply_diagnostics and diagnostics_cfg and "diagnostics" not in metrics:
+        metrics["diagnostics"] = {
+            "operational_readiness": detect_operational_readiness(messages, brand_policy, brand_prompt_text,
+                                                                  allowed_positions),
+            "risk_compliance": detect_risk_compliance(messages, brand_policy)
+        }
+
+    return transcript, metrics
+
+
+# Input của batch: conversation_id (fetch) hoặc conversation inline đã có messages
+# (dict payload / DecodedConversation) - không fetch lại
+ConversationInput = Union[str, Dict[str, Any], DecodedConversation]
+
+
+def _input_id(item: ConversationInput) -> str:
+    if isinstance(item, (dict, DecodedConversation)):
+        conversation_id = item.get("conversation_id")
+        if conversation_id is None:
+            raise ValueError("Inline conversation thiếu conversation_id")
+        return str(conversation_id)
+    return str(item)
+
+
+def _is_inline(item: ConversationInput) -> bool:
+    return isinstance(item, DecodedConversation) or (
+        isinstance(item, dict) and ("messages" in item or "data" in item))
+
+
+def _is_cached(work: "ConversationWork") -> bool:
+    return work.cached is not None
+
+
+def _skips_llm(work: "ConversationWork") -> bool:
+    return work.cached is not None or work.near_duplicate is not None or work.triage is not None
+
+
+def _flow_key(work: "ConversationWork") -> Optional[str]:
+    """Flow của call LLM trong admission controller: brand của conversation (multi-brand)"""
+    return work.brand_id if work.brand_id != "unknown" else None
+
+
+def _brand_key(work: "ConversationWork") -> Optional[str]:
+    """Key gom trước LLM stage: system prompt của brand; item không gọi LLM không thuộc run nào"""
+    return None if _skips_llm(work) else work.brand.brand_hash
+
+
+def coerce_and_dump(llm_response, **kwargs) -> Dict[str, Any]:
+    """Coerce LLM JSON rồi model_dump luôn trong cùng job CPU"""
+    return coerce_llm_json_unified(llm_response, **kwargs).model_dump()
+
+
+class ConversationWork:
+    """State của một conversation khi đi qua các stage fetch -> analyze -> LLM -> coerce"""
+
+    __slots__ = ("conversation_id", "start_time", "brand", "brand_policy", "brand_prompt_text", "bot_id", "brand_id",
+                 "messages", "transcript", "metrics", "llm_response", "diagnostics_hits", "result",
+                 "fetch_time", "llm_time", "content_hash", "brand_hash", "cached", "signature",
+                 "near_duplicate", "triage", "token_cost", "fetched")
+
+    def __init__(self, conversation_id: str, brand: BrandArtifact = None):
+        self.conversation_id = conversation_id
+        self.start_time = time.time()
+        self.set_brand(brand)
+        self.bot_id = None
+        self.brand_id = "unknown"
+        self.messages = None
+        self.transcript = None
+        self.metrics = None
+        self.llm_response = None
+        self.diagnostics_hits = None
+        self.result = None
+        self.fetch_time = 0.0
+        self.llm_time = 0.0
+        self.content_hash = None
+        self.brand_hash = None
+        self.cached = None  # result lấy từ result store -> các stage sau bỏ qua
+        self.signature = None  # MinHash signature (near-duplicate)
+        self.near_duplicate = None  # {"source_conversation_id", "similarity"} khi dùng lại output LLM
+        self.triage: Optional[TriageDecision] = None  # rule_based / not_evaluable -> không gọi LLM
+        self.token_cost: Optional[int] = None  # token ước lượng của call LLM (dispatch)
+        self.fetched = False  # lấy qua API theo ID (không phải payload inline)
+
+    def set_brand(self, brand: Optional[BrandArtifact]) -> None:
+        self.brand = brand
+        self.brand_policy = brand.brand_policy if brand else None
+        self.brand_prompt_text = brand.brand_prompt_text if brand else None
+
 
 class HighSpeedBatchEvaluator:
     """Batch evaluator tối ưu cho conversations song song với multi-brand support"""
     
     def __init__(self, config: BatchConfig = None):
         self.config = config or BatchConfig()
-        self.system_prompt_cache = {}
+        self.brand_artifacts = get_brand_artifacts()
+        self._brand: Optional[BrandArtifact] = None  # brand của batch (single-brand)
+        self._rubrics_key = None
         self.processed_count = 0
         self.brand_stats = {}
         self.api_client = None
+        self.cpu_stage = None
+        self.cpu_stage_stats = {}
+        self.pipeline_stats = {}
+        self.concurrency_stats = {}
+        self.triage_stats: Dict[str, int] = {}
+        self.prefix_cache_stats: Dict[str, Any] = {}
+        self._prefix_cache: Optional[PrefixCacheModel] = None
+        self._eval_hash = None
+        self._payloads: Dict[str, Any] = {}  # conversation_id -> payload inline, dùng thay cho fetch
+        self._near_dup = None
+        if self.config.result_store is not None and self.config.near_duplicate is not None:
+            self._near_dup = NearDuplicateIndex(self.config.result_store, self.config.near_duplicate)
         
     async def evaluate_batch(
         self, 
-        conversation_ids: List[str],
+        conversation_ids: List[ConversationInput],
         base_url: str,
         rubrics_cfg: dict,
         brand_policy: BrandPolicy = None,
@@ -71,18 +230,112 @@ class HighSpeedBatchEvaluator:
         diagnostics_cfg: dict = None,
         brand_resolver: BrandResolver = None
     ) -> List[Dict[str, Any]]:
-        """Main entry point"""
+        """
+        Main entry point - kết quả theo thứ tự input.
+
+        conversation_ids có thể trộn ID và conversation inline (dict có messages hoặc
+        DecodedConversation); chỉ ID mới được fetch.
+        """
+        
+        all_results = [
+            result async for result in self.iter_evaluate(
+                conversation_ids, base_url, rubrics_cfg, brand_policy, brand_prompt_text,
+                llm_api_key, llm_model, temperature, llm_base_url,
+                apply_diagnostics, diagnostics_cfg, brand_resolver
+            )
+        ]
+        
+        # Pipeline trả theo thứ tự hoàn thành -> sắp lại theo input
+        order = {_input_id(item): i for i, item in reversed(list(enumerate(conversation_ids)))}
+        all_results.sort(key=lambda r: order.get(r.get("conversation_id"), len(order)))
+        return all_results
+    
+    async def iter_evaluate(
+        self, 
+        conversation_ids: List[ConversationInput],
+        base_url: str,
+        rubrics_cfg: dict,
+        brand_policy: BrandPolicy = None,
+        brand_prompt_text: str = None,
+        llm_api_key: str = None,
+        llm_model: str = "gemini-2.5-flash",
+        temperature: float = 0.2,
+        llm_base_url: str = None,
+        apply_diagnostics: bool = True,
+        diagnostics_cfg: dict = None,
+        brand_resolver: BrandResolver = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Async iterator: yield từng result ngay khi conversation đó xong (thứ tự hoàn thành).
+
+        conversation_ids có thể là async iterable (ví dụ AsyncListFetcher.iter_conversations):
+        conversation vào pipeline ngay khi trang của nó về, total_conversations tăng dần.
+        """
         
         self.processed_count = 0
         self.brand_stats = {}
-        start_time = time.time()
-        total_count = len(conversation_ids)
+        self.triage_stats = {}
+        streaming_source = hasattr(conversation_ids, "__aiter__")
+        if streaming_source and not self.config.use_streaming_pipeline:
+            conversation_ids = [item async for item in conversation_ids]
+            streaming_source = False
+        
+        if streaming_source:
+            self._payloads = {}
+            self.total_conversations = 0
+            conversation_ids = self._register_source(conversation_ids)
+        else:
+            # Payload inline được giữ lại cho fetch stage; phía sau chỉ luân chuyển ID
+            self._payloads, ids, duplicates = {}, [], []
+            for item in conversation_ids:
+                conversation_id = _input_id(item)
+                if _is_inline(item):
+                    if conversation_id in self._payloads:
+                        duplicates.append(conversation_id)  # payload theo ID - bản trùng không có chỗ
+                        continue
+                    self._payloads[conversation_id] = item
+                ids.append(conversation_id)
+            conversation_ids = ids
+            if self._payloads:
+                logger.info(f"{len(self._payloads)} inline conversations, "
+                            f"{len(conversation_ids) - len(self._payloads)} to fetch")
+            self.total_conversations = len(conversation_ids) + len(duplicates)
+            for conversation_id in duplicates:
+                result = self._error_result(
+                    conversation_id, ValueError("Duplicate inline conversation_id in batch"))
+                await self._emit(result)
+                yield result
+        
+        # Brand compile một lần cho cả batch (registry dùng chung giữa các request)
+        self._rubrics_key = fingerprint(rubrics_cfg)
+        self._brand = self.brand_artifacts.from_text(brand_prompt_text, brand_policy)
+        
+        # Result store: trả ngay result đã lưu trước khi fetch / gọi LLM
+        store = self.config.result_store
+        self._eval_hash = None
+        if store is not None:
+            self._eval_hash = eval_fingerprint(
+                rubrics_cfg, diagnostics_cfg if apply_diagnostics else None, llm_model, temperature)
+            if streaming_source:
+                pass  # Nguồn stream: tra theo nội dung ở fetch stage, force_refresh đếm khi item vào
+            elif self.config.force_refresh:
+                for _ in conversation_ids:
+                    store.record_forced_refresh()
+            elif not self.config.verify_content:
+                # Conversation inline (có thể còn đang diễn ra) tra theo nội dung - không tốn fetch
+                stored = await asyncio.to_thread(
+                    self._lookup_stored, [cid for cid in conversation_ids if cid not in self._payloads],
+                    brand_policy, brand_prompt_text, brand_resolver)
+                conversation_ids = [cid for cid in conversation_ids if cid not in stored]
+                for result in stored.values():
+                    self._with_result_fields(result)
+                    await self._emit(result)
+                    yield result
         
         perf_monitor = get_performance_monitor()
         await perf_monitor.start_monitoring()
         
         is_multi_brand = brand_resolver is not None
-        mode_str = "multi-brand" if is_multi_brand else "single-brand"
         
         memory_pressure = get_memory_pressure()
         if memory_pressure in ["high", "critical"]:
@@ -90,13 +343,18 @@ class HighSpeedBatchEvaluator:
             self.config.max_concurrency = max(5, self.config.max_concurrency // 2)
         
         if not is_multi_brand:
-            system_prompt_key = self._get_system_prompt_key(brand_policy, brand_prompt_text)
-            if system_prompt_key not in self.system_prompt_cache:
-                self.system_prompt_cache[system_prompt_key] = build_system_prompt_unified(
-                    rubrics_cfg, brand_policy, brand_prompt_text
-                )
+            self._brand.system_prompt(rubrics_cfg, self._rubrics_key)
+        
+        if self.config.use_cpu_micro_batching:
+            self.cpu_stage = MicroBatchCPUStage(CPUStageConfig(
+                batch_window_ms=self.config.cpu_batch_window_ms,
+                max_batch_size=self.config.cpu_max_batch_size
+            ))
         
-        if self.config.use_high_performance_api:
+        # Tất cả đều inline -> không cần client cho single-conversation API
+        # (nguồn stream: chưa biết trước, chỉ tạo khi có base_url)
+        needs_fetch = bool(base_url) if streaming_source else len(self._payloads) < len(conversation_ids)
+        if self.config.use_high_performance_api and needs_fetch:
             api_config = APIClientConfig(
                 max_connections=min(self.config.max_concurrency * 2, 200),
                 rate_limit_per_second=self.config.api_rate_limit,
@@ -108,32 +366,189 @@ class HighSpeedBatchEvaluator:
                 redis_url=self.config.redis_url
             )
         
-        
+        args = (conversation_ids, base_url, rubrics_cfg, brand_policy, brand_prompt_text,
+                llm_api_key, llm_model, temperature, llm_base_url,
+                apply_diagnostics, diagnostics_cfg, brand_resolver)
         try:
             if self.api_client:
                 async with self.api_client:
-                    all_results = await self._process_all_conversations_async(
-                        conversation_ids, base_url, rubrics_cfg, brand_policy, brand_prompt_text,
-                        llm_api_key, llm_model, temperature, llm_base_url,
-                        apply_diagnostics, diagnostics_cfg, brand_resolver
-                    )
+                    async for result in self._iter_results(*args):
+                        yield result
             else:
-                all_results = await self._process_all_conversations_async(
-                    conversation_ids, base_url, rubrics_cfg, brand_policy, brand_prompt_text,
-                    llm_api_key, llm_model, temperature, llm_base_url,
-                    apply_diagnostics, diagnostics_cfg, brand_resolver
-                )
+                async for result in self._iter_results(*args):
+                    yield result
         finally:
-            pass
+            if self.cpu_stage:
+                await self.cpu_stage.close()
+                self.cpu_stage_stats = self.cpu_stage.get_stats()
+                self.cpu_stage = None
+            perf_monitor.stop_monitoring()
+    
+    async def _register_source(self, source: AsyncIterable[ConversationInput]) -> AsyncIterator[str]:
+        """Nguồn stream -> ID; payload inline giữ lại cho fetch stage như bản list"""
+        store = self.config.result_store
+        async for item in source:
+            conversation_id = _input_id(item)
+            if _is_inline(item):
+                self._payloads[conversation_id] = item
+            self.total_conversations += 1
+            if store is not None and self.config.force_refresh:
+                store.record_forced_refresh()
+            yield conversation_id
+    
+    def _lookup_stored(self, conversation_ids: List[str], brand_policy: BrandPolicy, brand_prompt_text: str,
+                       brand_resolver: BrandResolver = None) -> Dict[str, Dict[str, Any]]:
+        """Tra result store theo conversation_id (trước khi fetch); hit khi brand cũng không đổi"""
+        store = self.config.result_store
+        single_brand_hash = None if brand_resolver else self._brand.brand_hash
+        bot_brand_hash: Dict[Any, Optional[str]] = {}
+        hits = {}
+        for cid in conversation_ids:
+            entry = store.get_latest(cid, self._eval_hash)
+            expected = single_brand_hash
+            if entry is not None and brand_resolver is not None:
+                # Multi-brand: brand phụ thuộc bot_id đã lưu của conversation
+                bot_id = entry["bot_id"]
+                if bot_id not in bot_brand_hash:
+                    try:
+                        bot_brand_hash[bot_id] = brand_resolver.resolve_artifact(bot_id).brand_hash
+                    except Exception:
+                        bot_brand_hash[bot_id] = None
+                expected = bot_brand_hash[bot_id]
+            if entry is not None and expected is not None and entry["brand_hash"] == expected:
+                hits[cid] = entry["result"]
+                store.record_prefetch_hit(entry["row_id"])
+        return hits
+    
+    async def _iter_results(self, conversation_ids: List[str], *args) -> AsyncIterator[Dict[str, Any]]:
+        if self.config.use_streaming_pipeline:
+            async for result in self._process_streaming(conversation_ids, *args):
+                yield result
+        else:
+            for result in await self._process_all_conversations_async(conversation_ids, *args):
+                yield result
+    
+    async def _process_streaming(
+        self,
+        conversation_ids: List[str],
+        base_url: str,
+        rubrics_cfg: dict,
+        brand_policy: BrandPolicy,
+        brand_prompt_text: str,
+        llm_api_key: str,
+        llm_model: str,
+        temperature: float,
+        llm_base_url: str,
+        apply_diagnostics: bool,
+        diagnostics_cfg: dict,
+        brand_resolver: BrandResolver = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Continuous pipeline: fetch -> analyze -> LLM -> coerce -> emit, mỗi stage một pool worker"""
         
-        elapsed = time.time() - start_time
-        success_count = len([r for r in all_results if "error" not in r])
+        llm_slots = max(1, self.config.max_concurrency)
+        cpu_slots = max(1, self.config.cpu_concurrency or llm_slots)
+        fetch_slots = max(1, self.config.fetch_concurrency or 2 * llm_slots)
+        limiters = self._make_limiters(llm_slots, fetch_slots)
+        affinity = self.config.brand_affinity if brand_resolver is not None else None
+        self._prefix_cache = PrefixCacheModel(affinity.cache_slots if affinity else AffinityConfig.cache_slots)
+        dispatch = self.config.dispatch
+        windows = [cfg.reorder_window for cfg in (affinity, dispatch) if cfg is not None]
+        budget = TokenBudget(dispatch.max_inflight_tokens, dispatch.max_bypass) \
+            if dispatch is not None and dispatch.max_inflight_tokens else None
+
+        def priority(work: "ConversationWork") -> Optional[float]:
+            return None if _skips_llm(work) else dispatch.priority(self._token_cost(work, rubrics_cfg))
+
+        pipeline = StagedPipeline(
+            stages=[
+                Stage("fetch", lambda w: self._stage_fetch(w, base_url, brand_resolver),
+                      concurrency=fetch_slots, limiter=limiters.get("fetch"),
+                      limited=lambda w: w.conversation_id not in self._payloads),
+                Stage("analyze", lambda w: self._stage_analyze(w, apply_diagnostics, diagnostics_cfg),
+                      concurrency=cpu_slots, bypass=_is_cached),
+                Stage("triage", lambda w: self._stage_triage(w, rubrics_cfg, apply_diagnostics, diagnostics_cfg),
+                      concurrency=cpu_slots, bypass=_skips_llm),
+                Stage("llm", lambda w: self._stage_llm(w, rubrics_cfg, llm_api_key, llm_model,
+                                                       temperature, llm_base_url),
+                      concurrency=llm_slots, timeout=self.config.llm_timeout, limiter=limiters.get("llm"),
+                      bypass=_skips_llm,
+                      order_key=_brand_key if affinity else None,
+                      priority=priority if dispatch is not None and dispatch.priority(0) is not None else None,
+                      reorder_window=max(windows, default=0),
+                      budget=budget, cost=lambda w: self._token_cost(w, rubrics_cfg),
+                      # Chờ slot LLM của process ngoài llm_timeout và latency AIMD
+                      admission=lambda w: get_admission_controller().slot(flow_key=_flow_key(w))),
+                Stage("coerce", lambda w: self._stage_coerce(w, rubrics_cfg, apply_diagnostics, diagnostics_cfg),
+                      concurrency=cpu_slots, bypass=_is_cached),
+            ],
+            queue_size=self.config.pipeline_queue_size or llm_slots,
+            finalize=lambda w: self._build_result(w, brand_resolver),
+            on_error=lambda w, e, stage: self._error_result(w.conversation_id, e),
+        )
         
-        perf_monitor.stop_monitoring()
-        perf_summary = perf_monitor.get_performance_summary()
+        if hasattr(conversation_ids, "__aiter__"):
+            works = (ConversationWork(conv_id, self._brand) async for conv_id in conversation_ids)
+        else:
+            works = (ConversationWork(conv_id, self._brand) for conv_id in conversation_ids)
+        try:
+            async for result in pipeline.run(works):
+                await self._emit(result)
+                yield result
+        finally:
+            self.pipeline_stats = pipeline.get_stats()
+            self.concurrency_stats = {name: limiter.get_stats() for name, limiter in limiters.items()}
+            self.prefix_cache_stats = self._prefix_cache.stats()
+            self._prefix_cache = None
+            if brand_resolver is not None and self.prefix_cache_stats["calls"]:
+                logger.info(f"[prefix-cache] brand affinity {'on' if affinity else 'off'}: "
+                            f"hit ratio {self.prefix_cache_stats['hit_ratio']} over "
+                            f"{self.prefix_cache_stats['runs']} brand runs "
+                            f"({ {b: s['hit_ratio'] for b, s in self.prefix_cache_stats['brands'].items()} })")
+    
+    def _make_limiters(self, llm_slots: int, fetch_slots: int) -> Dict[str, AIMDLimiter]:
+        """AIMD limiter cho LLM và fetch: bắt đầu ở limit cấu hình, trần là adaptive_max_concurrency"""
+        if not self.config.adaptive_concurrency:
+            return {}
+        llm_max = max(llm_slots, self.config.adaptive_max_concurrency or llm_slots)
+        fetch_max = max(fetch_slots, fetch_slots * llm_max // llm_slots)
+        min_limit = max(1, self.config.min_concurrency)
+
+        def aimd(initial: int, ceiling: int) -> AIMDConfig:
+            return AIMDConfig(
+                min_limit=min(min_limit, initial),
+                max_limit=ceiling,
+                initial_limit=initial,
+                window_size=self.config.aimd_window_size,
+                latency_spike_ratio=self.config.aimd_latency_spike_ratio,
+            )
+
+        # CPU/memory quá tải (SystemPerformanceMonitor) cũng là tín hiệu giảm cho LLM stage
+        perf_monitor = get_performance_monitor()
+        return {
+            "fetch": AIMDLimiter("fetch", aimd(fetch_slots, fetch_max)),
+            "llm": AIMDLimiter("llm", aimd(llm_slots, llm_max), pressure_check=perf_monitor.should_reduce_concurrency),
+        }
+    
+    async def _emit(self, result: Dict[str, Any]) -> None:
+        """Stage emit: progress, streaming callback, performance monitor, memory cleanup"""
+        self.processed_count += 1
+        total_count = getattr(self, 'total_conversations', self.processed_count)
         
+        perf_monitor = get_performance_monitor()
+        perf_monitor.update_processed_count(self.processed_count)
         
-        return all_results
+        if self.config.progress_callback:
+            self.config.progress_callback(self.processed_count / max(1, total_count), self.processed_count, total_count)
+        
+        # streaming result (callback async được await ngay - xong trước khi iter_evaluate kết thúc)
+        if self.config.stream_callback:
+            ret = self.config.stream_callback(result)
+            if asyncio.iscoroutine(ret):
+                await ret
+        
+        # Cleanup memory định kỳ
+        if self.processed_count % self.config.memory_cleanup_interval == 0:
+            cleanup_memory()
     
     async def _process_all_conversations_async(
         self,
@@ -367,16 +782,10 @@ class HighSpeedBatchEvaluator:
                         self.config.stream_callback(result)
 
                     # log concurrent activity every 10 conversations
-                    # Cleanup memory định kỳ và adaptive concurrency
+                    # Cleanup memory định kỳ (adaptive concurrency: xem AIMDLimiter trong streaming pipeline)
                     if self.processed_count % self.config.memory_cleanup_interval == 0:
                         collected = cleanup_memory()
                         mem_info = monitor_memory_usage()
-                        
-                        # adaptive concurrency based on system pressure
-                        perf_monitor = get_performance_monitor()
-                        if perf_monitor.should_reduce_concurrency():
-                            # Dynamic adjustment would require more complex implementation
-                            pass
                     
                     return result
                     
@@ -424,83 +833,141 @@ class HighSpeedBatchEvaluator:
         """Async version of evaluate single conversation - TRUE concurrent LLM calls"""
         
         try:
-            # Timing debug
-            start_time = time.time()
-            
-            # Fetch data với high-performance client nếu có
-            if self.api_client:
-                # Use high-performance API client
-                api_results = await self.api_client.fetch_conversation_batch([conversation_id])
-                api_result = api_results[0]
-                if api_result.get("status") == "success":
-                    raw_data = api_result["data"]
-                else:
-                    raise ValueError(f"API fetch failed: {api_result.get('error', 'Unknown error')}")
-            else:
-                # Fallback to original method
-                raw_data = await asyncio.to_thread(fetch_messages, base_url, conversation_id)
-            
-            fetch_time = time.time() - start_time
-            
-            # Resolve brand nếu có brand_resolver
-            if brand_resolver:
-                bot_id = extract_bot_id(raw_data)
-                try:
-                    brand_prompt_text, brand_policy = brand_resolver.resolve_by_bot_id(bot_id)
-                    
-                    # Track brand stats
-                    try:
-                        resolved_brand_id, _ = brand_resolver._map.resolve(bot_id)
-                        self.brand_stats[resolved_brand_id] = self.brand_stats.get(resolved_brand_id, 0) + 1
-                    except:
-                        pass  # Không để stats làm crash
-                        
-                except Exception as e:
-                    # Re-raise để báo lỗi cho conversation này
-                    raise ValueError(f"Brand resolution failed: {e}")
-            
-            messages = normalize_messages(raw_data)
+            work = ConversationWork(conversation_id, self._brand)
+            await self._stage_fetch(work, base_url, brand_resolver)
+            await self._stage_analyze(work, apply_diagnostics, diagnostics_cfg)
+            await self._stage_triage(work, rubrics_cfg, apply_diagnostics, diagnostics_cfg)
+            await self._stage_llm(work, rubrics_cfg, llm_api_key, llm_model, temperature, llm_base_url)
+            await self._stage_coerce(work, rubrics_cfg, apply_diagnostics, diagnostics_cfg)
+            return self._build_result(work, brand_resolver)
             
-            if not messages:
-                raise ValueError("Không có messages")
-            
-            # Build transcript và metrics song song
-            transcript, metrics = await asyncio.to_thread(
-                self._compute_metrics_and_transcript, messages, brand_policy, brand_prompt_text
-            )
-            
-            # Diagnostics nếu cần
-            if apply_diagnostics and diagnostics_cfg:
-                # These are now internally threaded, but we run them in a thread from asyncio's perspective
-                # to avoid blocking the event loop at all.
-                or_hits, rc_hits = await asyncio.gather(
-                    asyncio.to_thread(detect_operational_readiness, messages, brand_policy, brand_prompt_text),
-                    asyncio.to_thread(detect_risk_compliance, messages, brand_policy)
-                )
-                diagnostics_hits = {
-                    "operational_readiness": or_hits,
-                    "risk_compliance": rc_hits
-                }
-                metrics["diagnostics"] = diagnostics_hits
-            
-            # Filter metrics for LLM
-            metrics_for_llm = filter_non_null_metrics(metrics)
-            
-            # Get cached system prompt
-            system_prompt_key = self._get_system_prompt_key(brand_policy, brand_prompt_text)
-            if system_prompt_key not in self.system_prompt_cache:
-                # Build system prompt if not cached
-                self.system_prompt_cache[system_prompt_key] = build_system_prompt_unified(
-                    rubrics_cfg, brand_policy, brand_prompt_text
-                )
-            system_prompt = self.system_prompt_cache[system_prompt_key]
-            
-            # Build user prompt
-            user_prompt = build_user_instruction(metrics_for_llm, transcript, rubrics_cfg)
-            
-            # Call LLM với ASYNC - THIS IS THE KEY FIX!
-            llm_start = time.time()
-            llm_response = await call_llm_async(
+        except Exception as e:
+            return self._error_result(conversation_id, e)
+    
+    # Các stage của một conversation - dùng chung cho đường tuần tự và StagedPipeline
+    
+    async def _fetch_conversation(self, conversation_id: str, base_url: str):
+        """Fetch + decode một conversation -> DecodedConversation"""
+        if self.api_client:
+            # Decode typed từ bytes: bot_id + frame trong một lượt
+            api_results = await self.api_client.fetch_conversation_batch([conversation_id], typed=True)
+            api_result = api_results[0]
+            if api_result.get("status") == "success":
+                return api_result["data"]
+            raise ValueError(f"API fetch failed: {api_result.get('error', 'Unknown error')}")
+        # Fallback to original method
+        raw_data = await asyncio.to_thread(fetch_messages, base_url, conversation_id)
+        return conversation_from_dict(raw_data, conversation_id)
+    
+    async def _call_llm(self, **kwargs) -> Dict[str, Any]:
+        """Gọi LLM (ASYNC - true concurrent); tách riêng để benchmark/test thay thế"""
+        return await call_llm_async(**kwargs)
+    
+    async def _stage_fetch(self, work: "ConversationWork", base_url: str, brand_resolver: BrandResolver = None):
+        payload = self._payloads.pop(work.conversation_id, None)
+        if isinstance(payload, DecodedConversation):
+            decoded = payload
+        elif payload is not None:
+            decoded = conversation_from_dict(payload, work.conversation_id)
+        else:
+            decoded = await self._fetch_conversation(work.conversation_id, base_url)
+            work.fetched = True
+        work.fetch_time = time.time() - work.start_time
+        work.bot_id = decoded.bot_id
+        
+        # Resolve brand nếu có brand_resolver
+        if brand_resolver:
+            try:
+                work.set_brand(brand_resolver.resolve_artifact(work.bot_id))
+                work.brand_id = work.brand.brand_id
+                self.brand_stats[work.brand_id] = self.brand_stats.get(work.brand_id, 0) + 1
+                
+            except Exception as e:
+                # Re-raise để báo lỗi cho conversation này
+                raise ValueError(f"Brand resolution failed: {e}")
+        
+        # Frame dạng cột thay cho list Message; payload thô không được giữ lại
+        work.messages = decoded.messages
+        if not work.messages:
+            raise ValueError("Không có messages")
+        
+        # Result store theo nội dung: cùng nội dung + brand + eval config -> bỏ qua LLM
+        store = self.config.result_store
+        if store is not None and self._eval_hash is not None:
+            work.content_hash = work.messages.content_hash()
+            work.brand_hash = work.brand.brand_hash
+            if not self.config.force_refresh:
+                work.cached = store.get(work.content_hash, work.brand_hash, self._eval_hash)
+                if work.cached is not None:
+                    work.cached["conversation_id"] = work.conversation_id
+            if work.cached is None and self._near_dup is not None:
+                self._match_near_duplicate(work)
+        return work
+    
+    def _match_near_duplicate(self, work: "ConversationWork") -> None:
+        """Conversation gần giống đã chấm -> dùng lại output LLM; metrics/diagnostics/coerce vẫn chạy"""
+        work.signature = self._near_dup.signature(work.messages)
+        if work.signature is None or self.config.force_refresh:
+            return
+        match = self._near_dup.lookup(work.signature, work.brand_hash, self._eval_hash)
+        if match is not None:
+            work.llm_response = match["result"]["llm_raw"]
+            work.near_duplicate = {"source_conversation_id": match["source_conversation_id"],
+                                   "similarity": match["similarity"]}
+    
+    async def _stage_analyze(self, work: "ConversationWork", apply_diagnostics: bool, diagnostics_cfg: dict):
+        if work.cached is not None:
+            return work
+        # Transcript + metrics + diagnostics trong một job CPU
+        args = (analyze_conversation, work.messages, work.brand_policy, work.brand_prompt_text,
+                apply_diagnostics, diagnostics_cfg, work.brand.allowed_positions)
+        if self.cpu_stage:
+            work.transcript, work.metrics = await self.cpu_stage.submit(*args)
+        else:
+            work.transcript, work.metrics = await asyncio.to_thread(*args)
+        return work
+    
+    async def _stage_triage(self, work: "ConversationWork", rubrics_cfg: dict, apply_diagnostics: bool,
+                            diagnostics_cfg: dict):
+        """Luật tất định trên metrics + diagnostics hits: rule_based / not_evaluable / gửi LLM"""
+        if self.config.triage is None or _skips_llm(work):
+            return work
+        work.triage = triage_conversation(
+            work.messages, work.metrics, rubrics_cfg, self.config.triage,
+            brand_policy=work.brand_policy, transcript=work.transcript,
+            diagnostics_cfg=diagnostics_cfg if apply_diagnostics else None,
+            diagnostics_hits=work.metrics.get("diagnostics", {}) if apply_diagnostics else None)
+        key = work.triage.reason if work.triage is not None else "llm"
+        self.triage_stats[key] = self.triage_stats.get(key, 0) + 1
+        return work
+    
+    def _token_cost(self, work: "ConversationWork", rubrics_cfg: dict) -> int:
+        """Token ước lượng của call LLM: system prompt + transcript đã normalize + output"""
+        if work.token_cost is None:
+            output_tokens = self.config.dispatch.output_tokens if self.config.dispatch else DispatchConfig.output_tokens
+            work.token_cost = (work.brand.system_prompt_tokens(rubrics_cfg, self._rubrics_key)
+                               + estimate_tokens(work.transcript) + output_tokens)
+        return work.token_cost
+    
+    async def _stage_llm(self, work: "ConversationWork", rubrics_cfg: dict, llm_api_key: str,
+                         llm_model: str, temperature: float, llm_base_url: str):
+        if _skips_llm(work):
+            return work
+        # Filter metrics for LLM
+        metrics_for_llm = filter_non_null_metrics(work.metrics)
+        
+        # System prompt đã render sẵn trong brand artifact
+        system_prompt = work.brand.system_prompt(rubrics_cfg, self._rubrics_key)
+        
+        # Build user prompt
+        user_prompt = build_user_instruction(metrics_for_llm, work.transcript, rubrics_cfg)
+        
+        if self._prefix_cache is not None:
+            self._prefix_cache.dispatch(work.brand.brand_hash, work.brand_id)
+        llm_start = time.time()
+        # Multi-brand: fair queuing theo brand của conversation trong lane LLM của process
+        with llm_flow(_flow_key(work)):
+            work.llm_response = await self._call_llm(
                 api_key=llm_api_key,
                 model=llm_model,
                 system_prompt=system_prompt,
@@ -508,78 +975,148 @@ class HighSpeedBatchEvaluator:
                 base_url=llm_base_url,
                 temperature=temperature
             )
-            llm_time = time.time() - llm_start
-            
-            # Process result
-            diagnostics_hits = metrics.get("diagnostics", {}) if apply_diagnostics else {}
-            
-            # Run final CPU-bound coercion in a thread
-            result = await asyncio.to_thread(
-                coerce_llm_json_unified,
-                llm_response,
-                rubrics_cfg=rubrics_cfg,
-                brand_policy=brand_policy,
-                messages=messages,
-                transcript=transcript,
-                metrics=metrics,
-                diagnostics_cfg=diagnostics_cfg if apply_diagnostics else None,
-                diagnostics_hits=diagnostics_hits
-            )
-            
-            total_time = time.time() - start_time
-            
-            # Extract brand_id for reporting
-            brand_id = "unknown"
-            if brand_resolver:
-                try:
-                    bot_id = extract_bot_id(raw_data)
-                    resolved_brand_id, _ = brand_resolver._map.resolve(bot_id)
-                    brand_id = resolved_brand_id
-                except:
-                    pass  # Keep default "unknown"
-            
-            # Return minimal result để tiết kiệm memory
-            return {
-                "conversation_id": conversation_id,
-                "brand_id": brand_id,  # Add brand_id for PDF/CSV reporting
-                "result": result.model_dump(),
-                "metrics": metrics,
-                "evaluation_timestamp": datetime.utcnow().isoformat() + "Z",
-                # Bỏ transcript_preview để tiết kiệm memory
-            }
-            
-        except Exception as e:
-            # Better error logging with traceback
-            error_msg = f"{str(e)}"
-            return {
-                "conversation_id": conversation_id,
-                "error": error_msg,
-                "evaluation_timestamp": datetime.utcnow().isoformat() + "Z"
-            }
+        work.llm_time = time.time() - llm_start
+        return work
+    
+    async def _stage_coerce(self, work: "ConversationWork", rubrics_cfg: dict, apply_diagnostics: bool,
+                            diagnostics_cfg: dict):
+        if work.cached is not None:
+            return work
+        work.diagnostics_hits = work.metrics.get("diagnostics", {}) if apply_diagnostics else {}
+        if work.triage is not None:
+            work.result = work.triage.result  # đã coerce trong triage (None nếu not_evaluable)
+            return work
+        
+        # Run final CPU-bound coercion (micro-batched nếu có CPU stage)
+        coerce_kwargs = dict(
+            rubrics_cfg=rubrics_cfg,
+            brand_policy=work.brand_policy,
+            messages=work.messages,
+            transcript=work.transcript,
+            metrics=work.metrics,
+            diagnostics_cfg=diagnostics_cfg if apply_diagnostics else None,
+            diagnostics_hits=work.diagnostics_hits
+        )
+        if self.cpu_stage:
+            work.result = await self.cpu_stage.submit(coerce_and_dump, work.llm_response, **coerce_kwargs)
+        else:
+            work.result = await asyncio.to_thread(coerce_and_dump, work.llm_response, **coerce_kwargs)
+        return work
+    
+    def _build_result(self, work: "ConversationWork", brand_resolver: BrandResolver = None) -> Dict[str, Any]:
+        if work.cached is not None:
+            return self._with_result_fields(work.cached)
+        if work.triage is not None:
+            return self._with_result_fields(self._triage_result(work, brand_resolver))
+        # Return minimal result để tiết kiệm memory
+        result = {
+            "conversation_id": work.conversation_id,
+            "brand_id": work.brand_id if brand_resolver else "unknown",  # Add brand_id for PDF/CSV reporting
+            "result": work.result,
+            "metrics": work.metrics,
+            # Input gốc để re-score offline (busqa.rescoring) khi đổi weights/penalties
+            "llm_raw": work.llm_response,
+            "diagnostics_hits": work.diagnostics_hits,
+            "evaluation_timestamp": datetime.utcnow().isoformat() + "Z",
+        }
+        if work.near_duplicate is not None:
+            result["near_duplicate"] = work.near_duplicate
+        self._add_transcript_preview(result, work)
+        self._with_result_fields(result)
+        if self.config.result_store is not None and work.content_hash is not None:
+            self.config.result_store.put(work.conversation_id, work.content_hash, work.brand_hash,
+                                         self._eval_hash, result, bot_id=work.bot_id, fetched=work.fetched)
+            # Chỉ result do LLM chấm mới vào near-duplicate index
+            if work.signature is not None and work.near_duplicate is None:
+                self._near_dup.add(work.conversation_id, work.content_hash, work.brand_hash,
+                                   self._eval_hash, work.signature)
+        return result
+    
+    def _with_result_fields(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        if self.config.result_fields:
+            result.update(self.config.result_fields)
+        return result
+    
+    def _triage_result(self, work: "ConversationWork", brand_resolver: BrandResolver = None) -> Dict[str, Any]:
+        """Result không qua LLM; không ghi result store (triage config không nằm trong eval hash)"""
+        result = {
+            "conversation_id": work.conversation_id,
+            "brand_id": work.brand_id if brand_resolver else "unknown",
+            "triage": work.triage.to_dict(),
+            "metrics": work.metrics,
+            "diagnostics_hits": work.diagnostics_hits,
+            "evaluation_timestamp": datetime.utcnow().isoformat() + "Z",
+        }
+        if work.triage.decision == NOT_EVALUABLE:
+            result["not_evaluable"] = work.triage.reason
+        else:
+            result["result"] = work.result
+        self._add_transcript_preview(result, work)
+        return result
+    
+    def _add_transcript_preview(self, result: Dict[str, Any], work: "ConversationWork") -> None:
+        limit = self.config.transcript_preview_chars
+        if limit and work.transcript is not None:
+            transcript = work.transcript
+            result["transcript_preview"] = transcript[:limit] + "..." if len(transcript) > limit else transcript
+    
+    def _error_result(self, conversation_id: str, error: BaseException) -> Dict[str, Any]:
+        if isinstance(error, asyncio.TimeoutError):
+            error_msg = f"Timeout after {self.config.llm_timeout}s"
+        else:
+            error_msg = f"{str(error)}"
+        return {
+            "conversation_id": conversation_id,
+            "error": error_msg,
+            "evaluation_timestamp": datetime.utcnow().isoformat() + "Z"
+        }
     
     def _compute_metrics_and_transcript(self, messages, brand_policy, brand_prompt_text):
         """Helper function to run synchronous metric computations in a thread."""
-        transcript = build_transcript(messages)
-        metrics = {}
-        
-        latency_metrics = compute_latency_metrics(messages)
-        additional_metrics = compute_additional_metrics(messages, brand_policy, brand_prompt_text)
-        policy_violations = compute_policy_violations_count(messages, brand_policy)
-        
-        metrics.update(latency_metrics)
-        metrics.update(additional_metrics)
-        metrics["policy_violations"] = policy_violations
-        
-        return transcript, metrics
+        return analyze_conversation(messages, brand_policy, brand_prompt_text)
 
-    def _get_system_prompt_key(self, brand_policy: BrandPolicy, brand_prompt_text: str) -> str:
-        """Tạo cache key cho system prompt - sử dụng abs() để tránh số âm"""
-        policy_hash = abs(hash(str(brand_policy.__dict__))) if brand_policy else 0
-        text_hash = abs(hash(brand_prompt_text)) if brand_prompt_text else 0
-        return f"prompt_{policy_hash}_{text_hash}"
+
+def _make_batch_config(
+    max_concurrency: int,
+    progress_callback: callable,
+    stream_callback: callable,
+    use_high_performance_api: bool,
+    redis_url: str,
+    api_rate_limit: int,
+    use_progressive_batching: bool,
+    use_streaming_pipeline: bool,
+    result_store: Any = None,
+    force_refresh: bool = False,
+    near_duplicate: Optional[NearDuplicateConfig] = None,
+    triage: Optional[TriageConfig] = None,
+    brand_affinity: Optional[AffinityConfig] = None,
+    dispatch: Optional[DispatchConfig] = None,
+    result_fields: Optional[Dict[str, Any]] = None,
+    transcript_preview_chars: Optional[int] = None,
+    verify_content: bool = False
+) -> BatchConfig:
+    return BatchConfig(
+        max_concurrency=max_concurrency,
+        adaptive_batching=use_progressive_batching,  
+        progress_callback=progress_callback,
+        stream_callback=stream_callback,
+        use_high_performance_api=use_high_performance_api,
+        redis_url=redis_url,
+        api_rate_limit=api_rate_limit,
+        use_streaming_pipeline=use_streaming_pipeline,
+        result_store=result_store,
+        force_refresh=force_refresh,
+        near_duplicate=near_duplicate,
+        triage=triage,
+        brand_affinity=brand_affinity,
+        dispatch=dispatch,
+        result_fields=result_fields,
+        transcript_preview_chars=transcript_preview_chars,
+        verify_content=verify_content
+    )
 
 async def evaluate_conversations_high_speed(
-    conversation_ids: List[str],
+    conversation_ids: List[ConversationInput],
     base_url: str,
     rubrics_cfg: dict,
     brand_policy: BrandPolicy = None,
@@ -597,18 +1134,25 @@ async def evaluate_conversations_high_speed(
     use_high_performance_api: bool = True,  
     redis_url: str = None,  
     api_rate_limit: int = 200,  
-    use_progressive_batching: bool = True  
+    use_progressive_batching: bool = True,
+    use_streaming_pipeline: bool = True,
+    result_store: Any = None,
+    force_refresh: bool = False,
+    near_duplicate: Optional[NearDuplicateConfig] = None,
+    triage: Optional[TriageConfig] = None,
+    brand_affinity: Optional[AffinityConfig] = None,
+    dispatch: Optional[DispatchConfig] = None,
+    result_fields: Optional[Dict[str, Any]] = None,
+    transcript_preview_chars: Optional[int] = None,
+    verify_content: bool = False
 ) -> List[Dict[str, Any]]:
-    """High-level API cho batch evaluation nhanh"""
+    """High-level API cho batch evaluation nhanh (ID và/hoặc conversation inline)"""
     
-    config = BatchConfig(
-        max_concurrency=max_concurrency,
-        adaptive_batching=use_progressive_batching,  
-        progress_callback=progress_callback,
-        stream_callback=stream_callback,
-        use_high_performance_api=use_high_performance_api,
-        redis_url=redis_url,
-        api_rate_limit=api_rate_limit
+    config = _make_batch_config(
+        max_concurrency, progress_callback, stream_callback, use_high_performance_api,
+        redis_url, api_rate_limit, use_progressive_batching, use_streaming_pipeline,
+        result_store, force_refresh, near_duplicate, triage, brand_affinity, dispatch, result_fields,
+        transcript_preview_chars, verify_content
     )
     
     evaluator = HighSpeedBatchEvaluator(config)
@@ -619,4 +1163,48 @@ async def evaluate_conversations_high_speed(
         llm_base_url, apply_diagnostics, diagnostics_cfg, brand_resolver
     )
 
+async def stream_evaluate_conversations(
+    conversation_ids: Union[List[ConversationInput], AsyncIterable[ConversationInput]],
+    base_url: str,
+    rubrics_cfg: dict,
+    brand_policy: BrandPolicy = None,
+    brand_prompt_text: str = None,
+    llm_api_key: str = None,
+    llm_model: str = "gemini-2.5-flash",
+    temperature: float = 0.2,
+    llm_base_url: str = None,
+    apply_diagnostics: bool = True,
+    diagnostics_cfg: dict = None,
+    max_concurrency: int = 30,
+    progress_callback: callable = None,
+    brand_resolver: BrandResolver = None,
+    use_high_performance_api: bool = True,
+    redis_url: str = None,
+    api_rate_limit: int = 200,
+    result_store: Any = None,
+    force_refresh: bool = False,
+    near_duplicate: Optional[NearDuplicateConfig] = None,
+    triage: Optional[TriageConfig] = None,
+    brand_affinity: Optional[AffinityConfig] = None,
+    dispatch: Optional[DispatchConfig] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Async iterator API: yield từng result theo thứ tự hoàn thành.
+
+        async for result in stream_evaluate_conversations(ids, base_url, rubrics_cfg, ...):
+            ...
 
+    conversation_ids có thể là async iterable (conversation đang fetch theo trang).
+    """
+    config = _make_batch_config(
+        max_concurrency, progress_callback, None, use_high_performance_api,
+        redis_url, api_rate_limit, False, True, result_store, force_refresh, near_duplicate, triage,
+        brand_affinity, dispatch
+    )
+    evaluator = HighSpeedBatchEvaluator(config)
+    async for result in evaluator.iter_evaluate(
+        conversation_ids, base_url, rubrics_cfg, brand_policy,
+        brand_prompt_text, llm_api_key, llm_model, temperature,
+        llm_base_url, apply_diagnostics, diagnostics_cfg, brand_resolver
+    ):
+        yield result
@@ -0,0 +1,230 @@
+"""
+Brand artifact registry: compile mỗi brand một lần, dùng chung giữa các request.
+
+BrandArtifact gom mọi thứ suy ra được từ brand (prompt file hoặc KB JSON):
+policy, brand_hash (khóa result store), dữ liệu detector trích sẵn (allowed_positions
+cho double-room), số token ước lượng và system prompt đã render theo từng rubrics.
+Artifact định danh bằng content hash của nguồn: prompt file sửa -> config registry
+reload -> hash mới -> compile lại; KB JSON giống nhau giữa các request -> dùng lại.
+
+    registry = get_brand_artifacts()
+    registry.warm_up("config/bot_map.yaml", rubrics_cfg)  # lúc khởi động
+    artifact = registry.from_prompt_file("brands/son_hai/prompt.md", brand_id="son_hai")
+    system_prompt = artifact.system_prompt(rubrics_cfg)
+"""
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, Optional
+
+from .brand_specs import BrandPolicy, build_brand_from_kb_json
+from .config_registry import get_config_registry
+from .diagnostics import extract_allowed_positions
+from .prompting import build_system_prompt_unified
+from .result_store import brand_fingerprint, fingerprint
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+_encoding = None
+
+
+def estimate_tokens(text: str) -> int:
+    """Số token (tiktoken cl100k nếu có, không thì ~3 ký tự/token cho tiếng Việt)"""
+    global _encoding
+    if not text:
+        return 0
+    if TIKTOKEN_AVAILABLE:
+        try:
+            if _encoding is None:
+                _encoding = tiktoken.get_encoding("cl100k_base")
+            return len(_encoding.encode(text))
+        except Exception:
+            pass
+    return max(1, len(text) // 3)
+
+
+@dataclass(frozen=True)
+class BrandArtifact:
+    """Brand đã compile - không sửa (BrandPolicy dùng chung giữa các request)"""
+    brand_id: str
+    source: str  # path prompt file, "kb" hoặc "inline"
+    content_hash: str
+    brand_prompt_text: str
+    brand_policy: BrandPolicy
+    brand_hash: str
+    allowed_positions: FrozenSet[str]
+    prompt_tokens: int
+    _system_prompts: Dict[str, tuple] = field(default_factory=dict, compare=False, repr=False)
+
+    def _render(self, rubrics_cfg: dict, rubrics_key: str = None) -> tuple:
+        key = rubrics_key or fingerprint(rubrics_cfg)
+        entry = self._system_prompts.get(key)
+        if entry is None:
+            prompt = build_system_prompt_unified(rubrics_cfg, self.brand_policy, self.brand_prompt_text)
+            entry = self._system_prompts[key] = (prompt, estimate_tokens(prompt))
+        return entry
+
+    def system_prompt(self, rubrics_cfg: dict, rubrics_key: str = None) -> str:
+        """System prompt đã render cho rubrics này (cache theo fingerprint của rubrics)"""
+        return self._render(rubrics_cfg, rubrics_key)[0]
+
+    def system_prompt_tokens(self, rubrics_cfg: dict, rubrics_key: str = None) -> int:
+        return self._render(rubrics_cfg, rubrics_key)[1]
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "brand_id": self.brand_id,
+            "source": self.source,
+            "content_hash": self.content_hash,
+            "brand_hash": self.brand_hash,
+            "prompt_tokens": self.prompt_tokens,
+            "system_prompt_tokens": [tokens for _, tokens in self._system_prompts.values()],
+            "allowed_positions": sorted(self.allowed_positions),
+        }
+
+
+def compile_brand(brand_id: str, source: str, content_hash: str, brand_prompt_text: str,
+                  brand_policy: BrandPolicy) -> BrandArtifact:
+    return BrandArtifact(
+        brand_id=brand_id,
+        source=source,
+        content_hash=content_hash,
+        brand_prompt_text=brand_prompt_text,
+        brand_policy=brand_policy,
+        brand_hash=brand_fingerprint(brand_prompt_text, brand_policy),
+        allowed_positions=frozenset(extract_allowed_positions(brand_prompt_text)),
+        prompt_tokens=estimate_tokens(brand_prompt_text),
+    )
+
+
+class BrandArtifactRegistry:
+    """Artifact theo content hash (LRU cho KB JSON / inline), dùng chung giữa event loop và thread"""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._artifacts: "OrderedDict[str, BrandArtifact]" = OrderedDict()
+        self.counters = {"hits": 0, "compiled": 0, "evicted": 0}
+        self.warm_up_report: Optional[Dict[str, Any]] = None
+
+    def _get_or_compile(self, key: str, build) -> BrandArtifact:
+        with self._lock:
+            artifact = self._artifacts.get(key)
+            if artifact is not None:
+                self._artifacts.move_to_end(key)
+                self.counters["hits"] += 1
+                return artifact
+        artifact = build()  # ngoài lock: compile lần đầu có thể chậm (tokenize, regex)
+        with self._lock:
+            existing = self._artifacts.get(key)
+            if existing is not None:
+                return existing
+            self._artifacts[key] = artifact
+            self.counters["compiled"] += 1
+            while len(self._artifacts) > self.max_entries:
+                self._artifacts.popitem(last=False)
+                self.counters["evicted"] += 1
+        return artifact
+
+    def from_prompt_file(self, path: str, brand_id: str = None) -> BrandArtifact:
+        """Prompt file qua config registry - file sửa thì snapshot mới, artifact mới"""
+        snapshot = get_config_registry().brand(path)
+        brand_id = brand_id or _brand_id_from_path(path)
+        text, policy = snapshot.data
+        return self._get_or_compile(
+            f"file:{brand_id}:{snapshot.content_hash}",
+            lambda: compile_brand(brand_id, snapshot.path, snapshot.content_hash, text, policy))
+
+    def from_kb_json(self, kb_json: Dict[str, Any]) -> BrandArtifact:
+        content_hash = fingerprint(kb_json)
+        brand_id = str(kb_json.get("agent_name") or "unknown").strip()
+
+        def build():
+            text, policy = build_brand_from_kb_json(kb_json)
+            return compile_brand(brand_id, "kb", content_hash, text, policy)
+        return self._get_or_compile(f"kb:{content_hash}", build)
+
+    def from_text(self, brand_prompt_text: str, brand_policy: BrandPolicy, brand_id: str = "unknown") -> BrandArtifact:
+        """Brand truyền thẳng (override / single-brand batch)"""
+        content_hash = brand_fingerprint(brand_prompt_text, brand_policy)
+        return self._get_or_compile(
+            f"inline:{brand_id}:{content_hash}",
+            lambda: compile_brand(brand_id, "inline", content_hash, brand_prompt_text or "", brand_policy))
+
+    def warm_up(self, bot_map_path: str = "config/bot_map.yaml", rubrics_cfg: dict = None) -> Dict[str, Any]:
+        """Compile trước mọi brand trong bot_map (kèm system prompt nếu có rubrics)"""
+        from .bot_map import BotMap
+
+        start = time.perf_counter()
+        bot_map = BotMap(bot_map_path)
+        targets = {}
+        for bot_id in bot_map.get_all_mapped_bots():
+            brand_id, prompt_path = bot_map.resolve(bot_id)
+            targets[prompt_path] = brand_id
+        try:
+            brand_id, prompt_path = bot_map.resolve(None)  # fallback brand
+            targets.setdefault(prompt_path, brand_id)
+        except ValueError:
+            pass
+
+        compiled, errors = [], {}
+        rubrics_key = fingerprint(rubrics_cfg) if rubrics_cfg is not None else None
+        for prompt_path, brand_id in targets.items():
+            try:
+                artifact = self.from_prompt_file(prompt_path, brand_id)
+                if rubrics_cfg is not None:
+                    artifact.system_prompt(rubrics_cfg, rubrics_key)
+                compiled.append(brand_id)
+            except Exception as e:
+                errors[brand_id] = str(e)
+                logger.warning(f"Brand warm-up failed for {brand_id} ({prompt_path}): {e}")
+        self.warm_up_report = {
+            "brands": sorted(set(compiled)),
+            "errors": errors,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+        }
+        logger.info(f"Warmed up {len(compiled)} brand artifacts in {self.warm_up_report['elapsed_ms']}ms")
+        return self.warm_up_report
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            artifacts = list(self._artifacts.values())
+            counters = dict(self.counters)
+        return {
+            **counters,
+            "entries": len(artifacts),
+            "warm_up": self.warm_up_report,
+            "artifacts": [a.describe() for a in artifacts],
+        }
+
+
+def _brand_id_from_path(path: str) -> str:
+    parts = os.path.normpath(path).split(os.sep)
+    if "brands" in parts:
+        idx = parts.index("brands")
+        if idx + 1 < len(parts) - 1:
+            return parts[idx + 1]
+    return "unknown"
+
+
+_default_registry: Optional[BrandArtifactRegistry] = None
+_default_lock = threading.Lock()
+
+
+def get_brand_artifacts() -> BrandArtifactRegistry:
+    """Registry dùng chung trong process"""
+    global _default_registry
+    if _default_registry is None:
+        with _default_lock:
+            if _default_registry is None:
+                _default_registry = BrandArtifactRegistry()
+    return _default_registry
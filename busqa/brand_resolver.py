@@ -1,8 +1,9 @@
 from typing import Tuple, Dict, Optional
 import logging
 
-from .brand_specs import load_brand_prompt, BrandPolicy
+from .brand_specs import BrandPolicy
 from .bot_map import BotMap
+from .brand_artifacts import BrandArtifact, BrandArtifactRegistry, get_brand_artifacts
 
 logger = logging.getLogger(__name__)
 
@@ -12,22 +13,34 @@ class BrandResolver:
     Class để resolve brand info từ bot_id, với caching để tối ưu performance.
     
     Sử dụng BotMap để ánh xạ bot_id -> (brand_id, prompt_path), 
-    sau đó load brand prompt và policy từ file.
+    sau đó lấy BrandArtifact đã compile từ registry dùng chung (prompt sửa thì tự compile lại).
     """
     
-    def __init__(self, bot_map_path: str = "config/bot_map.yaml"):
+    def __init__(self, bot_map_path: str = "config/bot_map.yaml", artifacts: BrandArtifactRegistry = None):
         """
         Initialize BrandResolver với bot mapping config.
         
         Args:
             bot_map_path: Đường dẫn tới file bot_map.yaml
+            artifacts: BrandArtifactRegistry (mặc định registry dùng chung của process)
         """
         self._map = BotMap(bot_map_path)
-        self._cache: Dict[str, Tuple[str, BrandPolicy]] = {}
+        self.bot_map_path = bot_map_path
+        self.artifacts = artifacts or get_brand_artifacts()
         
         # Log mapped bots for debugging
         mapped_bots = self._map.get_all_mapped_bots()
 
+    def resolve_artifact(self, bot_id: Optional[str]) -> BrandArtifact:
+        """
+        Resolve BrandArtifact (policy, system prompt, dữ liệu detector) từ bot_id.
+        
+        Raises:
+            ValueError: Khi không thể resolve được brand cho bot_id
+        """
+        brand_id, prompt_path = self._map.resolve(bot_id)
+        return self.artifacts.from_prompt_file(prompt_path, brand_id)
+
     def resolve_by_bot_id(self, bot_id: Optional[str]) -> Tuple[str, BrandPolicy]:
         """
         Resolve brand prompt text và policy từ bot_id.
@@ -41,23 +54,12 @@ class BrandResolver:
         Raises:
             ValueError: Khi không thể resolve được hoặc load brand prompt failed
         """
-        try:
-            brand_id, prompt_path = self._map.resolve(bot_id)
-            
-            # Check cache trước
-            if prompt_path not in self._cache:
-                # Load brand prompt và cache kết quả
-                brand_prompt_text, brand_policy = load_brand_prompt(prompt_path)
-                self._cache[prompt_path] = (brand_prompt_text, brand_policy)
-            
-            brand_prompt_text, brand_policy = self._cache[prompt_path]
-            
-            # Resolution completed
-            
-            return brand_prompt_text, brand_policy
-            
-        except Exception as e:
-            raise
+        artifact = self.resolve_artifact(bot_id)
+        return artifact.brand_prompt_text, artifact.brand_policy
+
+    def warm_up(self, rubrics_cfg: dict = None) -> Dict[str, object]:
+        """Compile trước mọi brand trong bot_map"""
+        return self.artifacts.warm_up(self.bot_map_path, rubrics_cfg)
     
     def get_cache_stats(self) -> Dict[str, int]:
         """
@@ -67,6 +69,6 @@ class BrandResolver:
             Dict với cache_size và mapped_bots_count
         """
         return {
-            "cache_size": len(self._cache),
+            "cache_size": self.artifacts.stats()["entries"],
             "mapped_bots_count": len(self._map.get_all_mapped_bots())
         }
@@ -0,0 +1,285 @@
+"""
+AIMD adaptive concurrency cho các stage gọi ra ngoài (LLM, fetch).
+
+Giới hạn concurrency không còn cố định theo request: tăng cộng (+increase_step) sau mỗi
+cửa sổ request khỏe mạnh mà limit thực sự bị dùng hết, giảm nhân (x decrease_factor) ngay
+khi gặp 429 / timeout, hoặc khi p95 latency của cửa sổ vượt p95 tham chiếu x latency_spike_ratio,
+tỷ lệ lỗi server cao hoặc hệ thống quá tải (SystemPerformanceMonitor). Mọi lần đổi limit
+được ghi vào history kèm lý do.
+
+Spike p95 chỉ tính khi median cũng dịch lên: LLM có đuôi latency dài cố hữu (vài % request
+chậm gấp 10 lần dù không quá tải), chỉ nhìn p95 của cửa sổ 20 request sẽ cắt nhầm liên tục.
+"""
+import asyncio
+import contextlib
+import math
+import time
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Outcome của một request
+OK = "ok"
+RATE_LIMITED = "rate_limited"
+TIMEOUT = "timeout"
+SERVER_ERROR = "server_error"
+ERROR = "error"  # lỗi dữ liệu/logic - không phải tín hiệu quá tải
+
+_RATE_LIMIT_MARKERS = ("429", "too many requests", "rate limit", "ratelimit", "resource_exhausted", "quota")
+_TIMEOUT_MARKERS = ("timeout", "timed out")
+_SERVER_ERROR_MARKERS = ("500 ", "502 ", "503 ", "504 ", "server error", "service unavailable",
+                         "connection reset", "connection refused", "connecterror", "remoteprotocolerror")
+
+
+def classify_error(exc: BaseException) -> str:
+    """Phân loại exception thành tín hiệu cho controller (429 / timeout / lỗi server / lỗi thường)"""
+    if isinstance(exc, asyncio.TimeoutError):
+        return TIMEOUT
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    if status == 429:
+        return RATE_LIMITED
+    if isinstance(status, int) and status >= 500:
+        return SERVER_ERROR
+
+    text = f"{type(exc).__name__} {exc}".lower()
+    if any(m in text for m in _RATE_LIMIT_MARKERS):
+        return RATE_LIMITED
+    if any(m in text for m in _TIMEOUT_MARKERS):
+        return TIMEOUT
+    if isinstance(exc, ConnectionError) or any(m in text for m in _SERVER_ERROR_MARKERS):
+        return SERVER_ERROR
+    return ERROR
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    """Nearest-rank percentile trên list đã sort"""
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+@dataclass
+class AIMDConfig:
+    """Config cho AIMD limiter"""
+    min_limit: int = 1
+    max_limit: int = 30
+    initial_limit: Optional[int] = None  # None -> max_limit
+    increase_step: int = 1
+    decrease_factor: float = 0.5
+    window_size: int = 20  # số request hoàn thành mỗi lần đánh giá
+    latency_spike_ratio: float = 2.0  # p95 cửa sổ > ratio x p95 tham chiếu -> giảm
+    median_shift_ratio: float = 1.5  # ... và median cửa sổ > ratio x median tham chiếu
+    reference_windows: int = 10  # latency tham chiếu = các cửa sổ gần nhất
+    max_error_rate: float = 0.2  # tỷ lệ lỗi server trong cửa sổ
+    history_size: int = 200
+
+
+class AIMDLimiter:
+    """
+    Semaphore có limit thay đổi được trong lúc chạy, điều khiển theo AIMD.
+
+        async with limiter.slot():
+            await call_llm(...)
+
+    Outcome của mỗi slot (ok / 429 / timeout / lỗi) được tự phân loại từ exception.
+    Khi limit giảm, các request đang chạy vẫn chạy tiếp; slot mới chỉ được cấp khi
+    in_flight xuống dưới limit mới.
+    """
+
+    def __init__(self, name: str, config: AIMDConfig = None,
+                 pressure_check: Optional[Callable[[], bool]] = None):
+        self.name = name
+        self.config = config or AIMDConfig()
+        cfg = self.config
+        if cfg.min_limit < 1 or cfg.max_limit < cfg.min_limit:
+            raise ValueError(f"invalid AIMD bounds: [{cfg.min_limit}, {cfg.max_limit}]")
+        self.pressure_check = pressure_check
+        self._limit = max(cfg.min_limit, min(cfg.max_limit, cfg.initial_limit or cfg.max_limit))
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+        self._window_latencies: List[float] = []
+        self._window_server_errors = 0
+        self._saturated = False
+        self._reference: Deque[float] = deque(maxlen=cfg.window_size * cfg.reference_windows)
+        self._reference_p95: Optional[float] = None
+        self._last_decrease_at = float("-inf")
+
+        self._created_at = time.monotonic()
+        self._limit_since = self._created_at
+        self._limit_area = 0.0
+        self.history: Deque[Dict[str, Any]] = deque(maxlen=cfg.history_size)
+        self.counts = {OK: 0, RATE_LIMITED: 0, TIMEOUT: 0, SERVER_ERROR: 0, ERROR: 0}
+        self.increases = 0
+        self.decreases = 0
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    # Cấp / trả slot
+
+    async def acquire(self) -> float:
+        """Chờ tới khi in_flight < limit; trả về thời điểm bắt đầu (dùng cho release)"""
+        if self._in_flight >= self._limit or self._waiters:
+            self._saturated = True
+            fut = asyncio.get_running_loop().create_future()
+            self._waiters.append(fut)
+            try:
+                await fut
+            except asyncio.CancelledError:
+                # Slot đã được cấp đúng lúc bị hủy -> chuyển cho waiter kế
+                if fut.done() and not fut.cancelled():
+                    self._in_flight -= 1
+                    self._wake()
+                raise
+        else:
+            self._in_flight += 1
+        if self._in_flight >= self._limit:
+            self._saturated = True
+        return time.monotonic()
+
+    def release(self, started: float, outcome: Optional[str]) -> None:
+        """Trả slot và ghi nhận outcome (None = không tính, ví dụ bị hủy)"""
+        self._in_flight -= 1
+        if outcome is not None:
+            self._record(started, time.monotonic() - started, outcome)
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self, inner: Any = None) -> AsyncIterator[None]:
+        """
+        `inner`: async context manager lấy sau slot này (vd slot LLM của process) - chỉ giữ nó
+        khi đã có slot AIMD; thời gian chờ nó không tính vào latency
+        """
+        started = await self.acquire()
+        outcome: Optional[str] = None  # lỗi / hủy trong lúc chờ inner: không tính
+        try:
+            async with inner if inner is not None else contextlib.nullcontext():
+                started = time.monotonic()
+                outcome = OK
+                try:
+                    yield
+                except asyncio.CancelledError:
+                    outcome = None
+                    raise
+                except Exception as e:
+                    outcome = classify_error(e)
+                    raise
+        finally:
+            self.release(started, outcome)
+
+    def _wake(self) -> None:
+        while self._waiters and self._in_flight < self._limit:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                self._in_flight += 1
+                fut.set_result(None)
+
+    # Điều khiển AIMD
+
+    def _record(self, started: float, latency: float, outcome: str) -> None:
+        self.counts[outcome] += 1
+        if outcome in (RATE_LIMITED, TIMEOUT):
+            # Request bắt đầu trước lần giảm gần nhất thuộc cùng đợt quá tải - đã phản ứng rồi
+            if started >= self._last_decrease_at:
+                self._decrease(outcome)
+            return
+        if outcome == ERROR:
+            return
+        if outcome == SERVER_ERROR:
+            self._window_server_errors += 1
+        else:
+            self._window_latencies.append(latency)
+        if len(self._window_latencies) + self._window_server_errors >= self.config.window_size:
+            self._evaluate_window()
+
+    def _evaluate_window(self) -> None:
+        cfg = self.config
+        samples = len(self._window_latencies) + self._window_server_errors
+        error_rate = self._window_server_errors / samples
+        window = sorted(self._window_latencies)
+        p95 = _percentile(window, 0.95) if window else None
+        spike = False
+        ref_p95 = None
+        # Cần ít nhất 2 cửa sổ tham chiếu trước khi xét spike
+        if window and len(self._reference) >= 2 * cfg.window_size:
+            reference = sorted(self._reference)
+            ref_p95 = _percentile(reference, 0.95)
+            spike = (p95 > ref_p95 * cfg.latency_spike_ratio
+                     and _percentile(window, 0.5) > _percentile(reference, 0.5) * cfg.median_shift_ratio)
+        # Tham chiếu trượt theo latency thực tế -> thay đổi kéo dài sẽ được chấp nhận sau vài cửa sổ
+        self._reference.extend(window)
+        self._reference_p95 = _percentile(sorted(self._reference), 0.95) if self._reference else None
+
+        details = {"p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+                   "ref_p95_ms": round(ref_p95 * 1000, 1) if ref_p95 is not None else None,
+                   "error_rate": round(error_rate, 3)}
+        if self.pressure_check is not None and self.pressure_check():
+            self._decrease("system_pressure", details)
+        elif error_rate > cfg.max_error_rate:
+            self._decrease("error_rate", details)
+        elif spike:
+            self._decrease("latency_spike", details)
+        elif self._saturated and self._limit < cfg.max_limit:
+            # Chỉ tăng khi limit đang là nút cổ chai
+            self._set_limit(min(cfg.max_limit, self._limit + cfg.increase_step), "healthy", details)
+            self.increases += 1
+
+        self._window_latencies = []
+        self._window_server_errors = 0
+        self._saturated = self._in_flight >= self._limit
+
+    def _decrease(self, reason: str, details: Optional[Dict[str, Any]] = None) -> None:
+        self._last_decrease_at = time.monotonic()
+        new_limit = max(self.config.min_limit, int(self._limit * self.config.decrease_factor))
+        if new_limit < self._limit:
+            self._set_limit(new_limit, reason, details)
+            self.decreases += 1
+        # Cửa sổ mới đo trên limit mới
+        self._window_latencies = []
+        self._window_server_errors = 0
+        self._saturated = False
+
+    def _set_limit(self, new_limit: int, reason: str, details: Optional[Dict[str, Any]] = None) -> None:
+        now = time.monotonic()
+        self._limit_area += self._limit * (now - self._limit_since)
+        self._limit_since = now
+        entry = {"t": round(now - self._created_at, 3), "from": self._limit, "to": new_limit,
+                 "reason": reason, "in_flight": self._in_flight}
+        if details:
+            entry.update(details)
+        self.history.append(entry)
+        logger.info(f"[{self.name}] concurrency {self._limit} -> {new_limit} ({reason})")
+        self._limit = new_limit
+        self._wake()
+
+    def avg_limit(self) -> float:
+        """Limit trung bình theo thời gian kể từ khi tạo"""
+        now = time.monotonic()
+        elapsed = now - self._created_at
+        if elapsed <= 0:
+            return float(self._limit)
+        return (self._limit_area + self._limit * (now - self._limit_since)) / elapsed
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self._limit,
+            "min_limit": self.config.min_limit,
+            "max_limit": self.config.max_limit,
+            "avg_limit": round(self.avg_limit(), 2),
+            "in_flight": self._in_flight,
+            "reference_p95_ms": round(self._reference_p95 * 1000, 1) if self._reference_p95 is not None else None,
+            "increases": self.increases,
+            "decreases": self.decreases,
+            "outcomes": dict(self.counts),
+            "history": list(self.history),
+        }
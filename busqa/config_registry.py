@@ -0,0 +1,194 @@
+"""
+Config registry: load mỗi config một lần, snapshot bất biến, reload khi file đổi.
+
+Rubrics, diagnostics và brand prompt được load + validate qua loader sẵn có
+(prompt_loader / brand_specs) rồi đóng băng thành ConfigSnapshot. Mỗi lần gọi chỉ
+stat file (tối đa một lần mỗi `check_interval` giây); mtime/size đổi mới đọc lại.
+Nội dung không đổi (chỉ touch) thì giữ snapshot cũ - snapshot định danh bằng content_hash.
+File hỏng giữa chừng (đang sửa dở) thì giữ snapshot cũ và log warning.
+
+    rubrics_cfg = current_rubrics()
+    diagnostics_cfg = current_diagnostics()
+    brand_prompt_text, brand_policy = brand_prompt("brands/son_hai/prompt.md")
+"""
+import os
+import time
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .prompt_loader import load_unified_rubrics, load_diagnostics_config
+from .brand_specs import load_brand_prompt, BrandPolicy
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RUBRICS_PATH = "config/rubrics_unified.yaml"
+DEFAULT_DIAGNOSTICS_PATH = "config/diagnostics.yaml"
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class FrozenDict(dict):
+    """dict chỉ đọc - vẫn là dict cho json.dumps / isinstance / {**cfg}"""
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("config snapshot is read-only; copy it (dict(cfg) / {**cfg}) before modifying")
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _readonly
+    __ior__ = _readonly
+
+    def __reduce__(self):
+        # pickle mặc định gọi __setitem__ khi load (ProcessPool của cpu_stage)
+        return (FrozenDict, (dict(self),))
+
+
+def freeze(obj: Any) -> Any:
+    """Đóng băng đệ quy: dict -> FrozenDict, list -> tuple"""
+    if isinstance(obj, dict):
+        return FrozenDict((k, freeze(v)) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return tuple(freeze(v) for v in obj)
+    return obj
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """Một phiên bản đã validate của file config"""
+    kind: str  # "rubrics" | "diagnostics" | "brand"
+    path: str
+    data: Any  # FrozenDict, hoặc (brand_prompt_text, BrandPolicy) với brand
+    content_hash: str
+    mtime_ns: int
+    loaded_at: float
+
+
+@dataclass
+class _Entry:
+    snapshot: ConfigSnapshot
+    size: int
+    checked_at: float
+
+
+_LOADERS: Dict[str, Callable[[str], Any]] = {
+    "rubrics": load_unified_rubrics,
+    "diagnostics": load_diagnostics_config,
+    "brand": load_brand_prompt,
+}
+
+
+class ConfigRegistry:
+    """Cache config theo (kind, path tuyệt đối), dùng chung được giữa event loop và thread"""
+
+    def __init__(self, check_interval: float = 1.0):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, str], _Entry] = {}
+        self.counters = {"loads": 0, "reloads": 0, "unchanged_reloads": 0, "errors": 0}
+
+    @staticmethod
+    def _resolve(kind: str, path: str) -> str:
+        # rubrics/diagnostics: path tương đối theo project root (như prompt_loader); brand: theo cwd
+        if os.path.isabs(path):
+            return path
+        if kind == "brand":
+            return os.path.abspath(path)
+        return os.path.join(_PROJECT_ROOT, path)
+
+    def get(self, kind: str, path: str) -> ConfigSnapshot:
+        """Snapshot hiện tại; đọc lại file nếu mtime/size đổi từ lần load trước"""
+        key = (kind, self._resolve(kind, path))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry.checked_at < self.check_interval:
+                return entry.snapshot
+            try:
+                st = os.stat(key[1])
+            except OSError:
+                if entry is None:
+                    raise
+                # File tạm thời biến mất (editor ghi đè) -> giữ bản cũ
+                entry.checked_at = now
+                return entry.snapshot
+            if entry is not None and st.st_mtime_ns == entry.snapshot.mtime_ns and st.st_size == entry.size:
+                entry.checked_at = now
+                return entry.snapshot
+            return self._load(kind, key, st, entry, now).snapshot
+
+    def _load(self, kind: str, key: Tuple[str, str], st: os.stat_result, entry: Optional[_Entry],
+              now: float) -> _Entry:
+        path = key[1]
+        try:
+            with open(path, "rb") as f:
+                content_hash = hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+            if entry is not None and entry.snapshot.content_hash == content_hash:
+                # Chỉ touch: giữ snapshot cũ (cùng object)
+                self.counters["unchanged_reloads"] += 1
+                snapshot = ConfigSnapshot(kind, path, entry.snapshot.data, content_hash,
+                                          st.st_mtime_ns, entry.snapshot.loaded_at)
+            else:
+                data = _LOADERS[kind](path)
+                if kind != "brand":
+                    data = freeze(data)
+                snapshot = ConfigSnapshot(kind, path, data, content_hash, st.st_mtime_ns, time.time())
+                self.counters["reloads" if entry is not None else "loads"] += 1
+                if entry is not None:
+                    logger.info(f"Reloaded {kind} config {path} ({entry.snapshot.content_hash[:8]} -> {content_hash[:8]})")
+        except Exception as e:
+            self.counters["errors"] += 1
+            if entry is None:
+                raise
+            logger.warning(f"Keeping previous {kind} config {path}: reload failed ({e})")
+            entry.checked_at = now
+            return entry
+        new_entry = _Entry(snapshot, st.st_size, now)
+        self._entries[key] = new_entry
+        return new_entry
+
+    def rubrics(self, path: str = DEFAULT_RUBRICS_PATH) -> ConfigSnapshot:
+        return self.get("rubrics", path)
+
+    def diagnostics(self, path: str = DEFAULT_DIAGNOSTICS_PATH) -> ConfigSnapshot:
+        return self.get("diagnostics", path)
+
+    def brand(self, path: str) -> ConfigSnapshot:
+        return self.get("brand", path)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            snapshots = [e.snapshot for e in self._entries.values()]
+            counters = dict(self.counters)
+        return {
+            **counters,
+            "check_interval": self.check_interval,
+            "configs": [{"kind": s.kind, "path": s.path, "content_hash": s.content_hash,
+                         "loaded_at": s.loaded_at} for s in snapshots],
+        }
+
+
+_default_registry: Optional[ConfigRegistry] = None
+_default_lock = threading.Lock()
+
+
+def get_config_registry() -> ConfigRegistry:
+    """Registry dùng chung trong process"""
+    global _default_registry
+    if _default_registry is None:
+        with _default_lock:
+            if _default_registry is None:
+                _default_registry = ConfigRegistry(float(os.getenv("BUSQA_CONFIG_CHECK_INTERVAL", "1.0")))
+    return _default_registry
+
+
+def current_rubrics(path: str = DEFAULT_RUBRICS_PATH) -> Dict[str, Any]:
+    return get_config_registry().rubrics(path).data
+
+
+def current_diagnostics(path: str = DEFAULT_DIAGNOSTICS_PATH) -> Dict[str, Any]:
+    return get_config_registry().diagnostics(path).data
+
+
+def brand_prompt(path: str) -> Tuple[str, BrandPolicy]:
+    """Như brand_specs.load_brand_prompt nhưng qua registry (BrandPolicy dùng chung - không sửa)"""
+    return get_config_registry().brand(path).data
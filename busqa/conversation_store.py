@@ -0,0 +1,386 @@
+"""
+Local conversation store: conversation đã normalize (SQLite) + sync tăng dần theo bot.
+
+Mỗi conversation lưu một dòng: metadata có index (bot_id, created_ts, turns) và các cột
+của ConversationFrame (ts / sender / offsets dạng BLOB + text buffer), nên load lại là
+ra frame ngay - không normalize lại, content_hash giống hệt lúc fetch (result store vẫn hit).
+
+Sync theo watermark (created_ts, conversation_id) mới nhất đã thấy của từng bot_id:
+list API trả mới nhất trước, nên sync dừng ở trang đầu tiên không có conversation nào
+mới hơn watermark. Watermark chỉ tiến khi sync chạy xong (lỗi giữa chừng -> lần sau sync lại)
+và đã đọc liền tới watermark cũ (hoặc hết danh sách): bị cắt bởi max_pages/limit trước đó thì
+giữ watermark cũ, lần sau đọc lại từ đầu thay vì bỏ sót khoảng ở giữa.
+
+    store = ConversationStore()
+    report = await sync_bot(store, FetchConfig(base_url, bot_id, token))
+    conversations = store.load_bot(bot_id, min_turns=4)
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+from array import array
+from dataclasses import replace
+from datetime import timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .decode import DecodedConversation, conversation_from_dict
+from .frame import ConversationFrame
+from .list_fetcher import AsyncListFetcher, FetchConfig
+from .selection import SelectionQuery, TURN_BUCKETS, allocate, created_ts, sample_rank
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONVERSATION_STORE_PATH = os.getenv("BUSQA_CONVERSATION_STORE", "data/conversations.sqlite")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    conversation_id TEXT PRIMARY KEY,
+    bot_id TEXT,
+    created_at TEXT,
+    created_ts REAL NOT NULL,
+    turns INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    ts BLOB NOT NULL,
+    senders BLOB NOT NULL,
+    starts BLOB NOT NULL,
+    ends BLOB NOT NULL,
+    buffer TEXT NOT NULL,
+    sender_names TEXT,
+    tz_offset REAL,
+    synced_at REAL NOT NULL,
+    flow TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_conversations_bot_created ON conversations (bot_id, created_ts);
+CREATE INDEX IF NOT EXISTS idx_conversations_bot_turns ON conversations (bot_id, turns);
+CREATE INDEX IF NOT EXISTS idx_conversations_created ON conversations (created_ts);
+CREATE INDEX IF NOT EXISTS idx_conversations_bot_flow ON conversations (bot_id, flow);
+CREATE TABLE IF NOT EXISTS sync_state (
+    bot_id TEXT PRIMARY KEY,
+    watermark_ts REAL NOT NULL,
+    watermark_id TEXT NOT NULL,
+    last_sync_at REAL NOT NULL,
+    last_report TEXT
+);
+"""
+
+_COLUMNS = ("conversation_id, bot_id, created_at, created_ts, turns, content_hash, "
+            "ts, senders, starts, ends, buffer, sender_names, tz_offset")
+
+Watermark = Tuple[float, str]
+
+# Biểu thức tầng cho strategy="stratified" (khớp selection.day_of / turn_bucket / flow)
+_STRATUM_SQL = {
+    "day": "date(created_ts, 'unixepoch')",
+    "flow": "COALESCE(flow, 'unknown')",
+    "turns": "CASE " + " ".join(
+        f"WHEN turns <= {high} THEN '{low}-{high}'"
+        for low, high in zip((1,) + tuple(b + 1 for b in TURN_BUCKETS), TURN_BUCKETS)
+    ) + f" ELSE '{TURN_BUCKETS[-1] + 1}+' END",
+}
+
+
+def _as_decoded(item: Any) -> DecodedConversation:
+    if isinstance(item, DecodedConversation):
+        return item
+    return conversation_from_dict(item)
+
+
+def _frame_row(frame: ConversationFrame) -> Tuple[bytes, bytes, bytes, bytes, str, Optional[str], Optional[float]]:
+    # Offsets lưu uint32 cố định (array "L" khác itemsize giữa các nền tảng)
+    names = json.dumps({str(i): n for i, n in frame.sender_names.items()}, ensure_ascii=False) \
+        if frame.sender_names else None
+    offset = frame.tz.utcoffset(None) if frame.tz is not None else None
+    return (frame.ts.tobytes(), frame.senders.tobytes(), array("I", frame.starts).tobytes(),
+            array("I", frame.ends).tobytes(), frame.buffer, names,
+            offset.total_seconds() if offset is not None else None)
+
+
+def _frame_from_row(conversation_id: str, ts: bytes, senders: bytes, starts: bytes, ends: bytes,
+                    buffer: str, sender_names: Optional[str], tz_offset: Optional[float]) -> ConversationFrame:
+    cols = []
+    for typecode, data, out in (("d", ts, "d"), ("B", senders, "B"), ("I", starts, "L"), ("I", ends, "L")):
+        col = array(typecode)
+        col.frombytes(data)
+        cols.append(col if out == typecode else array(out, col))
+    names = {int(i): n for i, n in json.loads(sender_names).items()} if sender_names else None
+    tz = timezone(timedelta(seconds=tz_offset)) if tz_offset is not None else None
+    return ConversationFrame(conversation_id, *cols, buffer, names, tz)
+
+
+class ConversationStore:
+    """SQLite conversation store, dùng chung được giữa event loop và worker thread"""
+
+    def __init__(self, path: str = DEFAULT_CONVERSATION_STORE_PATH):
+        self.path = path
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._migrate()
+        self._conn.executescript(_SCHEMA)
+        self._conn.create_function("busqa_rank", 2, sample_rank, deterministic=True)
+
+    def _migrate(self) -> None:
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(conversations)")}
+        if columns and "flow" not in columns:
+            self._conn.execute("ALTER TABLE conversations ADD COLUMN flow TEXT")
+
+    def upsert(self, conversations: Iterable[Any], bot_id: Optional[str] = None) -> Dict[str, int]:
+        """Ghi conversations (DecodedConversation hoặc dict thô); nội dung không đổi thì bỏ qua"""
+        rows = []
+        now = time.time()
+        for item in conversations:
+            conversation = _as_decoded(item)
+            if conversation.conversation_id is None:
+                continue
+            frame = conversation.messages
+            created_at = conversation.created_at
+            rows.append((
+                str(conversation.conversation_id), str(bot_id or conversation.bot_id or "") or None,
+                None if created_at is None else str(created_at), created_ts(conversation),
+                len(frame), frame.content_hash(), *_frame_row(frame), now))
+        counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+        if not rows:
+            return counts
+        with self._lock:
+            existing = {}
+            ids = [r[0] for r in rows]
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                existing.update(self._conn.execute(
+                    f"SELECT conversation_id, content_hash FROM conversations "
+                    f"WHERE conversation_id IN ({','.join('?' * len(chunk))})", chunk).fetchall())
+            changed = []
+            for row in rows:
+                old = existing.get(row[0])
+                if old is None:
+                    counts["inserted"] += 1
+                elif old != row[5]:
+                    counts["updated"] += 1
+                else:
+                    counts["unchanged"] += 1
+                    continue
+                changed.append(row)
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    f"INSERT OR REPLACE INTO conversations ({_COLUMNS}, synced_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", changed)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return counts
+
+    def _to_conversation(self, row) -> DecodedConversation:
+        conversation_id, bot_id, created_at = row[0], row[1], row[2]
+        frame = _frame_from_row(conversation_id, *row[6:13])
+        return DecodedConversation(conversation_id, bot_id, created_at, frame)
+
+    def get(self, conversation_id: str) -> Optional[DecodedConversation]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {_COLUMNS} FROM conversations WHERE conversation_id = ?",
+                                     (str(conversation_id),)).fetchone()
+        return self._to_conversation(row) if row is not None else None
+
+    def get_many(self, conversation_ids: List[str]) -> List[DecodedConversation]:
+        """Theo đúng thứ tự conversation_ids (id không có trong store bị bỏ qua)"""
+        ids = [str(cid) for cid in conversation_ids]
+        rows = {}
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                for row in self._conn.execute(
+                        f"SELECT {_COLUMNS} FROM conversations "
+                        f"WHERE conversation_id IN ({','.join('?' * len(chunk))})", chunk):
+                    rows[row[0]] = row
+        return [self._to_conversation(rows[cid]) for cid in ids if cid in rows]
+
+    def select(self, query: SelectionQuery, bot_id: Optional[str] = None) -> List[DecodedConversation]:
+        """
+        SelectionQuery bằng SQL: lọc + top-N/sample trên index, chỉ load frame của phần được chọn.
+        """
+        where, params = ["1 = 1"], []
+        if bot_id is not None:
+            where.append("bot_id = ?")
+            params.append(str(bot_id))
+        if query.min_turns:
+            where.append("turns >= ?")
+            params.append(query.min_turns)
+        if query.max_turns is not None:
+            where.append("turns <= ?")
+            params.append(query.max_turns)
+        since, until = query.window()
+        if since is not None:
+            where.append("created_ts >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("created_ts < ?")
+            params.append(until)
+        where_sql = " AND ".join(where)
+
+        if query.strategy == "stratified":
+            return self.get_many(self._select_stratified(query, where_sql, params))
+
+        strategy = query.strategy
+        if strategy == "random":
+            order_sql, order_params = "busqa_rank(conversation_id, ?)", [query.sample_seed()]
+        else:
+            if strategy in ("newest", "oldest"):
+                column, descending = "created_ts", strategy == "newest"
+            else:
+                column = "created_ts" if query.sort_by == "created_at" else "turns"
+                descending = query.order == "desc"
+            if strategy == "tail":
+                descending = not descending
+            direction = "DESC" if descending else "ASC"
+            order_sql, order_params = f"{column} {direction}, conversation_id {direction}", []
+        with self._lock:
+            ids = [row[0] for row in self._conn.execute(
+                f"SELECT conversation_id FROM conversations WHERE {where_sql} "
+                f"ORDER BY {order_sql} LIMIT ? OFFSET ?",
+                params + order_params + [query.take, query.skip])]
+        if strategy == "tail":
+            ids.reverse()
+        return self.get_many(ids)
+
+    def _select_stratified(self, query: SelectionQuery, where_sql: str, params: List[Any]) -> List[str]:
+        stratum = _STRATUM_SQL[query.stratify_by]
+        seed = query.sample_seed()
+        with self._lock:
+            counts = dict(self._conn.execute(
+                f"SELECT {stratum} AS s, COUNT(*) FROM conversations WHERE {where_sql} GROUP BY s", params))
+            alloc = allocate(counts, query.take, query.allocation == "equal")
+            ids = []
+            for name in sorted(alloc):
+                if alloc[name]:
+                    ids.extend(row[0] for row in self._conn.execute(
+                        f"SELECT conversation_id FROM conversations WHERE {where_sql} AND {stratum} = ? "
+                        f"ORDER BY busqa_rank(conversation_id, ?) LIMIT ?",
+                        params + [name, seed, alloc[name]]))
+        return ids
+
+    def record_flows(self, results: Iterable[Dict[str, Any]]) -> int:
+        """Lưu detected_flow của result đã chấm - dùng cho stratify_by="flow" lần sau"""
+        rows = [(str(r["result"]["detected_flow"]), str(r["conversation_id"])) for r in results
+                if "error" not in r and r.get("conversation_id") is not None
+                and (r.get("result") or {}).get("detected_flow")]
+        if not rows:
+            return 0
+        with self._lock:
+            self._conn.executemany("UPDATE conversations SET flow = ? WHERE conversation_id = ?", rows)
+        return len(rows)
+
+    def load_bot(self, bot_id: str, min_turns: int = 0, limit: Optional[int] = None) -> List[DecodedConversation]:
+        """Conversations của bot, mới nhất trước (index bot_id/created_ts)"""
+        sql = f"SELECT {_COLUMNS} FROM conversations WHERE bot_id = ? AND turns >= ? ORDER BY created_ts DESC"
+        params: List[Any] = [str(bot_id), min_turns]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._to_conversation(row) for row in rows]
+
+    def count(self, bot_id: Optional[str] = None) -> int:
+        with self._lock:
+            if bot_id is None:
+                return self._conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+            return self._conn.execute("SELECT COUNT(*) FROM conversations WHERE bot_id = ?",
+                                      (str(bot_id),)).fetchone()[0]
+
+    def watermark(self, bot_id: str) -> Optional[Watermark]:
+        with self._lock:
+            row = self._conn.execute("SELECT watermark_ts, watermark_id FROM sync_state WHERE bot_id = ?",
+                                     (str(bot_id),)).fetchone()
+        return (row[0], row[1]) if row is not None else None
+
+    def set_watermark(self, bot_id: str, watermark: Watermark, report: Optional[Dict[str, Any]] = None) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sync_state (bot_id, watermark_ts, watermark_id, last_sync_at, last_report) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (str(bot_id), watermark[0], watermark[1], time.time(),
+                 json.dumps(report, default=str) if report is not None else None))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            bots = self._conn.execute(
+                "SELECT c.bot_id, COUNT(*), MAX(c.created_ts), s.last_sync_at FROM conversations c "
+                "LEFT JOIN sync_state s ON s.bot_id = c.bot_id GROUP BY c.bot_id").fetchall()
+        return {
+            "path": self.path,
+            "conversations": sum(b[1] for b in bots),
+            "bots": [{"bot_id": b[0], "conversations": b[1], "newest_created_ts": b[2],
+                      "last_sync_at": b[3]} for b in bots],
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _key(conversation: DecodedConversation) -> Watermark:
+    return (created_ts(conversation), str(conversation.conversation_id))
+
+
+async def sync_bot(store: ConversationStore, config: FetchConfig, full: bool = False,
+                   fetcher: Optional[AsyncListFetcher] = None) -> Dict[str, Any]:
+    """
+    Fetch conversations mới hơn watermark của config.bot_id vào store.
+
+    full=True bỏ qua watermark (đọc lại tới max_pages/limit, cập nhật conversation đổi nội dung).
+    max_pages/limit vẫn giới hạn một lần sync - lần sync đầu chỉ lấy phần mới nhất; các lần sau
+    bị cắt trước khi tới watermark cũ thì watermark không tiến (report["truncated"]).
+    """
+    start = time.perf_counter()
+    bot_id = str(config.bot_id)
+    stored = await asyncio.to_thread(store.watermark, bot_id)
+    previous = None if full else stored
+    fetcher = fetcher or AsyncListFetcher(replace(config, typed_decode=True))
+    cfg = fetcher.config
+    report: Dict[str, Any] = {"bot_id": bot_id, "pages": 0, "fetched": 0, "new": 0,
+                              "inserted": 0, "updated": 0, "unchanged": 0,
+                              "previous_watermark": previous, "reached_watermark": False}
+    newest = previous
+    covered = False  # đã đọc tới conversation không mới hơn watermark đã lưu
+    last_page_size = 0
+    async for _, page in fetcher.iter_pages():
+        report["pages"] += 1
+        report["fetched"] += len(page)
+        last_page_size = len(page)
+        page = [c for c in (_as_decoded(c) for c in page) if c.conversation_id is not None]
+        keys = [_key(c) for c in page]
+        new = [c for c, k in zip(page, keys) if previous is None or k > previous]
+        report["new"] += len(new)
+        counts = await asyncio.to_thread(store.upsert, new, bot_id)
+        for name, value in counts.items():
+            report[name] += value
+        if keys:
+            page_newest = max(keys)
+            newest = page_newest if newest is None else max(newest, page_newest)
+        covered = covered or (stored is not None and any(k <= stored for k in keys))
+        if previous is not None and not new:
+            report["reached_watermark"] = True
+            break
+    # Dừng vì max_pages/limit khi trang cuối còn đầy - còn conversation chưa đọc
+    report["truncated"] = not report["reached_watermark"] and last_page_size >= cfg.page_size and (
+        report["pages"] >= cfg.max_pages or bool(cfg.limit and report["fetched"] >= cfg.limit))
+    if stored is not None and report["truncated"] and not covered:
+        logger.warning(f"Sync of bot {bot_id} stopped at max_pages/limit before the previous watermark; "
+                       f"watermark kept (raise max_pages to catch up)")
+        newest = stored
+    report["watermark"] = newest
+    report["seconds"] = round(time.perf_counter() - start, 3)
+    if newest is not None:
+        await asyncio.to_thread(store.set_watermark, bot_id, newest, report)
+    logger.info(f"Synced bot {bot_id}: {report['new']} new conversations in {report['pages']} pages "
+                f"({report['seconds']}s)")
+    return report
@@ -0,0 +1,147 @@
+"""
+Micro-batched CPU stage cho batch evaluator.
+
+Gom các job CPU nhỏ (metrics, transcript, diagnostics, coercion) của nhiều
+conversation trong một cửa sổ vài ms rồi chạy cả lô trong MỘT lần hop sang
+executor, thay vì mỗi conversation tốn 3-4 lần asyncio.to_thread.
+"""
+import asyncio
+import time
+import logging
+from collections import deque
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CPUStageConfig:
+    """Configuration for the micro-batched CPU stage"""
+    batch_window_ms: float = 5.0
+    max_batch_size: int = 64
+
+
+def _run_batch(jobs: List[Tuple[Callable, tuple, dict]]) -> List[Tuple[bool, Any]]:
+    """Chạy cả lô job trong một lần hop; lỗi từng job không làm hỏng cả lô."""
+    out = []
+    for fn, args, kwargs in jobs:
+        try:
+            out.append((True, fn(*args, **kwargs)))
+        except Exception as e:
+            out.append((False, e))
+    return out
+
+
+class MicroBatchCPUStage:
+    """Gom job CPU theo cửa sổ thời gian, trả kết quả qua futures"""
+
+    def __init__(self, config: CPUStageConfig = None, executor: Optional[Executor] = None):
+        self.config = config or CPUStageConfig()
+        # None = default executor của loop; có thể truyền ProcessPoolExecutor
+        # (khi đó job phải picklable - hàm module-level)
+        self.executor = executor
+        self._pending: Deque[Tuple[Callable, tuple, dict, asyncio.Future, float]] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._closed = False
+
+        # Stats
+        self.batches = 0
+        self.items = 0
+        self.max_queue_depth = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+        self._batch_time_total = 0.0
+
+    async def submit(self, fn: Callable, *args, **kwargs) -> Any:
+        """Đưa một job vào lô kế tiếp và chờ kết quả"""
+        if self._closed:
+            raise RuntimeError("CPU stage is closed")
+        loop = asyncio.get_running_loop()
+        if self._flush_task is None:
+            self._wakeup = asyncio.Event()
+            self._flush_task = loop.create_task(self._flush_loop())
+
+        fut = loop.create_future()
+        self._pending.append((fn, args, kwargs, fut, time.perf_counter()))
+        self.max_queue_depth = max(self.max_queue_depth, len(self._pending))
+        self._wakeup.set()
+        return await fut
+
+    async def _flush_loop(self):
+        loop = asyncio.get_running_loop()
+        window = self.config.batch_window_ms / 1000.0
+        try:
+            while True:
+                if not self._pending:
+                    if self._closed:
+                        return
+                    await self._wakeup.wait()
+                    self._wakeup.clear()
+                    continue
+
+                # Chờ thêm trong cửa sổ để gom lô, trừ khi đã đủ max_batch_size
+                if len(self._pending) < self.config.max_batch_size and window > 0:
+                    await asyncio.sleep(window)
+
+                while self._pending:
+                    batch = []
+                    while self._pending and len(batch) < self.config.max_batch_size:
+                        batch.append(self._pending.popleft())
+                    await self._execute(loop, batch)
+        except asyncio.CancelledError:
+            return
+
+    async def _execute(self, loop, batch):
+        jobs = [(fn, args, kwargs) for fn, args, kwargs, _, _ in batch]
+        batch_start = time.perf_counter()
+        try:
+            outcomes = await loop.run_in_executor(self.executor, _run_batch, jobs)
+        except Exception as e:
+            outcomes = [(False, e)] * len(batch)
+        done = time.perf_counter()
+
+        self.batches += 1
+        self.items += len(batch)
+        self._batch_time_total += done - batch_start
+
+        for (_, _, _, fut, enqueued), (ok, value) in zip(batch, outcomes):
+            latency = done - enqueued
+            self._latency_total += latency
+            self._latency_max = max(self._latency_max, latency)
+            if fut.done():
+                continue
+            if ok:
+                fut.set_result(value)
+            else:
+                fut.set_exception(value)
+
+    async def close(self):
+        """Xả nốt job đang chờ rồi dừng flush loop"""
+        self._closed = True
+        if self._flush_task is None:
+            return
+        self._wakeup.set()
+        try:
+            await self._flush_task
+        finally:
+            self._flush_task = None
+        for _, _, _, fut, _ in self._pending:
+            if not fut.done():
+                fut.set_exception(RuntimeError("CPU stage closed before job ran"))
+        self._pending.clear()
+
+    def get_stats(self) -> Dict[str, float]:
+        """Thống kê stage: số hop, batch size, queue depth, latency"""
+        return {
+            "executor_hops": self.batches,
+            "items": self.items,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+            "pending": len(self._pending),
+            "max_queue_depth": self.max_queue_depth,
+            "avg_stage_latency_ms": (self._latency_total / self.items * 1000) if self.items else 0.0,
+            "max_stage_latency_ms": self._latency_max * 1000,
+            "avg_batch_exec_ms": (self._batch_time_total / self.batches * 1000) if self.batches else 0.0,
+        }
@@ -0,0 +1,208 @@
+"""
+Typed decoding cho conversation payload thẳng từ bytes của response.
+
+Với msgspec, body được decode một lần vào Struct có field cố định: chỉ giữ các key
+mà normalize/extract_bot_id cần, các field khác bị bỏ qua ngay lúc parse, không tạo
+dict trung gian. bot_id, messages (ConversationFrame) và created_at được lấy ra trong
+cùng một lượt. Không có msgspec thì dùng orjson/json + đường dict cũ làm fallback.
+"""
+import json
+import logging
+from typing import Any, Dict, List, Optional, Union
+
+from .frame import ConversationFrame
+from .normalize import records_from_fields
+from .parsers import extract_bot_id
+
+try:
+    import msgspec
+    MSGSPEC_AVAILABLE = True
+except ImportError:
+    MSGSPEC_AVAILABLE = False
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+_BOT_KEYS = ("agent", "thread", "bot", "assistant")
+
+
+class DecodedConversation:
+    """
+    Conversation đã decode: conversation_id, bot_id, created_at (chuỗi gốc) và messages
+    dạng ConversationFrame. Hỗ trợ get()/[] như dict để select_conversations và
+    evaluate_conversation_from_raw dùng được mà không cần sửa.
+    """
+
+    __slots__ = ("conversation_id", "bot_id", "created_at", "messages")
+    _KEYS = __slots__
+
+    def __init__(self, conversation_id: Optional[str], bot_id: Optional[str],
+                 created_at: Any, messages: ConversationFrame):
+        self.conversation_id = conversation_id
+        self.bot_id = bot_id
+        self.created_at = created_at
+        self.messages = messages
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in self._KEYS:
+            value = getattr(self, key)
+            return default if value is None else value
+        return default
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._KEYS
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Dạng dict (messages là list dict) cho response JSON"""
+        return {
+            "conversation_id": self.conversation_id,
+            "bot_id": self.bot_id,
+            "created_at": self.created_at,
+            "messages": [
+                {"role": m.sender_type, "content": m.text,
+                 "created_at": m.ts.isoformat() if m.ts is not None else None}
+                for m in self.messages
+            ],
+        }
+
+    def __repr__(self) -> str:
+        return (f"DecodedConversation(conversation_id={self.conversation_id!r}, "
+                f"bot_id={self.bot_id!r}, messages={len(self.messages)})")
+
+
+if MSGSPEC_AVAILABLE:
+    class _MessageStruct(msgspec.Struct, gc=False):
+        # Thứ tự ưu tiên giống TEXT_KEYS / SENDER_KEYS / SENDER_NAME_KEYS / TS_KEYS trong normalize
+        content: Any = None
+        text: Any = None
+        message: Any = None
+        body: Any = None
+        payload: Any = None
+        role: Any = None
+        sender: Any = None
+        from_: Any = msgspec.field(default=None, name="from")
+        author: Any = None
+        source: Any = None
+        sender_name: Any = None
+        name: Any = None
+        display_name: Any = None
+        fromName: Any = None
+        ts: Any = None
+        timestamp: Any = None
+        createdAt: Any = None
+        created_at: Any = None
+        time: Any = None
+        bot_id: Any = None
+
+    class _ConversationStruct(msgspec.Struct, gc=False):
+        conversation_id: Any = None
+        bot_id: Any = None
+        created_at: Any = None
+        metadata: Any = None
+        messages: Optional[List[_MessageStruct]] = None
+        data: Optional[List[_MessageStruct]] = None
+        agent: Any = None
+        thread: Any = None
+        bot: Any = None
+        assistant: Any = None
+
+    class _PageStruct(msgspec.Struct, gc=False):
+        conversations: List[_ConversationStruct] = []
+
+    _conversation_decoder = msgspec.json.Decoder(_ConversationStruct)
+    _page_decoder = msgspec.json.Decoder(_PageStruct)
+
+
+def _first(*values):
+    for v in values:
+        if v is not None:
+            return v
+    return None
+
+
+def _struct_rows(items):
+    for i, m in enumerate(items):
+        yield (i,
+               _first(m.content, m.text, m.message, m.body, m.payload),
+               _first(m.role, m.sender, m.from_, m.author, m.source),
+               _first(m.sender_name, m.name, m.display_name, m.fromName),
+               _first(m.ts, m.timestamp, m.createdAt, m.created_at, m.time))
+
+
+def _struct_bot_id(c, items) -> Optional[str]:
+    """Cùng thứ tự tìm kiếm như parsers.extract_bot_id"""
+    if c.bot_id:
+        return str(c.bot_id)
+    if isinstance(c.metadata, dict) and c.metadata.get("bot_id"):
+        return str(c.metadata["bot_id"])
+    if c.messages is not None:
+        for m in items:
+            if m.bot_id:
+                return str(m.bot_id)
+            if isinstance(m.sender, dict) and m.sender.get("bot_id"):
+                return str(m.sender["bot_id"])
+    for key in _BOT_KEYS:
+        obj = getattr(c, key)
+        if isinstance(obj, dict):
+            v = obj.get("bot_id") or obj.get("id")
+            if v:
+                return str(v)
+    return None
+
+
+def _from_struct(c, conversation_id: Optional[str] = None) -> DecodedConversation:
+    items = c.messages if c.messages is not None else (c.data or [])
+    conv_id = c.conversation_id if c.conversation_id is not None else conversation_id
+    frame = ConversationFrame.from_messages(records_from_fields(_struct_rows(items)), conv_id)
+    return DecodedConversation(conv_id, _struct_bot_id(c, items), c.created_at, frame)
+
+
+def conversation_from_dict(raw: Any, conversation_id: Optional[str] = None) -> DecodedConversation:
+    """Đường dict: payload đã parse (dict/list) -> DecodedConversation"""
+    conv_id = raw.get("conversation_id", conversation_id) if isinstance(raw, dict) else conversation_id
+    created_at = raw.get("created_at") if isinstance(raw, dict) else None
+    frame = ConversationFrame.from_raw(raw)
+    frame.conversation_id = conv_id
+    return DecodedConversation(conv_id, extract_bot_id(raw), created_at, frame)
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Parse JSON generic - orjson nếu có, không thì json"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def decode_conversation(data: Union[bytes, str, dict, list],
+                        conversation_id: Optional[str] = None) -> DecodedConversation:
+    """Decode body của endpoint messages một conversation"""
+    if isinstance(data, (dict, list)):
+        return conversation_from_dict(data, conversation_id)
+    if MSGSPEC_AVAILABLE:
+        try:
+            return _from_struct(_conversation_decoder.decode(data), conversation_id)
+        except msgspec.ValidationError:
+            # Schema lạ (list gốc, messages không phải list...) -> đường dict
+            pass
+    return conversation_from_dict(loads(data), conversation_id)
+
+
+def decode_conversation_page(data: Union[bytes, str, dict]) -> List[DecodedConversation]:
+    """Decode một trang của list API ({"conversations": [...]})"""
+    if not isinstance(data, dict) and MSGSPEC_AVAILABLE:
+        try:
+            return [_from_struct(c) for c in _page_decoder.decode(data).conversations]
+        except msgspec.ValidationError as e:
+            logger.debug(f"Typed page decode failed, falling back to dict path: {e}")
+    page = data if isinstance(data, dict) else loads(data)
+    return [conversation_from_dict(c) for c in (page.get("conversations") or []) if isinstance(c, dict)]
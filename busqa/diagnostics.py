@@ -1,37 +1,96 @@
 import re
-from typing import List, TypedDict
+from typing import Iterable, List, Optional, Set, TypedDict
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor
 import itertools
 
+from .frame import iter_sender_text, agent_turns
+
 
 class DiagnosticHit(TypedDict):
     key: str
     evidence: List[str]
 
 
-def detect_operational_readiness(messages, brand_policy, brand_prompt_text: str) -> List[DiagnosticHit]:
+CHILD_POLICY_KEYWORDS = (
+    'trẻ', 'em bé', 'phụ thu', 'không phụ thu',
+    'dưới một mét', 'một mét rưỡi', 'một mét bốn'
+)
+PRICE_PATTERNS = (
+    r'(\d+)k(?:\s|$)',
+    r'(\d+)\s*nghìn',
+    r'(\d+)\s*ngàn',
+    r'(\d+)\s*đồng'
+)
+PDPA_DATA_PATTERNS = ('họ tên', 'năm sinh', 'địa chỉ', 'cmnd', 'cccd', 'căn cước')
+PDPA_CONSENT_PATTERNS = ('em xin phép', 'được phép lưu thông tin', 'đồng ý cho em', 'cho phép em')
+
+
+def turn_evidence(turn_idx: int, text: str, limit: int = 100) -> str:
+    return f"turn #{turn_idx + 1}: '{text[:limit]}...'" if len(text) > limit else f"turn #{turn_idx + 1}: '{text}'"
+
+
+def extract_birth_year(user_text_lower: str) -> Optional[int]:
+    """Năm sinh user nhắc tới trong một message (None nếu không có)"""
+    birth_year_match = re.search(r'(sinh năm |năm sinh |20(1|2)\d)', user_text_lower)
+    if birth_year_match:
+        year_match = re.search(r'20(1|2)\d', user_text_lower)
+        if year_match:
+            return int(year_match.group())
+    return None
+
+
+def extract_prices(turn_idx: int, text: str) -> List[tuple]:
+    """Các giá agent nói trong một turn: [(turn_idx, price, text)]"""
+    prices = []
+    text_lower = text.lower()
+    for pattern in PRICE_PATTERNS:
+        for match in re.findall(pattern, text_lower):
+            price_value = int(match)
+            if 'k' in text_lower or 'nghìn' in text_lower or 'ngàn' in text_lower:
+                price_value *= 1000
+            prices.append((turn_idx, price_value, text))
+    return prices
+
+
+def is_fare_conflict(price1: int, price2: int) -> bool:
+    if price1 == price2:
+        return False
+    diff_absolute = abs(price1 - price2)
+    return diff_absolute / max(price1, price2) > 0.2 or diff_absolute > 100000
+
+
+def fare_math_hit(first: tuple, second: tuple) -> DiagnosticHit:
+    (turn1, _, text1), (turn2, _, text2) = first, second
+    return DiagnosticHit(
+        key="fare_math_inconsistent",
+        evidence=[turn_evidence(turn1, text1, 50), turn_evidence(turn2, text2, 50)]
+    )
+
+
+def detect_operational_readiness(messages, brand_policy, brand_prompt_text: str,
+                                 allowed_positions: Optional[Iterable[str]] = None) -> List[DiagnosticHit]:
+    """allowed_positions: trích sẵn từ brand (BrandArtifact) - None thì parse brand_prompt_text"""
     hits = []
+    if allowed_positions is None:
+        allowed_positions = extract_allowed_positions(brand_prompt_text)
     
     current_year = datetime.now().year
     
     user_birth_year = None
     agent_responses = []
     
-    for i, msg in enumerate(messages):
-        if getattr(msg, 'sender_type', None) == "agent":
-            agent_responses.append((i, getattr(msg, 'text', '') or ''))
-        elif getattr(msg, 'sender_type', None) == "user":
-            user_text = (getattr(msg, 'text', '') or '').lower()
-            birth_year_match = re.search(r'(sinh năm |năm sinh |20(1|2)\d)', user_text)
-            if birth_year_match:
-                year_match = re.search(r'20(1|2)\d', user_text)
-                if year_match:
-                    user_birth_year = int(year_match.group())
+    for i, (sender_type, text) in enumerate(iter_sender_text(messages)):
+        if sender_type == "agent":
+            agent_responses.append((i, text))
+        elif sender_type == "user":
+            birth_year = extract_birth_year(text.lower())
+            if birth_year:
+                user_birth_year = birth_year
 
     with ThreadPoolExecutor() as executor:
         futures = []
-        futures.append(executor.submit(_detect_double_room_violation, agent_responses, brand_prompt_text))
+        futures.append(executor.submit(_detect_double_room_violation, agent_responses, allowed_positions))
         if user_birth_year:
             futures.append(executor.submit(_detect_child_policy_miss, agent_responses, user_birth_year, current_year))
         if hasattr(brand_policy, 'no_route_validation') and brand_policy.no_route_validation:
@@ -47,10 +106,7 @@ def detect_operational_readiness(messages, brand_policy, brand_prompt_text: str)
 
 def detect_risk_compliance(messages, brand_policy) -> List[DiagnosticHit]:
     """phát hiện các vi phạm rủi ro tuân thủ chính sách"""
-    agent_responses = []
-    for i, msg in enumerate(messages):
-        if getattr(msg, 'sender_type', None) == "agent":
-            agent_responses.append((i, getattr(msg, 'text', '') or ''))
+    agent_responses = agent_turns(messages)
 
     with ThreadPoolExecutor() as executor:
         futures = []
@@ -68,10 +124,8 @@ def detect_risk_compliance(messages, brand_policy) -> List[DiagnosticHit]:
     return list(itertools.chain.from_iterable(results))
 
 
-def _detect_double_room_violation(agent_responses: List[tuple], brand_prompt_text: str) -> List[DiagnosticHit]:
-    """phát hiện vi phạm quy định phòng đôi"""
-    hits = []
-    
+def extract_allowed_positions(brand_prompt_text: str) -> Set[str]:
+    """Vị trí phòng đôi brand cho bán ("chỉ bán A1D, B2D") - parse một lần mỗi brand"""
     allowed_positions = set()
     if brand_prompt_text:
         position_pattern = r'chỉ bán[^.]*?([A-B]\d[D](?:\s*,\s*[A-B]\d[D])*)'
@@ -79,6 +133,13 @@ def _detect_double_room_violation(agent_responses: List[tuple], brand_prompt_tex
         for match in matches:
             positions = re.findall(r'[A-B]\d[D]', match)
             allowed_positions.update(positions)
+    return allowed_positions
+
+
+def _detect_double_room_violation(agent_responses: List[tuple], allowed_positions: Iterable[str]) -> List[DiagnosticHit]:
+    """phát hiện vi phạm quy định phòng đôi"""
+    hits = []
+    allowed_positions = set(allowed_positions)
     
     if not allowed_positions:
         return hits
@@ -108,15 +169,10 @@ def _detect_child_policy_miss(agent_responses: List[tuple], birth_year: int, cur
     if child_age >= 10:
         return hits
     
-    child_policy_keywords = [
-        'trẻ', 'em bé', 'phụ thu', 'không phụ thu', 
-        'dưới một mét', 'một mét rưỡi', 'một mét bốn'
-    ]
-    
     policy_mentioned = False
     for turn_idx, text in agent_responses:
         text_lower = text.lower()
-        if any(keyword in text_lower for keyword in child_policy_keywords):
+        if any(keyword in text_lower for keyword in CHILD_POLICY_KEYWORDS):
             policy_mentioned = True
             break
     
@@ -159,40 +215,14 @@ def _detect_fare_math_inconsistent(agent_responses: List[tuple]) -> List[Diagnos
     
     prices = []
     for turn_idx, text in agent_responses:
-        price_patterns = [
-            r'(\d+)k(?:\s|$)',
-            r'(\d+)\s*nghìn',
-            r'(\d+)\s*ngàn',
-            r'(\d+)\s*đồng'
-        ]
-        
-        for pattern in price_patterns:
-            matches = re.findall(pattern, text.lower())
-            for match in matches:
-                price_value = int(match)
-                if 'k' in text.lower() or 'nghìn' in text.lower() or 'ngàn' in text.lower():
-                    price_value *= 1000
-                prices.append((turn_idx, price_value, text))
+        prices.extend(extract_prices(turn_idx, text))
     
     if len(prices) >= 2:
         for i in range(len(prices) - 1):
             for j in range(i + 1, len(prices)):
-                turn1, price1, text1 = prices[i]
-                turn2, price2, text2 = prices[j]
-                
-                if price1 != price2:
-                    diff_percent = abs(price1 - price2) / max(price1, price2)
-                    diff_absolute = abs(price1 - price2)
-                    
-                    if diff_percent > 0.2 or diff_absolute > 100000:
-                        evidence1 = f"turn #{turn1 + 1}: '{text1[:50]}...'" if len(text1) > 50 else f"turn #{turn1 + 1}: '{text1}'"
-                        evidence2 = f"turn #{turn2 + 1}: '{text2[:50]}...'" if len(text2) > 50 else f"turn #{turn2 + 1}: '{text2}'"
-                        
-                        hits.append(DiagnosticHit(
-                            key="fare_math_inconsistent",
-                            evidence=[evidence1, evidence2]
-                        ))
-                        return hits
+                if is_fare_conflict(prices[i][1], prices[j][1]):
+                    hits.append(fare_math_hit(prices[i], prices[j]))
+                    return hits
     
     return hits
 
@@ -308,18 +338,10 @@ def _detect_payment_policy_violation(agent_responses: List[tuple], brand_policy)
 def _detect_pdpa_consent_missing(agent_responses: List[tuple]) -> List[DiagnosticHit]:
     """phát hiện thiếu sót trong việc thu thập sự đồng ý PDPA"""
     hits = []
-    personal_data_patterns = [
-        'họ tên', 'năm sinh', 'địa chỉ', 'cmnd', 'cccd', 'căn cước'
-    ]
-    
-    consent_patterns = [
-        'em xin phép', 'được phép lưu thông tin', 'đồng ý cho em', 'cho phép em'
-    ]
-    
     data_collection_turns = []
     for turn_idx, text in agent_responses:
         text_lower = text.lower()
-        if any(pattern in text_lower for pattern in personal_data_patterns):
+        if any(pattern in text_lower for pattern in PDPA_DATA_PATTERNS):
             data_collection_turns.append((turn_idx, text))
     
     # cho mỗi lần thu thập dữ liệu, kiểm tra xem có sự đồng ý trong các lượt gần đó không
@@ -329,16 +351,16 @@ def _detect_pdpa_consent_missing(agent_responses: List[tuple]) -> List[Diagnosti
         # kiểm tra phản hồi của agent hiện tại và 2 phản hồi tiếp theo để tìm sự đồng ý
         for check_idx, check_text in agent_responses:
             if check_idx >= turn_idx and check_idx <= turn_idx + 2:
-                if any(pattern in check_text.lower() for pattern in consent_patterns):
+                if any(pattern in check_text.lower() for pattern in PDPA_CONSENT_PATTERNS):
                     consent_found = True
                     break
         
         if not consent_found:
-            evidence = f"turn #{turn_idx + 1}: '{text[:100]}...'" if len(text) > 100 else f"turn #{turn_idx + 1}: '{text}'"
-            hits.append(DiagnosticHit(
-                key="pdpa_consent_missing",
-                evidence=[evidence]
-            ))
+            hits.append(pdpa_consent_hit(turn_idx, text))
             return hits 
     
     return hits
+
+
+def pdpa_consent_hit(turn_idx: int, text: str) -> DiagnosticHit:
+    return DiagnosticHit(key="pdpa_consent_missing", evidence=[turn_evidence(turn_idx, text)])
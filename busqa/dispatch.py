@@ -0,0 +1,155 @@
+"""
+Dispatch theo kích thước trước LLM stage: thứ tự theo số token ước lượng + trần token in-flight.
+
+Thứ tự vào LLM mặc định là thứ tự input, nên vài conversation 200 lượt đến sớm chiếm hết
+slot trong khi hàng chục conversation ngắn phải chờ. Sau analyze (transcript đã normalize)
+mỗi conversation có cost = token system prompt + transcript + output ước lượng:
+
+- sjf: cost nhỏ trước - giảm thời gian hoàn thành trung bình, SSE ra kết quả đều hơn
+- ljf: cost lớn trước - giảm makespan (job dài không bị dồn về cuối)
+- fifo: thứ tự input
+
+Sắp xếp chỉ trong cửa sổ giới hạn (pipeline.Stage priority/reorder_window): không
+conversation nào bị vượt quá reorder_window lần. max_inflight_tokens giới hạn tổng cost
+đang gọi LLM (TokenBudget) thay vì chỉ số call - first-fit: call nhỏ lấp chỗ trống khi
+call lớn ở đầu hàng chưa vừa, tối đa max_bypass lần.
+"""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+FIFO = "fifo"
+SJF = "sjf"
+LJF = "ljf"
+POLICIES = (FIFO, SJF, LJF)
+
+
+@dataclass
+class DispatchConfig:
+    """Thứ tự + token budget của LLM stage"""
+    policy: str = SJF
+    reorder_window: int = 64  # số lần tối đa một conversation bị conversation đến sau vượt
+    max_inflight_tokens: Optional[int] = None  # None = chỉ giới hạn số call
+    output_tokens: int = 600  # token output ước lượng mỗi call (JSON chấm điểm)
+    max_bypass: int = 8  # số call nhỏ tối đa được vượt call lớn đang chờ budget
+
+    def __post_init__(self):
+        if self.policy not in POLICIES:
+            raise ValueError(f"Unknown dispatch policy '{self.policy}' (expected one of {list(POLICIES)})")
+        if self.reorder_window < 0 or self.max_bypass < 0:
+            raise ValueError("reorder_window and max_bypass must be >= 0")
+        if self.max_inflight_tokens is not None and self.max_inflight_tokens < 1:
+            raise ValueError("max_inflight_tokens must be >= 1")
+
+    def priority(self, cost: int) -> Optional[float]:
+        """Khóa sắp xếp (nhỏ ra trước); None = giữ thứ tự input"""
+        if self.policy == SJF:
+            return cost
+        if self.policy == LJF:
+            return -cost
+        return None
+
+
+class _BudgetWaiter:
+    __slots__ = ("cost", "future", "bypassed")
+
+    def __init__(self, cost: int, future: asyncio.Future):
+        self.cost = cost
+        self.future = future
+        self.bypassed = 0
+
+
+class TokenBudget:
+    """
+    Semaphore theo token: tổng cost in-flight <= max_tokens. Call lớn hơn cả budget vẫn
+    chạy khi không còn call nào in-flight (không kẹt vĩnh viễn).
+    """
+
+    def __init__(self, max_tokens: int, max_bypass: int = 8):
+        self.max_tokens = max(1, max_tokens)
+        self.max_bypass = max(0, max_bypass)
+        self.in_flight = 0
+        self.in_flight_calls = 0
+        self._waiters: List[_BudgetWaiter] = []
+        self.peak_in_flight = 0
+        self.calls = 0
+        self.waited = 0
+        self.bypasses = 0
+        self.wait_seconds = 0.0
+
+    def _fits(self, cost: int) -> bool:
+        return self.in_flight_calls == 0 or self.in_flight + cost <= self.max_tokens
+
+    def _grant(self, cost: int) -> None:
+        self.in_flight += cost
+        self.in_flight_calls += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        self.calls += 1
+
+    def _wake(self) -> None:
+        """First-fit theo thứ tự chờ; waiter bị vượt đủ max_bypass lần giữ chỗ cho nó"""
+        blocked: List[_BudgetWaiter] = []
+        for waiter in list(self._waiters):
+            if waiter.future.done():
+                self._waiters.remove(waiter)
+                continue
+            if self._fits(waiter.cost):
+                self._waiters.remove(waiter)
+                self._grant(waiter.cost)
+                waiter.future.set_result(None)
+                for ahead in blocked:
+                    ahead.bypassed += 1
+                    self.bypasses += 1
+                continue
+            blocked.append(waiter)
+            if waiter.bypassed >= self.max_bypass:
+                return
+
+    async def acquire(self, cost: int) -> None:
+        if not self._waiters and self._fits(cost):
+            self._grant(cost)
+            return
+        waiter = _BudgetWaiter(cost, asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        started = time.monotonic()
+        self._wake()  # call nhỏ có thể vừa ngay dù đang có waiter lớn
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.release(cost)  # đã được cấp đúng lúc bị hủy
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+                self._wake()
+            raise
+        self.waited += 1
+        self.wait_seconds += time.monotonic() - started
+
+    def release(self, cost: int) -> None:
+        self.in_flight -= cost
+        self.in_flight_calls -= 1
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self, cost: int) -> AsyncIterator[None]:
+        await self.acquire(cost)
+        try:
+            yield
+        finally:
+            self.release(cost)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "max_tokens": self.max_tokens,
+            "in_flight_tokens": self.in_flight,
+            "peak_in_flight_tokens": self.peak_in_flight,
+            "calls": self.calls,
+            "waited": self.waited,
+            "bypasses": self.bypasses,
+            "avg_wait_ms": round(self.wait_seconds / self.waited * 1000, 1) if self.waited else 0.0,
+        }
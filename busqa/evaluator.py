@@ -31,33 +31,26 @@ def label_from_score(score: float, rubrics_cfg: dict) -> str:
 
 
 
+# (metric, criterion, rule, note) - penalty theo metrics, áp dụng theo đúng thứ tự này.
+# rule: clamp_max -> min(clamp_max, score); delta -> max(0, score + delta)
+POLICY_FLOW_PENALTIES = [
+    ("policy_violations", "policy_compliance", {"clamp_max": 30}, "Policy violation detected"),
+    ("endcall_early_hint", "context_flow_closure", {"delta": -20}, "Early end call detected"),
+    ("long_option_lists", "no_redundant_questions", {"delta": -15}, "Long option lists detected"),
+    ("context_resets", "context_flow_closure", {"delta": -25}, "Context resets detected"),
+    ("tts_money_reading_violation", "style_tts", {"delta": -20}, "Money reading violation"),
+]
+
 def apply_policy_and_flow_penalties(result: dict, brand_policy, metrics: dict, rubrics_cfg: dict) -> dict:
     criteria = result.get("criteria", {})
     
-    if metrics.get("policy_violations", 0) > 0:
-        if "policy_compliance" in criteria:
-            criteria["policy_compliance"]["score"] = min(30, criteria["policy_compliance"]["score"])
-            criteria["policy_compliance"]["note"] += " [Policy violation detected]"
-    
-    if metrics.get("endcall_early_hint", 0) > 0:
-        if "context_flow_closure" in criteria:
-            criteria["context_flow_closure"]["score"] = max(0, criteria["context_flow_closure"]["score"] - 20)
-            criteria["context_flow_closure"]["note"] += " [Early end call detected]"
-    
-    if metrics.get("long_option_lists", 0) > 0:
-        if "no_redundant_questions" in criteria:
-            criteria["no_redundant_questions"]["score"] = max(0, criteria["no_redundant_questions"]["score"] - 15)
-            criteria["no_redundant_questions"]["note"] += " [Long option lists detected]"
-    
-    if metrics.get("context_resets", 0) > 0:
-        if "context_flow_closure" in criteria:
-            criteria["context_flow_closure"]["score"] = max(0, criteria["context_flow_closure"]["score"] - 25)
-            criteria["context_flow_closure"]["note"] += " [Context resets detected]"
-    
-    if metrics.get("tts_money_reading_violation", 0) > 0:
-        if "style_tts" in criteria:
-            criteria["style_tts"]["score"] = max(0, criteria["style_tts"]["score"] - 20)
-            criteria["style_tts"]["note"] += " [Money reading violation]"
+    for metric, criterion, rule, note in POLICY_FLOW_PENALTIES:
+        if metrics.get(metric, 0) > 0 and criterion in criteria:
+            if "clamp_max" in rule:
+                criteria[criterion]["score"] = min(rule["clamp_max"], criteria[criterion]["score"])
+            else:
+                criteria[criterion]["score"] = max(0, criteria[criterion]["score"] + rule["delta"])
+            criteria[criterion]["note"] += f" [{note}]"
     
     return result
 
@@ -168,8 +161,20 @@ def coerce_llm_json_unified(llm_json: Any, rubrics_cfg: dict, brand_policy=None,
     
     return LLMOutput(**normalized)
 
-def apply_diagnostics_penalties(result: dict, diagnostics_cfg: dict, diagnostics_hits: dict) -> dict:
+def compile_penalty_index(diagnostics_cfg: dict) -> Dict[str, dict]:
+    """hit key -> penalty config; operational_readiness ưu tiên trước risk_compliance như khi scan tuần tự"""
+    index: Dict[str, dict] = {}
+    for section in ("operational_readiness", "risk_compliance"):
+        for item in diagnostics_cfg.get(section, []) or []:
+            if item.get("penalty"):
+                index.setdefault(item["key"], item["penalty"])
+    return index
+
+def apply_diagnostics_penalties(result: dict, diagnostics_cfg: dict, diagnostics_hits: dict,
+                                penalty_index: Dict[str, dict] = None) -> dict:
     criteria = result.get("criteria", {})
+    if penalty_index is None:
+        penalty_index = compile_penalty_index(diagnostics_cfg)
     
     all_hits = []
     all_hits.extend(diagnostics_hits.get("operational_readiness", []))
@@ -179,18 +184,7 @@ def apply_diagnostics_penalties(result: dict, diagnostics_cfg: dict, diagnostics
         hit_key = hit["key"]
         hit_evidence = hit["evidence"]
         
-        penalty_config = None
-        
-        for item in diagnostics_cfg.get("operational_readiness", []):
-            if item["key"] == hit_key:
-                penalty_config = item["penalty"]
-                break
-        
-        if not penalty_config:
-            for item in diagnostics_cfg.get("risk_compliance", []):
-                if item["key"] == hit_key:
-                    penalty_config = item["penalty"]
-                    break
+        penalty_config = penalty_index.get(hit_key)
         
         if not penalty_config:
             continue
@@ -0,0 +1,180 @@
+"""
+Compact array-backed conversation representation.
+
+ConversationFrame giữ một conversation dưới dạng mảng song song
+(timestamp, sender code) + một text buffer duy nhất với offsets, thay vì
+list các object Message. Frame vẫn là một Sequence nên code cũ duyệt
+message vẫn chạy; metrics/diagnostics/build_transcript có fast path
+đọc thẳng từ mảng, không cấp phát object cho từng message.
+"""
+import hashlib
+import math
+import sys
+from array import array
+from datetime import datetime, tzinfo
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .models import MessageRecord
+
+SENDER_TYPES = ("user", "agent", "system", "unknown")
+SENDER_CODES = {name: code for code, name in enumerate(SENDER_TYPES)}
+USER, AGENT, SYSTEM, UNKNOWN = range(4)
+
+_NAN = float("nan")
+
+
+class ConversationFrame(Sequence):
+    """Conversation dạng cột: ts (epoch float, NaN = None), sender code, text buffer + offsets"""
+
+    __slots__ = ("conversation_id", "ts", "senders", "starts", "ends", "buffer", "sender_names", "tz")
+
+    def __init__(self, conversation_id: Optional[str], ts: array, senders: array, starts: array,
+                 ends: array, buffer: str, sender_names: Optional[Dict[int, str]] = None,
+                 tz: Optional[tzinfo] = None):
+        self.conversation_id = conversation_id
+        self.ts = ts
+        self.senders = senders
+        self.starts = starts
+        self.ends = ends
+        self.buffer = buffer
+        # Hầu hết message không có sender_name -> lưu thưa
+        self.sender_names = sender_names or {}
+        self.tz = tz
+
+    @classmethod
+    def from_messages(cls, messages, conversation_id: Optional[str] = None) -> "ConversationFrame":
+        """Đóng gói list message (MessageRecord/Message/duck-typed) thành frame"""
+        ts = array("d")
+        senders = array("B")
+        starts = array("L")
+        ends = array("L")
+        chunks: List[str] = []
+        seen: Dict[str, Tuple[int, int]] = {}
+        names: Dict[int, str] = {}
+        tz = None
+        pos = 0
+
+        for i, m in enumerate(messages):
+            t = getattr(m, "ts", None)
+            if t is None:
+                ts.append(_NAN)
+            else:
+                if t.tzinfo is not None and tz is None:
+                    tz = t.tzinfo
+                ts.append(t.timestamp())
+            senders.append(SENDER_CODES.get(getattr(m, "sender_type", "unknown"), UNKNOWN))
+
+            text = getattr(m, "text", "") or ""
+            # Intern: text lặp lại (câu chào theo script...) chỉ lưu một lần trong buffer
+            span = seen.get(text)
+            if span is None:
+                span = (pos, pos + len(text))
+                seen[text] = span
+                chunks.append(text)
+                pos += len(text)
+            starts.append(span[0])
+            ends.append(span[1])
+
+            name = getattr(m, "sender_name", None)
+            if name is not None:
+                names[i] = name
+
+        return cls(conversation_id, ts, senders, starts, ends, "".join(chunks), names, tz)
+
+    @classmethod
+    def from_raw(cls, raw: Any) -> "ConversationFrame":
+        """Normalize payload thô rồi đóng gói thành frame"""
+        from .normalize import normalize_messages
+        if isinstance(raw, ConversationFrame):
+            return raw
+        # DecodedConversation (busqa.decode) đã có sẵn frame
+        decoded = getattr(raw, "messages", None)
+        if isinstance(decoded, ConversationFrame):
+            return decoded
+        conversation_id = raw.get("conversation_id") if isinstance(raw, dict) else None
+        return cls.from_messages(normalize_messages(raw), conversation_id)
+
+    # Sequence protocol - tạo MessageRecord tạm thời khi code cũ cần object
+
+    def __len__(self) -> int:
+        return len(self.senders)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("frame index out of range")
+        return MessageRecord(self.datetime_at(i), SENDER_TYPES[self.senders[i]],
+                             self.sender_names.get(i), self.text(i))
+
+    def __iter__(self) -> Iterator[MessageRecord]:
+        for i in range(len(self)):
+            yield self[i]
+
+    # Truy cập cột - không cấp phát object message
+
+    def text(self, i: int) -> str:
+        return self.buffer[self.starts[i]:self.ends[i]]
+
+    def sender_type(self, i: int) -> str:
+        return SENDER_TYPES[self.senders[i]]
+
+    def timestamp(self, i: int) -> Optional[float]:
+        t = self.ts[i]
+        return None if math.isnan(t) else t
+
+    def datetime_at(self, i: int) -> Optional[datetime]:
+        t = self.ts[i]
+        if math.isnan(t):
+            return None
+        return datetime.fromtimestamp(t, self.tz) if self.tz is not None else datetime.fromtimestamp(t)
+
+    def turns(self, sender_type: Optional[str] = None) -> Iterator[Tuple[int, str]]:
+        """(index, text) cho các turn, lọc theo sender_type nếu có"""
+        if sender_type is None:
+            for i in range(len(self.senders)):
+                yield i, self.text(i)
+            return
+        code = SENDER_CODES[sender_type]
+        senders = self.senders
+        for i in range(len(senders)):
+            if senders[i] == code:
+                yield i, self.text(i)
+
+    def count_sender(self, sender_type: str) -> int:
+        return self.senders.count(SENDER_CODES[sender_type])
+
+    def content_hash(self) -> str:
+        """Hash nội dung (timestamp, sender, text, sender_name) - khóa của result store"""
+        h = hashlib.blake2b(digest_size=16)
+        for col in (self.ts, self.senders, self.starts, self.ends):
+            h.update(col.tobytes())
+        h.update(self.buffer.encode("utf-8", "surrogatepass"))
+        if self.sender_names:
+            h.update(repr(sorted(self.sender_names.items())).encode("utf-8", "surrogatepass"))
+        return h.hexdigest()
+
+    def nbytes(self) -> int:
+        """Ước lượng bộ nhớ của frame (mảng + buffer)"""
+        return (sum(a.itemsize * len(a) for a in (self.ts, self.senders, self.starts, self.ends))
+                + sys.getsizeof(self.buffer))
+
+
+def iter_sender_text(messages) -> Iterator[Tuple[str, str]]:
+    """(sender_type, text) cho từng message - đọc cột nếu là frame, getattr nếu không"""
+    if isinstance(messages, ConversationFrame):
+        for i in range(len(messages)):
+            yield SENDER_TYPES[messages.senders[i]], messages.text(i)
+    else:
+        for m in messages:
+            yield getattr(m, 'sender_type', None), getattr(m, 'text', '') or ''
+
+
+def agent_turns(messages) -> List[Tuple[int, str]]:
+    """(index, text) của các turn agent - dùng chung cho diagnostics"""
+    if isinstance(messages, ConversationFrame):
+        return list(messages.turns("agent"))
+    return [(i, getattr(m, 'text', '') or '') for i, m in enumerate(messages)
+            if getattr(m, 'sender_type', None) == "agent"]
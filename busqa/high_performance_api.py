@@ -10,6 +10,8 @@ from dataclasses import dataclass
 import math
 import random
 
+from .decode import decode_conversation
+
 try:
     import httpx
     HTTPX_AVAILABLE = True
@@ -143,17 +145,21 @@ class HighPerformanceAPIClient:
         except Exception as e:
             pass  # Cache set error
         
-    async def fetch_conversation_batch(self, conversation_ids: List[str]) -> List[Dict[str, Any]]:
-        """Fetch multiple conversations với connection pooling và caching"""
+    async def fetch_conversation_batch(self, conversation_ids: List[str], typed: bool = False) -> List[Dict[str, Any]]:
+        """
+        Fetch multiple conversations với connection pooling và caching.
+        typed=True: decode body bytes thẳng thành DecodedConversation (bot_id + frame),
+        bỏ qua bước response.json() -> dict.
+        """
         
         async def fetch_single(conv_id: str) -> Dict[str, Any]:
-            # Check cache first
-            cache_key = f"conv:{conv_id}:messages"
+            # Check cache first (typed cache body gốc nên dùng key riêng)
+            cache_key = f"conv:{conv_id}:{'raw' if typed else 'messages'}"
             cached_data = await self._get_from_cache(cache_key)
             if cached_data:
                 return {
                     "conversation_id": conv_id,
-                    "data": cached_data,
+                    "data": decode_conversation(cached_data, conv_id) if typed else cached_data,
                     "status": "success",
                     "cached": True
                 }
@@ -165,7 +171,7 @@ class HighPerformanceAPIClient:
                 if HTTPX_AVAILABLE and self.client:
                     response = await self.client.get(f"/api/conversations/{conv_id}/messages")
                     response.raise_for_status()
-                    data = response.json()
+                    body = response.content
                 else:
                     # Fallback to sync requests (wrapped in thread)
                     import requests
@@ -175,10 +181,14 @@ class HighPerformanceAPIClient:
                         lambda: requests.get(f"{self.base_url}/api/conversations/{conv_id}/messages", timeout=self.config.timeout)
                     )
                     response.raise_for_status()
-                    data = response.json()
+                    body = response.content
 
-                # Cache the result
-                await self._set_cache(cache_key, data)
+                if typed:
+                    data = decode_conversation(body, conv_id)
+                    await self._set_cache(cache_key, body.decode("utf-8"))
+                else:
+                    data = json.loads(body)
+                    await self._set_cache(cache_key, data)
 
                 return {
                     "conversation_id": conv_id,
@@ -0,0 +1,196 @@
+"""
+Append-only result journal cho batch run dài: mỗi result xong là ghi ngay xuống đĩa.
+
+File JSONL `{journal_dir}/{run_id}.jsonl`: dòng đầu là header (conversation_ids + params
+của run), mỗi dòng sau là một result. Crash/deploy/OOM giữa chừng chỉ mất các conversation
+đang chạy - resume đọc journal, bỏ qua conversation đã xong và chạy tiếp phần còn lại.
+Summary được dựng từ journal nên run dở dang vẫn có summary hợp lệ (partial).
+"""
+import json
+import os
+import re
+import time
+import uuid
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+from .aggregate import make_summary, generate_insights
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOURNAL_DIR = os.getenv("BUSQA_RUNS_DIR", "runs")
+_HEADER_KEY = "_run_header"
+_RUN_ID_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]{0,127}$")
+LAZY_FSYNC_INTERVAL = 1.0  # giây, khi fsync=False
+
+
+def new_run_id() -> str:
+    """Run ID dễ sort theo thời gian: 20250101-080000-a1b2c3"""
+    return f"{datetime.utcnow():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+
+
+class RunJournal:
+    """
+    Journal của một run. Dùng `create` cho run mới, `open` để resume / đọc summary:
+
+        journal = RunJournal.create(conversation_ids, params={"brand_id": "son_hai"})
+        ... evaluate(..., stream_callback=journal.append)
+        journal.summary()
+
+    Chỉ giữ trạng thái (ok / error) theo conversation_id trong memory; results đọc lại từ đĩa.
+    Conversation lỗi không tính là xong - resume sẽ chạy lại.
+
+    fsync=True: fsync sau mỗi record (CLI). fsync=False: mỗi record chỉ flush (sống sót khi
+    process chết), fsync tối đa mỗi LAZY_FSYNC_INTERVAL giây và khi close - dùng trên event loop.
+    """
+
+    def __init__(self, run_id: str, journal_dir: str = DEFAULT_JOURNAL_DIR, fsync: bool = True):
+        if not _RUN_ID_RE.match(run_id or ""):
+            raise ValueError(f"Invalid run_id: {run_id!r}")
+        self.run_id = run_id
+        self.path = Path(journal_dir) / f"{run_id}.jsonl"
+        self.fsync = fsync
+        self.header: Dict[str, Any] = {}
+        self._status: Dict[str, bool] = {}  # conversation_id -> thành công?
+        self._fh = None
+        self._synced_at = time.monotonic()
+
+    @classmethod
+    def create(cls, conversation_ids: List[str], params: Dict[str, Any] = None, run_id: str = None,
+               journal_dir: str = DEFAULT_JOURNAL_DIR, fsync: bool = True) -> "RunJournal":
+        journal = cls(run_id or new_run_id(), journal_dir, fsync)
+        if journal.path.exists():
+            raise FileExistsError(f"Run '{journal.run_id}' already exists: {journal.path}")
+        journal.path.parent.mkdir(parents=True, exist_ok=True)
+        journal.header = {
+            _HEADER_KEY: 1,
+            "run_id": journal.run_id,
+            "created_at": datetime.utcnow().isoformat() + "Z",
+            "conversation_ids": list(conversation_ids),
+            "params": params or {},
+        }
+        journal._write_line(journal.header)
+        return journal
+
+    @classmethod
+    def open(cls, run_id: str, journal_dir: str = DEFAULT_JOURNAL_DIR, fsync: bool = True) -> "RunJournal":
+        journal = cls(run_id, journal_dir, fsync)
+        if not journal.path.exists():
+            raise FileNotFoundError(f"Run '{run_id}' not found in {journal_dir}")
+        for record in journal._iter_records():
+            if _HEADER_KEY in record:
+                journal.header = record
+            else:
+                journal._status[str(record.get("conversation_id"))] = "error" not in record
+        if not journal.header:
+            raise ValueError(f"Journal {journal.path} has no run header")
+        return journal
+
+    @property
+    def conversation_ids(self) -> List[str]:
+        return self.header.get("conversation_ids", [])
+
+    @property
+    def params(self) -> Dict[str, Any]:
+        return self.header.get("params", {})
+
+    # Ghi
+
+    def append(self, result: Dict[str, Any]) -> None:
+        """Ghi một result (dùng trực tiếp làm stream_callback của evaluator)"""
+        self._write_line(result)
+        self._status[str(result.get("conversation_id"))] = "error" not in result
+
+    def _write_line(self, record: Dict[str, Any]) -> None:
+        if self._fh is None:
+            self._repair_tail()
+            self._fh = open(self.path, "a", encoding="utf-8")
+        self._fh.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        self._fh.flush()
+        if self.fsync or time.monotonic() - self._synced_at >= LAZY_FSYNC_INTERVAL:
+            self._sync()
+
+    def _sync(self) -> None:
+        os.fsync(self._fh.fileno())
+        self._synced_at = time.monotonic()
+
+    def _repair_tail(self) -> None:
+        """Dòng cuối ghi dở (crash giữa lúc write): kết thúc nó để record mới không dính vào"""
+        if not self.path.exists() or self.path.stat().st_size == 0:
+            return
+        with open(self.path, "rb+") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+                logger.warning(f"Journal {self.path}: last line was partially written, skipped")
+
+    def close(self) -> None:
+        if self._fh is not None:
+            if not self.fsync:
+                self._sync()
+            self._fh.close()
+            self._fh = None
+
+    def __enter__(self) -> "RunJournal":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # Đọc
+
+    def _iter_records(self) -> Iterator[Dict[str, Any]]:
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # Dòng cuối ghi dở khi crash
+                    continue
+
+    def completed_ids(self) -> set:
+        return {cid for cid, ok in self._status.items() if ok}
+
+    def remaining_ids(self) -> List[str]:
+        done = self.completed_ids()
+        return [cid for cid in self.conversation_ids if cid not in done]
+
+    def results(self) -> List[Dict[str, Any]]:
+        """Result mới nhất của mỗi conversation, theo thứ tự conversation_ids của run"""
+        latest: Dict[str, Dict[str, Any]] = {}
+        for record in self._iter_records():
+            if _HEADER_KEY not in record:
+                latest[str(record.get("conversation_id"))] = record
+        ordered = [latest.pop(cid) for cid in self.conversation_ids if cid in latest]
+        return ordered + list(latest.values())
+
+    def progress(self) -> Dict[str, Any]:
+        total = len(self.conversation_ids)
+        completed = len(self.completed_ids())
+        failed = sum(1 for ok in self._status.values() if not ok)
+        return {
+            "run_id": self.run_id,
+            "created_at": self.header.get("created_at"),
+            "total": total,
+            "completed": completed,
+            "failed": failed,
+            "remaining": len(self.remaining_ids()),
+            "partial": completed < total,
+        }
+
+    def summary(self, results: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Summary + insights dựng từ journal (hợp lệ cả khi run chưa xong)"""
+        if results is None:
+            results = self.results()
+        summary = make_summary(results)
+        return {
+            "run": self.progress(),
+            "summary": summary,
+            "insights": generate_insights(summary),
+            "generated_at": datetime.utcnow().isoformat() + "Z",
+        }
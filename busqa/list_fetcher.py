@@ -0,0 +1,226 @@
+"""
+Async list fetcher: tải các trang của conversation list API song song, có pipeline.
+
+Thay cho vòng lặp tuần tự requests.get + time.sleep: tối đa `page_concurrency` trang
+đang bay (speculative - chưa biết tổng số trang), giới hạn tốc độ request, HTTP/2 pool
+dùng chung. 429/5xx backoff bằng asyncio.sleep (429 tôn trọng Retry-After và tạm dừng
+cả fetcher vì rate limit là chung). Trang được trả ra theo đúng thứ tự trang ngay khi
+có thể, nên evaluator bắt đầu chấm từ trang 1 trong lúc các trang sau còn đang tải.
+
+    fetcher = AsyncListFetcher(FetchConfig(base_url, bot_id, token, page_concurrency=4))
+    async for conversation in fetcher.iter_conversations():
+        ...
+"""
+import asyncio
+import random
+import time
+import logging
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from .decode import decode_conversation_page
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+try:
+    import h2  # noqa: F401  (httpx cần h2 cho http2=True)
+    H2_AVAILABLE = True
+except ImportError:
+    H2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+_RETRYABLE = {429, 500, 502, 503, 504}
+
+
+@dataclass
+class FetchConfig:
+    """Configuration for fetching conversations"""
+    base_url: str
+    bot_id: str
+    bearer_token: str
+    page_size: int = 100
+    max_pages: int = 20
+    retry_count: int = 3
+    backoff_delay: float = 1.0
+    timeout: int = 30
+    limit: int = None  # Optional limit to stop fetching when reached
+    typed_decode: bool = False  # True: trả về DecodedConversation (decode typed từ bytes) thay vì dict
+    page_concurrency: int = 4  # số trang tải song song
+    rate_limit_per_second: float = 10.0  # 0 = không giới hạn
+    max_backoff: float = 30.0
+
+
+class ListFetchError(RuntimeError):
+    """Lỗi không retry được (401/403, hết lượt retry)"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class _RateLimiter:
+    """Giãn đều request theo rate, chờ bằng asyncio.sleep"""
+
+    def __init__(self, rate_per_second: float):
+        self.interval = 1.0 / rate_per_second if rate_per_second and rate_per_second > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if not self.interval:
+            return
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            now = loop.time()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class AsyncListFetcher:
+    """Fetch các trang /api/conversations song song, trả ra theo thứ tự trang"""
+
+    def __init__(self, config: FetchConfig, client: Any = None):
+        self.config = config
+        self._client = client
+        self._owns_client = client is None
+        self._limiter = _RateLimiter(config.rate_limit_per_second)
+        self._pause_until = 0.0  # 429: cả fetcher chờ
+        self.stats: Dict[str, Any] = {"pages": 0, "requests": 0, "retries": 0, "rate_limited": 0,
+                                      "conversations": 0, "first_page_seconds": None, "elapsed_seconds": None}
+
+    def _make_client(self):
+        if not HTTPX_AVAILABLE:
+            raise ListFetchError("httpx is required for AsyncListFetcher (pip install httpx[http2])")
+        concurrency = max(1, self.config.page_concurrency)
+        return httpx.AsyncClient(
+            headers={"Authorization": f"Bearer {self.config.bearer_token}",
+                     "Content-Type": "application/json"},
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+            timeout=httpx.Timeout(self.config.timeout),
+            http2=H2_AVAILABLE,
+        )
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after:
+            try:
+                return min(float(retry_after), self.config.max_backoff)
+            except ValueError:
+                pass
+        delay = self.config.backoff_delay * (2 ** attempt)
+        return min(delay * (0.5 + random.random() / 2), self.config.max_backoff)
+
+    async def _fetch_page(self, page: int) -> List[Any]:
+        cfg = self.config
+        loop = asyncio.get_running_loop()
+        url = f"{cfg.base_url.rstrip('/')}/api/conversations"
+        params = {"bot_id": cfg.bot_id, "page": page, "page_size": cfg.page_size}
+        for attempt in range(cfg.retry_count):
+            pause = self._pause_until - loop.time()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            await self._limiter.acquire()
+            self.stats["requests"] += 1
+            try:
+                response = await self._client.get(url, params=params)
+            except httpx.HTTPError as e:
+                if attempt == cfg.retry_count - 1:
+                    raise ListFetchError(f"Failed to fetch page {page} after {cfg.retry_count} attempts: {e}")
+                delay = self._backoff(attempt)
+                logger.warning(f"Page {page} request failed (attempt {attempt + 1}): {e}. Retrying in {delay:.1f}s")
+                self.stats["retries"] += 1
+                await asyncio.sleep(delay)
+                continue
+
+            status = response.status_code
+            if status == 401:
+                raise ListFetchError("401 Client Error: Unauthorized. Invalid or expired bearer token.", status)
+            if status == 403:
+                raise ListFetchError(f"403 Forbidden: Access denied to bot_id {cfg.bot_id}", status)
+            if status in _RETRYABLE:
+                if attempt == cfg.retry_count - 1:
+                    raise ListFetchError(f"Page {page} failed with HTTP {status} after {cfg.retry_count} attempts", status)
+                delay = self._backoff(attempt, response.headers.get("Retry-After"))
+                if status == 429:
+                    self.stats["rate_limited"] += 1
+                    self._pause_until = max(self._pause_until, loop.time() + delay)
+                logger.warning(f"Page {page}: HTTP {status}. Backing off for {delay:.1f}s")
+                self.stats["retries"] += 1
+                await asyncio.sleep(delay)
+                continue
+            if status >= 400:
+                raise ListFetchError(f"Page {page} failed with HTTP {status}: {response.text[:200]}", status)
+
+            if cfg.typed_decode:
+                return decode_conversation_page(response.content)
+            return response.json().get("conversations", []) or []
+        raise ListFetchError(f"Failed to fetch page {page}")
+
+    async def iter_pages(self) -> AsyncIterator[Tuple[int, List[Any]]]:
+        """(page, conversations) theo thứ tự trang; dừng ở trang rỗng/thiếu, max_pages hoặc limit"""
+        cfg = self.config
+        start = time.perf_counter()
+        if self._client is None:
+            self._client = self._make_client()
+        in_flight: Dict[int, asyncio.Task] = {}
+        next_page = 1
+        total = 0
+        try:
+            while True:
+                # Speculative: giữ đủ trang đang bay cho tới khi biết trang cuối
+                while len(in_flight) < max(1, cfg.page_concurrency) and next_page <= cfg.max_pages:
+                    in_flight[next_page] = asyncio.create_task(self._fetch_page(next_page))
+                    next_page += 1
+                page = min(in_flight) if in_flight else None
+                if page is None:
+                    break
+                conversations = await in_flight.pop(page)
+                if self.stats["first_page_seconds"] is None:
+                    self.stats["first_page_seconds"] = round(time.perf_counter() - start, 4)
+                if not conversations:
+                    logger.info(f"No more conversations on page {page}. Stopping.")
+                    break
+                self.stats["pages"] += 1
+                total += len(conversations)
+                self.stats["conversations"] = total
+                logger.info(f"Page {page}: Got {len(conversations)} conversations (total: {total})")
+                yield page, conversations
+                if cfg.limit and total >= cfg.limit:
+                    logger.info(f"Reached limit of {cfg.limit} conversations, stopping fetch.")
+                    break
+                if len(conversations) < cfg.page_size:
+                    logger.info("Last page reached (fewer than page_size conversations)")
+                    break
+        finally:
+            for task in in_flight.values():
+                task.cancel()
+            if in_flight:
+                await asyncio.gather(*in_flight.values(), return_exceptions=True)
+            if self._owns_client and self._client is not None:
+                await self._client.aclose()
+                self._client = None
+            self.stats["elapsed_seconds"] = round(time.perf_counter() - start, 4)
+
+    async def iter_conversations(self) -> AsyncIterator[Any]:
+        """Từng conversation ngay khi trang của nó về (đưa thẳng vào evaluator)"""
+        async for _, conversations in self.iter_pages():
+            for conversation in conversations:
+                yield conversation
+
+    async def fetch_all(self) -> List[Any]:
+        all_conversations: List[Any] = []
+        async for _, conversations in self.iter_pages():
+            all_conversations.extend(conversations)
+        logger.info(f"Total conversations fetched: {len(all_conversations)}")
+        return all_conversations
+
+
+async def fetch_conversations_async(config: FetchConfig) -> List[Any]:
+    """Tất cả conversations (có messages) từ list API - bản async của fetch_conversations_with_messages"""
+    return await AsyncListFetcher(config).fetch_all()
@@ -0,0 +1,477 @@
+"""
+Phân tích tăng dần cho conversation đang diễn ra (live): message được append từng cái.
+
+analyze_conversation tính lại toàn bộ transcript mỗi lần -> với conversation đang chạy,
+mỗi message mới tốn O(n) và gọi lại LLM. IncrementalAnalyzer giữ state đủ để cập nhật
+latency, repeated_questions, context_resets, tts_money_reading_violation, policy
+violations và diagnostics hit trong O(1) mỗi message (không phụ thuộc độ dài
+conversation); metrics() trả cùng dict với analyze_conversation trên prefix đã nhận.
+
+LiveSession quyết định khi nào đáng chấm lại bằng LLM: lần đầu khi đủ min_turns, sau đó
+khi thêm reevaluate_every_turns lượt hoặc khi xuất hiện diagnostics hit mới.
+
+Giả định message đến theo thứ tự thời gian (batch sort theo ts) - message đến trễ vẫn
+được xử lý theo thứ tự đến và được đếm ở out_of_order_messages.
+"""
+import asyncio
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from .diagnostics import (
+    CHILD_POLICY_KEYWORDS, PDPA_CONSENT_PATTERNS, PDPA_DATA_PATTERNS, DiagnosticHit,
+    _detect_child_policy_miss, _detect_double_room_violation, _detect_forbidden_phone_collect,
+    _detect_handover_sla_missing, _detect_payment_policy_violation, _detect_pickup_scope_violation,
+    _detect_promise_hold_seat, extract_allowed_positions, extract_birth_year, extract_prices,
+    fare_math_hit, is_fare_conflict, pdpa_consent_hit,
+)
+from .metrics import (
+    CONTEXT_RESET_MARKERS, EARLY_END_KEYWORDS, PHONE_KEYWORDS, REPEATED_KEYWORDS, SUMMARY_KEYWORDS,
+    is_fixed_greeting, is_long_option_list, is_money_reading_violation,
+)
+from .models import MessageRecord
+from .normalize import normalize_messages
+
+logger = logging.getLogger(__name__)
+
+_BASIC_INFO_KEYWORDS = ("điểm đón", "điểm đến", "ngày", "hôm nay")
+
+# Thứ tự hit giống detect_operational_readiness / detect_risk_compliance
+_FIRST_TURN_DETECTORS = {
+    "pickup_scope_violation": _detect_pickup_scope_violation,
+    "forbidden_phone_collect": _detect_forbidden_phone_collect,
+    "promise_hold_seat": _detect_promise_hold_seat,
+}
+
+
+@dataclass
+class LiveConfig:
+    """Ngưỡng chấm lại bằng LLM + giới hạn số session live"""
+    reevaluate_every_turns: int = 6  # 0 = không chấm lại theo số lượt
+    reevaluate_on_new_hits: bool = True
+    min_turns: int = 2  # chưa chấm LLM khi conversation quá ngắn
+    max_sessions: int = 1000
+    idle_ttl_seconds: float = 3600.0
+
+    def __post_init__(self):
+        if self.reevaluate_every_turns < 0 or self.min_turns < 0:
+            raise ValueError("reevaluate_every_turns and min_turns must be >= 0")
+        if self.max_sessions < 1:
+            raise ValueError("max_sessions must be >= 1")
+        if self.idle_ttl_seconds <= 0:
+            raise ValueError("idle_ttl_seconds must be > 0")
+
+
+class _KeywordScan:
+    """
+    Keyword đã xuất hiện trong transcript nối bằng ' ' chưa - mỗi message chỉ quét text mới
+    cộng đuôi (len keyword dài nhất - 1) của phần trước, bắt được keyword nằm vắt qua ranh giới.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = tuple(keywords)
+        self.found: Set[str] = set()
+        self._overlap = max(len(k) for k in self.keywords) - 1
+        self._tail: Optional[str] = None
+
+    def feed(self, text_lower: str) -> None:
+        window = text_lower if self._tail is None else f"{self._tail} {text_lower}"
+        for keyword in self.keywords:
+            if keyword not in self.found and keyword in window:
+                self.found.add(keyword)
+        self._tail = window[-self._overlap:] if self._overlap else ""
+
+    def any(self, keywords: Iterable[str]) -> bool:
+        return any(k in self.found for k in keywords)
+
+
+class IncrementalAnalyzer:
+    """
+    Metrics + diagnostics của một conversation, cập nhật theo từng message append.
+    Cùng tham số với analyze_conversation (brand_policy, brand_prompt_text, allowed_positions).
+    """
+
+    def __init__(self, brand_policy, brand_prompt_text: str = "", allowed_positions: Optional[Iterable[str]] = None):
+        self.brand_policy = brand_policy
+        if allowed_positions is None:
+            allowed_positions = extract_allowed_positions(brand_prompt_text)
+        self.allowed_positions = frozenset(allowed_positions)
+
+        self.message_count = 0
+        self.out_of_order_messages = 0
+        # latency
+        self.user_messages = 0
+        self.agent_messages = 0
+        self._first_ts: Optional[float] = None
+        self._last_ts: Optional[float] = None
+        self._max_ts: Optional[float] = None
+        self._last_user_ts: Optional[float] = None
+        self._first_response: Optional[float] = None
+        self._response_sum = 0.0
+        self._response_count = 0
+        # metrics
+        self._asked: Set[str] = set()
+        self.repeated_questions = 0
+        self.context_resets = 0
+        self._reset_pending = False  # marker ở message cuối chưa tính (batch bỏ qua message cuối)
+        self.long_option_lists = 0
+        self.tts_money_reading_violation = 0
+        self._transcript_scan = _KeywordScan(EARLY_END_KEYWORDS + _BASIC_INFO_KEYWORDS)
+        self._agent_scan = _KeywordScan(PHONE_KEYWORDS + SUMMARY_KEYWORDS)
+        self._greeting_ok: Optional[bool] = None
+        # diagnostics: hit "turn đầu tiên vi phạm" không đổi khi có thêm message
+        self._first_hits: Dict[str, DiagnosticHit] = {}
+        self._birth_year: Optional[int] = None
+        self._child_policy_mentioned = False
+        self._prices: List[tuple] = []
+        self._price_min: Optional[int] = None
+        self._price_max: Optional[int] = None
+        self._last_agent: Optional[tuple] = None
+        self._pdpa_open: List[list] = []  # [turn_idx, text, consent_found] còn trong cửa sổ 2 message
+        self._pdpa_miss: Optional[tuple] = None
+
+    def append(self, message: Any) -> List[str]:
+        """Thêm một message (MessageRecord/Message/dict thô); trả về key diagnostics mới xuất hiện"""
+        if isinstance(message, dict):
+            records = normalize_messages([message], start_index=self.message_count)
+            message = records[0] if records else MessageRecord()
+        before = self.hit_keys()
+
+        i = self.message_count
+        self.message_count += 1
+        ts = getattr(message, "ts", None)
+        t = ts.timestamp() if ts is not None else math.nan
+        sender_type = getattr(message, "sender_type", None)
+        text = getattr(message, "text", "") or ""
+        text_lower = text.lower()
+
+        if i == 0:
+            self._first_ts = None if math.isnan(t) else t
+        self._last_ts = None if math.isnan(t) else t
+        if self._last_ts is not None:
+            if self._max_ts is not None and self._last_ts < self._max_ts:
+                self.out_of_order_messages += 1
+            self._max_ts = self._last_ts if self._max_ts is None else max(self._max_ts, self._last_ts)
+
+        if self._reset_pending:
+            self.context_resets += 1
+            self._reset_pending = False
+        self._transcript_scan.feed(text_lower)
+
+        if sender_type == "user":
+            self.user_messages += 1
+            self._last_user_ts = None if math.isnan(t) else t
+            birth_year = extract_birth_year(text_lower)
+            if birth_year:
+                self._birth_year = birth_year
+        elif sender_type == "agent":
+            self.agent_messages += 1
+            self._append_agent(i, t, text, text_lower)
+
+        self._close_pdpa_windows(i)
+        return sorted(self.hit_keys() - before)
+
+    def _append_agent(self, i: int, t: float, text: str, text_lower: str) -> None:
+        if self._last_user_ts is not None and not math.isnan(t):
+            delta = max(t - self._last_user_ts, 0)
+            if self._first_response is None:
+                self._first_response = delta
+            self._response_sum += delta
+            self._response_count += 1
+
+        for keyword in REPEATED_KEYWORDS:
+            if keyword in text_lower:
+                if keyword in self._asked:
+                    self.repeated_questions += 1
+                self._asked.add(keyword)
+        if i > 0 and any(marker in text_lower for marker in CONTEXT_RESET_MARKERS):
+            self._reset_pending = True
+        if is_long_option_list(text_lower):
+            self.long_option_lists += 1
+        if is_money_reading_violation(text_lower):
+            self.tts_money_reading_violation += 1
+        self._agent_scan.feed(text_lower)
+        if self._greeting_ok is None:
+            self._greeting_ok = is_fixed_greeting(text)
+
+        turn = [(i, text)]
+        self._last_agent = (i, text)
+        if self.allowed_positions and "double_room_rule_violation" not in self._first_hits:
+            self._record_first(_detect_double_room_violation(turn, self.allowed_positions))
+        for key, detector in _FIRST_TURN_DETECTORS.items():
+            if key not in self._first_hits:
+                self._record_first(detector(turn))
+        if "payment_policy_violation" not in self._first_hits:
+            self._record_first(_detect_payment_policy_violation(turn, self.brand_policy))
+        if not self._child_policy_mentioned:
+            self._child_policy_mentioned = any(k in text_lower for k in CHILD_POLICY_KEYWORDS)
+        self._append_prices(i, text)
+
+        if any(p in text_lower for p in PDPA_CONSENT_PATTERNS):
+            for window in self._pdpa_open:
+                window[2] = True
+            consent = True
+        else:
+            consent = False
+        if any(p in text_lower for p in PDPA_DATA_PATTERNS):
+            self._pdpa_open.append([i, text, consent])
+
+    def _record_first(self, hits: List[DiagnosticHit]) -> None:
+        for hit in hits:
+            self._first_hits.setdefault(hit["key"], hit)
+
+    def _append_prices(self, i: int, text: str) -> None:
+        for price in extract_prices(i, text):
+            value = price[1]
+            if "fare_math_inconsistent" not in self._first_hits and self._prices and (
+                    is_fare_conflict(self._price_min, value) or is_fare_conflict(self._price_max, value)):
+                # Giá trước đó không mâu thuẫn nhau -> cặp batch tìm thấy là (giá sớm nhất lệch, giá này).
+                # Batch có thể đổi evidence sang cặp sớm hơn khi có giá mới; live giữ cặp phát hiện đầu tiên.
+                first = next(p for p in self._prices if is_fare_conflict(p[1], value))
+                self._first_hits["fare_math_inconsistent"] = fare_math_hit(first, price)
+                self._prices = []
+            if "fare_math_inconsistent" not in self._first_hits:
+                self._prices.append(price)
+            self._price_min = value if self._price_min is None else min(self._price_min, value)
+            self._price_max = value if self._price_max is None else max(self._price_max, value)
+
+    def _close_pdpa_windows(self, i: int) -> None:
+        # Lượt thu thập data ở turn k được xét đồng ý tới message k + 2
+        while self._pdpa_open and self._pdpa_open[0][0] + 2 <= i:
+            turn_idx, text, consent = self._pdpa_open.pop(0)
+            if not consent and self._pdpa_miss is None:
+                self._pdpa_miss = (turn_idx, text)
+
+    def _pdpa_hit(self) -> Optional[DiagnosticHit]:
+        if self._pdpa_miss is not None:
+            return pdpa_consent_hit(*self._pdpa_miss)
+        for turn_idx, text, consent in self._pdpa_open:
+            if not consent:
+                return pdpa_consent_hit(turn_idx, text)
+        return None
+
+    @property
+    def total_turns(self) -> int:
+        return self.user_messages + self.agent_messages
+
+    def diagnostics(self) -> Dict[str, List[DiagnosticHit]]:
+        policy = self.brand_policy
+        operational: List[DiagnosticHit] = []
+        if "double_room_rule_violation" in self._first_hits:
+            operational.append(self._first_hits["double_room_rule_violation"])
+        if self._birth_year and not self._child_policy_mentioned:
+            operational.extend(_detect_child_policy_miss([], self._birth_year, datetime.now().year))
+        if getattr(policy, "no_route_validation", False) and "pickup_scope_violation" in self._first_hits:
+            operational.append(self._first_hits["pickup_scope_violation"])
+        if "fare_math_inconsistent" in self._first_hits:
+            operational.append(self._first_hits["fare_math_inconsistent"])
+        if self._last_agent is not None:
+            operational.extend(_detect_handover_sla_missing([self._last_agent], [self._last_agent]))
+
+        risk: List[DiagnosticHit] = []
+        if getattr(policy, "forbid_phone_collect", False) and "forbidden_phone_collect" in self._first_hits:
+            risk.append(self._first_hits["forbidden_phone_collect"])
+        for key in ("promise_hold_seat", "payment_policy_violation"):
+            if key in self._first_hits:
+                risk.append(self._first_hits[key])
+        if getattr(policy, "pdpa_consent_required", False):
+            pdpa = self._pdpa_hit()
+            if pdpa is not None:
+                risk.append(pdpa)
+        return {"operational_readiness": operational, "risk_compliance": risk}
+
+    def hit_keys(self) -> Set[str]:
+        diagnostics = self.diagnostics()
+        return {hit["key"] for hits in diagnostics.values() for hit in hits}
+
+    def policy_violations(self) -> List[str]:
+        violations = []
+        policy = self.brand_policy
+        if policy.forbid_phone_collect and self._agent_scan.any(PHONE_KEYWORDS):
+            violations.append("phone_collection_forbidden")
+        if policy.require_fixed_greeting and not self._greeting_ok:
+            violations.append("missing_fixed_greeting")
+        if policy.ban_full_summary and self._agent_scan.any(SUMMARY_KEYWORDS):
+            violations.append("full_summary_banned")
+        return violations
+
+    def metrics(self) -> Dict[str, Any]:
+        """Cùng key/giá trị với metrics của analyze_conversation trên các message đã append"""
+        scan = self._transcript_scan
+        basic_info_missing = (
+            "điểm đón" not in scan.found or "điểm đến" not in scan.found
+            or ("ngày" not in scan.found and "hôm nay" not in scan.found)
+        )
+        duration = None
+        if self._first_ts is not None and self._last_ts is not None:
+            duration = self._last_ts - self._first_ts
+        return {
+            "first_response_latency_seconds": self._first_response,
+            "avg_agent_response_latency_seconds": (self._response_sum / self._response_count
+                                                   if self._response_count else None),
+            "agent_messages": self.agent_messages,
+            "user_messages": self.user_messages,
+            "total_turns": self.total_turns,
+            "duration_seconds": duration,
+            "repeated_questions": self.repeated_questions,
+            "agent_user_ratio": self.agent_messages / self.user_messages if self.user_messages else None,
+            "context_resets": self.context_resets,
+            "long_option_lists": self.long_option_lists,
+            "endcall_early_hint": int(scan.any(EARLY_END_KEYWORDS) and basic_info_missing),
+            "tts_money_reading_violation": self.tts_money_reading_violation,
+            "policy_violations": len(self.policy_violations()),
+            "diagnostics": self.diagnostics(),
+        }
+
+
+class LiveSession:
+    """Conversation live: message thô (để chấm LLM) + analyzer + trạng thái chấm lại"""
+
+    def __init__(self, conversation_id: str, analyzer: IncrementalAnalyzer, config: Optional[LiveConfig] = None,
+                 brand_id: str = "unknown", context: Optional[Dict[str, Any]] = None):
+        self.conversation_id = conversation_id
+        self.analyzer = analyzer
+        self.config = config or LiveConfig()
+        self.brand_id = brand_id
+        self.context = context or {}  # thông tin caller cần để chấm LLM (brand prompt path, model...)
+        self.raw_messages: List[Any] = []
+        self.created_at = self.updated_at = self.accessed_at = time.time()
+        self.evaluating = False
+        self.evaluations = 0
+        self.evaluated_turns = 0
+        self.evaluated_hits: Set[str] = set()
+        self.last_evaluation: Optional[Dict[str, Any]] = None
+        self.last_evaluated_at: Optional[float] = None
+        self._pending: Optional[tuple] = None
+
+    def append(self, raw_messages: List[Any]) -> List[str]:
+        """Append message thô (dict như payload conversation); trả về key diagnostics mới"""
+        records = normalize_messages(list(raw_messages), start_index=len(self.raw_messages))
+        self.raw_messages.extend(raw_messages)
+        new_hits: List[str] = []
+        for record in records:
+            new_hits.extend(self.analyzer.append(record))
+        self.updated_at = time.time()
+        return new_hits
+
+    def reevaluation_due(self) -> Optional[str]:
+        """Lý do cần chấm lại bằng LLM ("first" / "turns" / "hits"), None nếu chưa cần"""
+        turns = self.analyzer.total_turns
+        if turns < self.config.min_turns or self.evaluating:
+            return None
+        if self.last_evaluated_at is None:
+            return "first"
+        every = self.config.reevaluate_every_turns
+        if every and turns - self.evaluated_turns >= every:
+            return "turns"
+        if self.config.reevaluate_on_new_hits and self.analyzer.hit_keys() - self.evaluated_hits:
+            return "hits"
+        return None
+
+    def begin_evaluation(self) -> Dict[str, Any]:
+        """Đánh dấu đang chấm; trả về snapshot conversation (payload thô) để gửi LLM"""
+        self.evaluating = True
+        self._pending = (self.analyzer.total_turns, self.analyzer.hit_keys())
+        return {"conversation_id": self.conversation_id, "messages": list(self.raw_messages)}
+
+    def finish_evaluation(self, result: Dict[str, Any]) -> None:
+        # Lỗi cũng tính là đã chấm - chờ delta tiếp theo thay vì gọi lại sau mỗi message
+        turns, hits = self._pending or (self.analyzer.total_turns, self.analyzer.hit_keys())
+        self.evaluated_turns = turns
+        self.evaluated_hits = hits
+        self.last_evaluation = result
+        self.last_evaluated_at = time.time()
+        self.evaluations += 1
+        self.evaluating = False
+        self._pending = None
+
+    def abort_evaluation(self) -> None:
+        """Chưa gọi được LLM (vd. admission từ chối) - giữ nguyên delta để lần append sau thử lại"""
+        self.evaluating = False
+        self._pending = None
+
+    def state(self) -> Dict[str, Any]:
+        return {
+            "conversation_id": self.conversation_id,
+            "brand_id": self.brand_id,
+            "messages": self.analyzer.message_count,
+            "out_of_order_messages": self.analyzer.out_of_order_messages,
+            "metrics": self.analyzer.metrics(),
+            "reevaluation": {
+                "due": self.reevaluation_due(),
+                "evaluating": self.evaluating,
+                "evaluations": self.evaluations,
+                "evaluated_turns": self.evaluated_turns,
+                "last_evaluated_at": self.last_evaluated_at,
+            },
+            "evaluation": self.last_evaluation,
+        }
+
+
+class LiveSessionStore:
+    """Session live theo conversation_id: LRU max_sessions + hết hạn khi không được truy cập quá idle_ttl_seconds"""
+
+    def __init__(self, config: Optional[LiveConfig] = None):
+        self.config = config or LiveConfig()
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, LiveSession]" = OrderedDict()
+        self.counters = {"created": 0, "expired": 0, "evicted": 0, "closed": 0}
+        self._tasks: Set[asyncio.Task] = set()  # re-evaluation nền đang chạy (giữ reference tới khi xong)
+
+    def track(self, task: asyncio.Task) -> asyncio.Task:
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def _expire(self, now: float) -> None:
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.accessed_at <= self.config.idle_ttl_seconds:
+                return
+            self._sessions.popitem(last=False)
+            self.counters["expired"] += 1
+
+    def get(self, conversation_id: str) -> Optional[LiveSession]:
+        with self._lock:
+            now = time.time()
+            self._expire(now)
+            session = self._sessions.get(conversation_id)
+            if session is not None:
+                session.accessed_at = now
+                self._sessions.move_to_end(conversation_id)
+            return session
+
+    def add(self, session: LiveSession) -> LiveSession:
+        with self._lock:
+            now = time.time()
+            self._expire(now)
+            session.accessed_at = now
+            self._sessions[session.conversation_id] = session
+            self._sessions.move_to_end(session.conversation_id)
+            self.counters["created"] += 1
+            while len(self._sessions) > self.config.max_sessions:
+                evicted_id, _ = self._sessions.popitem(last=False)
+                self.counters["evicted"] += 1
+                logger.info(f"Live session {evicted_id} evicted (max_sessions={self.config.max_sessions})")
+            return session
+
+    def pop(self, conversation_id: str) -> Optional[LiveSession]:
+        with self._lock:
+            session = self._sessions.pop(conversation_id, None)
+            if session is not None:
+                self.counters["closed"] += 1
+            return session
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"sessions": len(self._sessions), "max_sessions": self.config.max_sessions,
+                    "idle_ttl_seconds": self.config.idle_ttl_seconds,
+                    "reevaluations_running": len(self._tasks), **self.counters}
@@ -6,6 +6,8 @@ from concurrent.futures import ThreadPoolExecutor
 from openai import AsyncOpenAI, OpenAI
 import google.generativeai as genai
 
+from .admission import get_admission_controller
+
 # Thread pool tối ưu cho Docker (giới hạn theo cores) - ULTRA HIGH PERFORMANCE
 import os
 
@@ -120,7 +122,11 @@ class LLMClient:
         )
 
 async def call_llm_async(api_key: str, model: str, system_prompt: str, user_prompt: str, base_url: str | None = None, temperature: float = 0.2, max_retries: int = 3) -> Dict[str, Any]:
-    """Async version của call_llm cho true concurrent processing"""
+    """Async version của call_llm cho true concurrent processing (qua slot LLM chung của process)"""
+    async with get_admission_controller().slot():
+        return await _call_llm_async(api_key, model, system_prompt, user_prompt, base_url, temperature, max_retries)
+
+async def _call_llm_async(api_key: str, model: str, system_prompt: str, user_prompt: str, base_url: str | None, temperature: float, max_retries: int) -> Dict[str, Any]:
     if model.startswith("gemini"):
         genai.configure(api_key=api_key)
         generation_config = {
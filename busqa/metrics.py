@@ -1,8 +1,74 @@
 from typing import List, Optional, Dict, Any
+import math
+import re
 from .models import Message
+from .frame import ConversationFrame, iter_sender_text, USER, AGENT
 from .diagnostics import detect_operational_readiness, detect_risk_compliance
 
+MONEY_RE = re.compile(r'\d+[k,đ]|\d+\s*(nghìn|ngàn|đồng)')
+NUMBER_WORDS = ('một', 'hai', 'ba', 'bốn', 'năm', 'sáu', 'bảy', 'tám', 'chín', 'mười')
+REPEATED_KEYWORDS = ("điểm đón", "điểm đến", "thời gian", "số điện thoại", "năm sinh", "ngày", "giờ")
+CONTEXT_RESET_MARKERS = ("kết thúc", "xin chào", "tôi là", "tổng đài viên", "hỗ trợ bạn")
+EARLY_END_KEYWORDS = ("kết thúc", "tạm biệt", "hẹn gặp lại", "cảm ơn bạn đã gọi")
+PHONE_KEYWORDS = ("số điện thoại", "sđt", "phone", "liên hệ", "gọi lại")
+SUMMARY_KEYWORDS = ("tóm lại", "tổng kết", "như vậy", "để tôi nhắc lại")
+
+
+def is_long_option_list(text: str) -> bool:
+    return text.count(",") >= 5 or text.count("\n") >= 5
+
+
+def is_money_reading_violation(text_lower: str) -> bool:
+    """Agent đọc tiền dạng số (350k) mà không đọc bằng chữ - TTS đọc sai"""
+    return bool(MONEY_RE.findall(text_lower)) and not any(word in text_lower for word in NUMBER_WORDS)
+
+
+def is_fixed_greeting(text: str) -> bool:
+    text = text.lower()
+    return "chào" in text and "nhân viên" in text
+
+
+def _latency_metrics_from_frame(frame: ConversationFrame) -> Dict[str, Any]:
+    # Đọc thẳng mảng epoch float, không tạo datetime cho từng message
+    first_resp_latency = None
+    per_resp = []
+    last_user_ts = None
+    agent_count = 0
+    user_count = 0
+    ts = frame.ts
+    senders = frame.senders
+
+    for i in range(len(senders)):
+        code = senders[i]
+        t = ts[i]
+        if code == USER:
+            user_count += 1
+            last_user_ts = None if math.isnan(t) else t
+        elif code == AGENT:
+            agent_count += 1
+            if last_user_ts is not None and not math.isnan(t):
+                delta = t - last_user_ts
+                if first_resp_latency is None:
+                    first_resp_latency = max(delta, 0)
+                per_resp.append(max(delta, 0))
+
+    avg_agent_resp = sum(per_resp)/len(per_resp) if per_resp else None
+    duration = None
+    if len(senders) and not math.isnan(ts[0]) and not math.isnan(ts[-1]):
+        duration = ts[-1] - ts[0]
+
+    return {
+        "first_response_latency_seconds": first_resp_latency,
+        "avg_agent_response_latency_seconds": avg_agent_resp,
+        "agent_messages": agent_count,
+        "user_messages": user_count,
+        "total_turns": user_count + agent_count,
+        "duration_seconds": duration,
+    }
+
 def compute_latency_metrics(messages: List[Message]) -> Dict[str, Any]:
+    if isinstance(messages, ConversationFrame):
+        return _latency_metrics_from_frame(messages)
     first_resp_latency = None
     per_resp = []
     last_user_ts = None
@@ -36,42 +102,39 @@ def compute_latency_metrics(messages: List[Message]) -> Dict[str, Any]:
         "duration_seconds": duration,
     }
 
-def compute_additional_metrics(messages: list, brand_policy=None, brand_prompt_text: str = "") -> dict:
-    repeated_keywords = ["điểm đón", "điểm đến", "thời gian", "số điện thoại", "năm sinh", "ngày", "giờ"]
+def compute_additional_metrics(messages: list, brand_policy=None, brand_prompt_text: str = "",
+                               allowed_positions=None) -> dict:
+    # Một lượt đọc (sender_type, text) thay vì getattr lặp lại trong từng vòng
+    pairs = list(iter_sender_text(messages))
+    agent_lowers = [(i, text.lower()) for i, (stype, text) in enumerate(pairs) if stype == "agent"]
+
     question_history = {}
     repeated_questions = 0
-    for m in messages:
-        if getattr(m, 'sender_type', None) == "agent":
-            text = (getattr(m, 'text', '') or '').lower()
-            for kw in repeated_keywords:
-                if kw in text:
-                    if kw in question_history and question_history[kw] >= 1:
-                        repeated_questions += 1
-                    question_history[kw] = question_history.get(kw, 0) + 1
-
-    agent_count = sum(1 for m in messages if getattr(m, 'sender_type', None) == "agent")
-    user_count = sum(1 for m in messages if getattr(m, 'sender_type', None) == "user")
+    for _, text in agent_lowers:
+        for kw in REPEATED_KEYWORDS:
+            if kw in text:
+                if kw in question_history and question_history[kw] >= 1:
+                    repeated_questions += 1
+                question_history[kw] = question_history.get(kw, 0) + 1
+
+    agent_count = len(agent_lowers)
+    user_count = sum(1 for stype, _ in pairs if stype == "user")
     agent_user_ratio = agent_count / user_count if user_count else None
 
     context_resets = 0
-    for i, m in enumerate(messages):
-        if getattr(m, 'sender_type', None) == "agent":
-            text = (getattr(m, 'text', '') or '').lower()
-            if ("kết thúc" in text or "xin chào" in text or "tôi là" in text or "tổng đài viên" in text or "hỗ trợ bạn" in text) and 0 < i < len(messages) - 1:
-                context_resets += 1
+    for i, text in agent_lowers:
+        if any(marker in text for marker in CONTEXT_RESET_MARKERS) and 0 < i < len(pairs) - 1:
+            context_resets += 1
 
     long_option_lists = 0
-    for m in messages:
-        if getattr(m, 'sender_type', None) == "agent":
-            text = (getattr(m, 'text', '') or '').lower()
-            if text.count(",") >= 5 or text.count("\n") >= 5:
-                long_option_lists += 1
+    for _, text in agent_lowers:
+        if is_long_option_list(text):
+            long_option_lists += 1
 
     endcall_early_hint = 0
-    transcript_text = " ".join([getattr(m, 'text', '') for m in messages]).lower()
+    transcript_text = " ".join([text for _, text in pairs]).lower()
     
-    early_end_keywords = ["kết thúc", "tạm biệt", "hẹn gặp lại", "cảm ơn bạn đã gọi"]
-    has_early_end = any(keyword in transcript_text for keyword in early_end_keywords)
+    has_early_end = any(keyword in transcript_text for keyword in EARLY_END_KEYWORDS)
     
     basic_info_missing = (
         "điểm đón" not in transcript_text or 
@@ -83,16 +146,9 @@ def compute_additional_metrics(messages: list, brand_policy=None, brand_prompt_t
         endcall_early_hint = 1
 
     tts_money_reading_violation = 0
-    for m in messages:
-        if getattr(m, 'sender_type', None) == "agent":
-            text = (getattr(m, 'text', '') or '').lower()
-            import re
-            money_patterns = re.findall(r'\d+[k,đ]|\d+\s*(nghìn|ngàn|đồng)', text)
-            if money_patterns:
-                number_words = ['một', 'hai', 'ba', 'bốn', 'năm', 'sáu', 'bảy', 'tám', 'chín', 'mười']
-                has_word_numbers = any(word in text for word in number_words)
-                if not has_word_numbers:
-                    tts_money_reading_violation += 1
+    for _, text in agent_lowers:
+        if is_money_reading_violation(text):
+            tts_money_reading_violation += 1
 
     result = {
         "repeated_questions": repeated_questions,
@@ -105,28 +161,27 @@ def compute_additional_metrics(messages: list, brand_policy=None, brand_prompt_t
     }
     
     if brand_policy is not None:
-        diagnostics = compute_diagnostics(messages, brand_policy, brand_prompt_text)
+        diagnostics = compute_diagnostics(messages, brand_policy, brand_prompt_text, allowed_positions)
         result["diagnostics"] = diagnostics
     
     return result
 
 def detect_policy_violations(messages: list, brand_policy) -> list:
     violations = []
-    transcript_text = " ".join([getattr(m, 'text', '') for m in messages if getattr(m, 'sender_type', None) == "agent"]).lower()
+    pairs = list(iter_sender_text(messages))
+    transcript_text = " ".join([text for stype, text in pairs if stype == "agent"]).lower()
     
     if brand_policy.forbid_phone_collect:
-        phone_keywords = ["số điện thoại", "sđt", "phone", "liên hệ", "gọi lại"]
-        if any(keyword in transcript_text for keyword in phone_keywords):
+        if any(keyword in transcript_text for keyword in PHONE_KEYWORDS):
             violations.append("phone_collection_forbidden")
     
     if brand_policy.require_fixed_greeting:
-        first_agent_msg = next((getattr(m, 'text', '') for m in messages if getattr(m, 'sender_type', None) == "agent"), "")
-        if not ("chào" in first_agent_msg.lower() and "nhân viên" in first_agent_msg.lower()):
+        first_agent_msg = next((text for stype, text in pairs if stype == "agent"), "")
+        if not is_fixed_greeting(first_agent_msg):
             violations.append("missing_fixed_greeting")
     
     if brand_policy.ban_full_summary:
-        summary_keywords = ["tóm lại", "tổng kết", "như vậy", "để tôi nhắc lại"]
-        if any(keyword in transcript_text for keyword in summary_keywords):
+        if any(keyword in transcript_text for keyword in SUMMARY_KEYWORDS):
             violations.append("full_summary_banned")
     
     return violations
@@ -135,8 +190,8 @@ def compute_policy_violations_count(messages: list, brand_policy) -> int:
     violations = detect_policy_violations(messages, brand_policy)
     return len(violations)
 
-def compute_diagnostics(messages: list, brand_policy, brand_prompt_text: str = "") -> dict:
-    operational_hits = detect_operational_readiness(messages, brand_policy, brand_prompt_text)
+def compute_diagnostics(messages: list, brand_policy, brand_prompt_text: str = "", allowed_positions=None) -> dict:
+    operational_hits = detect_operational_readiness(messages, brand_policy, brand_prompt_text, allowed_positions)
     risk_hits = detect_risk_compliance(messages, brand_policy)
     
     return {
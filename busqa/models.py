@@ -1,4 +1,4 @@
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, NamedTuple
 from datetime import datetime
 from pydantic import BaseModel, Field
 
@@ -8,6 +8,13 @@ class Message(BaseModel):
     sender_name: Optional[str] = None
     text: str = ""
 
+class MessageRecord(NamedTuple):
+    """Bản ghi message nhẹ do normalize_messages tạo ra - cùng field với Message, không validation"""
+    ts: Optional[datetime] = None
+    sender_type: str = "unknown"
+    sender_name: Optional[str] = None
+    text: str = ""
+
 class Conversation(BaseModel):
     conversation_id: str
     messages: List[Message]
@@ -0,0 +1,195 @@
+"""
+Near-duplicate detection: dùng lại đánh giá của conversation gần giống đã chấm.
+
+Bot chạy theo kịch bản nên nhiều conversation gần như trùng nhau (cùng câu chào, cùng câu
+trả lời FAQ, khách chỉ khác vài từ). Mỗi conversation có MinHash signature trên shingle từ
+của các turn user/agent đã normalize; LSH banding tìm ứng viên trong index (cùng brand và
+eval config), Jaccard ước lượng >= threshold thì dùng lại output LLM của conversation đó.
+
+Metrics/diagnostics vẫn được tính trên conversation mới và coerce chạy lại, nên penalty
+theo nội dung thật vẫn được áp (điều chỉnh nhẹ); result được đánh dấu "near_duplicate".
+Chỉ result do LLM chấm mới được đưa vào index - không dùng lại chuỗi result đã dùng lại.
+"""
+import re
+import zlib
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from .frame import iter_sender_text
+
+logger = logging.getLogger(__name__)
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_TOKEN_RE = re.compile(r"\w+")
+_PREFIX = {"user": "u", "agent": "a"}
+
+
+@dataclass
+class NearDuplicateConfig:
+    """Config cho near-duplicate reuse"""
+    threshold: float = 0.9  # Jaccard ước lượng tối thiểu để dùng lại
+    num_perm: int = 128
+    bands: int = 16  # 16 band x 8 row: J=0.9 gần như chắc chắn thành ứng viên, J<0.6 hiếm khi
+    shingle_size: int = 3  # số từ mỗi shingle
+    min_shingles: int = 8  # conversation quá ngắn ("alo", "ok") không dùng near-dup
+    max_candidates: int = 50
+    seed: int = 1  # đổi seed / num_perm / bands -> index cũ không còn dùng (scope khác)
+
+
+class MinHasher:
+    """MinHash signature + LSH band key cho conversation (frame hoặc list message)"""
+
+    def __init__(self, config: NearDuplicateConfig = None):
+        self.config = config or NearDuplicateConfig()
+        cfg = self.config
+        if cfg.num_perm % cfg.bands:
+            raise ValueError(f"num_perm ({cfg.num_perm}) must be a multiple of bands ({cfg.bands})")
+        # Hệ số cố định theo seed: signature lưu trong index phải so được giữa các process
+        rng = np.random.RandomState(cfg.seed)
+        self._a = rng.randint(1, _MERSENNE_PRIME, size=cfg.num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, _MERSENNE_PRIME, size=cfg.num_perm, dtype=np.uint64)
+        self.rows = cfg.num_perm // cfg.bands
+        self.scope = f"minhash-{cfg.num_perm}x{cfg.bands}-k{cfg.shingle_size}-s{cfg.seed}"
+
+    def shingles(self, messages) -> Set[int]:
+        """Shingle từ theo từng turn user/agent, gắn vai người nói; hash crc32 (ổn định giữa các process)"""
+        k = self.config.shingle_size
+        out: Set[int] = set()
+        for sender, text in iter_sender_text(messages):
+            prefix = _PREFIX.get(sender)
+            if prefix is None or not text:
+                continue
+            words = _TOKEN_RE.findall(text.lower())
+            if not words:
+                continue
+            if len(words) <= k:
+                out.add(zlib.crc32(f"{prefix}:{' '.join(words)}".encode("utf-8")))
+                continue
+            for i in range(len(words) - k + 1):
+                out.add(zlib.crc32(f"{prefix}:{' '.join(words[i:i + k])}".encode("utf-8")))
+        return out
+
+    def signature(self, messages) -> Optional[np.ndarray]:
+        """MinHash signature (uint64[num_perm]); None nếu conversation quá ngắn"""
+        shingles = self.shingles(messages)
+        if len(shingles) < self.config.min_shingles:
+            return None
+        hv = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+        permuted = np.bitwise_and((np.outer(hv, self._a) + self._b) % _MERSENNE_PRIME, _MAX_HASH)
+        return permuted.min(axis=0)
+
+    def band_keys(self, signature: np.ndarray) -> List[int]:
+        """Một bucket key (int64 có dấu, vừa SQLite INTEGER) cho mỗi band"""
+        keys = []
+        for band in range(self.config.bands):
+            chunk = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            digest = hashlib.blake2b(chunk, digest_size=8, person=band.to_bytes(2, "little")).digest()
+            keys.append(int.from_bytes(digest, "little", signed=True))
+        return keys
+
+    @staticmethod
+    def similarity(a: np.ndarray, b: np.ndarray) -> float:
+        """Jaccard ước lượng = tỷ lệ vị trí trùng của hai signature"""
+        return float(np.count_nonzero(a == b)) / len(a)
+
+    @staticmethod
+    def to_bytes(signature: np.ndarray) -> bytes:
+        return signature.astype("<u8").tobytes()
+
+    @staticmethod
+    def from_bytes(data: bytes) -> np.ndarray:
+        return np.frombuffer(data, dtype="<u8")
+
+
+class NearDuplicateIndex:
+    """
+    LSH index lưu trong ResultStore (bảng signatures / signature_bands):
+
+        index = NearDuplicateIndex(store, NearDuplicateConfig(threshold=0.9))
+        sig = index.signature(frame)
+        match = index.lookup(sig, brand_hash, eval_hash)  # {"result", "source_conversation_id", "similarity"}
+        index.add(conversation_id, content_hash, brand_hash, eval_hash, sig)
+    """
+
+    def __init__(self, store, config: NearDuplicateConfig = None):
+        self.store = store
+        self.hasher = MinHasher(config)
+        self.config = self.hasher.config
+
+    def signature(self, messages) -> Optional[np.ndarray]:
+        return self.hasher.signature(messages)
+
+    def _scope(self, brand_hash: str, eval_hash: str) -> str:
+        return f"{self.hasher.scope}:{brand_hash}:{eval_hash}"
+
+    def lookup(self, signature: np.ndarray, brand_hash: str, eval_hash: str) -> Optional[Dict[str, Any]]:
+        """Conversation đã chấm giống nhất (>= threshold) cùng brand + eval config, kèm result của nó"""
+        candidates = self.store.signature_candidates(
+            self._scope(brand_hash, eval_hash), self.hasher.band_keys(signature), self.config.max_candidates)
+        best = None
+        for row_id, conversation_id, content_hash, data in candidates:
+            score = self.hasher.similarity(signature, self.hasher.from_bytes(data))
+            if score >= self.config.threshold and (best is None or score > best[0]):
+                best = (score, conversation_id, content_hash)
+        if best is None:
+            return None
+        result = self.store.peek(best[2], brand_hash, eval_hash)
+        if result is None or not isinstance(result.get("llm_raw"), dict):
+            return None
+        self.store.record_near_duplicate_hit()
+        return {"result": result, "source_conversation_id": best[1], "similarity": round(best[0], 4)}
+
+    def add(self, conversation_id: str, content_hash: str, brand_hash: str, eval_hash: str,
+            signature: np.ndarray) -> None:
+        self.store.add_signature(self._scope(brand_hash, eval_hash), conversation_id, content_hash,
+                                 self.hasher.to_bytes(signature), self.hasher.band_keys(signature))
+
+
+def simulate_reuse(conversations: Iterable[Tuple[Any, str, Sequence]], thresholds: Sequence[float],
+                   config: NearDuplicateConfig = None) -> Dict[str, Any]:
+    """
+    Ước lượng số LLM call tránh được trên một ngày traffic (không gọi LLM).
+
+    conversations: (brand_key, content_hash, messages) theo thứ tự đến. Mô phỏng đúng luật
+    của evaluator: trùng nội dung -> dùng lại; không thì near-dup >= threshold với conversation
+    đã được LLM chấm cùng brand -> dùng lại; còn lại tính là một LLM call và vào index.
+    """
+    hasher = MinHasher(config)
+    items = []
+    for brand_key, content_hash, messages in conversations:
+        items.append((brand_key, content_hash, hasher.signature(messages)))
+
+    report: Dict[str, Any] = {"conversations": len(items), "thresholds": {}}
+    for threshold in thresholds:
+        seen_content: Set[Tuple[Any, str]] = set()
+        buckets: Dict[Tuple[Any, int, int], List[int]] = {}
+        exact = near = short = 0
+        for i, (brand_key, content_hash, sig) in enumerate(items):
+            if (brand_key, content_hash) in seen_content:
+                exact += 1
+                continue
+            seen_content.add((brand_key, content_hash))
+            if sig is None:
+                short += 1
+                continue
+            keys = hasher.band_keys(sig)
+            candidates = {j for band, key in enumerate(keys) for j in buckets.get((brand_key, band, key), ())}
+            if any(hasher.similarity(sig, items[j][2]) >= threshold for j in candidates):
+                near += 1
+                continue
+            for band, key in enumerate(keys):
+                buckets.setdefault((brand_key, band, key), []).append(i)
+        llm_calls = len(items) - exact - near
+        report["thresholds"][str(threshold)] = {
+            "exact_duplicates": exact,
+            "near_duplicates": near,
+            "too_short": short,
+            "llm_calls": llm_calls,
+            "llm_calls_avoided_pct": round(100.0 * (exact + near) / len(items), 2) if items else 0.0,
+        }
+    return report
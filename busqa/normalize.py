@@ -1,7 +1,18 @@
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 from datetime import datetime
+from functools import lru_cache
 from dateutil import parser as dtparser
-from .models import Message
+from .models import Message, MessageRecord
+from .frame import ConversationFrame
+
+TEXT_KEYS = ["content", "text", "message", "body", "payload"]
+SENDER_KEYS = ["role", "sender", "from", "author", "source"]
+SENDER_NAME_KEYS = ["sender_name", "name", "display_name", "fromName"]
+TS_KEYS = ["ts", "timestamp", "createdAt", "created_at", "time"]
+
+# Cache layout key theo schema (tuple các key của message) -> key ưu tiên cho từng field
+_layout_cache: Dict[Tuple, Tuple[Optional[str], ...]] = {}
+_LAYOUT_CACHE_MAX = 256
 
 def _first_present(d: Dict, keys: List[str], default=None):
     for k in keys:
@@ -9,7 +20,120 @@ def _first_present(d: Dict, keys: List[str], default=None):
             return d[k]
     return default
 
-def normalize_messages(raw: Any) -> List[Message]:
+def _layout_for(m: Dict) -> Tuple[Optional[str], ...]:
+    sig = tuple(m)
+    layout = _layout_cache.get(sig)
+    if layout is None:
+        layout = tuple(
+            next((k for k in keys if k in m), None)
+            for keys in (TEXT_KEYS, SENDER_KEYS, SENDER_NAME_KEYS, TS_KEYS)
+        )
+        if len(_layout_cache) >= _LAYOUT_CACHE_MAX:
+            _layout_cache.clear()
+        _layout_cache[sig] = layout
+    return layout
+
+def _field(m: Dict, key: Optional[str], keys: List[str], default=None):
+    # key theo layout; nếu value là None thì probe các key còn lại như _first_present
+    if key is not None:
+        v = m[key]
+        if v is not None:
+            return v
+        return _first_present(m, keys, default)
+    return default
+
+@lru_cache(maxsize=512)
+def _classify_sender(sender: str) -> Optional[str]:
+    if any(k in sender for k in ["agent", "support", "staff", "cskh"]):
+        return "agent"
+    if any(k in sender for k in ["user", "customer", "khach"]):
+        return "user"
+    if "system" in sender:
+        return "system"
+    return None
+
+def _sniff_ts_format(ts_raw: Any) -> str:
+    """Đoán format timestamp từ giá trị đầu tiên của conversation"""
+    if isinstance(ts_raw, (int, float)):
+        return "epoch"
+    s = str(ts_raw)
+    if s.isdigit() and len(s) in (10, 13):
+        return "epoch_str"
+    try:
+        _parse_iso(s)
+        return "iso"
+    except ValueError:
+        return "dateutil"
+
+def _parse_iso(s: str) -> datetime:
+    if s.endswith("Z"):
+        s = s[:-1] + "+00:00"
+    return datetime.fromisoformat(s)
+
+def _from_epoch(v: float) -> datetime:
+    if v > 10**10:
+        return datetime.fromtimestamp(v / 1000.0)
+    return datetime.fromtimestamp(v)
+
+def _parse_ts(ts_raw: Any, fmt: str) -> Optional[datetime]:
+    try:
+        if isinstance(ts_raw, (int, float)):
+            return _from_epoch(ts_raw)
+        if fmt == "iso":
+            try:
+                return _parse_iso(ts_raw if isinstance(ts_raw, str) else str(ts_raw))
+            except ValueError:
+                pass
+        elif fmt == "epoch_str":
+            s = str(ts_raw)
+            if s.isdigit():
+                return _from_epoch(int(s))
+        # miss fast path -> dateutil
+        return dtparser.parse(str(ts_raw))
+    except Exception:
+        return None
+
+def _iter_dict_fields(items: List[Any], start: int = 0) -> Iterator[Tuple[int, Any, Any, Any, Any]]:
+    for i, m in enumerate(items, start):
+        if not isinstance(m, dict):
+            continue
+        text_k, sender_k, name_k, ts_k = _layout_for(m)
+        yield (i,
+               _field(m, text_k, TEXT_KEYS, ""),
+               _field(m, sender_k, SENDER_KEYS, ""),
+               _field(m, name_k, SENDER_NAME_KEYS, None),
+               _field(m, ts_k, TS_KEYS, None))
+
+def records_from_fields(rows: Iterable[Tuple[int, Any, Any, Any, Any]]) -> List[MessageRecord]:
+    """
+    Dựng MessageRecord từ các field đã trích: (index, text, sender, sender_name, ts_raw).
+    Dùng chung cho đường dict (normalize_messages) và đường decode typed (busqa.decode).
+    """
+    out: List[MessageRecord] = []
+    ts_fmt = None
+    for i, text, sender, sender_name, ts_raw in rows:
+        text = text or ""
+        sender = sender or ""
+        if sender_name is not None and not isinstance(sender_name, str):
+            sender_name = str(sender_name)
+
+        ts = None
+        if ts_raw is not None:
+            if ts_fmt is None:
+                ts_fmt = _sniff_ts_format(ts_raw)
+            ts = _parse_ts(ts_raw, ts_fmt)
+
+        stype = _classify_sender(sender.lower() if isinstance(sender, str) else str(sender).lower())
+        if stype is None:
+            stype = "user" if i == 0 else "agent"
+
+        out.append(MessageRecord(ts, stype, sender_name, str(text).strip()))
+
+    out.sort(key=lambda x: x.ts or datetime.min)
+    return out
+
+def normalize_messages(raw: Any, start_index: int = 0) -> List[MessageRecord]:
+    # start_index: vị trí message đầu tiên trong conversation (append từng phần - busqa.live)
     # ưu tiên lấy "messages", sau đó đến "data", cuối cùng là list gốc
     if isinstance(raw, dict):
         if isinstance(raw.get("messages"), list):
@@ -23,52 +147,27 @@ def normalize_messages(raw: Any) -> List[Message]:
     else:
         items = []
 
-    out: List[Message] = []
-    for i, m in enumerate(items):
-        if not isinstance(m, dict):
-            continue
-        text = _first_present(m, ["content", "text", "message", "body", "payload"], "") or ""
-        sender = (_first_present(m, ["role", "sender", "from", "author", "source"], "") or "").lower()
-        sender_name = _first_present(m, ["sender_name", "name", "display_name", "fromName"], None)
-        ts_raw = _first_present(m, ["ts", "timestamp", "createdAt", "created_at", "time"], None)
-
-        ts = None
-        if ts_raw is not None:
-            try:
-                if isinstance(ts_raw, (int, float)):
-                    if ts_raw > 10**12: ts = datetime.fromtimestamp(ts_raw/1000.0)
-                    elif ts_raw > 10**10: ts = datetime.fromtimestamp(ts_raw/1000.0)
-                    else: ts = datetime.fromtimestamp(ts_raw)
-                else:
-                    ts = dtparser.parse(str(ts_raw))
-            except Exception:
-                ts = None
-
-        stype = "unknown"
-        if any(k in sender for k in ["agent", "support", "staff", "cskh"]):
-            stype = "agent"
-        elif any(k in sender for k in ["user", "customer", "khach"]):
-            stype = "user"
-        elif "system" in sender:
-            stype = "system"
-        else:
-            stype = "user" if i == 0 else "agent"
-
-        out.append(Message(ts=ts, sender_type=stype, sender_name=sender_name, text=str(text).strip()))
+    return records_from_fields(_iter_dict_fields(items, start_index))
 
-    out.sort(key=lambda x: x.ts or datetime.min)
-    return out
-
-def build_transcript(messages: List[Message], max_chars: int = 24000) -> str:
+def build_transcript(messages: List[MessageRecord], max_chars: int = 24000) -> str:
     lines = []
-    for m in messages:
-        ts = m.ts.strftime("%Y-%m-%d %H:%M:%S") if m.ts is not None else "-"
-        who = "USER" if m.sender_type == "user" else ("AGENT" if m.sender_type == "agent" else m.sender_type.upper())
-        text = (m.text or "").replace("\n", " ").strip()
-        lines.append(f"[{ts}] {who}: {text}")
+    if isinstance(messages, ConversationFrame):
+        for i in range(len(messages)):
+            dt = messages.datetime_at(i)
+            ts = dt.strftime("%Y-%m-%d %H:%M:%S") if dt is not None else "-"
+            stype = messages.sender_type(i)
+            who = "USER" if stype == "user" else ("AGENT" if stype == "agent" else stype.upper())
+            text = messages.text(i).replace("\n", " ").strip()
+            lines.append(f"[{ts}] {who}: {text}")
+    else:
+        for m in messages:
+            ts = m.ts.strftime("%Y-%m-%d %H:%M:%S") if m.ts is not None else "-"
+            who = "USER" if m.sender_type == "user" else ("AGENT" if m.sender_type == "agent" else m.sender_type.upper())
+            text = (m.text or "").replace("\n", " ").strip()
+            lines.append(f"[{ts}] {who}: {text}")
     full = "\n".join(lines)
     if len(full) <= max_chars:
         return full
     head = full[: max_chars // 2]
     tail = full[- max_chars // 2 :]
-    return head + "\n...\n" + tail
\ No newline at end of file
+    return head + "\n...\n" + tail
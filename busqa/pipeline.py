@@ -0,0 +1,330 @@
+"""
+Continuous staged pipeline cho batch evaluator.
+
+Thay cho progressive batching (chia lô -> gather -> sleep -> lô kế): mỗi stage có
+pool worker riêng với giới hạn concurrency riêng, nối với nhau bằng bounded queue.
+Một slot LLM rảnh là lấy ngay item kế tiếp đã fetch/analyze xong, không phải chờ
+conversation chậm nhất của lô. Kết quả được trả ra theo thứ tự hoàn thành.
+"""
+import asyncio
+import contextlib
+import time
+import logging
+from dataclasses import dataclass
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Union
+
+from .concurrency import AIMDLimiter
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+@dataclass
+class Stage:
+    """
+    Một stage: async fn(item) -> item, chạy bởi `concurrency` worker.
+
+    Có `limiter` thì số worker là trần (limiter.config.max_limit), số call đồng thời
+    thực tế do limiter AIMD quyết định trong lúc chạy; item không thỏa `limited(item)`
+    chạy ngoài limiter (ví dụ payload inline không gọi ra ngoài - không làm lệch latency
+    tham chiếu). Item thỏa `bypass(item)` đi thẳng qua stage (không chiếm slot, không tính
+    vào stats) - ví dụ result lấy từ store.
+
+    Có `order_key` thì hàng chờ đầu vào của stage gom item cùng key thành các run liên
+    tiếp (ví dụ theo brand trước LLM stage); có `priority` thì lấy item có priority nhỏ
+    nhất trước (ví dụ SJF theo token). Không item nào bị vượt quá `reorder_window` lần nên
+    kết quả vẫn ra đều. order_key(item) là None -> item không thuộc nhóm nào.
+
+    Có `budget` (dispatch.TokenBudget) thì tổng `cost(item)` của các item đang chạy trong
+    stage không vượt budget; thời gian chờ budget không tính vào latency/timeout.
+    `admission(item)` trả async context manager của slot dùng chung ngoài pipeline (slot LLM
+    của process) - lấy sau budget và sau slot của limiter (worker đang chờ AIMD không giữ slot
+    chung); chờ slot cũng không tính vào latency/timeout.
+    """
+    name: str
+    fn: Callable[[Any], Awaitable[Any]]
+    concurrency: int = 1
+    timeout: Optional[float] = None
+    limiter: Optional[AIMDLimiter] = None
+    bypass: Optional[Callable[[Any], bool]] = None
+    limited: Optional[Callable[[Any], bool]] = None  # None -> mọi item qua limiter
+    order_key: Optional[Callable[[Any], Any]] = None
+    priority: Optional[Callable[[Any], Optional[float]]] = None
+    reorder_window: int = 16
+    budget: Optional[Any] = None
+    cost: Optional[Callable[[Any], int]] = None
+    admission: Optional[Callable[[Any], Any]] = None
+
+    def __post_init__(self):
+        if self.limiter is not None:
+            self.concurrency = self.limiter.config.max_limit
+
+
+class _Envelope:
+    __slots__ = ("key", "item", "error", "failed_stage")
+
+    def __init__(self, key: Any, item: Any):
+        self.key = key
+        self.item = item
+        self.error: Optional[BaseException] = None
+        self.failed_stage: Optional[str] = None
+
+
+class _ReorderQueue(asyncio.Queue):
+    """
+    Bounded queue lấy item theo run của key rồi theo priority: tiếp tục key đang chạy khi
+    còn item cùng key; trong nhóm được chọn lấy item có priority nhỏ nhất (None ra trước,
+    hòa thì theo thứ tự đến). Item cũ nhất đã bị vượt `window` lần được lấy ngay.
+    _DONE chỉ ra khi không còn item nào (worker không thoát sớm).
+    """
+
+    def __init__(self, maxsize: int, window: int, key: Optional[Callable[[Any], Any]] = None,
+                 priority: Optional[Callable[[Any], Optional[float]]] = None):
+        self._key = key
+        self._priority = priority
+        self._window = max(0, window)
+        super().__init__(maxsize)
+
+    def _init(self, maxsize):
+        self._queue: List[list] = []  # [envelope, key, priority, số lần bị vượt] theo thứ tự đến
+        self._done: List[Any] = []
+        self._current = None
+        self.reordered = 0
+        self.switches = 0
+
+    def qsize(self) -> int:
+        return len(self._queue) + len(self._done)
+
+    def empty(self) -> bool:
+        return not self._queue and not self._done
+
+    def _put(self, env):
+        if env is _DONE:
+            self._done.append(env)
+            return
+        key = self._key(env.item) if self._key is not None else None
+        priority = self._priority(env.item) if self._priority is not None else None
+        self._queue.append([env, key, priority, 0])
+
+    def _rank(self, idx: int) -> tuple:
+        priority = self._queue[idx][2]
+        return (0, 0.0, idx) if priority is None else (1, priority, idx)
+
+    def _get(self):
+        if not self._queue:
+            return self._done.pop()
+        pick = 0
+        if self._queue[0][3] < self._window:
+            pool = [i for i, entry in enumerate(self._queue) if entry[1] == self._current] \
+                if self._current is not None else []
+            pool = pool or range(len(self._queue))
+            pick = min(pool, key=self._rank) if self._priority is not None else pool[0]
+        env, key, _, _ = self._queue.pop(pick)
+        for entry in self._queue[:pick]:
+            entry[3] += 1
+        if pick:
+            self.reordered += 1
+        if key is not None and key != self._current:
+            self._current = key
+            self.switches += 1
+        return env
+
+
+class _StageStats:
+    __slots__ = ("processed", "errors", "busy_seconds", "max_latency", "max_queue_depth")
+
+    def __init__(self):
+        self.processed = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.max_latency = 0.0
+        self.max_queue_depth = 0
+
+
+class StagedPipeline:
+    """
+    Chạy items qua chuỗi stage nối bằng bounded queue.
+
+    Item lỗi ở một stage đi thẳng ra output (bỏ qua các stage sau) và được chuyển
+    thành kết quả bởi `on_error(item, exc, stage_name)`. `finalize(item)` chuyển item
+    thành kết quả khi đi hết pipeline.
+    """
+
+    def __init__(
+        self,
+        stages: List[Stage],
+        queue_size: int = 32,
+        finalize: Optional[Callable[[Any], Any]] = None,
+        on_error: Optional[Callable[[Any, BaseException, str], Any]] = None,
+    ):
+        if not stages:
+            raise ValueError("pipeline needs at least one stage")
+        self.stages = stages
+        self.queue_size = max(1, queue_size)
+        self.finalize = finalize or (lambda item: item)
+        self.on_error = on_error
+        self.stats: Dict[str, _StageStats] = {s.name: _StageStats() for s in stages}
+        self._reorder: Dict[str, _ReorderQueue] = {}
+        self._started_at: Optional[float] = None
+        self._finished_at: Optional[float] = None
+
+    async def run(self, items: Union[Iterable[Any], AsyncIterable[Any]]) -> AsyncIterator[Any]:
+        """
+        Async iterator: đưa items vào pipeline, yield kết quả theo thứ tự hoàn thành.
+
+        `items` có thể là async iterable (ví dụ conversation đang được fetch theo trang):
+        item vào stage đầu ngay khi nguồn trả ra. Nguồn lỗi thì các item đã vào vẫn chạy
+        hết, sau đó lỗi của nguồn được raise lại.
+        """
+        queues = [self._make_queue(stage) for stage in self.stages]
+        output: asyncio.Queue = asyncio.Queue()
+        tasks: List[asyncio.Task] = []
+        feed_error: List[BaseException] = []
+        self._started_at = time.perf_counter()
+
+        async def feed():
+            try:
+                if hasattr(items, "__aiter__"):
+                    key = 0
+                    async for item in items:
+                        await queues[0].put(_Envelope(key, item))
+                        key += 1
+                else:
+                    for key, item in enumerate(items):
+                        await queues[0].put(_Envelope(key, item))
+            except Exception as e:
+                feed_error.append(e)
+            for _ in range(self.stages[0].concurrency):
+                await queues[0].put(_DONE)
+
+        async def worker(idx: int, remaining: List[int]):
+            stage = self.stages[idx]
+            stats = self.stats[stage.name]
+            inq = queues[idx]
+            last = idx == len(self.stages) - 1
+            while True:
+                stats.max_queue_depth = max(stats.max_queue_depth, inq.qsize())
+                env = await inq.get()
+                if env is _DONE:
+                    remaining[0] -= 1
+                    # Worker cuối cùng của stage báo hết cho stage sau
+                    if remaining[0] == 0:
+                        if last:
+                            await output.put(_DONE)
+                        else:
+                            for _ in range(self.stages[idx + 1].concurrency):
+                                await queues[idx + 1].put(_DONE)
+                    return
+                if stage.bypass is not None and stage.bypass(env.item):
+                    await (output if last else queues[idx + 1]).put(env)
+                    continue
+                t0 = time.perf_counter()
+                try:
+                    async with self._budget(stage, env.item):
+                        if stage.limiter is not None and (stage.limited is None or stage.limited(env.item)):
+                            async with stage.limiter.slot(self._admission(stage, env.item)):
+                                t0 = time.perf_counter()  # không tính thời gian chờ slot
+                                env.item = await self._call(stage, env.item)
+                        else:
+                            async with self._admission(stage, env.item):
+                                t0 = time.perf_counter()
+                                env.item = await self._call(stage, env.item)
+                except Exception as e:
+                    env.error = e
+                    env.failed_stage = stage.name
+                    stats.errors += 1
+                elapsed = time.perf_counter() - t0
+                stats.processed += 1
+                stats.busy_seconds += elapsed
+                stats.max_latency = max(stats.max_latency, elapsed)
+                if env.error is not None or last:
+                    await output.put(env)
+                else:
+                    await queues[idx + 1].put(env)
+
+        try:
+            tasks.append(asyncio.create_task(feed()))
+            for idx, stage in enumerate(self.stages):
+                remaining = [stage.concurrency]
+                for _ in range(stage.concurrency):
+                    tasks.append(asyncio.create_task(worker(idx, remaining)))
+
+            while True:
+                env = await output.get()
+                if env is _DONE:
+                    # Item lỗi có thể vào output sau khi stage cuối đã báo xong
+                    while not output.empty():
+                        yield self._to_result(output.get_nowait())
+                    break
+                yield self._to_result(env)
+            if feed_error:
+                raise feed_error[0]
+        finally:
+            self._finished_at = time.perf_counter()
+            for t in tasks:
+                if not t.done():
+                    t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _make_queue(self, stage: Stage) -> asyncio.Queue:
+        if stage.order_key is None and stage.priority is None:
+            return asyncio.Queue(self.queue_size)
+        # Buffer đủ rộng để sắp xếp: item đầu vào chờ tối đa reorder_window lượt
+        queue = _ReorderQueue(max(self.queue_size, stage.reorder_window), stage.reorder_window,
+                              key=stage.order_key, priority=stage.priority)
+        self._reorder[stage.name] = queue
+        return queue
+
+    @staticmethod
+    def _budget(stage: Stage, item: Any):
+        if stage.budget is None:
+            return contextlib.nullcontext()
+        return stage.budget.slot(stage.cost(item))
+
+    @staticmethod
+    def _admission(stage: Stage, item: Any):
+        if stage.admission is None:
+            return contextlib.nullcontext()
+        return stage.admission(item)
+
+    @staticmethod
+    async def _call(stage: Stage, item: Any) -> Any:
+        if stage.timeout:
+            return await asyncio.wait_for(stage.fn(item), timeout=stage.timeout)
+        return await stage.fn(item)
+
+    def _to_result(self, env: _Envelope) -> Any:
+        if env.error is None:
+            return self.finalize(env.item)
+        if self.on_error:
+            return self.on_error(env.item, env.error, env.failed_stage)
+        raise env.error
+
+    def get_stats(self) -> Dict[str, Any]:
+        end = self._finished_at or time.perf_counter()
+        wall = (end - self._started_at) if self._started_at else 0.0
+        out: Dict[str, Any] = {"wall_seconds": round(wall, 3), "stages": {}}
+        for stage in self.stages:
+            s = self.stats[stage.name]
+            slots = stage.limiter.avg_limit() if stage.limiter is not None else stage.concurrency
+            capacity = wall * slots
+            out["stages"][stage.name] = {
+                "concurrency": stage.concurrency,
+                "processed": s.processed,
+                "errors": s.errors,
+                "avg_latency_ms": round(s.busy_seconds / s.processed * 1000, 2) if s.processed else 0.0,
+                "max_latency_ms": round(s.max_latency * 1000, 2),
+                "utilization": round(s.busy_seconds / capacity, 3) if capacity else 0.0,
+                "max_queue_depth": s.max_queue_depth,
+            }
+            if stage.name in self._reorder:
+                queue = self._reorder[stage.name]
+                out["stages"][stage.name]["reorder"] = {"window": stage.reorder_window,
+                                                        "reordered": queue.reordered, "runs": queue.switches}
+            if stage.budget is not None:
+                out["stages"][stage.name]["token_budget"] = stage.budget.get_stats()
+            if stage.limiter is not None:
+                out["stages"][stage.name]["concurrency"] = stage.limiter.limit
+                out["stages"][stage.name]["adaptive"] = stage.limiter.get_stats()
+        return out
@@ -6,7 +6,7 @@ Analyzes evaluation summary to identify specific prompt issues and provide preci
 import json
 import os
 from typing import Dict, List, Any, Optional
-from busqa.prompt_loader import load_unified_rubrics
+from busqa.config_registry import current_rubrics
 
 
 class PromptDoctor:
@@ -23,7 +23,7 @@ class PromptDoctor:
             llm_client: Optional LLM client instance. If None, will create default.
         """
         self.llm_client = llm_client
-        self.rubrics_cfg = load_unified_rubrics()
+        self.rubrics_cfg = current_rubrics()
         
         if not self.llm_client:
             try:
@@ -0,0 +1,250 @@
+"""
+Offline re-scoring: áp dụng lại rubric weights / penalties lên result set đã có mà không gọi LLM.
+
+Mỗi result cần có "llm_raw" (JSON gốc của LLM) và "diagnostics_hits" - được lưu từ khi
+đánh giá. Engine tái hiện đúng chuỗi tính điểm của coerce_llm_json_unified:
+ensure_full_criteria -> apply_policy_and_flow_penalties -> apply_diagnostics_penalties ->
+recompute_total -> label_from_score, nhưng chạy trên mảng numpy cho cả result set với
+bảng penalty compile một lần (index theo hit key) thay vì scan config cho từng hit.
+"""
+import gc
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .evaluator import POLICY_FLOW_PENALTIES, compile_penalty_index
+
+logger = logging.getLogger(__name__)
+
+
+class CompiledScoring:
+    """Rubric + diagnostics config compile thành mảng: weights, labels, bảng penalty theo hit key"""
+
+    def __init__(self, rubrics_cfg: dict, diagnostics_cfg: Optional[dict] = None):
+        self.criteria: List[str] = list(rubrics_cfg["criteria"].keys())
+        self.col = {c: i for i, c in enumerate(self.criteria)}
+        self.weights = np.array([float(w) for w in rubrics_cfg["criteria"].values()])
+        labels = rubrics_cfg.get("labels", [])
+        self.label_names = [l["label"] for l in labels] + ["Kém"]
+        self.label_thresholds = [float(l["threshold"]) for l in labels]
+
+        # Policy/flow penalties theo metrics (thứ tự cố định như evaluator)
+        self.policy_rules = [
+            (metric, self.col[criterion], rule.get("clamp_max"), rule.get("delta"), note)
+            for metric, criterion, rule, note in POLICY_FLOW_PENALTIES
+            if criterion in self.col
+        ]
+
+        # Diagnostics: hit key -> hàng trong bảng; hàng cuối (toàn NaN) cho key không có trong config
+        self.diagnostics_enabled = bool(diagnostics_cfg)
+        index = compile_penalty_index(diagnostics_cfg or {})
+        self.hit_row = {key: i for i, key in enumerate(index)}
+        n_rows = len(index) + 1
+        self.hit_delta = np.full((n_rows, len(self.criteria)), np.nan)
+        self.hit_clamp = np.full((n_rows, len(self.criteria)), np.nan)
+        # hit key -> các criterion bị penalty (để ghi note)
+        self.hit_criteria: Dict[str, List[str]] = {}
+        for key, penalty in index.items():
+            row = self.hit_row[key]
+            touched = []
+            for criterion, rules in penalty.items():
+                if criterion not in self.col:
+                    continue
+                touched.append(criterion)
+                if "delta" in rules:
+                    self.hit_delta[row, self.col[criterion]] = rules["delta"]
+                if "clamp_max" in rules:
+                    self.hit_clamp[row, self.col[criterion]] = rules["clamp_max"]
+            self.hit_criteria[key] = touched
+        self.unknown_row = n_rows - 1
+
+    def labels_for(self, totals: np.ndarray) -> np.ndarray:
+        """label_from_score vectorized: label đầu tiên có score >= threshold"""
+        idx = np.full(len(totals), len(self.label_names) - 1)
+        for i in range(len(self.label_thresholds) - 1, -1, -1):
+            idx[totals >= self.label_thresholds[i]] = i
+        return idx
+
+    def weighted_totals(self, scores: np.ndarray) -> List[float]:
+        """recompute_total: cộng theo đúng thứ tự criteria rồi round như Python"""
+        total = np.zeros(scores.shape[0])
+        for c in range(scores.shape[1]):
+            total += scores[:, c] * self.weights[c]
+        return [round(t, 2) for t in total.tolist()]
+
+
+def _hits_of(diagnostics_hits: dict) -> List[dict]:
+    return list(diagnostics_hits.get("operational_readiness", [])) + list(diagnostics_hits.get("risk_compliance", []))
+
+
+def rescore_results(
+    results: List[Dict[str, Any]],
+    rubrics_cfg: dict,
+    diagnostics_cfg: Optional[dict] = None,
+    update_notes: bool = True,
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Tính lại criteria/total_score/label cho toàn bộ result set từ llm_raw + hits đã lưu.
+
+    Result lỗi hoặc không có llm_raw (đánh giá trước khi lưu raw) được giữ nguyên.
+    Policy penalties áp dụng khi result có metrics; diagnostics penalties áp dụng khi
+    có diagnostics_cfg và result có diagnostics_hits - giống điều kiện trong coerce.
+
+    Returns:
+        (results đã re-score theo thứ tự cũ, stats)
+    """
+    # Tạo hàng trăm nghìn dict nhỏ làm GC quét lại cả result set nhiều lần - tạm tắt trong lúc chạy
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _rescore(results, rubrics_cfg, diagnostics_cfg, update_notes)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def _rescore(results, rubrics_cfg, diagnostics_cfg, update_notes):
+    start = time.perf_counter()
+    table = CompiledScoring(rubrics_cfg, diagnostics_cfg)
+    positions = [i for i, r in enumerate(results) if "error" not in r and isinstance(r.get("llm_raw"), dict)]
+    n, k = len(positions), len(table.criteria)
+
+    score_rows: List[List[float]] = []
+    metric_rows: List[List[float]] = []
+    llm_totals: List[float] = []
+    llm_labels: List[Any] = []
+    policy_flags: List[bool] = []
+    diag_flags: List[bool] = []
+    hit_seqs: List[List[int]] = []
+    criteria_keys = table.criteria
+    policy_metrics = [rule[0] for rule in table.policy_rules]
+    no_hits: List[int] = []
+
+    # Gom input thành list thuần rồi chuyển sang numpy một lần (ensure_full_criteria)
+    for pos in positions:
+        r = results[pos]
+        raw = r["llm_raw"]
+        crit = raw.get("criteria") or {}
+        score_rows.append([float(v.get("score", 0) or 0) if isinstance(v := crit.get(key), dict) else 0.0
+                           for key in criteria_keys])
+        llm_totals.append(float(raw.get("total_score", 0.0) or 0.0))
+        llm_labels.append(raw.get("label"))
+        metrics = r.get("metrics")
+        policy_flags.append(bool(metrics))
+        metric_rows.append([metrics.get(m, 0) or 0 for m in policy_metrics] if metrics else [0] * len(policy_metrics))
+        hits = r.get("diagnostics_hits")
+        if table.diagnostics_enabled and hits:
+            diag_flags.append(True)
+            hit_seqs.append([table.hit_row.get(h["key"], table.unknown_row) for h in _hits_of(hits)])
+        else:
+            diag_flags.append(False)
+            hit_seqs.append(no_hits)
+
+    scores = np.array(score_rows, dtype=float).reshape(n, k)
+    metric_values = np.array(metric_rows, dtype=float).reshape(n, len(policy_metrics))
+    llm_totals = np.array(llm_totals, dtype=float)
+    policy_active = np.array(policy_flags, dtype=bool)
+    diag_active = np.array(diag_flags, dtype=bool)
+    del score_rows, metric_rows
+
+    # total/label ban đầu như coerce: dùng total của LLM trừ khi lệch > 0.1 so với tính lại
+    recalculated = np.array(table.weighted_totals(scores)) if n else np.zeros(0)
+    base_totals = np.where(np.abs(recalculated - llm_totals) > 0.1, recalculated, llm_totals)
+
+    # Policy/flow penalties - mỗi rule là một phép toán trên cả cột
+    for j, (_, c, clamp_max, delta, _) in enumerate(table.policy_rules):
+        mask = policy_active & (metric_values[:, j] > 0)
+        if clamp_max is not None:
+            scores[mask, c] = np.minimum(clamp_max, scores[mask, c])
+        else:
+            scores[mask, c] = np.maximum(0, scores[mask, c] + delta)
+
+    # Diagnostics penalties: xử lý hit thứ p của mọi result cùng lúc để giữ đúng thứ tự áp dụng
+    max_hits = max((len(s) for s in hit_seqs), default=0)
+    if max_hits:
+        seq = np.full((n, max_hits), -1)
+        for row, s in enumerate(hit_seqs):
+            seq[row, :len(s)] = s
+        for p in range(max_hits):
+            rows = np.nonzero(seq[:, p] >= 0)[0]
+            keys = seq[rows, p]
+            current = scores[rows]
+            delta = table.hit_delta[keys]
+            clamp = table.hit_clamp[keys]
+            new = np.where(np.isnan(delta), current, np.clip(current + np.nan_to_num(delta), 0, 100))
+            # clamp_max so với score trước delta (giống apply_diagnostics_penalties)
+            new = np.where(~np.isnan(clamp) & (current > clamp), clamp, new)
+            scores[rows] = new
+
+    active = policy_active | diag_active
+    final_totals = np.array(table.weighted_totals(scores)) if n else np.zeros(0)
+    final_label_idx = table.labels_for(final_totals)
+    base_label_idx = table.labels_for(base_totals)
+
+    totals = np.where(active, final_totals, base_totals).tolist()
+    label_names = table.label_names
+    final_labels = [label_names[i] for i in final_label_idx.tolist()]
+    base_labels = [label_names[i] for i in base_label_idx.tolist()]
+    active_list = active.tolist()
+
+    out = list(results)
+    changed_labels = 0
+    deltas = []
+    for row, (pos, row_scores) in enumerate(zip(positions, scores.tolist())):
+        r = results[pos]
+        total = totals[row]
+        if active_list[row]:
+            label = final_labels[row]
+        else:
+            label = llm_labels[row] or base_labels[row]
+
+        criteria = {key: {"score": sc, "note": "missing"} for key, sc in zip(criteria_keys, row_scores)}
+        if update_notes:
+            _fill_notes(criteria, r["llm_raw"], r, table, policy_flags[row], diag_flags[row])
+
+        previous = r.get("result", {}) or {}
+        prev_total = previous.get("total_score")
+        if prev_total is not None:
+            deltas.append(total - float(prev_total))
+        if previous.get("label") != label:
+            changed_labels += 1
+        out[pos] = {**r, "result": {**previous, "criteria": criteria, "total_score": total, "label": label}}
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        "rescored": n,
+        "skipped": len(results) - n,
+        "labels_changed": changed_labels,
+        "avg_score_delta": round(float(np.mean(deltas)), 3) if deltas else 0.0,
+        "rubric_version": rubrics_cfg.get("version"),
+        "elapsed_seconds": round(elapsed, 3),
+    }
+    logger.info(f"Re-scored {n} results in {elapsed:.2f}s ({stats['skipped']} skipped)")
+    return out, stats
+
+
+def _fill_notes(criteria: dict, raw: dict, r: dict, table: CompiledScoring, policy_on: bool, diag_on: bool) -> None:
+    """Dựng lại note giống chuỗi note của coerce (note LLM + tag penalty + Diag evidence)"""
+    crit = raw.get("criteria", {}) or {}
+    for key in criteria:
+        v = crit.get(key)
+        if isinstance(v, dict):
+            criteria[key]["note"] = str(v.get("note", ""))
+
+    if policy_on:
+        metrics = r.get("metrics") or {}
+        for metric, c, _, _, note in table.policy_rules:
+            if (metrics.get(metric, 0) or 0) > 0:
+                criteria[table.criteria[c]]["note"] += f" [{note}]"
+
+    if diag_on:
+        for hit in _hits_of(r.get("diagnostics_hits") or {}):
+            touched = table.hit_criteria.get(hit["key"])
+            if not touched:
+                continue
+            diag_note = f"Diag: {hit['key']} — evidence: {'; '.join(hit.get('evidence', [])[:2])}"
+            for criterion in touched:
+                current = criteria[criterion]["note"]
+                criteria[criterion]["note"] = f"{current}. {diag_note}" if current and current != "missing" else diag_note
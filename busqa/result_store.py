@@ -0,0 +1,239 @@
+"""
+Persistent result store: bỏ qua đánh giá lại khi không có gì liên quan thay đổi.
+
+Mỗi result thành công được lưu (SQLite) theo conversation_id và khóa
+(content_hash, brand_hash, eval_hash):
+- content_hash: nội dung conversation sau normalize (ConversationFrame.content_hash)
+- brand_hash: brand prompt text + BrandPolicy
+- eval_hash: rubric config, diagnostics config, model, temperature
+
+Batch evaluator còn tra theo conversation_id trước khi fetch - chỉ với result chấm từ bản fetch
+qua API (`fetched`); payload inline có thể là snapshot dở dang (/evaluate/single, live) nên chỉ
+được dùng lại qua content_hash.
+Đánh đổi của tra theo ID: bỏ được cả fetch, nhưng giả định conversation đã đóng không đổi nội
+dung - conversation có thêm message ở upstream sau khi chấm sẽ trả result cũ. Nguồn còn có thể
+đổi thì bật `verify_content` (API field verify_content, CLI --verify-content): luôn fetch rồi so
+content_hash, vẫn bỏ qua LLM khi nội dung không đổi; force_refresh chấm lại tất cả.
+Lỗi không bao giờ được lưu.
+Bảng signatures / signature_bands là LSH index của busqa.near_duplicate.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+from dataclasses import asdict, is_dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESULT_STORE_PATH = os.getenv("BUSQA_RESULT_STORE", "data/results.sqlite")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    content_hash TEXT NOT NULL,
+    brand_hash TEXT NOT NULL,
+    eval_hash TEXT NOT NULL,
+    conversation_id TEXT NOT NULL,
+    bot_id TEXT,
+    result_json TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    fetched INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (conversation_id, content_hash, brand_hash, eval_hash)
+);
+CREATE INDEX IF NOT EXISTS idx_results_content ON results (content_hash, brand_hash, eval_hash);
+CREATE INDEX IF NOT EXISTS idx_results_conversation ON results (conversation_id, eval_hash, created_at);
+CREATE TABLE IF NOT EXISTS signatures (
+    id INTEGER PRIMARY KEY,
+    scope TEXT NOT NULL,
+    conversation_id TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    signature BLOB NOT NULL,
+    UNIQUE (scope, content_hash)
+);
+CREATE TABLE IF NOT EXISTS signature_bands (
+    scope TEXT NOT NULL,
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    signature_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_signature_bands ON signature_bands (scope, band, bucket);
+"""
+
+
+def fingerprint(obj: Any) -> str:
+    """Hash ổn định của config/object JSON-able (dict sort key)"""
+    if is_dataclass(obj) and not isinstance(obj, type):
+        obj = asdict(obj)
+    data = json.dumps(obj, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(data.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def brand_fingerprint(brand_prompt_text: Optional[str], brand_policy: Any) -> str:
+    if is_dataclass(brand_policy):
+        policy = asdict(brand_policy)
+    else:
+        policy = getattr(brand_policy, "__dict__", brand_policy)
+    return fingerprint([brand_prompt_text or "", policy])
+
+
+def eval_fingerprint(rubrics_cfg: dict, diagnostics_cfg: Optional[dict], model: str, temperature: float) -> str:
+    return fingerprint([rubrics_cfg, diagnostics_cfg, model, float(temperature)])
+
+
+class ResultStore:
+    """SQLite result store, dùng chung được giữa event loop và worker thread"""
+
+    def __init__(self, path: str = DEFAULT_RESULT_STORE_PATH):
+        self.path = path
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(results)")}
+        if "fetched" not in columns:
+            # Store cũ: không biết nguồn -> coi như inline, không phục vụ tra theo ID
+            self._conn.execute("ALTER TABLE results ADD COLUMN fetched INTEGER NOT NULL DEFAULT 0")
+        self.counters = {"lookups": 0, "hits": 0, "prefetch_hits": 0, "misses": 0,
+                         "near_duplicate_hits": 0, "writes": 0, "forced_refresh": 0}
+
+    def get(self, content_hash: str, brand_hash: str, eval_hash: str) -> Optional[Dict[str, Any]]:
+        """Tra theo nội dung (sau khi đã có conversation) - dùng được cho cả conversation_id khác"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result_json, created_at, rowid FROM results "
+                "WHERE content_hash = ? AND brand_hash = ? AND eval_hash = ? "
+                "ORDER BY created_at DESC LIMIT 1",
+                (content_hash, brand_hash, eval_hash)).fetchone()
+            self.counters["lookups"] += 1
+            if row is None:
+                self.counters["misses"] += 1
+                return None
+            self.counters["hits"] += 1
+            self._conn.execute("UPDATE results SET hits = hits + 1 WHERE rowid = ?", (row[2],))
+        return self._load(row[0], row[1])
+
+    def peek(self, content_hash: str, brand_hash: str, eval_hash: str) -> Optional[Dict[str, Any]]:
+        """Như get nhưng không tính vào hit/miss"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result_json, created_at FROM results "
+                "WHERE content_hash = ? AND brand_hash = ? AND eval_hash = ? "
+                "ORDER BY created_at DESC LIMIT 1",
+                (content_hash, brand_hash, eval_hash)).fetchone()
+        return self._load(row[0], row[1]) if row is not None else None
+
+    def get_latest(self, conversation_id: str, eval_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Result mới nhất của conversation_id với cùng eval config - tra trước khi fetch.
+        Chỉ result chấm từ bản fetch qua API; snapshot inline có thể chưa đủ message.
+
+        Trả về {"brand_hash", "bot_id", "content_hash", "row_id", "result"}; caller tự kiểm brand_hash
+        (multi-brand: brand phụ thuộc bot_id của conversation).
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result_json, created_at, brand_hash, bot_id, content_hash, rowid FROM results "
+                "WHERE conversation_id = ? AND eval_hash = ? AND fetched = 1 ORDER BY created_at DESC LIMIT 1",
+                (conversation_id, eval_hash)).fetchone()
+        if row is None:
+            return None
+        return {"result": self._load(row[0], row[1]), "brand_hash": row[2], "bot_id": row[3],
+                "content_hash": row[4], "row_id": row[5]}
+
+    def record_prefetch_hit(self, row_id: int) -> None:
+        """
+        Hit khi tra trước khi fetch (caller quyết định sau khi kiểm brand). Miss không tính ở đây:
+        conversation đó sẽ được tra lại theo nội dung sau khi fetch - mỗi conversation một lookup.
+        """
+        with self._lock:
+            self.counters["lookups"] += 1
+            self.counters["hits"] += 1
+            self.counters["prefetch_hits"] += 1
+            self._conn.execute("UPDATE results SET hits = hits + 1 WHERE rowid = ?", (row_id,))
+
+    def record_forced_refresh(self) -> None:
+        with self._lock:
+            self.counters["forced_refresh"] += 1
+
+    def record_near_duplicate_hit(self) -> None:
+        with self._lock:
+            self.counters["near_duplicate_hits"] += 1
+
+    # LSH index cho near-duplicate
+
+    def add_signature(self, scope: str, conversation_id: str, content_hash: str, signature: bytes,
+                      band_keys: List[int]) -> None:
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT OR IGNORE INTO signatures (scope, conversation_id, content_hash, signature) "
+                "VALUES (?, ?, ?, ?)", (scope, str(conversation_id), content_hash, signature))
+            if cur.rowcount != 1:
+                return  # cùng nội dung đã có trong index
+            self._conn.executemany(
+                "INSERT INTO signature_bands (scope, band, bucket, signature_id) VALUES (?, ?, ?, ?)",
+                [(scope, band, key, cur.lastrowid) for band, key in enumerate(band_keys)])
+
+    def signature_candidates(self, scope: str, band_keys: List[int],
+                             limit: int = 50) -> List[Tuple[int, str, str, bytes]]:
+        """Signature chung ít nhất một band bucket: (id, conversation_id, content_hash, signature)"""
+        if not band_keys:
+            return []
+        match = " OR ".join(["(b.band = ? AND b.bucket = ?)"] * len(band_keys))
+        params: List[Any] = [scope]
+        for band, key in enumerate(band_keys):
+            params += [band, key]
+        with self._lock:
+            return self._conn.execute(
+                "SELECT DISTINCT s.id, s.conversation_id, s.content_hash, s.signature "
+                "FROM signature_bands b JOIN signatures s ON s.id = b.signature_id "
+                f"WHERE b.scope = ? AND ({match}) LIMIT ?", params + [limit]).fetchall()
+
+    def put(self, conversation_id: str, content_hash: str, brand_hash: str, eval_hash: str,
+            result: Dict[str, Any], bot_id: Optional[str] = None, fetched: bool = False) -> None:
+        if "error" in result:
+            return
+        stored = {k: v for k, v in result.items() if k != "cached"}
+        data = json.dumps(stored, ensure_ascii=False, default=str)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (conversation_id, content_hash, brand_hash, eval_hash, bot_id, "
+                "result_json, created_at, hits, fetched) VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?)",
+                (str(conversation_id), content_hash, brand_hash, eval_hash,
+                 str(bot_id) if bot_id is not None else None, data, time.time(), int(fetched)))
+            self.counters["writes"] += 1
+
+    @staticmethod
+    def _load(result_json: str, created_at: float) -> Dict[str, Any]:
+        result = json.loads(result_json)
+        result["cached"] = {"stored_at": datetime.utcfromtimestamp(created_at).isoformat() + "Z"}
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, total_hits = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM results").fetchone()
+            signatures = self._conn.execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+            counters = dict(self.counters)
+        lookups = counters["lookups"]
+        return {
+            **counters,
+            "hit_rate": round(counters["hits"] / lookups, 4) if lookups else 0.0,
+            # Tỷ lệ LLM call tránh được: trùng nội dung + near-duplicate
+            "reuse_rate": round((counters["hits"] + counters["near_duplicate_hits"]) / lookups, 4) if lookups else 0.0,
+            "entries": entries,
+            "signatures": signatures,
+            "lifetime_hits": total_hits,
+            "path": self.path,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,316 @@
+"""
+Conversation selection: lọc theo ngày / số turn, top-N theo ngày, lấy mẫu ngẫu nhiên
+đều hoặc phân tầng (theo ngày, flow, nhóm số turn).
+
+SelectionQuery dùng chung cho ba engine:
+- ConversationStore.select: chạy bằng SQL trên index (bot_id, created_ts / turns) -
+  chỉ đọc conversation_id của phần được chọn rồi mới load frame.
+- select_in_memory: cho list đã fetch - created_at parse một lần mỗi conversation,
+  top-N bằng heapq (không sort cả list), random bằng sample index.
+- StreamingSelector / stream_select: cho trang list API đang về - giữ reservoir giới hạn
+  (bottom-k theo rank ngẫu nhiên, top-N theo khóa sort), bộ nhớ không phụ thuộc số trang.
+
+    query = SelectionQuery(take=50, strategy="stratified", stratify_by="day", since="2025-01-01")
+    selected = store.select(query, bot_id="3794")
+    selected, stats = await stream_select(AsyncListFetcher(fetch_config), query)
+"""
+import hashlib
+import heapq
+import math
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from .normalize import _parse_ts, _sniff_ts_format
+
+STRATEGIES = ("head", "tail", "newest", "oldest", "random", "stratified")
+STRATA = ("day", "flow", "turns")
+TURN_BUCKETS = (5, 10, 20, 40)  # cận trên của từng nhóm số turn
+MAX_STREAM_STRATA = 32  # StreamingSelector: tầng thứ 33 trở đi gộp vào OVERFLOW_STRATUM
+OVERFLOW_STRATUM = "other"
+
+Timestamp = Union[None, int, float, str]
+
+
+@dataclass
+class SelectionQuery:
+    """Truy vấn chọn conversation (take/skip/strategy/sort giống select_conversations cũ)"""
+    take: int = 10
+    skip: int = 0
+    strategy: str = "head"
+    sort_by: str = "created_at"  # created_at | length (cho head/tail)
+    order: str = "desc"
+    min_turns: int = 0
+    max_turns: Optional[int] = None
+    since: Timestamp = None  # created_at >= since (epoch hoặc chuỗi ngày/giờ)
+    until: Timestamp = None  # created_at < until
+    stratify_by: str = "day"  # cho strategy="stratified"
+    allocation: str = "proportional"  # proportional | equal
+    seed: Optional[int] = None
+
+    def __post_init__(self):
+        if self.strategy not in STRATEGIES:
+            raise ValueError(f"Unknown selection strategy '{self.strategy}' (expected one of {STRATEGIES})")
+        if self.strategy == "stratified" and self.stratify_by not in STRATA:
+            raise ValueError(f"Unknown stratum '{self.stratify_by}' (expected one of {STRATA})")
+        self.take = max(0, int(self.take))
+        self.skip = max(0, int(self.skip))
+
+    def window(self):
+        """(since, until) dạng epoch"""
+        return to_epoch(self.since), to_epoch(self.until)
+
+    def sample_seed(self) -> int:
+        return self.seed if self.seed is not None else random.randrange(2 ** 31)
+
+
+def to_epoch(value: Timestamp) -> Optional[float]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    parsed = _parse_ts(value, _sniff_ts_format(value))
+    if parsed is None:
+        raise ValueError(f"Invalid date/time: {value!r}")
+    return parsed.timestamp()
+
+
+def created_ts(conversation: Any) -> float:
+    """Epoch của created_at; thiếu/không parse được thì lấy message đầu tiên có timestamp (frame)"""
+    raw = conversation.get("created_at")
+    if raw not in (None, ""):
+        parsed = _parse_ts(raw, _sniff_ts_format(raw))
+        if parsed is not None:
+            return parsed.timestamp()
+    frame_ts = getattr(conversation.get("messages"), "ts", None)
+    for t in frame_ts or ():
+        if not math.isnan(t):
+            return t
+    return 0.0
+
+
+def day_of(ts: float) -> str:
+    """Ngày (UTC) - khớp date(created_ts, 'unixepoch') của SQLite"""
+    return time.strftime("%Y-%m-%d", time.gmtime(ts))
+
+
+def turn_bucket(turns: int) -> str:
+    low = 1
+    for high in TURN_BUCKETS:
+        if turns <= high:
+            return f"{low}-{high}"
+        low = high + 1
+    return f"{low}+"
+
+
+def sample_rank(conversation_id: Any, seed: int) -> int:
+    """Thứ hạng ngẫu nhiên ổn định theo (seed, conversation_id) - cùng seed, cùng mẫu ở mọi engine"""
+    digest = hashlib.blake2b(f"{seed}:{conversation_id}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") >> 1  # SQLite INTEGER có dấu
+
+
+def allocate(counts: Dict[str, int], take: int, equal: bool = False) -> Dict[str, int]:
+    """Chia `take` cho các tầng (largest remainder, không vượt số conversation của tầng)"""
+    total = sum(counts.values())
+    if total <= take:
+        return dict(counts)
+    if equal:
+        quotas = {s: take / len(counts) for s in counts}
+    else:
+        quotas = {s: take * n / total for s, n in counts.items()}
+    alloc = {s: min(counts[s], int(q)) for s, q in quotas.items()}
+    remaining = take - sum(alloc.values())
+    while remaining > 0:
+        open_strata = sorted((s for s in counts if alloc[s] < counts[s]),
+                             key=lambda s: (alloc[s] - quotas[s], s))
+        if not open_strata:
+            break
+        for s in open_strata[:remaining]:
+            alloc[s] += 1
+            remaining -= 1
+    return alloc
+
+
+def select_in_memory(conversations: List[Any], query: SelectionQuery,
+                     flow_of: Optional[Callable[[Any], Optional[str]]] = None) -> List[Any]:
+    """SelectionQuery trên list conversation (dict hoặc DecodedConversation) đã có trong bộ nhớ"""
+    since, until = query.window()
+    rows = []  # (index, created_ts, turns, conversation)
+    for i, conv in enumerate(conversations):
+        turns = len(conv.get("messages") or [])
+        if turns < query.min_turns or (query.max_turns is not None and turns > query.max_turns):
+            continue
+        ts = created_ts(conv)
+        if (since is not None and ts < since) or (until is not None and ts >= until):
+            continue
+        rows.append((i, ts, turns, conv))
+
+    take, skip = query.take, query.skip
+    strategy = query.strategy
+    if strategy in ("random", "stratified"):
+        seed = query.sample_seed()
+        ranked = lambda group: sorted(group, key=lambda r: sample_rank(r[3].get("conversation_id", r[0]), seed))
+        if strategy == "random":
+            return [r[3] for r in ranked(rows)[skip:skip + take]]
+        strata: Dict[str, List[tuple]] = {}
+        for r in rows:
+            strata.setdefault(_stratum(r, query.stratify_by, flow_of), []).append(r)
+        alloc = allocate({s: len(g) for s, g in strata.items()}, take, query.allocation == "equal")
+        return [r[3] for s in sorted(strata) for r in ranked(strata[s])[:alloc[s]]]
+
+    # head / tail / newest / oldest: top-N theo khóa, tie giữ thứ tự gốc
+    if strategy in ("newest", "oldest"):
+        key, descending = (lambda r: r[1]), strategy == "newest"
+    else:
+        key = (lambda r: r[1]) if query.sort_by == "created_at" else (lambda r: r[2])
+        descending = query.order == "desc"
+    if strategy == "tail":
+        descending = not descending  # phần cuối của thứ tự = phần đầu của thứ tự ngược
+    n = skip + take
+    if descending:
+        top = heapq.nsmallest(n, rows, key=lambda r: (-key(r), r[0]))
+    else:
+        top = heapq.nsmallest(n, rows, key=lambda r: (key(r), r[0]))
+    picked = top[skip:skip + take]
+    if strategy == "tail":
+        picked.reverse()
+    return [r[3] for r in picked]
+
+
+def _stratum(row: tuple, stratify_by: str, flow_of: Optional[Callable[[Any], Optional[str]]]) -> str:
+    if stratify_by == "day":
+        return day_of(row[1])
+    if stratify_by == "turns":
+        return turn_bucket(row[2])
+    flow = flow_of(row[3]) if flow_of is not None else None
+    return flow or "unknown"
+
+
+class StreamingSelector:
+    """
+    SelectionQuery trên dòng conversation (theo trang), chỉ giữ tối đa skip + take conversation
+    (stratified: take mỗi tầng) - cùng kết quả với select_in_memory trên toàn bộ dòng.
+
+    stratified giữ tối đa max_strata tầng (theo thứ tự gặp); tầng mới sau đó gộp vào
+    OVERFLOW_STRATUM, nên bộ nhớ <= (max_strata + 1) * take dù quét bao nhiêu ngày - khi đó
+    phần overflow được chia như một tầng, khác select_in_memory.
+
+    newest_first=True (list API trả mới nhất trước): newest / head theo created_at desc dừng ngay
+    khi đủ skip + take conversation qua bộ lọc; có `since` thì dừng khi cả trang cũ hơn since.
+    """
+
+    def __init__(self, query: SelectionQuery, newest_first: bool = True,
+                 flow_of: Optional[Callable[[Any], Optional[str]]] = None, max_strata: int = MAX_STREAM_STRATA):
+        self.query = query
+        self.max_strata = max_strata
+        self.newest_first = newest_first
+        self.flow_of = flow_of
+        self.seed = query.sample_seed()
+        self.since, self.until = query.window()
+        self.k = query.skip + query.take
+        strategy = query.strategy
+        self._early_stop = newest_first and (strategy == "newest" or (
+            strategy == "head" and query.sort_by == "created_at" and query.order == "desc"))
+        self._heap: List[tuple] = []  # (-priority, -seq, conversation): gốc là phần tử tệ nhất
+        self._strata: Dict[str, List[tuple]] = {}
+        self._counts: Dict[str, int] = {}
+        self.seen = 0
+        self.accepted = 0
+        self.pages = 0
+        self.complete = False
+
+    def _priority(self, conversation: Any, ts: float, turns: int) -> Any:
+        """Nhỏ hơn = được chọn trước (giống thứ tự của select_in_memory)"""
+        query = self.query
+        if query.strategy in ("random", "stratified"):
+            return sample_rank(conversation.get("conversation_id", self.seen), self.seed)
+        if query.strategy in ("newest", "oldest"):
+            key, descending = ts, query.strategy == "newest"
+        else:
+            key = ts if query.sort_by == "created_at" else turns
+            descending = query.order == "desc"
+        if query.strategy == "tail":
+            descending = not descending
+        return -key if descending else key
+
+    @staticmethod
+    def _keep(heap: List[tuple], limit: int, priority: Any, seq: int, conversation: Any) -> None:
+        entry = (-priority, -seq, conversation)
+        if len(heap) < limit:
+            heapq.heappush(heap, entry)
+        elif limit and (priority, seq) < (-heap[0][0], -heap[0][1]):
+            heapq.heapreplace(heap, entry)
+
+    def offer(self, conversation: Any) -> Optional[float]:
+        """Đưa một conversation vào; trả về created_ts (None nếu selector đã đủ)"""
+        if self.complete:
+            return None
+        seq = self.seen
+        self.seen += 1
+        ts = created_ts(conversation)
+        turns = len(conversation.get("messages") or [])
+        query = self.query
+        if turns < query.min_turns or (query.max_turns is not None and turns > query.max_turns):
+            return ts
+        if (self.since is not None and ts < self.since) or (self.until is not None and ts >= self.until):
+            return ts
+        self.accepted += 1
+        priority = self._priority(conversation, ts, turns)
+        if query.strategy == "stratified":
+            stratum = _stratum((seq, ts, turns, conversation), query.stratify_by, self.flow_of)
+            if stratum not in self._strata and len(self._strata) >= self.max_strata:
+                stratum = OVERFLOW_STRATUM
+            self._counts[stratum] = self._counts.get(stratum, 0) + 1
+            self._keep(self._strata.setdefault(stratum, []), query.take, priority, seq, conversation)
+        else:
+            self._keep(self._heap, self.k, priority, seq, conversation)
+        if self._early_stop and self.accepted >= self.k:
+            self.complete = True
+        return ts
+
+    def offer_page(self, conversations: List[Any]) -> bool:
+        """Đưa một trang vào; True khi không cần trang nào nữa"""
+        self.pages += 1
+        newest = None
+        for conversation in conversations:
+            ts = self.offer(conversation)
+            if ts is not None and (newest is None or ts > newest):
+                newest = ts
+        if (self.newest_first and self.since is not None and newest is not None
+                and newest < self.since and not self.complete):
+            self.complete = True  # các trang sau còn cũ hơn
+        return self.complete
+
+    @staticmethod
+    def _ordered(heap: List[tuple]) -> List[Any]:
+        return [entry[2] for entry in sorted(heap, key=lambda e: (-e[0], -e[1]))]
+
+    def result(self) -> List[Any]:
+        query = self.query
+        if query.strategy == "stratified":
+            alloc = allocate(self._counts, query.take, query.allocation == "equal")
+            return [c for s in sorted(self._strata) for c in self._ordered(self._strata[s])[:alloc[s]]]
+        picked = self._ordered(self._heap)[query.skip:query.skip + query.take]
+        if query.strategy == "tail":
+            picked.reverse()
+        return picked
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pages": self.pages,
+            "seen": self.seen,
+            "matched": self.accepted,
+            "retained": len(self._heap) + sum(len(h) for h in self._strata.values()),
+            "stopped_early": self.complete,
+        }
+
+
+async def stream_select(fetcher: Any, query: SelectionQuery, newest_first: bool = True,
+                        flow_of: Optional[Callable[[Any], Optional[str]]] = None) -> Tuple[List[Any], Dict[str, Any]]:
+    """Chọn trong lúc fetch (AsyncListFetcher.iter_pages); dừng fetch ngay khi mẫu đã đủ"""
+    selector = StreamingSelector(query, newest_first, flow_of)
+    async for _, page in fetcher.iter_pages():
+        if selector.offer_page(page):
+            break
+    return selector.result(), selector.stats()
@@ -0,0 +1,217 @@
+"""
+Sequential audit: ước lượng điểm trung bình của brand với độ chính xác mục tiêu thay vì chấm hết.
+
+Conversation được xáo theo thứ tự ngẫu nhiên (seeded, cùng rank với busqa.selection) rồi
+chấm theo từng đợt (wave). Sau mỗi đợt, khoảng tin cậy của avg total_score (và tuỳ chọn:
+từng criterion, từng flow) được cập nhật từ thống kê chạy (Welford), có hiệu chỉnh quần
+thể hữu hạn. Dừng khi mọi nửa-độ-rộng CI <= target, phần còn lại không gọi LLM.
+
+    results, report = await run_sequential_audit(evaluator, conversations, None, rubrics_cfg, ...,
+                                                 config=AuditConfig(target_half_width=2.0))
+    report["llm_calls_saved"]
+
+Dừng tuần tự (optional stopping) làm CI hơi lạc quan khi n nhỏ - min_samples chặn việc
+dừng sớm trên vài wave đầu.
+"""
+import math
+import random
+import statistics
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from .selection import sample_rank
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class AuditConfig:
+    """Độ chính xác mục tiêu cho sequential audit"""
+    target_half_width: float = 2.0  # ± điểm
+    confidence: float = 0.95
+    wave_size: int = 20
+    min_samples: int = 30  # không dừng trước số mẫu này
+    per_criterion: bool = False  # CI của từng criterion cũng phải đạt target
+    per_flow: bool = False  # CI avg total_score của từng flow cũng phải đạt target
+    min_flow_share: float = 0.05  # flow hiếm hơn tỉ lệ này: chỉ báo cáo, không chặn dừng
+    max_samples: Optional[int] = None
+    seed: Optional[int] = None
+
+    def __post_init__(self):
+        if self.target_half_width <= 0:
+            raise ValueError("target_half_width must be > 0")
+        if not 0 < self.confidence < 1:
+            raise ValueError("confidence must be in (0, 1)")
+        if self.wave_size < 1:
+            raise ValueError("wave_size must be >= 1")
+
+
+class RunningStat:
+    """Mean/variance tăng dần (Welford)"""
+
+    __slots__ = ("n", "mean", "_m2")
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value: float) -> None:
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self._m2 += delta * (value - self.mean)
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self._m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+    def half_width(self, z: float, population: Optional[int] = None) -> float:
+        """Nửa-độ-rộng CI của mean; inf khi chưa đủ 2 mẫu"""
+        if self.n < 2:
+            return math.inf
+        width = z * self.std / math.sqrt(self.n)
+        if population and population > 1:
+            # Hiệu chỉnh quần thể hữu hạn: chấm hết quần thể thì CI = 0
+            width *= math.sqrt(max(0.0, (population - self.n) / (population - 1)))
+        return width
+
+    def to_dict(self, z: float, population: Optional[int] = None) -> Dict[str, Any]:
+        half = self.half_width(z, population)
+        return {"n": self.n, "mean": round(self.mean, 3), "std": round(self.std, 3),
+                "ci_half_width": None if math.isinf(half) else round(half, 3)}
+
+
+class SequentialAudit:
+    """Gom result khi về, cho biết khi nào đạt độ chính xác mục tiêu"""
+
+    def __init__(self, config: AuditConfig, population: int):
+        self.config = config
+        self.population = population
+        self.z = statistics.NormalDist().inv_cdf((1 + config.confidence) / 2)
+        self.total = RunningStat()
+        self.criteria: Dict[str, RunningStat] = {}
+        self.flows: Dict[str, RunningStat] = {}
+        self.evaluated = 0
+        self.errors = 0
+        self.not_evaluable = 0
+        self.waves = 0
+
+    def add(self, result: Dict[str, Any]) -> None:
+        self.evaluated += 1
+        if "error" in result:
+            self.errors += 1
+            return
+        if "not_evaluable" in result:
+            self.not_evaluable += 1
+            return
+        evaluation = result["result"]
+        self.total.add(float(evaluation["total_score"]))
+        for criterion, details in evaluation.get("criteria", {}).items():
+            self.criteria.setdefault(criterion, RunningStat()).add(float(details["score"]))
+        flow = evaluation.get("detected_flow") or "unknown"
+        self.flows.setdefault(flow, RunningStat()).add(float(evaluation["total_score"]))
+
+    def _gated(self) -> Dict[str, float]:
+        """Các ước lượng phải đạt target -> nửa-độ-rộng hiện tại"""
+        widths = {"total_score": self.total.half_width(self.z, self.population)}
+        if self.config.per_criterion:
+            for criterion, stat in self.criteria.items():
+                widths[f"criteria.{criterion}"] = stat.half_width(self.z, self.population)
+        if self.config.per_flow and self.total.n:
+            for flow, stat in self.flows.items():
+                if stat.n / self.total.n < self.config.min_flow_share:
+                    continue
+                # Quần thể của flow chưa biết -> ước lượng theo tỉ lệ đã thấy
+                flow_population = round(self.population * stat.n / self.total.n)
+                widths[f"flow.{flow}"] = stat.half_width(self.z, flow_population)
+        return widths
+
+    def pending(self) -> List[str]:
+        """Ước lượng chưa đạt target (rỗng = đủ chính xác)"""
+        if self.total.n < min(self.config.min_samples, self.population):
+            return ["min_samples"]
+        return [name for name, width in self._gated().items() if width > self.config.target_half_width]
+
+    def done(self) -> bool:
+        if self.evaluated >= self.population:
+            return True
+        if self.config.max_samples and self.evaluated >= self.config.max_samples:
+            return True
+        return not self.pending()
+
+    def report(self) -> Dict[str, Any]:
+        pending = self.pending()
+        return {
+            "population": self.population,
+            "evaluated": self.evaluated,
+            "successful": self.total.n,
+            "errors": self.errors,
+            "not_evaluable": self.not_evaluable,
+            "waves": self.waves,
+            "llm_calls_saved": self.population - self.evaluated,
+            "target_reached": not pending,
+            "pending": pending,
+            "target_half_width": self.config.target_half_width,
+            "confidence": self.config.confidence,
+            "avg_total_score": self.total.to_dict(self.z, self.population),
+            "criteria_avg": {k: v.to_dict(self.z, self.population) for k, v in self.criteria.items()},
+            "flow_avg": {k: v.to_dict(self.z) for k, v in self.flows.items()},
+        }
+
+
+def audit_order(conversations: List[Any], seed: Optional[int] = None) -> List[Any]:
+    """Thứ tự ngẫu nhiên ổn định theo seed: mỗi prefix là một mẫu ngẫu nhiên đơn giản"""
+    if seed is None:
+        seed = random.randrange(2 ** 31)
+    return sorted(conversations, key=lambda conv: sample_rank(
+        conv.get("conversation_id") if hasattr(conv, "get") else conv, seed))
+
+
+async def run_sequential_audit(
+    evaluator: Any,
+    conversations: List[Any],
+    base_url: Optional[str],
+    rubrics_cfg: dict,
+    brand_policy: Any = None,
+    brand_prompt_text: str = None,
+    llm_api_key: str = None,
+    llm_model: str = "gemini-2.5-flash",
+    temperature: float = 0.2,
+    llm_base_url: str = None,
+    apply_diagnostics: bool = True,
+    diagnostics_cfg: dict = None,
+    config: AuditConfig = None,
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Chấm theo wave trên HighSpeedBatchEvaluator cho tới khi CI đạt target.
+
+    Trả (results đã chấm, report); report["llm_calls_saved"] là số conversation không phải chấm.
+    """
+    config = config or AuditConfig()
+    ordered = audit_order(conversations, config.seed)
+    audit = SequentialAudit(config, population=len(ordered))
+    results: List[Dict[str, Any]] = []
+    position = 0
+    while position < len(ordered) and not audit.done():
+        wave_size = config.wave_size
+        if config.max_samples:
+            wave_size = min(wave_size, config.max_samples - audit.evaluated)
+        wave = ordered[position:position + wave_size]
+        position += len(wave)
+        async for result in evaluator.iter_evaluate(
+            wave, base_url, rubrics_cfg, brand_policy, brand_prompt_text,
+            llm_api_key, llm_model, temperature, llm_base_url,
+            apply_diagnostics, diagnostics_cfg
+        ):
+            audit.add(result)
+            results.append(result)
+        audit.waves += 1
+        half = audit.total.half_width(audit.z, audit.population)
+        logger.info(f"Audit wave {audit.waves}: {audit.evaluated}/{audit.population} evaluated, "
+                    f"avg={audit.total.mean:.2f} ±{half:.2f} (pending: {audit.pending() or 'none'})")
+    report = audit.report()
+    logger.info(f"Audit stopped after {report['evaluated']}/{report['population']} conversations, "
+                f"{report['llm_calls_saved']} LLM calls saved")
+    return results, report
@@ -0,0 +1,132 @@
+"""
+Triage trước LLM: conversation tầm thường hoặc đã rõ kết quả thì không gọi LLM.
+
+Chạy sau analyze (đã có metrics + diagnostics hits), mỗi conversation nhận một quyết định:
+
+- not_evaluable: hang-up một message, transcript rỗng, không có lượt user/agent -> không chấm,
+  result không có "result" và không tính vào điểm trung bình (make_summary đếm riêng)
+- rule_based: kết quả đã quyết định bởi luật tất định -> result dựng từ luật, đánh dấu
+  "triage" + tag "triage_rule_based":
+    * auto_fail_hits: hit zero-tolerance (ví dụ forbidden_phone_collect) -> mọi criterion 0
+    * score ceiling: chấm mọi criterion 100 rồi áp đúng penalty/cap như coerce (đơn điệu) cho
+      ra trần điểm; trần < decided_below thì LLM không thể đổi label -> trả trần điểm
+- llm: còn lại, đi tiếp như bình thường
+
+Với rubric hiện tại cap của diagnostics rơi vào criterion trọng số nhỏ (policy_compliance
+0.03) nên trần điểm hiếm khi < 50 - loại "clear-cut" thường gặp nằm ở auto_fail_hits.
+"""
+import logging
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .evaluator import coerce_llm_json_unified
+from .frame import iter_sender_text
+
+logger = logging.getLogger(__name__)
+
+LLM = "llm"
+RULE_BASED = "rule_based"
+NOT_EVALUABLE = "not_evaluable"
+DECISIONS = (LLM, RULE_BASED, NOT_EVALUABLE)
+
+
+@dataclass
+class TriageConfig:
+    """
+    Luật triage; mặc định loại conversation không chấm được và bật luật trần điểm
+    (trần < decided_below=50 -> rule_based, không gọi LLM). decided_below=None để tắt.
+    """
+    min_messages: int = 2  # ít hơn: hang-up
+    min_user_messages: int = 1
+    min_agent_messages: int = 1
+    decided_below: Optional[float] = 50.0  # trần điểm thấp hơn ngưỡng -> rule_based; None = tắt
+    auto_fail_hits: Tuple[str, ...] = ()  # diagnostics key zero-tolerance -> rule_based, điểm 0
+
+
+@dataclass
+class TriageDecision:
+    decision: str
+    reason: str
+    result: Optional[Dict[str, Any]] = None  # LLMOutput dạng dict (rule_based)
+
+    def to_dict(self) -> Dict[str, str]:
+        return {"decision": self.decision, "reason": self.reason}
+
+
+def _hit_keys(diagnostics_hits: Optional[dict]) -> List[str]:
+    if not diagnostics_hits:
+        return []
+    return [hit["key"] for section in ("operational_readiness", "risk_compliance")
+            for hit in diagnostics_hits.get(section, []) or []]
+
+
+def _not_evaluable_reason(messages, config: TriageConfig) -> Optional[str]:
+    pairs = list(iter_sender_text(messages))
+    if not any(text.strip() for _, text in pairs):
+        return "empty_transcript"
+    if len(pairs) < config.min_messages:
+        return "hang_up"
+    senders = Counter(stype for stype, _ in pairs)
+    if senders["user"] < config.min_user_messages:
+        return "no_user_turn"
+    if senders["agent"] < config.min_agent_messages:
+        return "no_agent_turn"
+    return None
+
+
+def _rule_based_result(score: float, comment: str, rubrics_cfg: dict, **coerce_kwargs) -> Dict[str, Any]:
+    """Chấm mọi criterion = score rồi coerce như output LLM (penalty/cap/tag giữ nguyên)"""
+    llm_json = {"criteria": {key: {"score": score, "note": comment} for key in rubrics_cfg["criteria"]},
+                "final_comment": comment}
+    result = coerce_llm_json_unified(llm_json, rubrics_cfg, **coerce_kwargs).model_dump()
+    result["tags"] = sorted(set(result["tags"]) | {"triage_rule_based"})
+    return result
+
+
+def triage_conversation(messages, metrics: dict, rubrics_cfg: dict, config: TriageConfig,
+                        brand_policy=None, transcript: str = None, diagnostics_cfg: dict = None,
+                        diagnostics_hits: dict = None) -> Optional[TriageDecision]:
+    """Quyết định triage cho một conversation đã analyze; None = gửi LLM"""
+    reason = _not_evaluable_reason(messages, config)
+    if reason is not None:
+        return TriageDecision(NOT_EVALUABLE, reason)
+
+    coerce_kwargs = dict(brand_policy=brand_policy, messages=messages, transcript=transcript or "",
+                         metrics=metrics, diagnostics_cfg=diagnostics_cfg, diagnostics_hits=diagnostics_hits)
+    hit_keys = _hit_keys(diagnostics_hits)
+    for key in config.auto_fail_hits:
+        if key in hit_keys:
+            result = _rule_based_result(0.0, f"Triage: auto fail ({key})", rubrics_cfg, **coerce_kwargs)
+            return TriageDecision(RULE_BASED, f"auto_fail:{key}", result)
+
+    if config.decided_below is not None:
+        # Penalty chỉ kéo điểm xuống (clamp/delta đơn điệu) -> output từ điểm 100 là trần
+        ceiling = _rule_based_result(100.0, "Triage: score ceiling from deterministic caps",
+                                     rubrics_cfg, **coerce_kwargs)
+        if ceiling["total_score"] < config.decided_below:
+            return TriageDecision(RULE_BASED, "score_ceiling", ceiling)
+
+    return None
+
+
+def summarize_triage(results: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Tỉ lệ traffic bỏ qua LLM (result không có "triage" là đã qua LLM / store)"""
+    decisions: Counter = Counter()
+    reasons: Counter = Counter()
+    for result in results:
+        if "error" in result:
+            continue
+        triage = result.get("triage")
+        if triage is None:
+            decisions[LLM] += 1
+            continue
+        decisions[triage["decision"]] += 1
+        reasons[triage["reason"]] += 1
+    total = sum(decisions.values())
+    bypassed = decisions[RULE_BASED] + decisions[NOT_EVALUABLE]
+    return {
+        "decisions": {decision: decisions[decision] for decision in DECISIONS},
+        "reasons": dict(reasons),
+        "llm_bypass_rate": round(bypassed / total, 4) if total else 0.0,
+    }
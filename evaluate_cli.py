@@ -16,14 +16,23 @@ from typing import List, Dict, Any
 project_root = Path(__file__).parent
 sys.path.insert(0, str(project_root))
 
-from busqa.prompt_loader import load_unified_rubrics
-from busqa.brand_specs import load_brand_prompt
+from busqa.config_registry import current_rubrics, current_diagnostics, brand_prompt
 from busqa.aggregate import make_summary, generate_insights
 from busqa.utils import cleanup_memory, estimate_batch_time
+from busqa.journal import RunJournal, DEFAULT_JOURNAL_DIR
+from busqa.result_store import ResultStore, DEFAULT_RESULT_STORE_PATH
+from busqa.near_duplicate import NearDuplicateConfig
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Args quyết định kết quả chấm - lưu trong journal header, resume dùng lại để run nhất quán
+RUN_PARAM_KEYS = [
+    "base_url", "brand_mode", "brand_prompt_path", "bot_map", "default_brand_prompt_path", "rubrics",
+    "llm_model", "llm_base_url", "temperature", "apply_diagnostics", "no_diagnostics",
+    "diagnostics_config", "output", "near_duplicate_threshold",
+]
+
 def parse_conversation_ids(args) -> List[str]:
     """Parse conversation IDs from command line arguments."""
     conversation_ids = []
@@ -93,8 +102,49 @@ def main():
     
     parser.add_argument("--verbose", "-v", action="store_true", help="Verbose output")
     
+    # Offline re-scoring
+    parser.add_argument("--rescore", metavar="RESULTS_JSON",
+                       help="Re-score a saved results file with current --rubrics/--diagnostics-config (no LLM calls)")
+    parser.add_argument("--diagnostics-config", default="config/diagnostics.yaml", help="Path to diagnostics config")
+    
+    # Checkpoint / resume
+    parser.add_argument("--run-id", help="Run ID for the result journal (default: auto-generated)")
+    parser.add_argument("--resume", metavar="RUN_ID",
+                       help="Resume a journaled run: skip conversations already evaluated, reuse its settings")
+    parser.add_argument("--runs-dir", default=DEFAULT_JOURNAL_DIR, help="Directory for run journals")
+    
+    # Result store (skip conversation không đổi)
+    parser.add_argument("--result-store", default=DEFAULT_RESULT_STORE_PATH,
+                       help="SQLite result store; unchanged conversations reuse stored results")
+    parser.add_argument("--no-result-store", action="store_true", help="Disable the result store")
+    parser.add_argument("--force-refresh", action="store_true",
+                       help="Re-evaluate every conversation and overwrite stored results")
+    parser.add_argument("--verify-content", action="store_true",
+                       help="Always fetch and compare content before reusing a stored result "
+                            "(default trusts results stored for the same conversation ID)")
+    parser.add_argument("--near-duplicate-threshold", type=float, metavar="JACCARD",
+                       help="Reuse the LLM evaluation of an already evaluated conversation this similar (e.g. 0.9)")
+    
     args = parser.parse_args()
     
+    if args.rescore:
+        run_rescore(args)
+        return
+    
+    journal = None
+    if args.resume:
+        try:
+            journal = RunJournal.open(args.resume, args.runs_dir)
+        except Exception as e:
+            print(f"✗ Cannot resume run '{args.resume}': {e}")
+            sys.exit(1)
+        for key in RUN_PARAM_KEYS:
+            if key in journal.params:
+                setattr(args, key, journal.params[key])
+        progress = journal.progress()
+        print(f"↻ Resuming run {journal.run_id}: {progress['completed']}/{progress['total']} done, "
+              f"{progress['remaining']} remaining")
+    
     if args.brand_mode == "single" and not args.brand_prompt_path:
         print("✗ --brand-prompt-path is required when using --brand-mode=single")
         sys.exit(1)
@@ -103,9 +153,11 @@ def main():
         print(f"✗ Bot map file not found: {args.bot_map}")
         sys.exit(1)
     
-    # Parse conversation IDs
-    conversation_ids = parse_conversation_ids(args)
-    if not conversation_ids:
+    # Parse conversation IDs (resume: phần còn lại của run)
+    conversation_ids = journal.remaining_ids() if journal else parse_conversation_ids(args)
+    if not conversation_ids and journal:
+        print("✓ Run already complete - rebuilding summary from journal")
+    elif not conversation_ids:
         print("✗ No conversation IDs provided. Use --conversation-id, --conversation-ids, or --conversations-file")
         sys.exit(1)
     
@@ -120,7 +172,7 @@ def main():
     
     # Load configurations
     try:
-        rubrics_cfg = load_unified_rubrics(args.rubrics)
+        rubrics_cfg = current_rubrics(args.rubrics)
         if args.verbose:
             print(f"✓ Loaded unified rubrics v{rubrics_cfg['version']}")
             print(f"  Criteria: {list(rubrics_cfg['criteria'].keys())}")
@@ -132,8 +184,7 @@ def main():
     diagnostics_cfg = None
     if apply_diagnostics:
         try:
-            from busqa.prompt_loader import load_diagnostics_config
-            diagnostics_cfg = load_diagnostics_config()
+            diagnostics_cfg = current_diagnostics(args.diagnostics_config)
             if args.verbose:
                 or_count = len(diagnostics_cfg.get('operational_readiness', []))
                 rc_count = len(diagnostics_cfg.get('risk_compliance', []))
@@ -160,7 +211,7 @@ def main():
     else:
         # Single brand mode
         try:
-            brand_prompt_text, brand_policy = load_brand_prompt(args.brand_prompt_path)
+            brand_prompt_text, brand_policy = brand_prompt(args.brand_prompt_path)
             if args.verbose:
                 print(f"✓ Loaded brand prompt: {args.brand_prompt_path}")
                 print(f"  Policy flags: phone_collect={not brand_policy.forbid_phone_collect}, "
@@ -188,9 +239,32 @@ def main():
         estimated_time = estimate_batch_time(len(conversation_ids), args.max_concurrency)
         print(f"⏱️  Estimated time: {estimated_time:.1f}s for {len(conversation_ids)} conversations")
     
-    print(f"\n🚀 Starting evaluation with concurrency={args.max_concurrency}...")
+    if journal is None:
+        try:
+            journal = RunJournal.create(
+                conversation_ids, params={key: getattr(args, key) for key in RUN_PARAM_KEYS},
+                run_id=args.run_id, journal_dir=args.runs_dir
+            )
+        except Exception as e:
+            print(f"✗ Cannot create run journal: {e}")
+            sys.exit(1)
+    print(f"📒 Run ID: {journal.run_id} (journal: {journal.path})")
     
-
+    result_store = None
+    if not args.no_result_store:
+        try:
+            result_store = ResultStore(args.result_store)
+        except Exception as e:
+            print(f"⚠ Result store disabled: {e}")
+    
+    near_duplicate = None
+    if args.near_duplicate_threshold is not None:
+        if result_store is None:
+            print("⚠ --near-duplicate-threshold needs the result store - ignored")
+        else:
+            near_duplicate = NearDuplicateConfig(threshold=args.near_duplicate_threshold)
+    
+    print(f"\n🚀 Starting evaluation with concurrency={args.max_concurrency}...")
     
     try:
         from busqa.batch_evaluator import evaluate_conversations_high_speed
@@ -198,12 +272,27 @@ def main():
         def progress_callback(progress, current, total):
             print(f"Progress: {current}/{total} ({progress:.1%})", end='\r', flush=True)
         
-        results = asyncio.run(evaluate_conversations_high_speed(
-            conversation_ids, args.base_url, rubrics_cfg, brand_policy,
-            brand_prompt_text, llm_api_key, args.llm_model, args.temperature,
-            args.llm_base_url, apply_diagnostics, diagnostics_cfg,
-            args.max_concurrency, progress_callback, brand_resolver
-        ))
+        # Mỗi result ghi vào journal ngay khi xong
+        if conversation_ids:
+            asyncio.run(evaluate_conversations_high_speed(
+                conversation_ids, args.base_url, rubrics_cfg, brand_policy,
+                brand_prompt_text, llm_api_key, args.llm_model, args.temperature,
+                args.llm_base_url, apply_diagnostics, diagnostics_cfg,
+                args.max_concurrency, progress_callback, stream_callback=journal.append,
+                brand_resolver=brand_resolver, result_store=result_store,
+                force_refresh=args.force_refresh, near_duplicate=near_duplicate,
+                verify_content=args.verify_content
+            ))
+        journal.close()
+        if result_store is not None:
+            store_stats = result_store.stats()
+            print(f"💾 Result store: {store_stats['hits']}/{store_stats['lookups']} reused "
+                  f"(hit rate {store_stats['hit_rate']:.1%}), {store_stats['writes']} stored")
+            if near_duplicate is not None:
+                print(f"   Near-duplicates: {store_stats['near_duplicate_hits']} reused, "
+                      f"LLM calls avoided {store_stats['reuse_rate']:.1%}")
+            result_store.close()
+        results = journal.results()
         
         # Save batch results
         if args.output:
@@ -213,28 +302,69 @@ def main():
         
         cleanup_memory()
         
-        # Tạo summary nhanh
-        summary = make_summary(results)
-        insights = generate_insights(summary)
-        
-        summary_data = {
-            "summary": summary,
-            "insights": insights,
-            "generated_at": datetime.utcnow().isoformat() + "Z"
-        }
-        
-        summary_file = args.output.replace('.json', '_summary.json') if args.output else 'batch_summary.json'
-        with open(summary_file, 'w', encoding='utf-8') as f:
-            json.dump(summary_data, f, ensure_ascii=False, indent=2)
-        print(f"✓ Summary saved to {summary_file}")
-        
-        # Print batch summary
-        print_batch_summary(summary, insights)
+        # Summary dựng từ journal (gồm cả kết quả của các lần chạy trước khi resume)
+        summary_data = write_journal_summary(journal, args, results)
+        print_batch_summary(summary_data["summary"], summary_data["insights"])
         
+    except KeyboardInterrupt:
+        journal.close()
+        write_journal_summary(journal, args)
+        print(f"\n⏸ Interrupted - resume with: --resume {journal.run_id}")
+        sys.exit(130)
     except Exception as e:
+        journal.close()
         print(f"✗ Error running batch evaluation: {e}")
+        write_journal_summary(journal, args)
+        print(f"  Completed results are kept - resume with: --resume {journal.run_id}")
         sys.exit(1)
 
+def write_journal_summary(journal: RunJournal, args, results: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Ghi summary (partial nếu run chưa xong) dựng từ journal"""
+    summary_data = journal.summary(results)
+    summary_file = args.output.replace('.json', '_summary.json') if args.output else 'batch_summary.json'
+    with open(summary_file, 'w', encoding='utf-8') as f:
+        json.dump(summary_data, f, ensure_ascii=False, indent=2)
+    run = summary_data["run"]
+    partial = f" (partial: {run['completed']}/{run['total']})" if run["partial"] else ""
+    print(f"✓ Summary saved to {summary_file}{partial}")
+    return summary_data
+
+def run_rescore(args):
+    """Re-score saved results với rubric/diagnostics hiện tại - không gọi LLM."""
+    from busqa.rescoring import rescore_results
+    
+    try:
+        with open(args.rescore, 'r', encoding='utf-8') as f:
+            results = json.load(f)
+        rubrics_cfg = current_rubrics(args.rubrics)
+        diagnostics_cfg = None if args.no_diagnostics else current_diagnostics(args.diagnostics_config)
+    except Exception as e:
+        print(f"✗ Error loading results/configs: {e}")
+        sys.exit(1)
+    
+    results, stats = rescore_results(results, rubrics_cfg, diagnostics_cfg)
+    print(f"✓ Re-scored {stats['rescored']} results in {stats['elapsed_seconds']}s "
+          f"({stats['skipped']} skipped, {stats['labels_changed']} labels changed, "
+          f"avg delta {stats['avg_score_delta']:+})")
+    
+    output = args.output or args.rescore.replace('.json', '_rescored.json')
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"✓ Re-scored results saved to {output}")
+    
+    summary = make_summary(results)
+    insights = generate_insights(summary)
+    summary_file = output.replace('.json', '_summary.json')
+    with open(summary_file, 'w', encoding='utf-8') as f:
+        json.dump({
+            "summary": summary,
+            "insights": insights,
+            "rescore_stats": stats,
+            "generated_at": datetime.utcnow().isoformat() + "Z"
+        }, f, ensure_ascii=False, indent=2)
+    print(f"✓ Summary saved to {summary_file}")
+    print_batch_summary(summary, insights)
+
 def print_single_summary(result: Dict[str, Any], rubrics_cfg: dict, apply_diagnostics: bool):
     """Print summary for single conversation evaluation."""
     eval_result = result["result"]
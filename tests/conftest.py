@@ -0,0 +1,84 @@
+"""
+Fixture dùng chung cho test evaluator: hội thoại mẫu, evaluator với fetch/LLM giả
+"""
+import asyncio
+import copy
+import threading
+
+import pytest
+
+from busqa.batch_evaluator import HighSpeedBatchEvaluator
+from busqa.decode import conversation_from_dict
+
+_MESSAGES = [
+    {"role": "user", "content": "Cho tôi hỏi vé đi Đà Lạt", "created_at": "2025-01-01T08:00:00"},
+    {"role": "agent", "content": "Dạ anh đi ngày nào ạ", "created_at": "2025-01-01T08:00:04"},
+]
+
+
+def _llm_output(rubrics_cfg):
+    criteria = {k: {"score": 80, "note": ""} for k in rubrics_cfg["criteria"]} if rubrics_cfg else {}
+    return {"criteria": criteria, "total_score": 80, "detected_flow": "A"}
+
+
+class FakeLLMEvaluator(HighSpeedBatchEvaluator):
+    """
+    Evaluator không gọi mạng.
+    - fetch: conversations[id] nếu có dict conversations (id không có -> lỗi 404), không thì hội thoại mẫu
+    - LLM: respond(kwargs) hoặc 80 điểm mọi criterion; llm_delay là số giây hoặc hàm theo kwargs
+    fetched / llm_requests ghi lại các lần gọi.
+    """
+
+    def __init__(self, config, rubrics_cfg=None, conversations=None, llm_delay=0.0, respond=None):
+        super().__init__(config)
+        self.rubrics_cfg = rubrics_cfg
+        self.conversations = conversations
+        self.llm_delay = llm_delay
+        self.respond = respond
+        self.fetched = []
+        self.llm_requests = []
+
+    @property
+    def llm_calls(self) -> int:
+        return len(self.llm_requests)
+
+    async def _fetch_conversation(self, conversation_id, base_url):
+        self.fetched.append(conversation_id)
+        if self.conversations is None:
+            raw = {"messages": _MESSAGES}
+        elif conversation_id in self.conversations:
+            raw = self.conversations[conversation_id]
+        else:
+            raise ValueError("API fetch failed: 404")
+        return conversation_from_dict(raw, conversation_id)
+
+    async def _call_llm(self, **kwargs):
+        self.llm_requests.append(kwargs)
+        delay = self.llm_delay(kwargs) if callable(self.llm_delay) else self.llm_delay
+        if delay:
+            await asyncio.sleep(delay)
+        return self.respond(kwargs) if self.respond else _llm_output(self.rubrics_cfg)
+
+
+@pytest.fixture
+def messages():
+    """Hội thoại 2 lượt user/agent"""
+    return copy.deepcopy(_MESSAGES)
+
+
+@pytest.fixture
+def fake_evaluator():
+    return FakeLLMEvaluator
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """Thay _call_llm của mọi HighSpeedBatchEvaluator (evaluator do code dưới test tự tạo); trả về thread của từng call"""
+    calls = []
+
+    async def fake_call_llm(self, **kwargs):
+        calls.append(threading.get_ident())
+        return _llm_output(None)
+
+    monkeypatch.setattr(HighSpeedBatchEvaluator, "_call_llm", fake_call_llm)
+    return calls
@@ -0,0 +1,182 @@
+"""
+Tests for process-wide LLM admission control
+"""
+import asyncio
+
+import pytest
+
+import busqa.admission as admission
+import busqa.llm_client as llm_client
+from busqa.admission import (AdmissionConfig, AdmissionController, AdmissionRejected, LaneConfig,
+                             INTERACTIVE, BATCH, llm_flow)
+from busqa.batch_evaluator import HighSpeedBatchEvaluator, BatchConfig
+from busqa.brand_specs import BrandPolicy
+from busqa.concurrency import AIMDLimiter, AIMDConfig
+from busqa.pipeline import StagedPipeline, Stage
+from busqa.prompt_loader import load_unified_rubrics
+
+
+def _controller(total=3, interactive=2, batch=2, batch_queue=4):
+    return AdmissionController(AdmissionConfig(total_slots=total, lanes={
+        INTERACTIVE: LaneConfig(max_slots=interactive, max_queue=4, max_wait_seconds=1.0),
+        BATCH: LaneConfig(max_slots=batch, max_queue=batch_queue, max_wait_seconds=60.0),
+    }, default_latency_seconds=0.05))
+
+
+def test_bulkheads_cap_lanes_and_interactive_goes_first():
+    controller = _controller()
+    peak = {INTERACTIVE: 0, BATCH: 0, "total": 0}
+    order = []
+
+    async def call(lane, name, seconds=0.02):
+        async with controller.slot(lane):
+            order.append(name)
+            stats = controller.stats()
+            peak[lane] = max(peak[lane], stats["lanes"][lane]["in_flight"])
+            peak["total"] = max(peak["total"], stats["in_flight"])
+            await asyncio.sleep(seconds)
+
+    async def run():
+        batch = [asyncio.create_task(call(BATCH, f"b{i}")) for i in range(6)]
+        await asyncio.sleep(0.005)  # batch đã chiếm 2 slot, 4 call đang chờ
+        interactive = [asyncio.create_task(call(INTERACTIVE, f"i{i}")) for i in range(3)]
+        await asyncio.gather(*batch, *interactive)
+
+    asyncio.run(run())
+    assert peak[BATCH] == 2 and peak[INTERACTIVE] == 2 and peak["total"] == 3
+    # Slot trống được cấp cho interactive trước các batch call đang chờ
+    assert order.index("i2") < order.index("b3")
+    stats = controller.stats()
+    assert stats["in_flight"] == 0 and stats["lanes"][BATCH]["calls"] == 6
+    assert stats["lanes"][BATCH]["max_queue_depth"] == 4 and stats["lanes"][BATCH]["p95_wait_ms"] > 0
+
+
+def test_requests_over_queue_budget_are_rejected_with_retry_after():
+    controller = _controller(batch_queue=3)
+
+    async def run():
+        controller.admit(BATCH, demand=2)
+        holders = [asyncio.create_task(controller.acquire(BATCH)) for _ in range(5)]
+        await asyncio.sleep(0.01)
+        assert controller.stats()["lanes"][BATCH]["queue_depth"] == 3
+        with pytest.raises(AdmissionRejected) as exc:
+            controller.admit(BATCH)
+        assert exc.value.retry_after >= 1 and "queue" in exc.value.reason
+
+        # Lane interactive vẫn nhận, nhưng ước lượng chờ vượt 1s thì từ chối
+        controller.admit(INTERACTIVE)
+        with pytest.raises(AdmissionRejected):
+            controller.admit(INTERACTIVE, demand=60)
+        for task in holders:
+            task.cancel()
+        for granted in await asyncio.gather(*holders, return_exceptions=True):
+            if isinstance(granted, tuple):
+                controller.release(*granted)
+
+    asyncio.run(run())
+    stats = controller.stats()["lanes"]
+    assert stats[BATCH]["rejected"] == 1 and stats[INTERACTIVE]["rejected"] == 1
+    assert stats[BATCH]["admitted"] == 1 and stats[BATCH]["queue_depth"] == 0
+    assert controller.stats()["in_flight"] == 0
+
+
+def test_weighted_fair_queuing_between_flows_in_a_lane():
+    controller = AdmissionController(AdmissionConfig(total_slots=1, lanes={
+        BATCH: LaneConfig(max_slots=1, max_queue=100, max_wait_seconds=60.0),
+    }, flow_weights={"vip": 2.0}))
+    order = []
+
+    async def call(flow, name):
+        with llm_flow(flow):
+            async with controller.slot(BATCH):
+                order.append(name)
+                await asyncio.sleep(0.001)
+
+    async def run():
+        holder = await controller.acquire(BATCH)
+        # Brand lớn xếp hàng 12 call trước, brand nhỏ / vip đến sau
+        tasks = [asyncio.create_task(call("big", f"big{i}")) for i in range(12)]
+        await asyncio.sleep(0)
+        tasks += [asyncio.create_task(call("small", f"small{i}")) for i in range(3)]
+        tasks += [asyncio.create_task(call("vip", f"vip{i}")) for i in range(4)]
+        await asyncio.sleep(0)
+        controller.release(*holder)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    # small không phải chờ hết 12 call của big; vip (weight 2) được phục vụ gấp đôi
+    assert order.index("small2") < order.index("big5")
+    assert order.index("vip3") < order.index("small2")
+    flows = controller.stats()["lanes"][BATCH]["flows"]
+    assert flows["big"]["served"] == 12 and flows["vip"]["weight"] == 2.0
+    assert flows["small"]["avg_wait_ms"] < flows["big"]["avg_wait_ms"]
+
+
+def test_starving_batch_waiter_is_promoted_over_interactive():
+    controller = AdmissionController(AdmissionConfig(total_slots=1, lanes={
+        INTERACTIVE: LaneConfig(max_slots=1, max_queue=10, max_wait_seconds=60.0),
+        BATCH: LaneConfig(max_slots=1, max_queue=10, max_wait_seconds=60.0, max_starvation_seconds=0.05),
+    }))
+    order = []
+
+    async def call(lane, name, seconds=0.02):
+        async with controller.slot(lane):
+            order.append(name)
+            await asyncio.sleep(seconds)
+
+    async def run():
+        tasks = [asyncio.create_task(call(INTERACTIVE, "i0"))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(call(BATCH, "b0")))
+        await asyncio.sleep(0)
+        # Interactive liên tục tới: không có guard thì b0 chờ tới khi interactive hết
+        tasks += [asyncio.create_task(call(INTERACTIVE, f"i{i}")) for i in range(1, 8)]
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert order[0] == "i0" and order.index("b0") < len(order) - 1
+    stats = controller.stats()["lanes"]
+    assert stats[BATCH]["promotions"] == 1 and stats[INTERACTIVE]["promotions"] == 0
+
+
+def test_pipeline_waits_for_slot_outside_llm_timeout(monkeypatch, messages):
+    # 1 slot cho cả process: 6 call x 0.2s xếp hàng lâu hơn llm_timeout nhưng không call nào timeout
+    controller = AdmissionController(AdmissionConfig(total_slots=1))
+    monkeypatch.setattr(admission, "_default_controller", controller)
+
+    async def fake_llm(*args):
+        await asyncio.sleep(0.2)
+        return {"criteria": {}, "total_score": 80, "detected_flow": "A"}
+
+    monkeypatch.setattr(llm_client, "_call_llm_async", fake_llm)
+    evaluator = HighSpeedBatchEvaluator(BatchConfig(max_concurrency=6, llm_timeout=0.5,
+                                                    use_high_performance_api=False))
+    conversations = [{"conversation_id": f"c{i}", "messages": messages} for i in range(6)]
+    results = asyncio.run(evaluator.evaluate_batch(conversations, None, load_unified_rubrics(), BrandPolicy(), "",
+                                                   apply_diagnostics=False))
+
+    assert [r.get("error") for r in results] == [None] * 6
+    assert evaluator.concurrency_stats["llm"]["outcomes"].get("timeout", 0) == 0
+    stats = controller.stats()["lanes"][BATCH]
+    assert stats["calls"] == 6 and stats["in_flight"] == 0  # call_llm_async không lấy slot lần hai
+
+
+def test_workers_waiting_on_aimd_do_not_hold_process_slots():
+    # Batch bị cắt còn AIMD limit 1: 8 worker chờ AIMD nhưng chỉ 1 slot chung bị giữ
+    controller = _controller(total=8, batch=8, batch_queue=16)
+    limiter = AIMDLimiter("llm", AIMDConfig(min_limit=1, max_limit=8, initial_limit=1, window_size=100))
+    observed = []
+
+    async def call(item):
+        observed.append(controller.stats()["lanes"][BATCH]["in_flight"])
+        await asyncio.sleep(0.005)
+        return item
+
+    pipeline = StagedPipeline([Stage("llm", call, limiter=limiter,
+                                     admission=lambda item: controller.slot(BATCH))], queue_size=8)
+
+    async def run():
+        return [r async for r in pipeline.run(range(12))]
+
+    assert sorted(asyncio.run(run())) == list(range(12))
+    assert max(observed) == 1 and controller.stats()["lanes"][BATCH]["calls"] == 12
@@ -0,0 +1,76 @@
+"""
+Tests for brand-affinity ordering before the LLM stage
+"""
+import asyncio
+
+from busqa.affinity import AffinityConfig, PrefixCacheModel
+from busqa.batch_evaluator import BatchConfig
+from busqa.brand_artifacts import get_brand_artifacts
+from busqa.brand_specs import BrandPolicy
+from busqa.pipeline import StagedPipeline, Stage
+from busqa.prompt_loader import load_unified_rubrics
+
+def test_reorder_queue_groups_keys_within_window():
+    dispatched = []
+
+    async def record(item):
+        dispatched.append(item)
+        await asyncio.sleep(0.001)
+        return item
+
+    async def run(window):
+        dispatched.clear()
+        pipeline = StagedPipeline(
+            [Stage("feed", lambda x: asyncio.sleep(0, x), concurrency=1),
+             Stage("llm", record, concurrency=1, order_key=lambda x: None if x[0] == "-" else x[0],
+                   reorder_window=window)],
+            queue_size=1)
+        items = [("abc-"[i % 4], i) for i in range(40)]
+        results = [r async for r in pipeline.run(items)]
+        return items, results, pipeline.get_stats()["stages"]["llm"]
+
+    items, results, stats = asyncio.run(run(window=8))
+    assert sorted(results, key=lambda x: x[1]) == items  # không mất item, _DONE ra sau cùng
+    runs = sum(1 for prev, cur in zip(dispatched, dispatched[1:]) if prev[0] != cur[0]) + 1
+    assert runs < 20 and stats["reorder"]["reordered"] > 0
+    # Không item nào bị vượt quá window lần
+    for item in items:
+        overtaken = sum(1 for later in dispatched[:dispatched.index(item)] if later[1] > item[1])
+        assert overtaken <= 8
+
+    asyncio.run(run(window=0))
+    assert [i for _, i in dispatched] == list(range(40))  # window 0 = FIFO
+
+
+class _Resolver:
+    def resolve_artifact(self, bot_id):
+        return get_brand_artifacts().from_text(f"Nhà xe {bot_id}", BrandPolicy(), brand_id=f"brand_{bot_id}")
+
+
+def _evaluate(fake_evaluator, messages, affinity):
+    # 3 brand đến xen kẽ theo thứ tự
+    conversations = [{"conversation_id": f"c{i}", "bot_id": str(i % 3), "messages": messages} for i in range(60)]
+    # LLM là stage chậm nhất -> hàng chờ trước LLM đầy
+    evaluator = fake_evaluator(BatchConfig(max_concurrency=1, cpu_concurrency=4,
+                                           use_high_performance_api=False, brand_affinity=affinity), llm_delay=0.01)
+    results = asyncio.run(evaluator.evaluate_batch(conversations, None, load_unified_rubrics(),
+                                                   apply_diagnostics=False, brand_resolver=_Resolver()))
+    assert len(results) == 60 and not any("error" in r for r in results)
+    return evaluator
+
+
+def test_brand_affinity_raises_prefix_cache_hit_ratio(fake_evaluator, messages):
+    baseline = _evaluate(fake_evaluator, messages, None).prefix_cache_stats
+    grouped_eval = _evaluate(fake_evaluator, messages, AffinityConfig(reorder_window=16, cache_slots=1))
+    grouped = grouped_eval.prefix_cache_stats
+
+    assert baseline["calls"] == grouped["calls"] == 60
+    assert baseline["runs"] > 50 and grouped["runs"] < 15
+    assert grouped["hit_ratio"] > 0.7 and set(grouped["brands"]) == {"brand_0", "brand_1", "brand_2"}
+    assert all(b["hit_ratio"] > 0.6 for b in grouped["brands"].values())
+    assert grouped_eval.pipeline_stats["stages"]["llm"]["reorder"]["window"] == 16
+
+    model = PrefixCacheModel(cache_slots=2)
+    assert [model.dispatch(k, k) for k in "ababcb"] == [False, False, True, True, False, True]
+    assert model.stats()["brands"]["b"] == {"calls": 3, "hits": 2, "hit_ratio": round(2 / 3, 4)}
+    assert model.stats()["runs"] == 6
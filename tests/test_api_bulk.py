@@ -0,0 +1,62 @@
+"""
+Tests for the /evaluate/bulk endpoint với list API và LLM giả
+"""
+import httpx
+import pytest
+
+from busqa.batch_evaluator import HighSpeedBatchEvaluator
+from busqa.list_fetcher import AsyncListFetcher
+
+fastapi_testclient = pytest.importorskip("fastapi.testclient")
+
+
+def _raw(i: int):
+    return {
+        "conversation_id": f"c{i}",
+        "bot_id": "3794",
+        "created_at": f"2025-01-0{i + 1}T08:00:00Z",
+        "messages": [{"role": "user", "content": f"Cho tôi hỏi vé {i}", "created_at": f"2025-01-0{i + 1}T08:00:00"},
+                     {"role": "agent", "content": "Dạ anh đi ngày nào ạ", "created_at": f"2025-01-0{i + 1}T08:00:04"}],
+    }
+
+
+@pytest.fixture
+def api(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "dummy")
+    import api as api_module
+    monkeypatch.setattr(api_module, "result_store", None)
+    monkeypatch.setattr(api_module, "conversation_store", None)
+    return api_module
+
+
+def test_bulk_evaluates_selected_conversations_with_requested_model(api, monkeypatch):
+    models = []
+
+    def list_api(request: httpx.Request) -> httpx.Response:
+        page, size = int(request.url.params["page"]), int(request.url.params["page_size"])
+        newest_first = [_raw(i) for i in (2, 1, 0)]
+        return httpx.Response(200, json={"conversations": newest_first[(page - 1) * size:page * size]})
+
+    async def fake_call_llm(self, **kwargs):
+        models.append(kwargs["model"])
+        return {"criteria": {}, "total_score": 80, "detected_flow": "A"}
+
+    async def no_fetch(self, conversation_id, base_url):
+        raise AssertionError(f"fetched {conversation_id} again")
+
+    monkeypatch.setattr(api, "AsyncListFetcher", lambda config: AsyncListFetcher(
+        config, httpx.AsyncClient(transport=httpx.MockTransport(list_api))))
+    monkeypatch.setattr(HighSpeedBatchEvaluator, "_call_llm", fake_call_llm)
+    monkeypatch.setattr(HighSpeedBatchEvaluator, "_fetch_conversation", no_fetch)
+
+    with fastapi_testclient.TestClient(api.app) as client:
+        response = client.post("/evaluate/bulk", data={
+            "bot_id": "3794", "bearer_token": "token", "limit": 2, "strategy": "newest",
+            "model": "gemini-test", "max_concurrency": 2})
+
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert [r["conversation_id"] for r in body["results"]] == ["c2", "c1"]
+    # messages có sẵn từ list API -> không fetch lại từng conversation
+    assert all("error" not in r for r in body["results"])
+    assert models == ["gemini-test", "gemini-test"]
@@ -0,0 +1,83 @@
+"""
+Tests for the compiled brand artifact registry
+"""
+import asyncio
+import os
+
+import yaml
+
+import busqa.brand_artifacts as brand_artifacts
+from busqa.brand_artifacts import BrandArtifactRegistry
+from busqa.brand_resolver import BrandResolver
+from busqa.batch_evaluator import BatchConfig
+from busqa.config_registry import get_config_registry
+from busqa.prompt_loader import load_unified_rubrics
+from busqa.result_store import brand_fingerprint
+
+_PROMPT = "---\npolicies:\n  forbid_phone_collect: true\n---\nNhà xe chỉ bán phòng đôi A1D, B2D."
+
+
+def _setup(tmp_path, monkeypatch):
+    registry = BrandArtifactRegistry()
+    monkeypatch.setattr(brand_artifacts, "_default_registry", registry)
+    monkeypatch.setattr(get_config_registry(), "check_interval", 0)
+    prompt = tmp_path / "brands" / "nha_xe" / "prompt.md"
+    prompt.parent.mkdir(parents=True)
+    prompt.write_text(_PROMPT, encoding="utf-8")
+    bot_map = tmp_path / "bot_map.yaml"
+    bot_map.write_text(yaml.safe_dump({"defaults": {"fallback_brand": "nha_xe", "brands_dir": str(tmp_path / "brands")},
+                                       "bots": {"42": {"brand_id": "nha_xe", "prompt_path": str(prompt)}}}),
+                       encoding="utf-8")
+    return registry, prompt, str(bot_map)
+
+
+def test_compiled_artifact_and_reload(tmp_path, monkeypatch):
+    registry, prompt, _ = _setup(tmp_path, monkeypatch)
+    rubrics_cfg = load_unified_rubrics()
+
+    artifact = registry.from_prompt_file(str(prompt))
+    assert artifact.brand_id == "nha_xe" and artifact.brand_policy.forbid_phone_collect
+    assert artifact.allowed_positions == {"A1D", "B2D"}
+    assert artifact.brand_hash == brand_fingerprint(artifact.brand_prompt_text, artifact.brand_policy)
+    assert artifact.prompt_tokens > 0
+    assert artifact.system_prompt(rubrics_cfg) is artifact.system_prompt(rubrics_cfg)
+    assert registry.from_prompt_file(str(prompt)) is artifact
+
+    prompt.write_text(_PROMPT.replace("B2D", "B3D"), encoding="utf-8")
+    os.utime(prompt, ns=(10**18, 10**18))
+    edited = registry.from_prompt_file(str(prompt))
+    assert edited is not artifact and edited.allowed_positions == {"A1D", "B3D"}
+
+    kb = {"agent_name": "KB Bot", "summary": "Đọc số tiền bằng chữ"}
+    assert registry.from_kb_json(kb) is registry.from_kb_json(dict(kb))
+    assert registry.from_kb_json(kb).brand_policy.read_money_in_words
+    assert registry.stats()["compiled"] == 3
+
+
+def test_warm_up_and_shared_system_prompt(tmp_path, monkeypatch, fake_evaluator):
+    registry, prompt, bot_map = _setup(tmp_path, monkeypatch)
+    rubrics_cfg = load_unified_rubrics()
+    renders = []
+    original = brand_artifacts.build_system_prompt_unified
+    monkeypatch.setattr(brand_artifacts, "build_system_prompt_unified",
+                        lambda *args: renders.append(args) or original(*args))
+
+    resolver = BrandResolver(bot_map)
+    report = resolver.warm_up(rubrics_cfg)
+    assert report["brands"] == ["nha_xe"] and not report["errors"] and len(renders) == 1
+
+    prompts = []
+    conversation = {"conversation_id": "c1", "bot_id": "42", "messages": [
+        {"role": "user", "content": "Còn phòng đôi không", "created_at": "2025-01-01T08:00:00"},
+        {"role": "agent", "content": "Dạ phòng đôi B5D còn ạ", "created_at": "2025-01-01T08:00:03"}]}
+    for _ in range(2):  # hai request, cùng artifact
+        evaluator = fake_evaluator(BatchConfig(max_concurrency=1, use_high_performance_api=False))
+        results = asyncio.run(evaluator.evaluate_batch(
+            [dict(conversation)], None, rubrics_cfg, apply_diagnostics=True,
+            diagnostics_cfg={"operational_readiness": [], "risk_compliance": []}, brand_resolver=resolver))
+        assert results[0]["brand_id"] == "nha_xe"
+        hits = results[0]["metrics"]["diagnostics"]["operational_readiness"]
+        assert [h["key"] for h in hits] == ["double_room_rule_violation"]
+        prompts.extend(kw["system_prompt"] for kw in evaluator.llm_requests)
+    assert len(renders) == 1 and prompts[0] == prompts[1]
+    assert prompts[0] == resolver.resolve_artifact("42").system_prompt(rubrics_cfg)
@@ -0,0 +1,127 @@
+"""
+Tests for AIMD adaptive concurrency limiter
+"""
+import asyncio
+import time
+
+from busqa.concurrency import AIMDLimiter, AIMDConfig, classify_error, OK, RATE_LIMITED, TIMEOUT, SERVER_ERROR, ERROR
+from busqa.pipeline import StagedPipeline, Stage
+
+
+class _HTTPError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def test_classify_error():
+    assert classify_error(asyncio.TimeoutError()) == TIMEOUT
+    assert classify_error(_HTTPError(429)) == RATE_LIMITED
+    assert classify_error(_HTTPError(503)) == SERVER_ERROR
+    assert classify_error(Exception("429 Resource has been exhausted (RESOURCE_EXHAUSTED)")) == RATE_LIMITED
+    assert classify_error(Exception("Gemini API timeout after 30s (attempt 4/4)")) == TIMEOUT
+    assert classify_error(ValueError("Không có messages")) == ERROR
+
+
+def _release_with_latency(limiter, latency, outcome=OK):
+    """Chiếm hết slot (limit đang là nút cổ chai), trả một slot với outcome, còn lại không tính"""
+    async def fill():
+        return [await limiter.acquire() for _ in range(limiter.limit)]
+    slots = asyncio.run(fill())
+    limiter.release(time.monotonic() - latency, outcome)
+    for _ in slots[1:]:
+        limiter.release(time.monotonic(), None)
+
+
+def test_latency_spike_and_rate_limit_cut_then_recover():
+    limiter = AIMDLimiter("llm", AIMDConfig(min_limit=2, max_limit=12, initial_limit=8, window_size=4))
+    for _ in range(8):
+        _release_with_latency(limiter, 0.01)  # 2 cửa sổ đầu: latency tham chiếu
+    assert limiter.limit == 10 and limiter.history[-1]["reason"] == "healthy"
+
+    for _ in range(4):
+        _release_with_latency(limiter, 0.05)
+    assert limiter.limit == 5 and limiter.history[-1]["reason"] == "latency_spike"
+
+    _release_with_latency(limiter, 0.0, RATE_LIMITED)
+    assert limiter.limit == 2
+    _release_with_latency(limiter, 0.0, RATE_LIMITED)
+    assert limiter.limit == 2  # không xuống dưới min_limit
+
+    for _ in range(8):
+        _release_with_latency(limiter, 0.01)
+    assert limiter.limit == 4
+    stats = limiter.get_stats()
+    assert [h["reason"] for h in stats["history"]] == [
+        "healthy", "healthy", "latency_spike", "rate_limited", "healthy", "healthy"]
+    assert stats["outcomes"][RATE_LIMITED] == 2 and stats["increases"] == 4 and stats["decreases"] == 2
+
+
+def test_long_tail_alone_is_not_a_spike():
+    # ~5% request chậm gấp 10 lần nhưng median không đổi -> không cắt
+    limiter = AIMDLimiter("llm", AIMDConfig(min_limit=1, max_limit=8, initial_limit=8, window_size=20))
+    for i in range(400):
+        _release_with_latency(limiter, 0.1 if i % 20 == 7 else 0.01)
+    assert limiter.decreases == 0 and limiter.limit == 8
+
+
+def test_limit_gates_in_flight_and_in_flight_burst_is_cut_once():
+    async def run():
+        limiter = AIMDLimiter("fetch", AIMDConfig(min_limit=1, max_limit=8, window_size=100))
+        active, peak = [0], [0]
+        started = asyncio.Event()
+
+        async def call(i):
+            async with limiter.slot():
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+                if active[0] == 8:
+                    started.set()
+                await started.wait()
+                await asyncio.sleep(0.01)
+                active[0] -= 1
+                if i < 4:
+                    raise _HTTPError(429)
+
+        results = await asyncio.gather(*(call(i) for i in range(20)), return_exceptions=True)
+        return limiter, peak[0], results
+
+    limiter, peak, results = asyncio.run(run())
+    assert peak == 8
+    assert sum(isinstance(r, _HTTPError) for r in results) == 4
+    # 4 lần 429 cùng đợt request -> chỉ giảm một lần
+    assert limiter.limit == 4 and limiter.decreases == 1
+    assert limiter.in_flight == 0
+
+
+def test_pipeline_stage_adapts_to_backend_capacity():
+    capacity = 6
+    in_flight = [0]
+
+    async def backend(x):
+        in_flight[0] += 1
+        try:
+            await asyncio.sleep(0.002)
+            if in_flight[0] > capacity:
+                raise _HTTPError(429)
+            return x
+        finally:
+            in_flight[0] -= 1
+
+    limiter = AIMDLimiter("llm", AIMDConfig(min_limit=1, max_limit=16, initial_limit=2, window_size=5))
+    pipeline = StagedPipeline([Stage("llm", backend, limiter=limiter)],
+                              on_error=lambda item, exc, stage: "error")
+
+    async def run():
+        return [r async for r in pipeline.run(range(600))]
+
+    results = asyncio.run(run())
+    assert len(results) == 600
+    reasons = {h["reason"] for h in limiter.history}
+    assert "healthy" in reasons and "rate_limited" in reasons
+    assert 1 <= limiter.limit <= 16
+    stats = pipeline.get_stats()["stages"]["llm"]
+    assert stats["concurrency"] == limiter.limit
+    assert stats["adaptive"]["max_limit"] == 16
+    # AIMD dao động quanh capacity: phần lớn request thành công
+    assert results.count("error") < 60
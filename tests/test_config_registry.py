@@ -0,0 +1,82 @@
+"""
+Tests for the config registry (immutable snapshots, mtime-based reload)
+"""
+import os
+import json
+import pickle
+
+import pytest
+import yaml
+
+from busqa.config_registry import ConfigRegistry, FrozenDict
+from busqa.prompt_loader import load_unified_rubrics
+
+_RUBRICS = {"version": "t1", "criteria": {"a": 0.5, "b": 0.5}, "labels": [{"min": 0, "name": "ok"}]}
+
+
+def _write(path, data, mtime_ns=None):
+    path.write_text(yaml.safe_dump(data), encoding="utf-8")
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_snapshot_is_immutable_and_cached(tmp_path):
+    path = tmp_path / "rubrics.yaml"
+    _write(path, _RUBRICS)
+    registry = ConfigRegistry(check_interval=0)
+
+    snapshot = registry.rubrics(str(path))
+    assert registry.rubrics(str(path)) is snapshot
+    assert registry.counters["loads"] == 1 and registry.counters["reloads"] == 0
+
+    cfg = snapshot.data
+    assert isinstance(cfg, dict)
+    # Cùng JSON với loader gốc -> eval_fingerprint của result store không đổi
+    assert json.dumps(cfg, sort_keys=True) == json.dumps(load_unified_rubrics(str(path)), sort_keys=True)
+    with pytest.raises(TypeError):
+        cfg["version"] = "x"
+    with pytest.raises(TypeError):
+        cfg["criteria"]["a"] = 1.0
+    assert isinstance(cfg["labels"], tuple)
+    assert {**cfg, "version": "t2"}["version"] == "t2"  # copy thì sửa được
+    assert pickle.loads(pickle.dumps(cfg)) == cfg
+
+
+def test_reload_on_mtime_change_only(tmp_path):
+    path = tmp_path / "rubrics.yaml"
+    _write(path, _RUBRICS, mtime_ns=1_000_000_000)
+    registry = ConfigRegistry(check_interval=0)
+    first = registry.rubrics(str(path))
+
+    # Touch không đổi nội dung -> giữ data cũ
+    os.utime(path, ns=(2_000_000_000, 2_000_000_000))
+    touched = registry.rubrics(str(path))
+    assert touched.data is first.data and touched.content_hash == first.content_hash
+    assert registry.counters["unchanged_reloads"] == 1
+
+    _write(path, {**_RUBRICS, "version": "t2"}, mtime_ns=3_000_000_000)
+    changed = registry.rubrics(str(path))
+    assert changed.data["version"] == "t2" and changed.content_hash != first.content_hash
+    assert first.data["version"] == "t1"  # snapshot cũ không bị đổi
+    assert registry.counters["reloads"] == 1
+
+    # File hỏng giữa chừng -> giữ bản đang chạy
+    path.write_text("criteria: [unclosed", encoding="utf-8")
+    os.utime(path, ns=(4_000_000_000, 4_000_000_000))
+    assert registry.rubrics(str(path)).data["version"] == "t2"
+    assert registry.counters["errors"] == 1
+
+
+def test_check_interval_and_brand_prompt(tmp_path):
+    path = tmp_path / "prompt.md"
+    path.write_text("---\npolicies:\n  forbid_phone_collect: true\n---\nXin chào", encoding="utf-8")
+    registry = ConfigRegistry(check_interval=3600)
+    text, policy = registry.brand(str(path)).data
+    assert text == "Xin chào" and policy.forbid_phone_collect
+
+    # Trong check_interval không stat lại file
+    path.write_text("Đã sửa", encoding="utf-8")
+    assert registry.brand(str(path)).data[0] == "Xin chào"
+    registry.check_interval = 0
+    assert registry.brand(str(path)).data[0] == "Đã sửa"
+    assert [c["kind"] for c in registry.stats()["configs"]] == ["brand"]
@@ -0,0 +1,113 @@
+"""
+Tests for the local conversation store and incremental per-bot sync
+"""
+import asyncio
+
+import httpx
+
+from busqa.conversation_store import ConversationStore, sync_bot
+from busqa.decode import conversation_from_dict
+from busqa.list_fetcher import AsyncListFetcher, FetchConfig
+
+
+def _raw(i: int, turns: int = 2):
+    return {
+        "conversation_id": f"c{i}",
+        "bot_id": "3794",
+        "created_at": f"2025-01-01T08:{i:02d}:00Z",
+        "messages": [{"role": "user" if t % 2 == 0 else "agent", "content": f"tin nhắn {t} của {i}",
+                      "sender_name": "Lan" if t == 1 else None,
+                      "created_at": f"2025-01-01T08:{i:02d}:{t:02d}+07:00"} for t in range(turns)],
+    }
+
+
+def test_round_trip_keeps_frame_and_content_hash(tmp_path):
+    store = ConversationStore(str(tmp_path / "conversations.sqlite"))
+    original = conversation_from_dict(_raw(1, turns=5))
+    assert store.upsert([original, _raw(2, turns=1)]) == {"inserted": 2, "updated": 0, "unchanged": 0}
+
+    loaded = store.get("c1")
+    assert loaded.bot_id == "3794" and loaded.created_at == "2025-01-01T08:01:00Z"
+    assert loaded.messages.content_hash() == original.messages.content_hash()
+    assert [m.text for m in loaded.messages] == [m.text for m in original.messages]
+    assert loaded.messages[1].sender_name == "Lan"
+    assert loaded.messages[0].ts == original.messages[0].ts
+
+    # Cùng nội dung -> không ghi lại; nội dung đổi -> update
+    assert store.upsert([_raw(2, turns=1), _raw(1, turns=6)]) == {"inserted": 0, "updated": 1, "unchanged": 1}
+    assert [c.conversation_id for c in store.load_bot("3794")] == ["c2", "c1"]
+    assert [c.conversation_id for c in store.load_bot("3794", min_turns=3)] == ["c1"]
+
+
+class _ListAPI:
+    """list API mới nhất trước, page_size 3"""
+
+    def __init__(self, count: int):
+        self.count = count
+        self.pages = []
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        page = int(request.url.params["page"])
+        size = int(request.url.params["page_size"])
+        self.pages.append(page)
+        newest_first = list(range(self.count - 1, -1, -1))
+        return httpx.Response(200, json={"conversations": [
+            _raw(i) for i in newest_first[(page - 1) * size:page * size]]})
+
+
+def test_incremental_sync_fetches_only_new_conversations(tmp_path):
+    store = ConversationStore(str(tmp_path / "conversations.sqlite"))
+    api = _ListAPI(count=7)
+
+    def sync():
+        api.pages.clear()
+        config = FetchConfig("http://list.local", "3794", "token", page_size=3, page_concurrency=1,
+                             rate_limit_per_second=0)
+        fetcher = AsyncListFetcher(config, httpx.AsyncClient(transport=httpx.MockTransport(api)))
+        return asyncio.run(sync_bot(store, config, fetcher=fetcher))
+
+    first = sync()
+    assert first["inserted"] == 7 and store.count("3794") == 7
+    assert store.watermark("3794")[1] == "c6"
+
+    api.count = 9  # c7, c8 mới, nằm ở trang đầu
+    second = sync()
+    assert second["new"] == 2 and second["inserted"] == 2
+    assert second["reached_watermark"] and api.pages == [1, 2]
+    assert store.watermark("3794")[1] == "c8"
+
+    third = sync()
+    assert third["new"] == 0 and api.pages == [1]
+    assert store.stats()["conversations"] == 9
+
+
+def test_truncated_sync_keeps_watermark_and_skips_items_without_id(tmp_path):
+    store = ConversationStore(str(tmp_path / "conversations.sqlite"))
+    api = _ListAPI(count=3)
+
+    def sync(max_pages=20):
+        config = FetchConfig("http://list.local", "3794", "token", page_size=3, page_concurrency=1,
+                             max_pages=max_pages, rate_limit_per_second=0)
+        fetcher = AsyncListFetcher(config, httpx.AsyncClient(transport=httpx.MockTransport(api)))
+        return asyncio.run(sync_bot(store, config, fetcher=fetcher))
+
+    assert sync()["inserted"] == 3 and store.watermark("3794")[1] == "c2"
+
+    api.count = 10  # c3..c9 mới, nhiều hơn một trang
+    truncated = sync(max_pages=1)
+    assert truncated["truncated"] and not truncated["reached_watermark"] and truncated["inserted"] == 3
+    assert store.watermark("3794")[1] == "c2"  # c3..c6 chưa đọc -> không nhảy qua
+
+    caught_up = sync()
+    assert caught_up["reached_watermark"] and not caught_up["truncated"]
+    assert store.count("3794") == 10 and store.watermark("3794")[1] == "c9"
+
+    # Item thiếu conversation_id không làm lệch cặp conversation / key
+    async def with_orphan(request):
+        page = [{**_raw(20), "conversation_id": None}, _raw(11), _raw(10)]
+        return httpx.Response(200, json={"conversations": page if request.url.params["page"] == "1" else []})
+
+    api = with_orphan
+    report = sync()
+    assert report["new"] == 2 and store.get("c11") is not None and store.get("c10") is not None
+    assert store.watermark("3794")[1] == "c11"
@@ -0,0 +1,55 @@
+"""
+Tests for the micro-batched CPU stage
+"""
+import asyncio
+import pytest
+
+from busqa.cpu_stage import MicroBatchCPUStage, CPUStageConfig
+
+
+def _square(x):
+    return x * x
+
+
+def _boom(x):
+    raise ValueError(f"bad {x}")
+
+
+def test_micro_batch_groups_jobs_into_few_hops():
+    """Nhiều job gửi cùng lúc phải được gom vào ít lần hop executor"""
+    async def run():
+        stage = MicroBatchCPUStage(CPUStageConfig(batch_window_ms=5, max_batch_size=50))
+        results = await asyncio.gather(*(stage.submit(_square, i) for i in range(100)))
+        await stage.close()
+        return results, stage.get_stats()
+
+    results, stats = asyncio.run(run())
+    assert results == [i * i for i in range(100)]
+    assert stats["items"] == 100
+    assert stats["executor_hops"] <= 4
+    assert stats["pending"] == 0
+
+
+def test_micro_batch_propagates_errors_per_job():
+    """Lỗi của một job chỉ ảnh hưởng future của job đó"""
+    async def run():
+        stage = MicroBatchCPUStage()
+        ok = stage.submit(_square, 3)
+        bad = stage.submit(_boom, 1)
+        results = await asyncio.gather(ok, bad, return_exceptions=True)
+        await stage.close()
+        return results
+
+    ok, bad = asyncio.run(run())
+    assert ok == 9
+    assert isinstance(bad, ValueError)
+
+
+def test_submit_after_close_raises():
+    async def run():
+        stage = MicroBatchCPUStage()
+        await stage.close()
+        with pytest.raises(RuntimeError):
+            await stage.submit(_square, 2)
+
+    asyncio.run(run())
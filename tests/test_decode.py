@@ -0,0 +1,97 @@
+"""
+Tests for typed conversation decoding from bytes
+"""
+import json
+
+import pytest
+
+from busqa.decode import decode_conversation, decode_conversation_page, conversation_from_dict
+from busqa.frame import ConversationFrame
+from busqa.parsers import extract_bot_id
+from tools.bulk_list_evaluate import select_conversations
+
+
+CONV = {
+    "conversation_id": "c1",
+    "created_at": "2025-01-01T08:00:00Z",
+    "status": "closed",
+    "metadata": {"bot_id": 3794, "channel": "zalo"},
+    "messages": [
+        {"id": 1, "from": "customer", "content": None, "text": "Cho tôi hỏi vé", "createdAt": 1735718400000},
+        {"id": 2, "from": "cskh", "content": "Dạ em chào anh", "fromName": "Lan", "createdAt": 1735718405000,
+         "attachments": [{"url": "x"}]},
+    ],
+}
+
+
+def _same(a, b):
+    assert a.conversation_id == b.conversation_id
+    assert a.bot_id == b.bot_id
+    assert a.created_at == b.created_at
+    assert list(a.messages) == list(b.messages)
+
+
+def test_typed_path_matches_dict_path():
+    body = json.dumps(CONV, ensure_ascii=False).encode("utf-8")
+    decoded = decode_conversation(body)
+    _same(decoded, conversation_from_dict(CONV))
+    assert decoded.bot_id == extract_bot_id(CONV) == "3794"
+    assert decoded.messages[1].sender_name == "Lan"
+    assert decoded.messages[0].text == "Cho tôi hỏi vé"
+
+
+def test_bot_id_from_message_sender_and_data_key():
+    raw = {"data": [{"role": "user", "content": "a", "sender": {"bot_id": "99"}}], "bot": {"id": "7"}}
+    decoded = decode_conversation(json.dumps(raw).encode(), conversation_id="c2")
+    # messages không có -> bot_id lấy theo key "bot" như extract_bot_id
+    assert decoded.bot_id == extract_bot_id(raw) == "7"
+    assert decoded.conversation_id == "c2"
+    assert len(decoded.messages) == 1
+
+
+def test_unexpected_schema_falls_back_to_dict_path():
+    raw = [{"role": "user", "content": "a"}, "not a message", {"role": "agent", "content": "b"}]
+    decoded = decode_conversation(json.dumps(raw).encode(), conversation_id="c3")
+    assert [m.text for m in decoded.messages] == ["a", "b"]
+    assert decoded.bot_id is None
+
+
+def test_page_decode_works_with_selection():
+    other = dict(CONV, conversation_id="c0", created_at="2024-12-31T08:00:00Z")
+    body = json.dumps({"conversations": [other, CONV], "page": 1}).encode()
+    page = decode_conversation_page(body)
+    assert [c.get("conversation_id") for c in page] == ["c0", "c1"]
+    assert isinstance(ConversationFrame.from_raw(page[0]), ConversationFrame)
+
+    selected = select_conversations(page, take=1, strategy="newest")
+    assert selected[0]["conversation_id"] == "c1"
+    assert selected[0].to_dict()["messages"][1]["content"] == "Dạ em chào anh"
+
+
+def test_struct_path_parity_with_dict_path():
+    msgspec = pytest.importorskip("msgspec")
+    from busqa import decode
+
+    variants = [
+        CONV,
+        dict(CONV, bot_id="42"),  # bot_id top-level ưu tiên hơn metadata
+        {"conversation_id": "c4", "messages": [{"role": "agent", "content": "x", "bot_id": 5}]},
+        {"conversation_id": "c5", "messages": [{"role": "user", "content": "y"}], "thread": {"id": "t9"}},
+    ]
+    for raw in variants:
+        body = json.dumps(raw, ensure_ascii=False).encode("utf-8")
+        _same(decode._from_struct(decode._conversation_decoder.decode(body)), conversation_from_dict(raw))
+
+    page = json.dumps({"conversations": variants}, ensure_ascii=False).encode("utf-8")
+    typed = [decode._from_struct(c) for c in decode._page_decoder.decode(page).conversations]
+    assert [c.bot_id for c in typed] == [extract_bot_id(v) for v in variants] == ["3794", "42", "5", "t9"]
+    for a, raw in zip(decode_conversation_page(page), variants):
+        _same(a, conversation_from_dict(raw))
+
+    # Schema lệch (messages không phải list) -> struct decode lỗi, decode_* rơi về đường dict
+    bad = {"conversation_id": "c6", "messages": {"role": "user"}}
+    with pytest.raises(msgspec.ValidationError):
+        decode._conversation_decoder.decode(json.dumps(bad).encode())
+    assert decode_conversation(json.dumps(bad).encode()).conversation_id == "c6"
+    page = json.dumps({"conversations": [bad, CONV]}).encode()
+    assert [c.conversation_id for c in decode_conversation_page(page)] == ["c6", "c1"]
@@ -0,0 +1,72 @@
+"""
+Tests for size-aware LLM dispatch (SJF / LJF) and the token budget
+"""
+import asyncio
+import statistics
+
+from busqa.batch_evaluator import BatchConfig
+from busqa.brand_specs import BrandPolicy
+from busqa.dispatch import DispatchConfig, TokenBudget, FIFO, SJF, LJF
+from busqa.prompt_loader import load_unified_rubrics
+
+
+def test_token_budget_backfills_small_calls_and_runs_oversized_alone():
+    budget = TokenBudget(100, max_bypass=1)
+    order = []
+
+    async def call(name, cost, seconds=0.02):
+        async with budget.slot(cost):
+            order.append(name)
+            assert budget.in_flight <= 100 or budget.in_flight_calls == 1
+            await asyncio.sleep(seconds)
+
+    async def run():
+        first = asyncio.create_task(call("big1", 80))
+        await asyncio.sleep(0)
+        big2 = asyncio.create_task(call("big2", 80))
+        await asyncio.sleep(0)
+        # small1 vừa chỗ trống -> vượt big2; big2 đã bị vượt 1 lần -> small2 phải chờ sau big2
+        smalls = [asyncio.create_task(call(f"small{i}", 15)) for i in (1, 2)]
+        huge = asyncio.create_task(call("huge", 500, 0.001))
+        await asyncio.gather(first, big2, *smalls, huge)
+
+    asyncio.run(run())
+    assert order[:3] == ["big1", "small1", "big2"]
+    assert order.index("small2") > order.index("big2")
+    stats = budget.get_stats()
+    assert stats["calls"] == 5 and stats["bypasses"] == 1 and stats["in_flight_tokens"] == 0
+    assert stats["peak_in_flight_tokens"] == 500  # quá budget nhưng chạy một mình
+
+
+def _conversation(idx, turns):
+    messages = [{"role": "user" if t % 2 == 0 else "agent", "content": f"Tin nhắn số {t} về chuyến đi Đà Lạt",
+                 "created_at": f"2025-01-01T08:{t // 60:02d}:{t % 60:02d}"} for t in range(turns)]
+    return {"conversation_id": f"c{idx}", "bot_id": "3794", "messages": messages}
+
+
+def _dispatch_order(fake_evaluator, conversations, dispatch):
+    # LLM giả: latency tỉ lệ độ dài prompt
+    evaluator = fake_evaluator(BatchConfig(max_concurrency=1, cpu_concurrency=4, use_high_performance_api=False,
+                                           dispatch=dispatch),
+                               llm_delay=lambda kwargs: len(kwargs["user_prompt"]) / 500_000)
+    results = asyncio.run(evaluator.evaluate_batch(conversations, None, load_unified_rubrics(), BrandPolicy(), "",
+                                                   apply_diagnostics=False))
+    assert len(results) == len(conversations) and not any("error" in r for r in results)
+    sizes = [len(kwargs["user_prompt"]) for kwargs in evaluator.llm_requests]
+    threshold = statistics.median(sizes) * 3
+    return [i for i, size in enumerate(sizes) if size > threshold], evaluator
+
+
+def test_sjf_and_ljf_reorder_llm_dispatch_by_token_cost(fake_evaluator):
+    long_first = [_conversation(i, 200 if i % 6 == 0 else 6) for i in range(24)]
+    fifo, _ = _dispatch_order(fake_evaluator, long_first, DispatchConfig(policy=FIFO))
+    sjf, evaluator = _dispatch_order(fake_evaluator, long_first, DispatchConfig(policy=SJF, max_inflight_tokens=50_000))
+    assert len(fifo) == len(sjf) == 4
+    assert statistics.mean(sjf) > statistics.mean(fifo) + 5  # hội thoại dài bị đẩy ra sau
+    budget = evaluator.pipeline_stats["stages"]["llm"]["token_budget"]
+    assert budget["calls"] == 24 and budget["peak_in_flight_tokens"] <= 50_000
+
+    long_last = [_conversation(i, 200 if i >= 20 else 6) for i in range(24)]
+    fifo, _ = _dispatch_order(fake_evaluator, long_last, DispatchConfig(policy=FIFO))
+    ljf, _ = _dispatch_order(fake_evaluator, long_last, DispatchConfig(policy=LJF))
+    assert fifo == [20, 21, 22, 23] and statistics.mean(ljf) < statistics.mean(fifo) - 5
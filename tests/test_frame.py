@@ -0,0 +1,60 @@
+"""
+Tests for ConversationFrame compact representation
+"""
+from datetime import datetime
+
+from busqa.frame import ConversationFrame
+from busqa.models import Message
+from busqa.normalize import normalize_messages, build_transcript
+from busqa.metrics import compute_latency_metrics, compute_additional_metrics
+from busqa.diagnostics import detect_risk_compliance
+from busqa.brand_specs import BrandPolicy
+
+
+RAW = {
+    "conversation_id": "c1",
+    "messages": [
+        {"role": "user", "content": "Tôi muốn đặt vé", "created_at": "2025-01-01T08:00:00"},
+        {"role": "agent", "content": "Cho em xin số điện thoại ạ", "created_at": "2025-01-01T08:00:04"},
+        {"role": "user", "content": "0901234567", "created_at": "2025-01-01T08:00:10"},
+        {"role": "agent", "content": "Cho em xin số điện thoại ạ", "created_at": "2025-01-01T08:00:12"},
+    ],
+}
+
+
+def test_frame_matches_message_records():
+    records = normalize_messages(RAW)
+    frame = ConversationFrame.from_raw(RAW)
+
+    assert frame.conversation_id == "c1"
+    assert len(frame) == 4
+    assert list(frame) == records
+    assert build_transcript(frame) == build_transcript(records)
+    assert compute_latency_metrics(frame) == compute_latency_metrics(records)
+    assert compute_additional_metrics(frame) == compute_additional_metrics(records)
+
+
+def test_frame_interns_repeated_text():
+    frame = ConversationFrame.from_raw(RAW)
+    # câu lặp lại của agent chỉ lưu một lần trong buffer
+    assert frame.buffer.count("Cho em xin số điện thoại ạ") == 1
+    assert frame.text(1) == frame.text(3)
+    assert list(frame.turns("agent")) == [(1, "Cho em xin số điện thoại ạ"), (3, "Cho em xin số điện thoại ạ")]
+
+
+def test_frame_handles_missing_timestamps_and_pydantic_messages():
+    messages = [
+        Message(ts=None, sender_type="user", text="a"),
+        Message(ts=datetime(2025, 1, 1, 8, 0, 0), sender_type="agent", text="b"),
+    ]
+    frame = ConversationFrame.from_messages(messages)
+    assert frame.timestamp(0) is None
+    assert frame.datetime_at(1) == datetime(2025, 1, 1, 8, 0, 0)
+    assert frame[-1].text == "b"
+    assert compute_latency_metrics(frame)["first_response_latency_seconds"] is None
+
+
+def test_diagnostics_accept_frame():
+    frame = ConversationFrame.from_raw(RAW)
+    hits = detect_risk_compliance(frame, BrandPolicy(forbid_phone_collect=True))
+    assert [h["key"] for h in hits if h["key"] == "forbidden_phone_collect"] == ["forbidden_phone_collect"]
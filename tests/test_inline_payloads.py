@@ -0,0 +1,49 @@
+"""
+Tests for evaluating inline conversation payloads without re-fetching
+"""
+import asyncio
+
+from busqa.batch_evaluator import BatchConfig
+from busqa.brand_specs import BrandPolicy
+from busqa.decode import decode_conversation_page
+from busqa.prompt_loader import load_unified_rubrics
+
+
+def _evaluate(fake_evaluator, items, **config):
+    rubrics_cfg = load_unified_rubrics()
+    evaluator = fake_evaluator(BatchConfig(max_concurrency=2, **config), rubrics_cfg)
+    results = asyncio.run(evaluator.evaluate_batch(items, "http://unused", rubrics_cfg, BrandPolicy(), ""))
+    return evaluator, results
+
+
+def test_mixed_ids_and_inline_only_fetch_ids(fake_evaluator, messages):
+    # Dạng của /evaluate/batch (pydantic .dict()) và của list API (DecodedConversation)
+    inline_dict = {"conversation_id": "inline-1", "messages": messages, "metadata": None}
+    page = {"conversations": [{"conversation_id": "inline-2", "bot_id": "3794", "messages": [
+        {"role": "user", "content": "Xe có wifi không", "created_at": "2025-01-01T09:00:00"}]}]}
+    decoded = decode_conversation_page(page)[0]
+
+    evaluator, results = _evaluate(fake_evaluator, ["id-1", inline_dict, decoded, {"conversation_id": "id-2"}],
+                                   use_high_performance_api=False)
+    assert sorted(evaluator.fetched) == ["id-1", "id-2"]
+    assert [r["conversation_id"] for r in results] == ["id-1", "inline-1", "inline-2", "id-2"]
+    assert all("error" not in r for r in results)
+    assert results[2]["metrics"]
+    # Chỉ conversation thật sự fetch mới đi qua AIMD limiter của fetch
+    assert evaluator.concurrency_stats["fetch"]["outcomes"]["ok"] == 2
+
+
+def test_all_inline_needs_no_conversation_api(fake_evaluator, messages):
+    items = [{"conversation_id": f"c{i}", "messages": messages} for i in range(3)]
+    evaluator, results = _evaluate(fake_evaluator, items, use_high_performance_api=True)
+    assert evaluator.fetched == [] and evaluator.api_client is None
+    assert [r["conversation_id"] for r in results] == ["c0", "c1", "c2"]
+    assert all("error" not in r for r in results)
+
+
+def test_duplicate_inline_id_is_a_per_item_error(fake_evaluator, messages):
+    items = [{"conversation_id": "c1", "messages": messages}, {"conversation_id": "c1", "messages": messages}]
+    evaluator, results = _evaluate(fake_evaluator, items, use_high_performance_api=True)
+    assert evaluator.fetched == [] and evaluator.api_client is None
+    assert sorted("error" in r for r in results) == [False, True]
+    assert evaluator.processed_count == 2
@@ -0,0 +1,98 @@
+"""
+Tests for checkpointed run journal and resume
+"""
+import asyncio
+
+import pytest
+
+import busqa.journal as journal_module
+from busqa.journal import RunJournal
+from busqa.batch_evaluator import BatchConfig
+from busqa.brand_specs import BrandPolicy
+from busqa.prompt_loader import load_unified_rubrics
+
+
+def _ok(cid, score=80.0):
+    return {"conversation_id": cid, "metrics": {"policy_violations": 0},
+            "result": {"total_score": score, "label": "Tốt", "detected_flow": "A",
+                       "criteria": {"empathy_experience": {"score": score, "note": ""}}}}
+
+
+def test_crash_mid_write_then_resume_state(tmp_path):
+    journal = RunJournal.create(["a", "b", "c", "d"], params={"brand_id": "x"}, run_id="run-1",
+                                journal_dir=str(tmp_path))
+    journal.append(_ok("a", 90))
+    journal.append({"conversation_id": "b", "error": "LLM timeout"})
+    journal.close()
+    with open(journal.path, "a", encoding="utf-8") as f:
+        f.write('{"conversation_id": "c", "resu')  # process chết giữa lúc ghi
+
+    reopened = RunJournal.open("run-1", str(tmp_path))
+    assert reopened.params == {"brand_id": "x"}
+    assert reopened.remaining_ids() == ["b", "c", "d"]  # lỗi được chạy lại
+
+    report = reopened.summary()
+    assert report["run"] == {**report["run"], "total": 4, "completed": 1, "failed": 1, "partial": True}
+    assert report["summary"]["successful_count"] == 1 and report["summary"]["error_count"] == 1
+
+    # Ghi tiếp sau dòng hỏng; kết quả mới nhất thắng và giữ thứ tự của run
+    reopened.append(_ok("b", 70))
+    reopened.append(_ok("d", 60))
+    reopened.close()
+    results = RunJournal.open("run-1", str(tmp_path)).results()
+    assert [r["conversation_id"] for r in results] == ["a", "b", "d"]
+    assert "error" not in results[1]
+
+    with pytest.raises(FileExistsError):
+        RunJournal.create(["a"], run_id="run-1", journal_dir=str(tmp_path))
+    with pytest.raises(ValueError):
+        RunJournal("../etc/passwd", str(tmp_path))
+
+
+def test_empty_partial_summary_is_valid(tmp_path):
+    journal = RunJournal.create(["a", "b"], journal_dir=str(tmp_path))
+    report = journal.summary()
+    assert report["run"]["completed"] == 0 and report["run"]["remaining"] == 2
+    assert report["summary"]["successful_count"] == 0
+    assert report["insights"]
+
+
+def test_lazy_fsync_batches_syncs_until_close(tmp_path, monkeypatch):
+    syncs = []
+    monkeypatch.setattr(journal_module.os, "fsync", syncs.append)
+    monkeypatch.setattr(journal_module, "LAZY_FSYNC_INTERVAL", 3600)
+
+    durable = RunJournal.create(["a", "b"], run_id="durable", journal_dir=str(tmp_path))
+    durable.append(_ok("a"))
+    durable.close()
+    assert len(syncs) == 2  # header + result, không sync thêm khi close
+
+    syncs.clear()
+    lazy = RunJournal.create(["a", "b"], run_id="lazy", journal_dir=str(tmp_path), fsync=False)
+    lazy.append(_ok("a"))
+    lazy.append(_ok("b"))
+    assert syncs == []
+    assert len(RunJournal.open("lazy", str(tmp_path)).results()) == 2  # đã flush, đọc được ngay
+    lazy.close()
+    assert len(syncs) == 1
+
+
+def test_resume_evaluates_only_remaining(tmp_path, fake_evaluator):
+    rubrics_cfg = load_unified_rubrics()
+    ids = [f"c{i}" for i in range(10)]
+    journal = RunJournal.create(ids, run_id="resume", journal_dir=str(tmp_path))
+    for cid in ids[:6]:
+        journal.append(_ok(cid))
+    journal.close()
+
+    resumed = RunJournal.open("resume", str(tmp_path))
+    config = BatchConfig(max_concurrency=3, use_high_performance_api=False, stream_callback=resumed.append)
+    evaluator = fake_evaluator(config, rubrics_cfg)
+    asyncio.run(evaluator.evaluate_batch(resumed.remaining_ids(), "http://x", rubrics_cfg, BrandPolicy(), ""))
+    resumed.close()
+
+    assert sorted(evaluator.fetched) == ids[6:]
+    final = RunJournal.open("resume", str(tmp_path))
+    assert [r["conversation_id"] for r in final.results()] == ids
+    assert final.progress()["partial"] is False
+    assert final.summary()["summary"]["successful_count"] == 10
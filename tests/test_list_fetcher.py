@@ -0,0 +1,91 @@
+"""
+Tests for the pipelined async list fetcher
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from busqa.batch_evaluator import BatchConfig
+from busqa.brand_specs import BrandPolicy
+from busqa.list_fetcher import AsyncListFetcher, FetchConfig, ListFetchError
+from busqa.prompt_loader import load_unified_rubrics
+
+
+class _ListAPI:
+    """list API giả lập: trang sau trả nhanh hơn trang trước, có thể 429/401 theo request"""
+
+    def __init__(self, total: int, statuses=None, messages=()):
+        self.total = total
+        self.messages = list(messages)
+        self.statuses = list(statuses or [])
+        self.requests = []
+        self.active = 0
+        self.max_active = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        page = int(request.url.params["page"])
+        size = int(request.url.params["page_size"])
+        self.requests.append(page)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(0.02 / page)
+        finally:
+            self.active -= 1
+        if self.statuses:
+            status = self.statuses.pop(0)
+            if status != 200:
+                return httpx.Response(status, headers={"Retry-After": "0.01"}, json={})
+        ids = range((page - 1) * size, min(page * size, self.total))
+        return httpx.Response(200, json={"conversations": [
+            {"conversation_id": f"c{i}", "bot_id": "3794", "messages": self.messages} for i in ids]})
+
+
+def _fetcher(api: _ListAPI, **config) -> AsyncListFetcher:
+    client = httpx.AsyncClient(transport=httpx.MockTransport(api))
+    return AsyncListFetcher(FetchConfig("http://list.local", "3794", "token", page_size=3,
+                                        rate_limit_per_second=0, backoff_delay=0.01, **config), client)
+
+
+def test_pages_fetched_concurrently_and_emitted_in_order():
+    api = _ListAPI(total=7)
+    fetcher = _fetcher(api, page_concurrency=3)
+    conversations = asyncio.run(fetcher.fetch_all())
+    assert [c["conversation_id"] for c in conversations] == [f"c{i}" for i in range(7)]
+    assert api.max_active == 3
+    # Trang 3 thiếu -> dừng, không mở thêm trang sau cửa sổ speculative
+    assert sorted(api.requests) == [1, 2, 3]
+    assert fetcher.stats["pages"] == 3 and fetcher.stats["first_page_seconds"] is not None
+
+    limited = _fetcher(_ListAPI(total=100), page_concurrency=2, limit=5)
+    assert len(asyncio.run(limited.fetch_all())) == 6  # dừng ở trang đủ limit
+
+
+def test_rate_limited_pages_retry_and_auth_errors_fail_fast():
+    api = _ListAPI(total=4, statuses=[429, 200, 503])
+    fetcher = _fetcher(api, page_concurrency=1)
+    assert len(asyncio.run(fetcher.fetch_all())) == 4
+    assert fetcher.stats["rate_limited"] == 1 and fetcher.stats["retries"] == 2
+
+    unauthorized = _ListAPI(total=4, statuses=[401])
+    with pytest.raises(ListFetchError) as exc:
+        asyncio.run(_fetcher(unauthorized, page_concurrency=1, retry_count=5).fetch_all())
+    assert exc.value.status_code == 401 and unauthorized.requests == [1]
+
+
+def test_streaming_source_feeds_evaluator_as_pages_arrive(fake_evaluator, messages):
+    rubrics_cfg = load_unified_rubrics()
+    # conversations={} -> mọi fetch lại của payload list API đều là lỗi
+    evaluator = fake_evaluator(BatchConfig(max_concurrency=2), rubrics_cfg, conversations={})
+    fetcher = _fetcher(_ListAPI(total=8, messages=messages), page_concurrency=2, typed_decode=True)
+
+    async def run():
+        return [result async for result in evaluator.iter_evaluate(
+            fetcher.iter_conversations(), None, rubrics_cfg, BrandPolicy(), "")]
+
+    results = asyncio.run(run())
+    assert sorted(r["conversation_id"] for r in results) == sorted(f"c{i}" for i in range(8))
+    assert all("error" not in r for r in results)
+    assert evaluator.fetched == [] and evaluator.api_client is None
+    assert evaluator.total_conversations == 8
@@ -0,0 +1,123 @@
+"""
+Tests for incremental analysis of live (still-growing) conversations
+"""
+import asyncio
+
+from busqa.batch_evaluator import analyze_conversation
+from busqa.brand_specs import BrandPolicy
+from busqa.frame import ConversationFrame
+from busqa.live import IncrementalAnalyzer, LiveConfig, LiveSession, LiveSessionStore
+from busqa.normalize import normalize_messages
+
+_BRAND_TEXT = "Nhà xe chỉ bán A1D, B2D cho phòng đôi."
+
+_MESSAGES = [
+    {"role": "user", "content": "Alo cho tôi hỏi vé đi Đà Lạt", "created_at": "2025-01-01T08:00:00"},
+    {"role": "agent", "content": "Dạ em chào anh, em là nhân viên nhà xe. Anh đi ngày nào ạ?",
+     "created_at": "2025-01-01T08:00:05"},
+    {"role": "user", "content": "Ngày mai, cho con tôi sinh năm 2019 đi cùng", "created_at": "2025-01-01T08:00:20"},
+    {"role": "agent", "content": "Dạ anh cho em xin họ tên và số điện thoại ạ", "created_at": "2025-01-01T08:00:26"},
+    {"role": "system", "content": "call transferred", "created_at": "2025-01-01T08:00:30"},
+    {"role": "agent", "content": "Dạ giá vé là 350k anh muốn điểm đón ở đâu ạ?", "created_at": "2025-01-01T08:00:40"},
+    {"role": "user", "content": "Đón ở bến xe, điểm đến là chợ Đà Lạt", "created_at": "2025-01-01T08:01:00"},
+    {"role": "agent", "content": "Dạ xin chào, tôi là tổng đài viên. Phòng đôi còn B3D, A1D, giá 500 nghìn",
+     "created_at": "2025-01-01T08:01:09"},
+    {"role": "agent", "content": "Em đã giữ chỗ, anh đặt cọc giúp em. Tóm lại: 1, 2, 3, 4, 5, 6 ạ",
+     "created_at": "2025-01-01T08:01:15"},
+    {"role": "user", "content": "Ok em", "created_at": "2025-01-01T08:01:30"},
+    {"role": "agent", "content": "Em xin phép lưu thông tin địa chỉ anh nhé. Cảm ơn anh, tạm biệt",
+     "created_at": "2025-01-01T08:01:40"},
+]
+
+
+def _policy():
+    policy = BrandPolicy(forbid_phone_collect=True, require_fixed_greeting=True, ban_full_summary=True)
+    policy.no_route_validation = True
+    policy.pdpa_consent_required = True
+    return policy
+
+
+def _keys(diagnostics):
+    return {group: [hit["key"] for hit in hits] for group, hits in diagnostics.items()}
+
+
+def test_incremental_metrics_match_batch_analysis_on_every_prefix():
+    policy = _policy()
+    analyzer = IncrementalAnalyzer(policy, _BRAND_TEXT)
+    records = normalize_messages(_MESSAGES)
+    seen_hits = []
+    for n, record in enumerate(records, 1):
+        seen_hits.extend(analyzer.append(record))
+        _, expected = analyze_conversation(ConversationFrame.from_messages(records[:n]), policy, _BRAND_TEXT)
+        live = analyzer.metrics()
+        assert _keys(live.pop("diagnostics")) == _keys(expected.pop("diagnostics")), f"prefix {n}"
+        assert live == expected, f"prefix {n}"
+
+    _, expected = analyze_conversation(ConversationFrame.from_messages(records), policy, _BRAND_TEXT)
+    assert analyzer.metrics()["diagnostics"] == expected["diagnostics"]  # evidence giống hệt
+    assert {"forbidden_phone_collect", "fare_math_inconsistent", "double_room_rule_violation",
+            "promise_hold_seat", "payment_policy_violation", "child_policy_miss"} <= set(seen_hits)
+    assert analyzer.context_resets == 1 and analyzer.repeated_questions == 0
+
+    # Dict thô append từng cái (start_index giữ đúng quy tắc sender mặc định)
+    raw = IncrementalAnalyzer(policy, _BRAND_TEXT)
+    for message in _MESSAGES:
+        raw.append(message)
+    assert raw.metrics() == analyzer.metrics()
+
+
+def test_live_session_reevaluates_only_after_turn_or_hit_deltas():
+    config = LiveConfig(reevaluate_every_turns=4, min_turns=2)
+    session = LiveSession("c1", IncrementalAnalyzer(BrandPolicy()), config)
+    session.append(_MESSAGES[:1])
+    assert session.reevaluation_due() is None  # chưa đủ min_turns
+
+    session.append(_MESSAGES[1:2])
+    assert session.reevaluation_due() == "first"
+    payload = session.begin_evaluation()
+    assert len(payload["messages"]) == 2 and session.reevaluation_due() is None
+    session.finish_evaluation({"total_score": 80})
+
+    assert session.append(_MESSAGES[2:3]) == ["child_policy_miss"]  # trẻ 6 tuổi, chưa nói chính sách
+    assert session.reevaluation_due() == "hits"
+    session.begin_evaluation()
+    session.finish_evaluation({"total_score": 70})
+
+    assert session.append(_MESSAGES[3:4]) == []  # BrandPolicy mặc định không cấm hỏi số điện thoại
+    session.append(_MESSAGES[4:7])
+    assert session.analyzer.total_turns == 6 and session.reevaluation_due() is None
+    session.append(_MESSAGES[7:8])
+    assert session.reevaluation_due() == "turns"
+    session.begin_evaluation()
+    session.append(_MESSAGES[8:9])  # message đến trong lúc đang chấm - không chấm chồng
+    assert session.reevaluation_due() is None
+    session.finish_evaluation({"total_score": 60})
+
+    # promise/payment xuất hiện sau snapshot đã gửi LLM -> vẫn cần chấm lại
+    assert session.reevaluation_due() == "hits"
+    state = session.state()
+    assert state["evaluation"] == {"total_score": 60} and state["reevaluation"]["evaluations"] == 3
+    assert state["reevaluation"]["evaluated_turns"] == 7
+    assert state["metrics"]["total_turns"] == 8 and state["messages"] == 9
+
+    store = LiveSessionStore(LiveConfig(max_sessions=1))
+    store.add(session)
+    store.add(LiveSession("c2", IncrementalAnalyzer(BrandPolicy()), config))
+    assert store.get("c1") is None and store.get("c2") is not None
+    assert store.get_stats()["evicted"] == 1
+
+
+def test_store_keeps_background_reevaluations_until_done():
+    store = LiveSessionStore()
+
+    async def run():
+        release = asyncio.Event()
+        task = store.track(asyncio.create_task(release.wait()))
+        await asyncio.sleep(0)
+        running = store.get_stats()["reevaluations_running"]
+        release.set()
+        await task
+        await asyncio.sleep(0)  # done callback
+        return running
+
+    assert asyncio.run(run()) == 1 and store.get_stats()["reevaluations_running"] == 0
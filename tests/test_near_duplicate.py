@@ -0,0 +1,87 @@
+"""
+Tests for near-duplicate detection and LLM output reuse
+"""
+import asyncio
+
+from busqa.near_duplicate import MinHasher, NearDuplicateConfig, simulate_reuse
+from busqa.result_store import ResultStore
+from busqa.batch_evaluator import BatchConfig
+from busqa.brand_specs import BrandPolicy
+from busqa.frame import ConversationFrame
+from busqa.prompt_loader import load_unified_rubrics
+
+_SCRIPT = [
+    ("user", "Cho tôi hỏi vé đi Đà Lạt ngày mai"),
+    ("agent", "Dạ em chào anh chị, anh chị đón ở đâu và muốn đi khung giờ nào ạ?"),
+    ("user", "Tôi đón ở bến xe Miền Đông khoảng 8 giờ tối"),
+    ("agent", "Dạ chuyến 20 giờ còn chỗ, vé giường nằm giá 350 nghìn một người, anh chị đi mấy người ạ?"),
+    ("user", "Hai người lớn nhé"),
+    ("agent", "Dạ em đã giữ 2 chỗ, em cảm ơn anh chị, chúc anh chị thượng lộ bình an ạ."),
+]
+
+
+def _raw(first_user_turn=None, start_minute=0):
+    turns = list(_SCRIPT)
+    if first_user_turn:
+        turns[0] = ("user", first_user_turn)
+    return {"messages": [{"role": role, "content": text,
+                          "created_at": f"2025-01-01T08:{start_minute:02d}:{10 + 5 * i:02d}"}
+                         for i, (role, text) in enumerate(turns)]}
+
+
+_VARIANTS = {
+    "a": _raw(),
+    "b": _raw("Cho mình hỏi vé đi Đà Lạt ngày mai", start_minute=30),  # khác một từ, khác giờ
+    "c": _raw("Xe có cho mang thú cưng lên không em, nhà tôi có con chó nhỏ"),
+}
+
+
+def test_signature_similarity():
+    hasher = MinHasher()
+    a, b, c = (hasher.signature(ConversationFrame.from_raw(_VARIANTS[k])) for k in "abc")
+    assert hasher.similarity(a, b) >= 0.8
+    assert hasher.similarity(a, c) < hasher.similarity(a, b)
+    assert set(hasher.band_keys(a)) & set(hasher.band_keys(b))
+    # Hệ số cố định theo seed -> signature so được giữa các process
+    assert (MinHasher().signature(ConversationFrame.from_raw(_VARIANTS["a"])) == a).all()
+    assert hasher.signature(ConversationFrame.from_raw({"messages": [{"role": "user", "content": "alo"}]})) is None
+
+
+def test_near_duplicate_reuses_llm_output(tmp_path, fake_evaluator):
+    rubrics_cfg = load_unified_rubrics()
+    store = ResultStore(str(tmp_path / "results.sqlite"))
+
+    def run(ids):
+        config = BatchConfig(max_concurrency=1, use_high_performance_api=False, result_store=store,
+                             near_duplicate=NearDuplicateConfig(threshold=0.8))
+        evaluator = fake_evaluator(config, rubrics_cfg, _VARIANTS)
+        results = asyncio.run(evaluator.evaluate_batch(ids, "http://x", rubrics_cfg, BrandPolicy(), "brand"))
+        return evaluator, results
+
+    first, _ = run(["a"])
+    assert first.llm_calls == 1
+
+    second, results = run(["b", "c"])
+    assert second.llm_calls == 1  # chỉ c cần LLM
+    by_id = {r["conversation_id"]: r for r in results}
+    assert by_id["b"]["near_duplicate"]["source_conversation_id"] == "a"
+    assert by_id["b"]["near_duplicate"]["similarity"] >= 0.8
+    # Metrics/coerce chạy trên conversation mới
+    assert by_id["b"]["metrics"] and by_id["b"]["result"]["total_score"] is not None
+    assert "near_duplicate" not in by_id["c"]
+
+    stats = store.stats()
+    assert stats["near_duplicate_hits"] == 1
+    assert stats["signatures"] == 2  # b dùng lại nên không vào index
+    assert stats["reuse_rate"] == round(1 / 3, 4)
+
+
+def test_simulate_reuse_counts_avoided_calls():
+    items = []
+    for i, key in enumerate(["a", "a", "b", "c", "b"]):
+        frame = ConversationFrame.from_raw(_VARIANTS[key])
+        items.append(("bot-1", frame.content_hash(), frame))
+    items.append(("bot-2", items[0][1], items[0][2]))  # brand khác không dùng lại
+    report = simulate_reuse(items, [0.8])["thresholds"]["0.8"]
+    assert report["exact_duplicates"] == 2 and report["near_duplicates"] == 1
+    assert report["llm_calls"] == 3
@@ -0,0 +1,47 @@
+"""
+Tests for message normalization fast paths
+"""
+from datetime import datetime, timezone
+
+from busqa.normalize import normalize_messages, build_transcript
+
+
+def test_iso_timestamps_fast_path():
+    raw = {"messages": [
+        {"role": "agent", "content": "Xin chào", "created_at": "2025-01-01T08:00:05Z"},
+        {"role": "user", "content": "Cho tôi hỏi vé", "created_at": "2025-01-01T08:00:00Z"},
+    ]}
+    messages = normalize_messages(raw)
+    # sort theo ts
+    assert [m.sender_type for m in messages] == ["user", "agent"]
+    assert messages[0].ts == datetime(2025, 1, 1, 8, 0, 0, tzinfo=timezone.utc)
+
+
+def test_epoch_seconds_and_millis():
+    raw = [
+        {"sender": "customer", "text": "a", "timestamp": 1700000000},
+        {"sender": "cskh", "text": "b", "timestamp": 1700000001000},
+    ]
+    messages = normalize_messages(raw)
+    assert messages[0].ts == datetime.fromtimestamp(1700000000)
+    assert messages[1].ts == datetime.fromtimestamp(1700000001)
+    assert messages[1].sender_type == "agent"
+
+
+def test_dateutil_fallback_and_key_probing():
+    """Format lạ vẫn parse qua dateutil; key None thì probe key kế tiếp"""
+    raw = {"data": [
+        {"from": "user", "content": None, "text": "xin chào", "time": "01/02/2025 10:00"},
+        {"from": "bot", "content": "dạ", "time": "01/02/2025 10:01"},
+    ]}
+    messages = normalize_messages(raw)
+    assert messages[0].text == "xin chào"
+    assert messages[0].ts == datetime(2025, 1, 2, 10, 0)
+    # sender không rõ -> vị trí != 0 là agent
+    assert messages[1].sender_type == "agent"
+
+
+def test_unparseable_timestamp_is_none():
+    messages = normalize_messages([{"role": "user", "content": "x", "ts": "not a date"}])
+    assert messages[0].ts is None
+    assert "[-] USER: x" in build_transcript(messages)
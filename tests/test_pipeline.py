@@ -0,0 +1,104 @@
+"""
+Tests for the continuous staged pipeline
+"""
+import asyncio
+
+from busqa.pipeline import StagedPipeline, Stage
+from busqa.batch_evaluator import BatchConfig
+from busqa.brand_specs import BrandPolicy
+from busqa.prompt_loader import load_unified_rubrics
+
+
+def _collect(pipeline, items):
+    async def run():
+        return [r async for r in pipeline.run(items)]
+    return asyncio.run(run())
+
+
+def test_results_in_completion_order_and_errors_short_circuit():
+    seen_second = []
+
+    async def slow_first(x):
+        await asyncio.sleep(0.05 if x == 0 else 0.001)
+        if x == 3:
+            raise ValueError("bad item")
+        return x
+
+    async def second(x):
+        seen_second.append(x)
+        return x * 10
+
+    pipeline = StagedPipeline(
+        [Stage("a", slow_first, concurrency=4), Stage("b", second, concurrency=2)],
+        queue_size=2,
+        on_error=lambda item, exc, stage: ("error", stage, str(exc)),
+    )
+    results = _collect(pipeline, range(6))
+
+    assert results[-1] == 0  # item chậm không chặn các item sau
+    assert ("error", "a", "bad item") in results
+    assert sorted(r for r in results if isinstance(r, int)) == [0, 10, 20, 40, 50]
+    assert 3 not in seen_second
+    stats = pipeline.get_stats()["stages"]
+    assert stats["a"]["processed"] == 6 and stats["a"]["errors"] == 1
+    assert stats["b"]["processed"] == 5
+
+
+def test_stage_timeout_and_early_close():
+    async def hang(x):
+        await asyncio.sleep(10 if x == 1 else 0)
+        return x
+
+    pipeline = StagedPipeline([Stage("llm", hang, concurrency=2, timeout=0.05)],
+                              on_error=lambda item, exc, stage: type(exc).__name__)
+    assert sorted(_collect(pipeline, range(3)), key=str) == [0, 2, "TimeoutError"]
+
+    async def first_only():
+        gen = StagedPipeline([Stage("s", hang, concurrency=2)]).run(range(100))
+        first = await gen.__anext__()
+        await gen.aclose()  # hủy worker còn lại, không treo
+        return first
+    assert asyncio.run(asyncio.wait_for(first_only(), timeout=2)) in (0, 2)
+
+
+def test_streaming_and_progressive_modes_agree(fake_evaluator, messages):
+    rubrics_cfg = load_unified_rubrics()
+    ids = [f"c{i}" for i in range(20)] + ["missing"]
+    conversations = {cid: {"messages": messages} for cid in ids[:-1]}  # "missing" -> fetch 404
+
+    def run(streaming):
+        config = BatchConfig(max_concurrency=4, use_high_performance_api=False, use_streaming_pipeline=streaming)
+        evaluator = fake_evaluator(config, rubrics_cfg, conversations, llm_delay=0.01)
+        results = asyncio.run(evaluator.evaluate_batch(ids, "http://x", rubrics_cfg, BrandPolicy(), ""))
+        return evaluator, results
+
+    streaming_eval, streaming = run(True)
+    _, progressive = run(False)
+
+    assert [r["conversation_id"] for r in streaming] == ids
+    assert streaming[-1]["error"] == "API fetch failed: 404"
+    for a, b in zip(streaming, progressive):
+        assert a.get("result") == b.get("result")
+        assert a.get("error") == b.get("error")
+    assert streaming_eval.processed_count == len(ids)
+    assert streaming_eval.pipeline_stats["stages"]["llm"]["processed"] == 20
+
+
+def test_async_stream_callback_completes_before_iteration_ends(fake_evaluator):
+    rubrics_cfg = load_unified_rubrics()
+    streamed = []
+
+    async def callback(result):
+        await asyncio.sleep(0.01)
+        streamed.append(result["conversation_id"])
+
+    config = BatchConfig(max_concurrency=4, use_high_performance_api=False, stream_callback=callback)
+    evaluator = fake_evaluator(config, rubrics_cfg)
+
+    async def run():
+        ids = [result["conversation_id"] async for result in evaluator.iter_evaluate(
+            [f"c{i}" for i in range(6)], "http://x", rubrics_cfg, BrandPolicy(), "")]
+        return ids, list(streamed)
+
+    ids, streamed_at_end = asyncio.run(run())
+    assert len(ids) == 6 and streamed_at_end == ids
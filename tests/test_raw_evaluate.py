@@ -0,0 +1,66 @@
+"""
+Tests for the raw-conversation evaluation path on the high-speed engine
+"""
+import asyncio
+import threading
+
+from busqa.brand_specs import BrandPolicy
+from busqa.result_store import ResultStore
+from tools.bulk_list_evaluate import (
+    evaluate_many_raw_conversations, evaluate_conversation_from_raw, evaluate_many_raw_conversations_sync
+)
+
+def _kwargs(**extra):
+    return dict(override_brand_prompt_text="brand", override_brand_policy=BrandPolicy(),
+                llm_api_key="test", apply_diagnostics=False, **extra)
+
+
+def test_raw_conversations_run_on_async_engine(fake_llm, messages):
+    calls = fake_llm
+    raw = [{"conversation_id": f"c{i}", "messages": messages} for i in range(4)]
+    streamed = []
+
+    results = asyncio.run(evaluate_many_raw_conversations(
+        raw, "config/brands/long_van/prompt.md", max_concurrency=4,
+        stream_callback=lambda r: streamed.append(dict(r)), **_kwargs()))
+
+    assert [r["conversation_id"] for r in results] == ["c0", "c1", "c2", "c3"]
+    assert all("error" not in r for r in results)
+    assert {r["brand_id"] for r in results} == {"long_van"}
+    assert all(r["rubric_version"] and r["metrics"] for r in results)
+    assert sorted(r["conversation_id"] for r in streamed) == ["c0", "c1", "c2", "c3"]
+    # Field per-conversation đã có khi stream, không chỉ trong list trả về
+    assert {(r["brand_id"], r["brand_prompt_path"]) for r in streamed} == {
+        ("long_van", "config/brands/long_van/prompt.md")}
+    assert all(r["transcript_preview"] for r in results)  # prompt doctor đọc field này
+    # LLM chạy trên event loop (async client), không qua worker thread
+    assert len(calls) == 4 and set(calls) == {threading.get_ident()}
+
+
+def test_sync_facades_and_result_store(fake_llm, messages, tmp_path):
+    calls = fake_llm
+    store = ResultStore(str(tmp_path / "results.sqlite"))
+    raw = {"conversation_id": "x", "messages": messages}
+
+    first = evaluate_conversation_from_raw(raw, "", kb_json={"agent_name": "kb_brand"}, result_store=store,
+                                           llm_api_key="test", apply_diagnostics=False)
+    assert "error" not in first and first["brand_id"] == "kb_brand"
+
+    # Cùng nội dung, id khác -> dùng lại result đã lưu
+    results = evaluate_many_raw_conversations_sync(
+        [{"conversation_id": "y", "messages": messages}, {"messages": messages}], "",
+        kb_json={"agent_name": "kb_brand"}, result_store=store, llm_api_key="test", apply_diagnostics=False)
+    assert len(calls) == 1
+    assert [r["conversation_id"] for r in results] == ["y", "unknown-1"]
+    assert all("cached" in r for r in results)
+
+
+def test_raw_conversations_with_same_id_are_evaluated_independently(fake_llm, messages):
+    raw = [{"conversation_id": "c1", "messages": messages},
+           {"conversation_id": "c1", "messages": messages[:1]},
+           {"conversation_id": "c2", "messages": messages}]
+    results = asyncio.run(evaluate_many_raw_conversations(raw, "", max_concurrency=2, **_kwargs()))
+
+    assert [r["conversation_id"] for r in results] == ["c1", "c1", "c2"]
+    assert all("error" not in r for r in results) and len(fake_llm) == 3
+    assert [r["metrics"]["total_turns"] for r in results] == [2, 1, 2]
@@ -0,0 +1,81 @@
+"""
+Tests for offline re-scoring engine
+"""
+import copy
+import random
+
+from busqa.prompt_loader import load_unified_rubrics, load_diagnostics_config
+from busqa.evaluator import coerce_llm_json_unified, apply_diagnostics_penalties, compile_penalty_index
+from busqa.brand_specs import BrandPolicy
+from busqa.rescoring import rescore_results
+
+
+def _random_case(rng, rubrics_cfg, hit_keys):
+    criteria = {k: {"score": rng.randint(0, 100), "note": rng.choice(["", "ok"])}
+                for k in rubrics_cfg["criteria"] if rng.random() > 0.1}
+    llm_raw = {"criteria": criteria, "total_score": rng.choice([0, 72.5]), "label": rng.choice([None, "Tốt"])}
+    metrics = {m: rng.choice([0, 1]) for m in ("policy_violations", "endcall_early_hint", "long_option_lists",
+                                               "context_resets", "tts_money_reading_violation")}
+    hits = {
+        "operational_readiness": [{"key": rng.choice(hit_keys), "evidence": ["a", "b", "c"]}
+                                  for _ in range(rng.randint(0, 3))],
+        "risk_compliance": [{"key": rng.choice(hit_keys), "evidence": ["x"]} for _ in range(rng.randint(0, 1))],
+    }
+    return llm_raw, metrics, hits
+
+
+def test_rescore_matches_coerce():
+    rubrics_cfg = load_unified_rubrics()
+    diagnostics_cfg = load_diagnostics_config()
+    hit_keys = list(compile_penalty_index(diagnostics_cfg)) + ["not_in_config"]
+    rng = random.Random(3)
+
+    stored, expected = [], []
+    for i in range(300):
+        llm_raw, metrics, hits = _random_case(rng, rubrics_cfg, hit_keys)
+        expected.append(coerce_llm_json_unified(
+            copy.deepcopy(llm_raw), rubrics_cfg, brand_policy=BrandPolicy(), metrics=metrics,
+            diagnostics_cfg=diagnostics_cfg, diagnostics_hits=hits).model_dump())
+        stored.append({"conversation_id": str(i), "result": {"tags": ["kept"]}, "metrics": metrics,
+                       "llm_raw": llm_raw, "diagnostics_hits": hits})
+
+    rescored, stats = rescore_results(stored, rubrics_cfg, diagnostics_cfg)
+    assert stats["rescored"] == 300
+    for exp, got in zip(expected, rescored):
+        assert got["result"]["criteria"] == exp["criteria"]
+        assert got["result"]["total_score"] == exp["total_score"]
+        assert got["result"]["label"] == exp["label"]
+        assert got["result"]["tags"] == ["kept"]
+
+
+def test_rescore_applies_new_weights_and_penalties():
+    rubrics_cfg = load_unified_rubrics()
+    llm_raw = {"criteria": {k: {"score": 80, "note": ""} for k in rubrics_cfg["criteria"]}, "total_score": 80}
+    stored = [
+        {"conversation_id": "a", "result": {"total_score": 80, "label": "Tốt"}, "metrics": {"x": 0},
+         "llm_raw": llm_raw, "diagnostics_hits": {"operational_readiness": [{"key": "k", "evidence": []}]}},
+        {"conversation_id": "b", "error": "LLM timeout"},
+        {"conversation_id": "c", "result": {"total_score": 50}},  # kết quả cũ chưa lưu llm_raw
+    ]
+
+    new_rubrics = copy.deepcopy(rubrics_cfg)
+    new_rubrics["criteria"] = {k: 0.0 for k in rubrics_cfg["criteria"]}
+    new_rubrics["criteria"]["empathy_experience"] = 1.0
+    diagnostics_cfg = {"operational_readiness": [{"key": "k", "penalty": {"empathy_experience": {"delta": -30}}}],
+                       "risk_compliance": []}
+
+    rescored, stats = rescore_results(stored, new_rubrics, diagnostics_cfg)
+    assert stats == {**stats, "rescored": 1, "skipped": 2, "labels_changed": 1}
+    assert rescored[0]["result"]["total_score"] == 50.0
+    assert rescored[0]["result"]["criteria"]["empathy_experience"]["note"].startswith("Diag: k")
+    assert rescored[1] is stored[1] and rescored[2] is stored[2]
+
+
+def test_penalty_index_keeps_first_match():
+    diagnostics_cfg = {
+        "operational_readiness": [{"key": "dup", "penalty": {"style_tts": {"clamp_max": 10}}}],
+        "risk_compliance": [{"key": "dup", "penalty": {"style_tts": {"clamp_max": 90}}}],
+    }
+    result = {"criteria": {"style_tts": {"score": 50.0, "note": ""}}}
+    apply_diagnostics_penalties(result, diagnostics_cfg, {"risk_compliance": [{"key": "dup", "evidence": ["e"]}]})
+    assert result["criteria"]["style_tts"]["score"] == 10.0
@@ -0,0 +1,102 @@
+"""
+Tests for persistent result store and skip-if-unchanged evaluation
+"""
+import asyncio
+import json
+
+from busqa.result_store import ResultStore, eval_fingerprint
+from busqa.batch_evaluator import BatchConfig
+from busqa.brand_specs import BrandPolicy
+from busqa.decode import conversation_from_dict, decode_conversation
+from busqa.prompt_loader import load_unified_rubrics
+
+
+def _run(fake_evaluator, store, rubrics_cfg, ids, conversations=None, **config):
+    config = BatchConfig(max_concurrency=3, use_high_performance_api=False, result_store=store, **config)
+    evaluator = fake_evaluator(config, rubrics_cfg, conversations)
+    results = asyncio.run(evaluator.evaluate_batch(ids, "http://x", rubrics_cfg, BrandPolicy(), "brand"))
+    return evaluator, results
+
+
+def test_unchanged_conversations_are_not_fetched_or_evaluated(tmp_path, fake_evaluator):
+    rubrics_cfg = load_unified_rubrics()
+    store = ResultStore(str(tmp_path / "results.sqlite"))
+    ids = ["a", "b", "c"]
+
+    first, results = _run(fake_evaluator, store, rubrics_cfg, ids)
+    assert first.llm_calls == 3 and all("cached" not in r for r in results)
+    assert store.stats()["entries"] == 3
+
+    # a/b/c: tra theo conversation_id, không fetch; d: id mới nhưng cùng nội dung -> hit sau khi fetch
+    second, results = _run(fake_evaluator, store, rubrics_cfg, ids + ["d"])
+    assert second.fetched == ["d"] and second.llm_calls == 0
+    assert sorted(r["conversation_id"] for r in results) == ids + ["d"]
+    assert sum("cached" in r for r in results) == 4
+
+    forced, _ = _run(fake_evaluator, store, rubrics_cfg, ids, force_refresh=True)
+    assert forced.llm_calls == 3
+
+    stats = store.stats()
+    assert stats["prefetch_hits"] == 3 and stats["hits"] == 4 and stats["forced_refresh"] == 3
+    assert stats["hit_rate"] == round(4 / 7, 4)
+
+
+def test_config_change_misses_and_content_check_skips_llm(tmp_path, fake_evaluator):
+    rubrics_cfg = load_unified_rubrics()
+    store = ResultStore(str(tmp_path / "results.sqlite"))
+    _run(fake_evaluator, store, rubrics_cfg, ["a"])
+
+    # Đổi rubric -> eval_hash khác -> chấm lại
+    changed = {**rubrics_cfg, "version": f"{rubrics_cfg.get('version')}-changed"}
+    assert eval_fingerprint(changed, None, "m", 0.2) != eval_fingerprint(rubrics_cfg, None, "m", 0.2)
+    evaluator, _ = _run(fake_evaluator, store, changed, ["a"])
+    assert evaluator.llm_calls == 1
+
+    # verify_content: fetch lại nhưng nội dung không đổi -> LLM được bỏ qua; id khác cùng nội dung cũng dùng lại
+    evaluator, results = _run(fake_evaluator, store, rubrics_cfg, ["a", "z"], verify_content=True)
+    assert sorted(evaluator.fetched) == ["a", "z"] and evaluator.llm_calls == 0
+    assert sorted(r["conversation_id"] for r in results) == ["a", "z"]
+    assert evaluator.pipeline_stats["stages"]["llm"]["processed"] == 0
+
+
+def test_inline_snapshot_is_not_served_by_conversation_id(tmp_path, fake_evaluator, messages):
+    rubrics_cfg = load_unified_rubrics()
+    store = ResultStore(str(tmp_path / "results.sqlite"))
+    # Snapshot dở dang của "a" (/evaluate/single, live) được lưu theo nội dung
+    snapshot = [{"conversation_id": "a", "messages": messages[:1]}]
+    inline, _ = _run(fake_evaluator, store, rubrics_cfg, snapshot)
+    assert inline.fetched == [] and inline.llm_calls == 1 and store.stats()["entries"] == 1
+
+    # Chấm theo ID: phải fetch bản đầy đủ, không trả kết quả của snapshot
+    by_id, results = _run(fake_evaluator, store, rubrics_cfg, ["a"])
+    assert by_id.fetched == ["a"] and by_id.llm_calls == 1 and "cached" not in results[0]
+
+    # Result chấm từ bản fetch thì được tra theo ID
+    again, results = _run(fake_evaluator, store, rubrics_cfg, ["a"])
+    assert again.fetched == [] and again.llm_calls == 0 and "cached" in results[0]
+
+
+def test_verify_content_catches_conversation_changed_upstream(tmp_path, fake_evaluator, messages):
+    rubrics_cfg = load_unified_rubrics()
+    store = ResultStore(str(tmp_path / "results.sqlite"))
+    _run(fake_evaluator, store, rubrics_cfg, ["a"], {"a": {"messages": messages[:1]}})
+
+    grown = {"a": {"messages": messages}}  # thêm message ở upstream sau khi chấm
+    trusted, results = _run(fake_evaluator, store, rubrics_cfg, ["a"], grown)
+    assert trusted.fetched == [] and "cached" in results[0]  # đánh đổi mặc định: tin result theo ID
+
+    verified, results = _run(fake_evaluator, store, rubrics_cfg, ["a"], grown, verify_content=True)
+    assert verified.fetched == ["a"] and verified.llm_calls == 1 and "cached" not in results[0]
+
+
+def test_store_skips_errors_and_content_hash_is_decode_independent(tmp_path, messages):
+    raw = {"messages": messages}
+    store = ResultStore(str(tmp_path / "results.sqlite"))
+    store.put("x", "c", "b", "e", {"conversation_id": "x", "error": "LLM timeout"})
+    assert store.get("c", "b", "e") is None and store.stats()["entries"] == 0
+
+    from_dict = conversation_from_dict(raw, "a").messages
+    from_bytes = decode_conversation(json.dumps(raw).encode("utf-8"), "a").messages
+    assert from_dict.content_hash() == from_bytes.content_hash()
+    edited = {"messages": [dict(messages[0]), {**messages[1], "content": "Dạ"}]}
+    assert conversation_from_dict(edited, "a").messages.content_hash() != from_dict.content_hash()
@@ -0,0 +1,78 @@
+"""
+Tests for conversation selection queries (in-memory and on the conversation store)
+"""
+import pytest
+
+from busqa.conversation_store import ConversationStore
+from busqa.selection import SelectionQuery, allocate, select_in_memory
+
+
+def _raw(i: int, day: int, turns: int):
+    return {
+        "conversation_id": f"c{i}",
+        "bot_id": "3794",
+        "created_at": f"2025-01-{day:02d}T{i % 24:02d}:00:00Z",
+        "messages": [{"role": "user" if t % 2 == 0 else "agent", "content": f"{i}-{t}",
+                      "created_at": f"2025-01-{day:02d}T{i % 24:02d}:00:{t:02d}Z"} for t in range(turns)],
+    }
+
+
+# 3 ngày: 12 / 6 / 2 conversations, số turn 1..9
+_CONVERSATIONS = [_raw(i, 1 + (i >= 12) + (i >= 18), 1 + i % 9) for i in range(20)]
+
+
+def _ids(conversations):
+    return [c.get("conversation_id") for c in conversations]
+
+
+def test_in_memory_filters_and_partial_top_n():
+    newest = select_in_memory(_CONVERSATIONS, SelectionQuery(take=3, strategy="newest"))
+    assert _ids(newest) == ["c19", "c18", "c17"]
+    assert _ids(select_in_memory(_CONVERSATIONS, SelectionQuery(take=2, skip=1, strategy="oldest"))) == ["c1", "c2"]
+    # tail = cuối thứ tự (created_at desc) -> cũ nhất, vẫn theo thứ tự desc
+    assert _ids(select_in_memory(_CONVERSATIONS, SelectionQuery(take=2, strategy="tail"))) == ["c1", "c0"]
+
+    window = SelectionQuery(take=50, strategy="head", since="2025-01-02", until="2025-01-03",
+                            min_turns=3, max_turns=6)
+    picked = select_in_memory(_CONVERSATIONS, window)
+    assert _ids(picked) == ["c14", "c13", "c12"]  # ngày 2, 3 <= turns <= 6
+
+    by_length = select_in_memory(_CONVERSATIONS, SelectionQuery(take=2, sort_by="length", order="desc"))
+    assert [len(c["messages"]) for c in by_length] == [9, 9]
+
+    a = select_in_memory(_CONVERSATIONS, SelectionQuery(take=5, strategy="random", seed=3))
+    assert _ids(a) == _ids(select_in_memory(_CONVERSATIONS, SelectionQuery(take=5, strategy="random", seed=3)))
+    assert len(set(_ids(a))) == 5
+
+    with pytest.raises(ValueError):
+        SelectionQuery(strategy="bogus")
+
+
+def test_allocation_is_proportional_and_capped():
+    assert allocate({"a": 12, "b": 6, "c": 2}, 10) == {"a": 6, "b": 3, "c": 1}
+    assert allocate({"a": 12, "b": 6, "c": 2}, 12, equal=True) == {"a": 5, "b": 5, "c": 2}
+    assert allocate({"a": 1, "b": 1}, 10) == {"a": 1, "b": 1}
+
+
+def test_store_select_matches_in_memory_engine(tmp_path):
+    store = ConversationStore(str(tmp_path / "conversations.sqlite"))
+    store.upsert(_CONVERSATIONS)
+
+    for query in (SelectionQuery(take=4, strategy="newest"),
+                  SelectionQuery(take=3, strategy="tail"),
+                  SelectionQuery(take=5, strategy="random", seed=9, min_turns=2),
+                  SelectionQuery(take=50, since="2025-01-02", until="2025-01-03", min_turns=3, max_turns=6)):
+        assert _ids(store.select(query, bot_id="3794")) == _ids(select_in_memory(_CONVERSATIONS, query))
+
+    stratified = store.select(SelectionQuery(take=10, strategy="stratified", stratify_by="day", seed=1), "3794")
+    days = [c.created_at[:10] for c in stratified]
+    assert (days.count("2025-01-01"), days.count("2025-01-02"), days.count("2025-01-03")) == (6, 3, 1)
+    assert stratified[0].messages.content_hash()  # frame load lại được
+
+    # Flow học từ result đã chấm; conversation chưa chấm vào tầng "unknown"
+    store.record_flows([{"conversation_id": f"c{i}", "result": {"detected_flow": "A" if i < 4 else "B"}}
+                        for i in range(8)])
+    by_flow = store.select(SelectionQuery(take=20, strategy="stratified", stratify_by="flow",
+                                          allocation="equal", seed=1), "3794")
+    assert len(by_flow) == 20
+    assert set(_ids(by_flow)[:4]) == {"c0", "c1", "c2", "c3"}  # tầng "A" đứng đầu
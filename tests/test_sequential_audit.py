@@ -0,0 +1,67 @@
+"""
+Tests for sequential audit (CI early stopping)
+"""
+import asyncio
+import random
+import statistics
+
+from busqa.batch_evaluator import BatchConfig
+from busqa.brand_specs import BrandPolicy
+from busqa.prompt_loader import load_unified_rubrics
+from busqa.sequential_audit import AuditConfig, RunningStat, audit_order, run_sequential_audit
+
+
+def _noisy_llm(rubrics_cfg):
+    """LLM giả: điểm quanh 75, criterion đầu tiên nhiễu hơn hẳn"""
+    rng = random.Random(7)
+
+    def respond(_):
+        criteria = {}
+        for i, key in enumerate(rubrics_cfg["criteria"]):
+            spread = 30 if i == 0 else 4
+            criteria[key] = {"score": max(0, min(100, round(rng.gauss(75, spread)))), "note": ""}
+        return {"criteria": criteria, "total_score": 75, "detected_flow": "A"}
+    return respond
+
+
+def _audit(fake_evaluator, messages, per_criterion: bool, population: int = 400):
+    rubrics_cfg = load_unified_rubrics()
+    evaluator = fake_evaluator(BatchConfig(max_concurrency=4), rubrics_cfg, respond=_noisy_llm(rubrics_cfg))
+    conversations = [{"conversation_id": f"c{i}", "bot_id": "3794", "messages": messages}
+                     for i in range(population)]
+    config = AuditConfig(target_half_width=2.0, wave_size=25, min_samples=30,
+                         per_criterion=per_criterion, seed=3)
+    results, report = asyncio.run(run_sequential_audit(
+        evaluator, conversations, None, rubrics_cfg, BrandPolicy(), "",
+        apply_diagnostics=False, config=config))
+    return evaluator, results, report
+
+
+def test_running_stat_matches_statistics_and_finite_population():
+    rng = random.Random(1)
+    values = [rng.uniform(0, 100) for _ in range(50)]
+    stat = RunningStat()
+    for value in values:
+        stat.add(value)
+    assert abs(stat.mean - statistics.mean(values)) < 1e-9
+    assert abs(stat.std - statistics.stdev(values)) < 1e-9
+    assert stat.half_width(1.96, population=50) == 0.0  # chấm hết quần thể
+    assert stat.half_width(1.96) > stat.half_width(1.96, population=100) > 0
+    assert RunningStat().half_width(1.96) == float("inf")
+
+    ids = [f"c{i}" for i in range(100)]
+    assert audit_order(ids, seed=5) == audit_order(list(reversed(ids)), seed=5)
+
+
+def test_audit_stops_once_precision_reached_and_reports_savings(fake_evaluator, messages):
+    evaluator, results, report = _audit(fake_evaluator, messages, per_criterion=False)
+    assert report["target_reached"] and report["pending"] == []
+    assert report["avg_total_score"]["ci_half_width"] <= 2.0
+    assert report["evaluated"] == len(results) == evaluator.llm_calls
+    assert report["evaluated"] % 25 == 0 and report["evaluated"] >= 30
+    assert report["llm_calls_saved"] == 400 - report["evaluated"] > 0
+
+    # Criterion nhiễu phải đạt ±2 riêng -> cần nhiều mẫu hơn
+    _, strict_results, strict = _audit(fake_evaluator, messages, per_criterion=True)
+    assert len(strict_results) > len(results)
+    assert all(c["ci_half_width"] <= 2.0 for c in strict["criteria_avg"].values())
@@ -0,0 +1,97 @@
+"""
+Tests for streaming (reservoir / stratified) selection over paged fetches
+"""
+import asyncio
+
+import httpx
+
+from busqa.list_fetcher import AsyncListFetcher, FetchConfig
+from busqa.selection import (MAX_STREAM_STRATA, OVERFLOW_STRATUM, SelectionQuery, StreamingSelector, select_in_memory,
+                             stream_select)
+
+
+def _raw(i: int):
+    # Mới nhất trước: i nhỏ = mới hơn; 4 conversation mỗi ngày
+    day = 28 - i // 4
+    return {
+        "conversation_id": f"c{i}",
+        "bot_id": "3794",
+        "created_at": f"2025-01-{day:02d}T{23 - i % 4:02d}:00:00Z",
+        "messages": [{"role": "user", "content": f"{i}-{t}"} for t in range(1 + i % 12)],
+    }
+
+
+_STREAM = [_raw(i) for i in range(100)]
+
+
+def _ids(conversations):
+    return [c.get("conversation_id") for c in conversations]
+
+
+def test_streaming_matches_in_memory_with_bounded_memory():
+    for query in (SelectionQuery(take=7, strategy="random", seed=5, min_turns=3),
+                  SelectionQuery(take=12, strategy="stratified", stratify_by="turns", seed=5),
+                  SelectionQuery(take=9, strategy="stratified", stratify_by="day", allocation="equal", seed=2),
+                  SelectionQuery(take=4, skip=2, strategy="tail"),
+                  SelectionQuery(take=5, strategy="head", sort_by="length", order="desc")):
+        selector = StreamingSelector(query)
+        for start in range(0, len(_STREAM), 10):
+            selector.offer_page(_STREAM[start:start + 10])
+        assert _ids(selector.result()) == _ids(select_in_memory(_STREAM, query))
+        stats = selector.stats()
+        assert stats["seen"] == 100 and not stats["stopped_early"]
+        bound = query.take * 25 if query.strategy == "stratified" else query.skip + query.take
+        assert stats["retained"] <= bound
+
+
+def test_stratified_by_day_caps_strata():
+    # 25 ngày, tối đa 4 tầng: 21 ngày cũ nhất gộp thành một tầng
+    query = SelectionQuery(take=3, strategy="stratified", stratify_by="day", seed=3)
+    selector = StreamingSelector(query, max_strata=4)
+    for start in range(0, len(_STREAM), 10):
+        selector.offer_page(_STREAM[start:start + 10])
+    assert sorted(selector._strata) == ["2025-01-25", "2025-01-26", "2025-01-27", "2025-01-28", OVERFLOW_STRATUM]
+    assert selector._counts[OVERFLOW_STRATUM] == 84
+    assert selector.stats()["retained"] <= 5 * query.take
+    assert len(selector.result()) == query.take
+
+    # Mặc định: quét 400 ngày vẫn chỉ giữ (MAX_STREAM_STRATA + 1) * take
+    selector = StreamingSelector(query)
+    for day in range(400):
+        selector.offer({"conversation_id": f"d{day}", "created_at": 1735689600 + day * 86400, "messages": [{}]})
+    assert selector.stats()["retained"] <= (MAX_STREAM_STRATA + 1) * query.take
+
+
+class _ListAPI:
+    def __init__(self):
+        self.pages = []
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        page = int(request.url.params["page"])
+        size = int(request.url.params["page_size"])
+        self.pages.append(page)
+        return httpx.Response(200, json={"conversations": _STREAM[(page - 1) * size:page * size]})
+
+
+def _select(query):
+    api = _ListAPI()
+    config = FetchConfig("http://list.local", "3794", "token", page_size=10, page_concurrency=1,
+                         rate_limit_per_second=0)
+    fetcher = AsyncListFetcher(config, httpx.AsyncClient(transport=httpx.MockTransport(api)))
+    selected, stats = asyncio.run(stream_select(fetcher, query))
+    return selected, stats, api.pages
+
+
+def test_newest_and_date_window_stop_fetching_early():
+    selected, stats, pages = _select(SelectionQuery(take=15, strategy="newest", min_turns=2))
+    assert _ids(selected) == _ids(select_in_memory(_STREAM, SelectionQuery(take=15, strategy="newest", min_turns=2)))
+    assert stats["stopped_early"] and pages == [1, 2]
+
+    # Random trong 3 ngày gần nhất: trang 2 đã cũ hơn since -> không đọc tiếp
+    window = SelectionQuery(take=5, strategy="random", seed=1, since="2025-01-26")
+    selected, stats, pages = _select(window)
+    assert _ids(selected) == _ids(select_in_memory(_STREAM, window))
+    assert pages == [1, 2, 3] and stats["matched"] == 12
+
+    _, stats, pages = _select(SelectionQuery(take=5, strategy="oldest"))
+    assert not stats["stopped_early"] and pages == list(range(1, 12))  # oldest cần đọc hết
@@ -0,0 +1,75 @@
+"""
+Tests for the rule-based triage tier in front of the LLM
+"""
+import asyncio
+
+from busqa.aggregate import make_summary
+from busqa.batch_evaluator import BatchConfig, analyze_conversation
+from busqa.brand_specs import BrandPolicy
+from busqa.frame import ConversationFrame
+from busqa.prompt_loader import load_unified_rubrics, load_diagnostics_config
+from busqa.triage import TriageConfig, triage_conversation, NOT_EVALUABLE, RULE_BASED
+
+_NORMAL = [
+    {"role": "user", "content": "Cho tôi hỏi vé đi Đà Lạt", "created_at": "2025-01-01T08:00:00"},
+    {"role": "agent", "content": "Dạ anh đi ngày nào ạ", "created_at": "2025-01-01T08:00:04"},
+    {"role": "user", "content": "Mai em", "created_at": "2025-01-01T08:00:09"},
+]
+_HANG_UP = [{"role": "agent", "content": "Alo, nhà xe xin nghe ạ", "created_at": "2025-01-01T09:00:00"}]
+_PHONE = [
+    {"role": "user", "content": "Đặt giúp tôi vé đi Huế", "created_at": "2025-01-01T10:00:00"},
+    {"role": "agent", "content": "Anh cho em xin số điện thoại ạ", "created_at": "2025-01-01T10:00:03"},
+]
+
+
+def _decide(messages, policy, rubrics_cfg, config):
+    frame = ConversationFrame.from_raw(messages)
+    diagnostics_cfg = load_diagnostics_config()
+    transcript, metrics = analyze_conversation(frame, policy, "", True, diagnostics_cfg)
+    return triage_conversation(frame, metrics, rubrics_cfg, config, brand_policy=policy, transcript=transcript,
+                               diagnostics_cfg=diagnostics_cfg, diagnostics_hits=metrics.get("diagnostics"))
+
+
+def test_triage_rules():
+    rubrics_cfg = load_unified_rubrics()
+    policy = BrandPolicy(forbid_phone_collect=True)
+    assert _decide(_HANG_UP, policy, rubrics_cfg, TriageConfig()).reason == "hang_up"
+    assert _decide(_HANG_UP * 2, policy, rubrics_cfg, TriageConfig()).reason == "no_user_turn"
+    assert _decide(_NORMAL, policy, rubrics_cfg, TriageConfig()) is None
+    # Cap của forbidden_phone_collect (policy_compliance <= 30) không đổi được label với rubric hiện tại
+    assert _decide(_PHONE, policy, rubrics_cfg, TriageConfig()) is None
+
+    auto_fail = _decide(_PHONE, policy, rubrics_cfg, TriageConfig(auto_fail_hits=("forbidden_phone_collect",)))
+    assert auto_fail.decision == RULE_BASED and auto_fail.reason == "auto_fail:forbidden_phone_collect"
+    assert auto_fail.result["total_score"] == 0 and "triage_rule_based" in auto_fail.result["tags"]
+
+    # Rubric dồn trọng số vào policy_compliance: trần điểm 30 < 50 -> đã rõ kết quả, không cần LLM
+    heavy = {**rubrics_cfg, "criteria": {k: (0.9 if k == "policy_compliance" else 0.1 / 7)
+                                          for k in rubrics_cfg["criteria"]}}
+    ceiling = _decide(_PHONE, policy, heavy, TriageConfig())
+    assert ceiling.decision == RULE_BASED and ceiling.reason == "score_ceiling"
+    assert ceiling.result["criteria"]["policy_compliance"]["score"] == 30
+    assert ceiling.result["total_score"] < 50
+
+
+def test_triage_stage_bypasses_llm_and_reports_fraction(fake_evaluator):
+    rubrics_cfg = load_unified_rubrics()
+    triage = TriageConfig(auto_fail_hits=("forbidden_phone_collect",))
+    evaluator = fake_evaluator(BatchConfig(max_concurrency=2, triage=triage), rubrics_cfg)
+    conversations = [{"conversation_id": cid, "bot_id": "3794", "messages": messages}
+                     for cid, messages in (("normal", _NORMAL), ("hangup", _HANG_UP), ("phone", _PHONE))]
+    results = asyncio.run(evaluator.evaluate_batch(
+        conversations, None, rubrics_cfg, BrandPolicy(forbid_phone_collect=True), "",
+        diagnostics_cfg=load_diagnostics_config()))
+    by_id = {r["conversation_id"]: r for r in results}
+
+    assert evaluator.llm_calls == 1
+    assert "triage" not in by_id["normal"] and by_id["normal"]["result"]["total_score"] > 0
+    assert by_id["hangup"]["triage"]["decision"] == NOT_EVALUABLE and "result" not in by_id["hangup"]
+    assert by_id["phone"]["triage"]["decision"] == RULE_BASED and by_id["phone"]["result"]["total_score"] == 0
+    assert evaluator.triage_stats == {"llm": 1, "hang_up": 1, "auto_fail:forbidden_phone_collect": 1}
+
+    summary = make_summary(results)
+    assert summary["successful_count"] == 2 and summary["not_evaluable_count"] == 1
+    assert summary["triage"]["decisions"] == {"llm": 1, "rule_based": 1, "not_evaluable": 1}
+    assert summary["triage"]["llm_bypass_rate"] == round(2 / 3, 4)
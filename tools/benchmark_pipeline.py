@@ -0,0 +1,813 @@
+#!/usr/bin/env python3
+"""
+Benchmark Tool - đo hiệu năng các stage của pipeline đánh giá trên dữ liệu tổng hợp.
+Không gọi LLM thật và không cần network: LLM được giả lập bằng asyncio.sleep.
+
+Ví dụ:
+    python tools/benchmark_pipeline.py cpu-stage --conversations 1000
+    python tools/benchmark_pipeline.py normalize --messages 100
+    python tools/benchmark_pipeline.py frame --conversations 10000
+    python tools/benchmark_pipeline.py decode --pages 50
+    python tools/benchmark_pipeline.py rescore --results 100000
+    python tools/benchmark_pipeline.py pipeline --conversations 300 --concurrency 10
+    python tools/benchmark_pipeline.py adaptive --concurrency 30 --capacity 12
+    python tools/benchmark_pipeline.py near-dup --conversations 5000
+    python tools/benchmark_pipeline.py near-dup --input day_export.jsonl --thresholds 0.8,0.9,0.95
+    python tools/benchmark_pipeline.py list-fetch --conversations 2000 --page-latency 0.3
+    python tools/benchmark_pipeline.py dispatch --conversations 300 --concurrency 8 --max-inflight-tokens 40000
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from busqa.normalize import normalize_messages
+from busqa.brand_specs import BrandPolicy
+from busqa.config_registry import current_rubrics, current_diagnostics
+from busqa.diagnostics import detect_operational_readiness, detect_risk_compliance
+from busqa.batch_evaluator import analyze_conversation, coerce_and_dump, HighSpeedBatchEvaluator, BatchConfig
+from busqa.cpu_stage import MicroBatchCPUStage, CPUStageConfig
+from busqa.frame import ConversationFrame
+from busqa import decode as busqa_decode
+from busqa.evaluator import coerce_llm_json_unified, POLICY_FLOW_PENALTIES
+from busqa.rescoring import rescore_results
+from busqa.near_duplicate import NearDuplicateConfig, simulate_reuse
+from busqa.list_fetcher import FetchConfig, AsyncListFetcher
+from busqa.dispatch import DispatchConfig, POLICIES
+from busqa.brand_artifacts import estimate_tokens
+
+AGENT_LINES = [
+    "Dạ em chào anh chị, em là nhân viên nhà xe, em có thể hỗ trợ gì ạ?",
+    "Anh chị đi từ điểm đón nào và điểm đến ở đâu ạ?",
+    "Anh chị muốn đi ngày nào, khoảng mấy giờ ạ?",
+    "Vé giường nằm giá 350k một người ạ.",
+    "Dạ chuyến 20 giờ còn chỗ, anh chị đi mấy người ạ?",
+    "Em cảm ơn anh chị, chúc anh chị thượng lộ bình an, tạm biệt ạ.",
+]
+USER_LINES = [
+    "Cho tôi hỏi vé đi Đà Lạt",
+    "Tôi đón ở bến xe Miền Đông, đi Đà Lạt",
+    "Ngày mai khoảng 8 giờ tối",
+    "2 người lớn và 1 bé sinh năm 2019",
+    "Ok cảm ơn em",
+]
+
+
+def make_raw_conversation(idx: int, turns: int, ts_format: str = "iso") -> Dict[str, Any]:
+    """Sinh một conversation thô giống payload của list API"""
+    base = datetime(2025, 1, 1, 8, 0, 0) + timedelta(minutes=idx)
+    messages = []
+    for t in range(turns):
+        ts = base + timedelta(seconds=7 * t)
+        if ts_format == "epoch_ms":
+            ts_val: Any = int(ts.timestamp() * 1000)
+        elif ts_format == "epoch_s":
+            ts_val = int(ts.timestamp())
+        else:
+            ts_val = ts.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        is_user = t % 2 == 0
+        text = random.choice(USER_LINES if is_user else AGENT_LINES)
+        messages.append({
+            "role": "user" if is_user else "agent",
+            "content": text,
+            "created_at": ts_val,
+        })
+    return {
+        "conversation_id": f"bench-{idx}",
+        "bot_id": "3794",
+        "created_at": base.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "messages": messages,
+    }
+
+
+def make_raw_conversations(n: int, min_turns: int = 6, max_turns: int = 40, seed: int = 7,
+                           ts_format: str = "iso") -> List[Dict[str, Any]]:
+    random.seed(seed)
+    return [make_raw_conversation(i, random.randint(min_turns, max_turns), ts_format) for i in range(n)]
+
+
+def fake_llm_json(rubrics_cfg: dict) -> Dict[str, Any]:
+    return {
+        "version": "v1.0",
+        "detected_flow": "A",
+        "confidence": 0.9,
+        "criteria": {k: {"score": 80, "note": "ok"} for k in rubrics_cfg["criteria"]},
+        "total_score": 80,
+        "label": "Tốt",
+        "final_comment": "",
+    }
+
+
+class _QueueDepthSampler:
+    """Lấy mẫu độ sâu hàng đợi của default executor trong lúc chạy"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: List[int] = []
+        self._task = None
+
+    def _depth(self) -> int:
+        loop = asyncio.get_running_loop()
+        executor = getattr(loop, "_default_executor", None)
+        queue = getattr(executor, "_work_queue", None)
+        return queue.qsize() if queue is not None else 0
+
+    async def _run(self):
+        while True:
+            self.samples.append(self._depth())
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    def summary(self) -> Dict[str, float]:
+        if not self.samples:
+            return {"avg": 0, "max": 0}
+        return {"avg": round(statistics.mean(self.samples), 2), "max": max(self.samples)}
+
+
+async def _run_cpu_stage_mode(mode: str, messages_list, policy, prompt_text, rubrics_cfg,
+                              diagnostics_cfg, concurrency: int, llm_latency: float) -> Dict[str, Any]:
+    llm_json = fake_llm_json(rubrics_cfg)
+    stage = MicroBatchCPUStage(CPUStageConfig()) if mode == "micro-batch" else None
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    sampler = _QueueDepthSampler()
+
+    async def one(messages):
+        async with semaphore:
+            t0 = time.perf_counter()
+            if stage:
+                transcript, metrics = await stage.submit(
+                    analyze_conversation, messages, policy, prompt_text, True, diagnostics_cfg)
+            else:
+                # Mô phỏng đường cũ: 4 hop riêng lẻ mỗi conversation
+                transcript, metrics = await asyncio.to_thread(analyze_conversation, messages, policy, prompt_text)
+                or_hits, rc_hits = await asyncio.gather(
+                    asyncio.to_thread(detect_operational_readiness, messages, policy, prompt_text),
+                    asyncio.to_thread(detect_risk_compliance, messages, policy),
+                )
+                metrics["diagnostics"] = {"operational_readiness": or_hits, "risk_compliance": rc_hits}
+            t1 = time.perf_counter()
+            await asyncio.sleep(llm_latency)
+            t2 = time.perf_counter()
+            kwargs = dict(rubrics_cfg=rubrics_cfg, brand_policy=policy, messages=messages, transcript=transcript,
+                          metrics=metrics, diagnostics_cfg=diagnostics_cfg, diagnostics_hits=metrics.get("diagnostics", {}))
+            if stage:
+                await stage.submit(coerce_and_dump, llm_json, **kwargs)
+            else:
+                await asyncio.to_thread(coerce_and_dump, llm_json, **kwargs)
+            latencies.append((t1 - t0) + (time.perf_counter() - t2))
+
+    sampler.start()
+    start = time.perf_counter()
+    await asyncio.gather(*(one(m) for m in messages_list))
+    wall = time.perf_counter() - start
+    await sampler.stop()
+
+    out = {
+        "mode": mode,
+        "wall_seconds": round(wall, 3),
+        "cpu_stage_latency_ms": {
+            "avg": round(statistics.mean(latencies) * 1000, 3),
+            "p95": round(sorted(latencies)[int(len(latencies) * 0.95) - 1] * 1000, 3),
+        },
+        "default_executor_queue_depth": sampler.summary(),
+    }
+    if stage:
+        await stage.close()
+        out["stage_stats"] = stage.get_stats()
+    return out
+
+
+def bench_cpu_stage(args) -> Dict[str, Any]:
+    rubrics_cfg = current_rubrics()
+    diagnostics_cfg = current_diagnostics()
+    policy = BrandPolicy(forbid_phone_collect=True)
+    raw = make_raw_conversations(args.conversations)
+    messages_list = [normalize_messages(r) for r in raw]
+
+    results = []
+    for mode in ("per-hop", "micro-batch"):
+        results.append(asyncio.run(_run_cpu_stage_mode(
+            mode, messages_list, policy, "", rubrics_cfg, diagnostics_cfg,
+            args.concurrency, args.llm_latency
+        )))
+    return {"benchmark": "cpu-stage", "conversations": args.conversations, "results": results}
+
+
+def bench_normalize(args) -> Dict[str, Any]:
+    results = []
+    for fmt in ("iso", "epoch_ms", "epoch_s"):
+        conv = make_raw_conversation(0, args.messages, fmt)
+        normalize_messages(conv)  # warm cache layout
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            normalize_messages(conv)
+        per_conv = (time.perf_counter() - start) / args.repeat
+        results.append({"ts_format": fmt, "ms_per_conversation": round(per_conv * 1000, 4)})
+    return {"benchmark": "normalize", "messages_per_conversation": args.messages, "results": results}
+
+
+def _peak_memory_mb(build) -> Dict[str, float]:
+    tracemalloc.start()
+    held = build()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del held
+    return {"retained_mb": round(current / 1024 / 1024, 2), "peak_mb": round(peak / 1024 / 1024, 2)}
+
+
+def bench_frame(args) -> Dict[str, Any]:
+    raw = make_raw_conversations(args.conversations, min_turns=20, max_turns=120)
+    records = _peak_memory_mb(lambda: [normalize_messages(r) for r in raw])
+    frames = _peak_memory_mb(lambda: [ConversationFrame.from_raw(r) for r in raw])
+    return {
+        "benchmark": "frame",
+        "conversations": args.conversations,
+        "messages": sum(len(r["messages"]) for r in raw),
+        "results": [
+            {"representation": "message-records", **records},
+            {"representation": "conversation-frame", **frames},
+        ],
+    }
+
+
+def _time_and_peak(fn, bodies) -> Dict[str, float]:
+    fn(bodies[0])  # warm up
+    start = time.perf_counter()
+    for body in bodies:
+        fn(body)
+    per_page = (time.perf_counter() - start) / len(bodies)
+
+    peaks = []
+    for body in bodies[:5]:
+        tracemalloc.start()
+        held = fn(body)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del held
+        peaks.append(peak)
+    return {"ms_per_page": round(per_page * 1000, 3), "peak_kb_per_page": round(statistics.mean(peaks) / 1024, 1)}
+
+
+def bench_decode(args) -> Dict[str, Any]:
+    raw = make_raw_conversations(args.pages * args.page_size)
+    bodies = [
+        json.dumps({"conversations": raw[i:i + args.page_size], "page": i // args.page_size + 1},
+                   ensure_ascii=False).encode("utf-8")
+        for i in range(0, len(raw), args.page_size)
+    ]
+
+    modes = {
+        # Chỉ bước parse, không normalize - để tách chi phí decode khỏi chi phí dựng frame
+        "json-parse-only": json.loads,
+        # Đường cũ: response.json() -> dict, rồi extract_bot_id + normalize walk lại dict
+        "json-dict": lambda b: [busqa_decode.conversation_from_dict(c) for c in json.loads(b)["conversations"]],
+    }
+    if busqa_decode.ORJSON_AVAILABLE:
+        import orjson
+        modes["orjson-dict"] = lambda b: [busqa_decode.conversation_from_dict(c)
+                                          for c in orjson.loads(b)["conversations"]]
+    if busqa_decode.MSGSPEC_AVAILABLE:
+        modes["msgspec-parse-only"] = busqa_decode._page_decoder.decode
+        modes["msgspec-typed"] = busqa_decode.decode_conversation_page
+
+    return {
+        "benchmark": "decode",
+        "pages": len(bodies),
+        "page_size": args.page_size,
+        "avg_page_kb": round(statistics.mean(len(b) for b in bodies) / 1024, 1),
+        "results": [{"mode": name, **_time_and_peak(fn, bodies)} for name, fn in modes.items()],
+    }
+
+
+def make_stored_results(n: int, rubrics_cfg: dict, diagnostics_cfg: dict, seed: int = 11) -> List[Dict[str, Any]]:
+    """Result set tổng hợp có llm_raw + diagnostics_hits như result thật"""
+    random.seed(seed)
+    hit_keys = [item["key"] for section in ("operational_readiness", "risk_compliance")
+                for item in diagnostics_cfg[section]]
+    metric_keys = [rule[0] for rule in POLICY_FLOW_PENALTIES]
+    results = []
+    for i in range(n):
+        llm_raw = fake_llm_json(rubrics_cfg)
+        llm_raw["criteria"] = {k: {"score": random.randint(40, 100), "note": "ok"} for k in rubrics_cfg["criteria"]}
+        hits = [{"key": random.choice(hit_keys), "evidence": ["..."]} for _ in range(random.choice([0, 0, 1, 2]))]
+        results.append({
+            "conversation_id": f"bench-{i}",
+            "result": {**fake_llm_json(rubrics_cfg), "tags": [], "risks": [], "suggestions": []},
+            "metrics": {k: random.choice([0, 0, 0, 1]) for k in metric_keys},
+            "llm_raw": llm_raw,
+            "diagnostics_hits": {"operational_readiness": hits, "risk_compliance": []},
+        })
+    return results
+
+
+def bench_rescore(args) -> Dict[str, Any]:
+    rubrics_cfg = current_rubrics()
+    diagnostics_cfg = current_diagnostics()
+    results = make_stored_results(args.results, rubrics_cfg, diagnostics_cfg)
+    policy = BrandPolicy()
+
+    # Đường cũ: coerce từng result (scan config tuyến tính cho mỗi hit)
+    sample = results[:args.coerce_sample]
+    start = time.perf_counter()
+    for r in sample:
+        coerce_llm_json_unified(r["llm_raw"], rubrics_cfg, brand_policy=policy, metrics=r["metrics"],
+                                diagnostics_cfg=diagnostics_cfg, diagnostics_hits=r["diagnostics_hits"]).model_dump()
+    per_result = (time.perf_counter() - start) / len(sample)
+
+    out = [{"mode": "coerce-per-result (extrapolated)", "seconds": round(per_result * len(results), 3)}]
+    for notes in (True, False):
+        start = time.perf_counter()
+        rescore_results(results, rubrics_cfg, diagnostics_cfg, update_notes=notes)
+        out.append({"mode": f"vectorized{'' if notes else ' (no notes)'}",
+                    "seconds": round(time.perf_counter() - start, 3)})
+    return {"benchmark": "rescore", "results": args.results, "timings": out}
+
+
+class _SimulatedEvaluator(HighSpeedBatchEvaluator):
+    """Evaluator thật (analyze/coerce/CPU stage), chỉ thay fetch và LLM bằng sleep có đuôi dài"""
+
+    def __init__(self, config: BatchConfig, raw_by_id: Dict[str, Any], llm_json: Dict[str, Any],
+                 fetch_latency: float, llm_latency: float):
+        super().__init__(config)
+        self.raw_by_id = raw_by_id
+        self.llm_json = llm_json
+        self.fetch_latency = fetch_latency
+        self.llm_latency = llm_latency
+
+    def _tail_latency(self, prompt: str) -> float:
+        # Seed theo prompt -> cùng conversation có cùng độ trễ ở cả 2 mode.
+        # ~5% request chậm gấp 8-12 lần (retry/queue phía provider)
+        rng = random.Random(prompt)
+        if rng.random() < 0.05:
+            return self.llm_latency * rng.uniform(8, 12)
+        return self.llm_latency * rng.uniform(0.6, 1.6)
+
+    async def _fetch_conversation(self, conversation_id: str, base_url: str):
+        await asyncio.sleep(self.fetch_latency)
+        return busqa_decode.conversation_from_dict(self.raw_by_id[conversation_id], conversation_id)
+
+    async def _call_llm(self, **kwargs) -> Dict[str, Any]:
+        await asyncio.sleep(self._tail_latency(kwargs["user_prompt"]))
+        return dict(self.llm_json)
+
+
+async def _run_pipeline_mode(streaming: bool, args, raw_by_id, rubrics_cfg, diagnostics_cfg) -> Dict[str, Any]:
+    config = BatchConfig(
+        max_concurrency=args.concurrency,
+        use_high_performance_api=False,
+        use_streaming_pipeline=streaming,
+        adaptive_batching=True,
+        llm_timeout=120.0,
+    )
+    evaluator = _SimulatedEvaluator(config, raw_by_id, fake_llm_json(rubrics_cfg),
+                                    args.fetch_latency, args.llm_latency)
+    start = time.perf_counter()
+    results = await evaluator.evaluate_batch(
+        list(raw_by_id), "http://bench.local", rubrics_cfg, BrandPolicy(forbid_phone_collect=True), "",
+        None, "bench-model", 0.2, None, True, diagnostics_cfg
+    )
+    wall = time.perf_counter() - start
+    out = {
+        "mode": "streaming-pipeline" if streaming else "progressive-batches",
+        "wall_seconds": round(wall, 3),
+        "throughput_per_s": round(len(results) / wall, 2),
+        "errors": sum(1 for r in results if "error" in r),
+    }
+    if streaming:
+        out["llm_stage"] = evaluator.pipeline_stats["stages"]["llm"]
+    return out
+
+
+def bench_pipeline(args) -> Dict[str, Any]:
+    rubrics_cfg = current_rubrics()
+    diagnostics_cfg = current_diagnostics()
+    raw_by_id = {r["conversation_id"]: r for r in make_raw_conversations(args.conversations)}
+
+    results = []
+    for streaming in (False, True):
+        results.append(asyncio.run(_run_pipeline_mode(streaming, args, raw_by_id, rubrics_cfg, diagnostics_cfg)))
+    return {"benchmark": "pipeline", "conversations": args.conversations, "concurrency": args.concurrency,
+            "llm_latency_median_s": args.llm_latency, "results": results}
+
+
+class _CapacityLimitedEvaluator(_SimulatedEvaluator):
+    """Provider giả lập có capacity: vượt quá số request đồng thời -> 429 sau một nhịp ngắn"""
+
+    def __init__(self, *args, capacity: int, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.capacity = capacity
+        self.active = 0
+
+    async def _call_llm(self, **kwargs) -> Dict[str, Any]:
+        self.active += 1
+        try:
+            if self.active > self.capacity:
+                await asyncio.sleep(self.llm_latency * 0.2)
+                raise RuntimeError("429 Too Many Requests")
+            await asyncio.sleep(self._tail_latency(kwargs["user_prompt"]))
+            return dict(self.llm_json)
+        finally:
+            self.active -= 1
+
+
+async def _run_adaptive_mode(adaptive: bool, args, raw_by_id, rubrics_cfg, diagnostics_cfg) -> Dict[str, Any]:
+    config = BatchConfig(
+        max_concurrency=args.concurrency,
+        use_high_performance_api=False,
+        adaptive_concurrency=adaptive,
+        llm_timeout=120.0,
+    )
+    evaluator = _CapacityLimitedEvaluator(config, raw_by_id, fake_llm_json(rubrics_cfg),
+                                          args.fetch_latency, args.llm_latency, capacity=args.capacity)
+    start = time.perf_counter()
+    results = await evaluator.evaluate_batch(
+        list(raw_by_id), "http://bench.local", rubrics_cfg, BrandPolicy(forbid_phone_collect=True), "",
+        None, "bench-model", 0.2, None, True, diagnostics_cfg
+    )
+    wall = time.perf_counter() - start
+    ok = sum(1 for r in results if "error" not in r)
+    out = {
+        "mode": "aimd" if adaptive else "fixed",
+        "wall_seconds": round(wall, 3),
+        "succeeded": ok,
+        "rate_limited": sum(1 for r in results if "429" in r.get("error", "")),
+        "goodput_per_s": round(ok / wall, 2),
+    }
+    llm = evaluator.concurrency_stats.get("llm")
+    if llm:
+        out["llm_limit"] = {k: llm[k] for k in ("limit", "avg_limit", "increases", "decreases")}
+        out["llm_limit"]["adjustments"] = [(h["from"], h["to"], h["reason"]) for h in llm["history"][:8]]
+    return out
+
+
+def bench_adaptive(args) -> Dict[str, Any]:
+    rubrics_cfg = current_rubrics()
+    diagnostics_cfg = current_diagnostics()
+    raw_by_id = {r["conversation_id"]: r for r in make_raw_conversations(args.conversations)}
+
+    results = []
+    for adaptive in (False, True):
+        results.append(asyncio.run(_run_adaptive_mode(adaptive, args, raw_by_id, rubrics_cfg, diagnostics_cfg)))
+    return {"benchmark": "adaptive", "conversations": args.conversations, "concurrency": args.concurrency,
+            "provider_capacity": args.capacity, "results": results}
+
+
+class _TokenLatencyEvaluator(_SimulatedEvaluator):
+    """LLM giả lập: latency tỉ lệ token của user prompt (system prompt coi như đã nằm trong prefix cache)"""
+
+    def __init__(self, *args, seconds_per_1k_tokens: float, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.seconds_per_1k_tokens = seconds_per_1k_tokens
+
+    async def _call_llm(self, **kwargs) -> Dict[str, Any]:
+        tokens = estimate_tokens(kwargs["user_prompt"])
+        await asyncio.sleep(self.llm_latency + tokens / 1000 * self.seconds_per_1k_tokens)
+        return dict(self.llm_json)
+
+
+def make_mixed_length_conversations(n: int, long_ratio: float, long_turns: int, seed: int = 9) -> List[Dict[str, Any]]:
+    """Phần lớn hội thoại ngắn, một ít rất dài rải ngẫu nhiên trong thứ tự input"""
+    random.seed(seed)
+    return [make_raw_conversation(i, long_turns if random.random() < long_ratio else random.randint(4, 16))
+            for i in range(n)]
+
+
+async def _run_dispatch_mode(policy: str, max_inflight_tokens, args, conversations, rubrics_cfg,
+                             diagnostics_cfg) -> Dict[str, Any]:
+    config = BatchConfig(
+        max_concurrency=args.concurrency,
+        use_high_performance_api=False,
+        adaptive_concurrency=False,
+        llm_timeout=600.0,
+        dispatch=DispatchConfig(policy=policy, reorder_window=args.window, max_inflight_tokens=max_inflight_tokens),
+    )
+    evaluator = _TokenLatencyEvaluator(config, {}, fake_llm_json(rubrics_cfg), 0.0, args.llm_latency,
+                                       seconds_per_1k_tokens=args.seconds_per_1k_tokens)
+    turns = {c["conversation_id"]: len(c["messages"]) for c in conversations}
+    completions = []
+    short_completions = []
+    errors = 0
+    start = time.perf_counter()
+    async for result in evaluator.iter_evaluate(
+        [dict(c) for c in conversations], None, rubrics_cfg, BrandPolicy(forbid_phone_collect=True), "",
+        None, "bench-model", 0.2, None, True, diagnostics_cfg
+    ):
+        done = time.perf_counter() - start
+        completions.append(done)
+        errors += "error" in result
+        if turns[result["conversation_id"]] < args.long_turns:
+            short_completions.append(done)
+    completions.sort()
+    out = {
+        "policy": policy if not max_inflight_tokens else f"{policy}+budget",
+        "makespan_s": round(completions[-1], 3),
+        "mean_completion_s": round(statistics.mean(completions), 3),
+        "p50_completion_s": round(completions[len(completions) // 2], 3),
+        "p95_completion_s": round(completions[max(0, int(len(completions) * 0.95) - 1)], 3),
+        "short_mean_completion_s": round(statistics.mean(short_completions), 3) if short_completions else None,
+        "errors": errors,
+    }
+    llm = evaluator.pipeline_stats["stages"]["llm"]
+    if "token_budget" in llm:
+        out["token_budget"] = {k: llm["token_budget"][k] for k in ("max_tokens", "peak_in_flight_tokens", "bypasses")}
+    return out
+
+
+def bench_dispatch(args) -> Dict[str, Any]:
+    rubrics_cfg = current_rubrics()
+    diagnostics_cfg = current_diagnostics()
+    conversations = make_mixed_length_conversations(args.conversations, args.long_ratio, args.long_turns)
+    runs = [(policy, None) for policy in POLICIES]
+    if args.max_inflight_tokens:
+        runs += [(policy, args.max_inflight_tokens) for policy in POLICIES if policy != "fifo"]
+    results = [asyncio.run(_run_dispatch_mode(policy, budget, args, conversations, rubrics_cfg, diagnostics_cfg))
+               for policy, budget in runs]
+    return {"benchmark": "dispatch", "conversations": args.conversations,
+            "long_conversations": sum(1 for c in conversations if len(c["messages"]) >= args.long_turns),
+            "concurrency": args.concurrency, "window": args.window, "results": results}
+
+
+# Traffic bot theo kịch bản: agent gần như cố định, khách hỏi cùng ý với vài cách nói
+SCRIPT_DESTINATIONS = ["Đà Lạt", "Nha Trang", "Vũng Tàu", "Cần Thơ", "Phan Thiết"]
+SCRIPT_USER_VARIANTS = {
+    "ask": ["Cho tôi hỏi vé đi {d}", "Cho mình hỏi vé đi {d}", "Còn vé đi {d} không em",
+            "Hỏi vé xe đi {d} với", "Em ơi cho hỏi xe đi {d}"],
+    "pickup": ["Tôi đón ở bến xe Miền Đông", "Đón ở bến xe Miền Đông nha", "Mình lên xe ở Miền Đông"],
+    "time": ["Ngày mai khoảng 8 giờ tối", "Tối mai tầm 8h", "Chuyến tối mai lúc 8 giờ"],
+    "pax": ["{p} người lớn", "Đi {p} người em nhé", "Cho {p} vé"],
+    "thanks": ["Ok cảm ơn em", "Cảm ơn nha", "Ok em"],
+    "faq": ["Xe có cho mang thú cưng không", "Xe có wifi không em", "Hành lý được mang bao nhiêu ký"],
+}
+SCRIPT_AGENT = {
+    "greet": "Dạ em chào anh chị, em là trợ lý của nhà xe, em có thể hỗ trợ gì cho anh chị ạ?",
+    "ask": "Dạ tuyến đi {d} có chuyến mỗi giờ, anh chị đón ở đâu và muốn đi ngày nào ạ?",
+    "pickup": "Dạ xe có đón tại bến xe Miền Đông, anh chị muốn đi khung giờ nào ạ?",
+    "time": "Dạ chuyến 20 giờ tối mai còn chỗ, anh chị đi mấy người ạ?",
+    "pax": "Dạ em giữ {p} chỗ giường nằm, giá vé 350 nghìn một người, anh chị cho em xin tên ạ.",
+    "faq": "Dạ theo quy định nhà xe, mỗi khách được mang 20 ký hành lý, thú cưng phải để trong lồng ạ.",
+    "bye": "Dạ em cảm ơn anh chị, chúc anh chị thượng lộ bình an ạ.",
+}
+FREEFORM_WORDS = ("xe vé chuyến giờ đón trả khách hàng ghế giường tầng trên dưới đổi hủy hoàn tiền "
+                  "chuyển khoản sớm muộn trễ tài xế nhà ga bến đường quốc lộ hành lý gửi hàng").split()
+
+
+def make_scripted_day(n: int, freeform_ratio: float = 0.2, seed: int = 5) -> List[Dict[str, Any]]:
+    """Một ngày traffic tổng hợp: hội thoại theo kịch bản (đặt vé / FAQ) + một phần hội thoại tự do"""
+    rng = random.Random(seed)
+    out = []
+    for i in range(n):
+        messages = [{"role": "agent", "content": SCRIPT_AGENT["greet"]}]
+        if rng.random() < freeform_ratio:
+            for t in range(rng.randint(4, 12)):
+                words = " ".join(rng.choice(FREEFORM_WORDS) for _ in range(rng.randint(6, 18)))
+                messages.append({"role": "user" if t % 2 == 0 else "agent", "content": words})
+        else:
+            d, p = rng.choice(SCRIPT_DESTINATIONS), rng.randint(1, 4)
+            steps = ["ask", "pickup", "time", "pax"] if rng.random() < 0.7 else ["faq"]
+            for step in steps + ["thanks"]:
+                messages.append({"role": "user",
+                                 "content": rng.choice(SCRIPT_USER_VARIANTS[step]).format(d=d, p=p)})
+                messages.append({"role": "agent",
+                                 "content": SCRIPT_AGENT.get(step, SCRIPT_AGENT["bye"]).format(d=d, p=p)})
+        out.append({"conversation_id": f"day-{i}", "bot_id": "3794", "messages": messages})
+    return out
+
+
+def _load_conversations(path: str) -> List[Dict[str, Any]]:
+    """JSON list hoặc JSONL các conversation thô (payload của list API)"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if data.lstrip()[:1] == b"[":
+        return json.loads(data)
+    return [json.loads(line) for line in data.splitlines() if line.strip()]
+
+
+def bench_near_dup(args) -> Dict[str, Any]:
+    raws = _load_conversations(args.input) if args.input else make_scripted_day(args.conversations)
+    frames = []
+    t0 = time.perf_counter()
+    for raw in raws:
+        frame = ConversationFrame.from_raw(raw)
+        frames.append((raw.get("bot_id"), frame.content_hash(), frame))
+    normalize_seconds = time.perf_counter() - t0
+
+    thresholds = [float(t) for t in args.thresholds.split(",")]
+    t0 = time.perf_counter()
+    report = simulate_reuse(frames, thresholds, NearDuplicateConfig())
+    report.update({
+        "benchmark": "near-dup",
+        "source": args.input or "synthetic scripted day",
+        "normalize_seconds": round(normalize_seconds, 3),
+        "signature_and_index_seconds": round(time.perf_counter() - t0, 3),
+    })
+    return report
+
+
+class _ListAPIStandIn:
+    """List API giả lập (stdlib HTTP server, localhost): độ trễ mỗi trang + 429 định kỳ kèm Retry-After"""
+
+    def __init__(self, conversations: List[Dict[str, Any]], page_latency: float,
+                 rate_limit_every: int = 0, retry_after: float = 0.2):
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from urllib.parse import parse_qs, urlparse
+
+        stand_in = self
+        self.requests = 0
+        self._lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                page = int(query["page"][0])
+                size = int(query["page_size"][0])
+                with stand_in._lock:
+                    stand_in.requests += 1
+                    n = stand_in.requests
+                time.sleep(page_latency)
+                if rate_limit_every and n % rate_limit_every == 0:
+                    body, status = b"{}", 429
+                else:
+                    chunk = conversations[(page - 1) * size:page * size]
+                    body, status = json.dumps({"conversations": chunk}).encode(), 200
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                if status == 429:
+                    self.send_header("Retry-After", str(retry_after))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+async def _run_list_fetch_mode(pipelined: bool, args, base_url: str, rubrics_cfg, diagnostics_cfg) -> Dict[str, Any]:
+    fetch_config = FetchConfig(
+        base_url=base_url, bot_id="3794", bearer_token="bench", page_size=args.page_size,
+        max_pages=args.conversations // args.page_size + 1, backoff_delay=0.1, retry_count=5,
+        page_concurrency=args.page_concurrency if pipelined else 1,
+        rate_limit_per_second=args.rate_limit, typed_decode=True,
+    )
+    fetcher = AsyncListFetcher(fetch_config)
+    config = BatchConfig(max_concurrency=args.concurrency, use_high_performance_api=False, llm_timeout=120.0)
+    evaluator = _SimulatedEvaluator(config, {}, fake_llm_json(rubrics_cfg), 0.0, args.llm_latency)
+
+    start = time.perf_counter()
+    if pipelined:
+        # Trang nào về thì chấm trang đó, fetch các trang sau chạy song song
+        source = fetcher.iter_conversations()
+        fetch_done = None
+    else:
+        # Cách cũ: fetch tuần tự hết list rồi mới chấm
+        source = await fetcher.fetch_all()
+        fetch_done = time.perf_counter() - start
+    first_result = None
+    results = []
+    async for result in evaluator.iter_evaluate(
+        source, None, rubrics_cfg, BrandPolicy(forbid_phone_collect=True), "",
+        None, "bench-model", 0.2, None, True, diagnostics_cfg
+    ):
+        if first_result is None:
+            first_result = time.perf_counter() - start
+        results.append(result)
+    wall = time.perf_counter() - start
+    return {
+        "mode": f"pipelined (page_concurrency={args.page_concurrency})" if pipelined else "serial fetch-then-evaluate",
+        "time_to_first_evaluation_s": round(first_result or 0.0, 3),
+        "fetch_seconds": round(fetch_done if fetch_done is not None else fetcher.stats["elapsed_seconds"], 3),
+        "total_seconds": round(wall, 3),
+        "evaluated": len(results),
+        "errors": sum(1 for r in results if "error" in r),
+        "fetch": {k: fetcher.stats[k] for k in ("pages", "requests", "retries", "rate_limited")},
+    }
+
+
+def bench_list_fetch(args) -> Dict[str, Any]:
+    rubrics_cfg = current_rubrics()
+    diagnostics_cfg = current_diagnostics()
+    conversations = make_raw_conversations(args.conversations)
+
+    results = []
+    with _ListAPIStandIn(conversations, args.page_latency, args.rate_limit_every) as server:
+        for pipelined in (False, True):
+            results.append(asyncio.run(_run_list_fetch_mode(pipelined, args, server.base_url,
+                                                            rubrics_cfg, diagnostics_cfg)))
+    return {"benchmark": "list-fetch", "conversations": args.conversations, "page_size": args.page_size,
+            "page_latency_s": args.page_latency, "llm_latency_median_s": args.llm_latency, "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pipeline stages on synthetic conversations")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("cpu-stage", help="Per-conversation thread hops vs micro-batched CPU stage")
+    p.add_argument("--conversations", type=int, default=1000)
+    p.add_argument("--concurrency", type=int, default=50)
+    p.add_argument("--llm-latency", type=float, default=0.05, help="Simulated LLM latency (seconds)")
+    p.set_defaults(func=bench_cpu_stage)
+
+    p = sub.add_parser("normalize", help="normalize_messages cost per conversation")
+    p.add_argument("--messages", type=int, default=100)
+    p.add_argument("--repeat", type=int, default=500)
+    p.set_defaults(func=bench_normalize)
+
+    p = sub.add_parser("frame", help="Memory held by normalized messages vs ConversationFrame")
+    p.add_argument("--conversations", type=int, default=10000)
+    p.set_defaults(func=bench_frame)
+
+    p = sub.add_parser("decode", help="List API page decode: json/orjson dict path vs msgspec typed path")
+    p.add_argument("--pages", type=int, default=50)
+    p.add_argument("--page-size", type=int, default=100)
+    p.set_defaults(func=bench_decode)
+
+    p = sub.add_parser("rescore", help="Offline re-scoring of a stored result set vs per-result coerce")
+    p.add_argument("--results", type=int, default=100000)
+    p.add_argument("--coerce-sample", type=int, default=5000)
+    p.set_defaults(func=bench_rescore)
+
+    p = sub.add_parser("pipeline", help="Progressive batches vs continuous staged pipeline (simulated fetch/LLM)")
+    p.add_argument("--conversations", type=int, default=300)
+    p.add_argument("--concurrency", type=int, default=10)
+    p.add_argument("--fetch-latency", type=float, default=0.02)
+    p.add_argument("--llm-latency", type=float, default=0.1, help="Median simulated LLM latency (seconds)")
+    p.set_defaults(func=bench_pipeline)
+
+    p = sub.add_parser("adaptive", help="Fixed vs AIMD LLM concurrency against a capacity-limited provider")
+    p.add_argument("--conversations", type=int, default=300)
+    p.add_argument("--concurrency", type=int, default=30, help="Configured (max) LLM concurrency")
+    p.add_argument("--capacity", type=int, default=12, help="Concurrent requests the provider accepts")
+    p.add_argument("--fetch-latency", type=float, default=0.02)
+    p.add_argument("--llm-latency", type=float, default=0.1, help="Median simulated LLM latency (seconds)")
+    p.set_defaults(func=bench_adaptive)
+
+    p = sub.add_parser("near-dup", help="Fraction of LLM calls avoided by exact + near-duplicate reuse")
+    p.add_argument("--input", help="JSON/JSONL export of a day's raw conversations (default: synthetic)")
+    p.add_argument("--conversations", type=int, default=5000)
+    p.add_argument("--thresholds", default="0.8,0.9,0.95")
+    p.set_defaults(func=bench_near_dup)
+
+    p = sub.add_parser("list-fetch", help="Serial list fetch then evaluate vs pipelined page fetch (local stand-in API)")
+    p.add_argument("--conversations", type=int, default=2000)
+    p.add_argument("--page-size", type=int, default=100)
+    p.add_argument("--page-latency", type=float, default=0.3, help="Stand-in server latency per page (seconds)")
+    p.add_argument("--page-concurrency", type=int, default=4)
+    p.add_argument("--rate-limit", type=float, default=20.0, help="Client-side list requests per second")
+    p.add_argument("--rate-limit-every", type=int, default=7, help="Every Nth request gets 429 (0 = never)")
+    p.add_argument("--concurrency", type=int, default=30, help="LLM concurrency")
+    p.add_argument("--llm-latency", type=float, default=0.05, help="Median simulated LLM latency (seconds)")
+    p.set_defaults(func=bench_list_fetch)
+
+    p = sub.add_parser("dispatch", help="FIFO vs SJF vs LJF LLM dispatch (latency proportional to prompt tokens)")
+    p.add_argument("--conversations", type=int, default=300)
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--long-ratio", type=float, default=0.05, help="Fraction of very long conversations")
+    p.add_argument("--long-turns", type=int, default=200)
+    p.add_argument("--window", type=int, default=64, help="Reorder window")
+    p.add_argument("--llm-latency", type=float, default=0.02, help="Fixed simulated LLM latency per call (seconds)")
+    p.add_argument("--seconds-per-1k-tokens", type=float, default=0.2)
+    p.add_argument("--max-inflight-tokens", type=int, help="Also run sjf/ljf with this token budget")
+    p.set_defaults(func=bench_dispatch)
+
+    args = parser.parse_args()
+    print(json.dumps(args.func(args), indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,49 +9,33 @@ import json
 import sys
 import os
 import asyncio
-import random
-import time
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, List, Dict, Any, Optional
 import logging
 import requests
-from dataclasses import dataclass
 
 # Add project root to path
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
-from busqa.normalize import normalize_messages, build_transcript
-from busqa.metrics import (
-    compute_latency_metrics, compute_additional_metrics, 
-    compute_policy_violations_count, filter_non_null_metrics
-)
-from busqa.prompt_loader import load_unified_rubrics
-from busqa.brand_specs import load_brand_prompt, build_brand_from_kb_json, BrandPolicy
-from busqa.prompting import build_system_prompt_unified, build_user_instruction
-from busqa.llm_client import call_llm
-from busqa.batch_evaluator import evaluate_conversations_high_speed
-from busqa.evaluator import coerce_llm_json_unified
+from busqa.config_registry import current_rubrics, current_diagnostics, brand_prompt
+from busqa.brand_artifacts import get_brand_artifacts
+from busqa.brand_specs import BrandPolicy
+from busqa.batch_evaluator import evaluate_conversations_high_speed, HighSpeedBatchEvaluator, BatchConfig
 from busqa.aggregate import make_summary
-from busqa.diagnostics import detect_operational_readiness, detect_risk_compliance
+from busqa.list_fetcher import FetchConfig, AsyncListFetcher, fetch_conversations_async
+from busqa.conversation_store import ConversationStore, sync_bot
+from busqa.selection import SelectionQuery, select_in_memory, stream_select, STRATEGIES, STRATA
+from busqa.sequential_audit import AuditConfig, run_sequential_audit
+from busqa.triage import TriageConfig
+from busqa.dispatch import DispatchConfig, POLICIES
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-@dataclass
-class FetchConfig:
-    """Configuration for fetching conversations"""
-    base_url: str
-    bot_id: str
-    bearer_token: str
-    page_size: int = 100
-    max_pages: int = 20
-    retry_count: int = 3
-    backoff_delay: float = 1.0
-    timeout: int = 30
-    limit: int = None  # Optional limit to stop fetching when reached
+_TRANSCRIPT_PREVIEW_CHARS = 500  # transcript_preview của format per-conversation (prompt doctor đọc)
 
 def test_bearer_token(base_url: str, bearer_token: str, timeout: int = 30) -> bool:
     """
@@ -90,106 +74,45 @@ def fetch_conversations_with_messages(config: FetchConfig) -> List[Dict[str, Any
     """
     Fetch all conversations with messages from API with retry/backoff for 429/5xx errors.
     
+    Sync facade over busqa.list_fetcher.AsyncListFetcher: pages are fetched
+    concurrently (config.page_concurrency) under config.rate_limit_per_second.
+    From async code, await fetch_conversations_async / iterate AsyncListFetcher instead.
+    
     Args:
         config: FetchConfig object with API parameters
         
     Returns:
         List of conversation dictionaries with conversation_id, messages, created_at, etc.
+        With config.typed_decode, DecodedConversation objects (dict-style get() still works).
     """
-    all_conversations = []
-    headers = {
-        "Authorization": f"Bearer {config.bearer_token}",
-        "Content-Type": "application/json"
-    }
-    
-    for page in range(1, config.max_pages + 1):
-        # Check if we already have enough conversations
-        if hasattr(config, 'limit') and config.limit and len(all_conversations) >= config.limit:
-            logger.info(f"Already have {len(all_conversations)} conversations, stopping fetch.")
-            break
-            
-        url = f"{config.base_url.rstrip('/')}/api/conversations"
-        params = {
-            "bot_id": config.bot_id,
-            "page": page,
-            "page_size": config.page_size
-        }
-        
-        for attempt in range(config.retry_count):
-            try:
-                logger.info(f"Fetching page {page}/{config.max_pages} (attempt {attempt + 1}/{config.retry_count})")
-                
-                response = requests.get(
-                    url, 
-                    headers=headers, 
-                    params=params, 
-                    timeout=config.timeout
-                )
-                
-                # Request completed
-                
-                if response.status_code == 401:
-                    # Authentication error - don't retry, fail immediately
-                    logger.error(f"Authentication failed (401). Check bearer token.")
-                    logger.error(f"Token preview: {config.bearer_token[:20]}...")
-                    logger.error(f"Response: {response.text[:200]}")
-                    raise requests.exceptions.HTTPError(f"401 Client Error: Unauthorized. Invalid or expired bearer token.")
-                elif response.status_code == 403:
-                    # Forbidden - don't retry
-                    logger.error(f"Access forbidden (403). Check bot_id permissions.")
-                    logger.error(f"Bot ID: {config.bot_id}")
-                    logger.error(f"Response: {response.text[:200]}")
-                    raise requests.exceptions.HTTPError(f"403 Forbidden: Access denied to bot_id {config.bot_id}")
-                elif response.status_code == 429:
-                    # Rate limited - backoff and retry
-                    backoff_time = config.backoff_delay * (2 ** attempt)
-                    logger.warning(f"Rate limited (429). Backing off for {backoff_time:.1f}s")
-                    time.sleep(backoff_time)
-                    continue
-                elif response.status_code >= 500:
-                    # Server error - backoff and retry
-                    backoff_time = config.backoff_delay * (2 ** attempt)
-                    logger.warning(f"Server error ({response.status_code}). Backing off for {backoff_time:.1f}s")
-                    time.sleep(backoff_time)
-                    continue
-                
-                response.raise_for_status()
-                data = response.json()
-                
-                conversations = data.get("conversations", [])
-                if not conversations:
-                    logger.info(f"No more conversations on page {page}. Stopping.")
-                    break
-                
-                all_conversations.extend(conversations)
-                logger.info(f"Page {page}: Got {len(conversations)} conversations (total: {len(all_conversations)})")
-                
-                # Check if we have enough conversations
-                if hasattr(config, 'limit') and config.limit and len(all_conversations) >= config.limit:
-                    logger.info(f"Reached limit of {config.limit} conversations, stopping fetch.")
-                    break
-                
-                # Check if there are more pages
-                if len(conversations) < config.page_size:
-                    logger.info("Last page reached (fewer than page_size conversations)")
-                    break
-                
-                break  # Success, no need to retry
-                
-            except requests.exceptions.RequestException as e:
-                if attempt == config.retry_count - 1:
-                    logger.error(f"Failed to fetch page {page} after {config.retry_count} attempts: {e}")
-                    raise
-                else:
-                    backoff_time = config.backoff_delay * (2 ** attempt)
-                    logger.warning(f"Request failed (attempt {attempt + 1}): {e}. Retrying in {backoff_time:.1f}s")
-                    time.sleep(backoff_time)
-        else:
-            # All attempts failed for this page
-            break
+    return asyncio.run(fetch_conversations_async(config))
+
+async def stream_conversations(
+    config: FetchConfig,
+    take: int = 10,
+    skip: int = 0,
+    min_turns: int = 0,
+    fetcher: Optional[AsyncListFetcher] = None
+) -> AsyncIterator[Any]:
+    """
+    Head selection theo thứ tự trang, trả từng conversation ngay khi trang về.
     
-    logger.info(f"Total conversations fetched: {len(all_conversations)}")
-    return all_conversations
+    Dùng để chấm song song với fetch (không sort được vì chưa có đủ list);
+    dừng fetch ngay khi đã đủ skip + take.
+    """
+    fetcher = fetcher or AsyncListFetcher(config)
+    seen = 0
+    emitted = 0
+    async for conversation in fetcher.iter_conversations():
+        if min_turns > 0 and len(conversation.get("messages", []) or []) < min_turns:
+            continue
+        seen += 1
+        if seen <= skip or not conversation.get("conversation_id"):
+            continue
+        yield conversation
+        emitted += 1
+        if emitted >= take:
+            break
 
 def select_conversations(
     conversations: List[Dict[str, Any]], 
@@ -198,19 +121,31 @@ def select_conversations(
     strategy: str = "head",
     sort_by: str = "created_at",
     order: str = "desc",
-    min_turns: int = 0
+    min_turns: int = 0,
+    max_turns: Optional[int] = None,
+    since: Any = None,
+    until: Any = None,
+    stratify_by: str = "day",
+    seed: Optional[int] = None
 ) -> List[Dict[str, Any]]:
     """
     Select N conversations based on strategy after filtering and sorting.
     
+    In-memory engine of busqa.selection (created_at parsed once per conversation,
+    top-N via partial selection); with a ConversationStore use store.select instead.
+    
     Args:
         conversations: List of conversation dictionaries
         take: Number of conversations to select
         skip: Number of conversations to skip
-        strategy: Selection strategy (head|tail|random|newest|oldest)
+        strategy: Selection strategy (head|tail|random|newest|oldest|stratified)
         sort_by: Sort field (created_at|length)
         order: Sort order (asc|desc)
         min_turns: Minimum number of turns (messages) required
+        max_turns: Maximum number of turns (messages) allowed
+        since / until: created_at window (epoch or date/datetime string, until exclusive)
+        stratify_by: Stratum for strategy="stratified" (day|flow|turns)
+        seed: Seed for random/stratified sampling (reproducible selection)
         
     Returns:
         Selected conversations list
@@ -218,91 +153,29 @@ def select_conversations(
     if not conversations:
         return []
     
-    # Filter by minimum turns
-    if min_turns > 0:
-        filtered_convs = []
-        for conv in conversations:
-            messages = conv.get("messages", [])
-            if len(messages) >= min_turns:
-                filtered_convs.append(conv)
-        conversations = filtered_convs
-        logger.info(f"Filtered to {len(conversations)} conversations with >= {min_turns} turns")
-    
-    # Sort conversations
-    if sort_by == "created_at":
-        # Parse created_at to datetime for proper sorting
-        def parse_created_at(conv):
-            try:
-                created_at = conv.get("created_at", "")
-                if created_at:
-                    # Handle different datetime formats
-                    for fmt in ["%Y-%m-%dT%H:%M:%S.%fZ", "%Y-%m-%dT%H:%M:%SZ", "%Y-%m-%d %H:%M:%S"]:
-                        try:
-                            return datetime.strptime(created_at, fmt)
-                        except ValueError:
-                            continue
-                return datetime.min
-            except:
-                return datetime.min
-        
-        conversations.sort(key=parse_created_at, reverse=(order == "desc"))
-        
-    elif sort_by == "length":
-        conversations.sort(
-            key=lambda conv: len(conv.get("messages", [])), 
-            reverse=(order == "desc")
-        )
-    
-    # Apply strategy
-    if strategy == "newest":
-        # Sort by created_at desc regardless of current sort
-        def parse_created_at(conv):
-            try:
-                created_at = conv.get("created_at", "")
-                if created_at:
-                    for fmt in ["%Y-%m-%dT%H:%M:%S.%fZ", "%Y-%m-%dT%H:%M:%SZ", "%Y-%m-%d %H:%M:%S"]:
-                        try:
-                            return datetime.strptime(created_at, fmt)
-                        except ValueError:
-                            continue
-                return datetime.min
-            except:
-                return datetime.min
-        conversations.sort(key=parse_created_at, reverse=True)
-        
-    elif strategy == "oldest":
-        # Sort by created_at asc regardless of current sort
-        def parse_created_at(conv):
-            try:
-                created_at = conv.get("created_at", "")
-                if created_at:
-                    for fmt in ["%Y-%m-%dT%H:%M:%S.%fZ", "%Y-%m-%dT%H:%M:%SZ", "%Y-%m-%d %H:%M:%S"]:
-                        try:
-                            return datetime.strptime(created_at, fmt)
-                        except ValueError:
-                            continue
-                return datetime.min
-            except:
-                return datetime.min
-        conversations.sort(key=parse_created_at, reverse=False)
-        
-    elif strategy == "random":
-        random.shuffle(conversations)
-        
-    elif strategy == "tail":
-        # Take from the end (after current sorting)
-        conversations = conversations[-(take + skip):] if len(conversations) > (take + skip) else conversations
-        
-    # elif strategy == "head" is the default - no additional processing needed
-    
-    # Apply skip and take
-    selected = conversations[skip:skip + take]
-    
-    # Conversations selected
-    return selected
+    query = SelectionQuery(take=take, skip=skip, strategy=strategy, sort_by=sort_by, order=order,
+                           min_turns=min_turns, max_turns=max_turns, since=since, until=until,
+                           stratify_by=stratify_by, seed=seed)
+    return select_in_memory(conversations, query)
 
-def evaluate_conversation_from_raw(
-    raw_conv: Dict[str, Any],
+def _brand_id_for(brand_prompt_path: str, kb_json: Optional[Dict[str, Any]]) -> str:
+    """brand_id từ brand_prompt_path (brands/<id>/...) hoặc agent_name của KB (best-effort)"""
+    try:
+        if kb_json and kb_json.get("agent_name"):
+            return str(kb_json.get("agent_name")).strip()
+        if brand_prompt_path:
+            brand_parts = brand_prompt_path.split(os.sep)
+            if "brands" in brand_parts:
+                brand_idx = brand_parts.index("brands")
+                if brand_idx + 1 < len(brand_parts):
+                    return brand_parts[brand_idx + 1]
+    except Exception:
+        pass
+    return "unknown"
+
+
+async def evaluate_many_raw_conversations(
+    raw_conversations: List[Dict[str, Any]],
     brand_prompt_path: str,
     rubrics: str = "config/rubrics_unified.yaml",
     model: str = "gemini-2.5-flash",
@@ -310,142 +183,113 @@ def evaluate_conversation_from_raw(
     apply_diagnostics: bool = True,
     llm_api_key: str = None,
     llm_base_url: str = None,
+    max_concurrency: int = 10,
+    stream_callback: Optional[callable] = None,
     kb_json: Optional[Dict[str, Any]] = None,
     override_brand_prompt_text: Optional[str] = None,
-    override_brand_policy: Optional[BrandPolicy] = None
-) -> Dict[str, Any]:
+    override_brand_policy: Optional[BrandPolicy] = None,
+    rubrics_cfg: Optional[Dict[str, Any]] = None,
+    diagnostics_cfg: Optional[Dict[str, Any]] = None,
+    result_store: Optional[Any] = None,
+    force_refresh: bool = False
+) -> List[Dict[str, Any]]:
     """
-    Evaluate a single conversation using the existing pipeline.
+    Evaluate raw conversations (already holding their messages) on the high-speed engine.
+    
+    Conversations are passed inline to HighSpeedBatchEvaluator: async LLM calls, AIMD
+    concurrency, result store - no per-conversation thread, no fetch.
     
     Args:
-        raw_conv: Raw conversation dict with conversation_id, messages, etc.
-        brand_prompt_path: Path to brand prompt file
-        rubrics: Path to rubrics config file
+        raw_conversations: List of raw conversation dicts
+        brand_prompt_path: Path to brand prompt file (unused with kb_json / overrides)
+        rubrics: Path to rubrics config file (unused when rubrics_cfg is given)
         model: LLM model name
         temperature: LLM temperature
         apply_diagnostics: Whether to apply diagnostics
         llm_api_key: LLM API key
         llm_base_url: LLM base URL
+        max_concurrency: Maximum concurrent LLM calls (AIMD ceiling)
+        stream_callback: Called (sync or async) with each result as it completes
+        rubrics_cfg / diagnostics_cfg: Configs đã load sẵn (API) - khỏi đọc lại file mỗi request
+        result_store: busqa.result_store.ResultStore - trả result đã lưu nếu không có gì thay đổi
+        force_refresh: Bỏ qua result store, chấm lại và ghi đè
         
     Returns:
-        Per-conversation result dict (same format as evaluate_cli.py)
+        List of evaluation results in input order (errors included, processing continues)
     """
-    conversation_id = raw_conv.get("conversation_id")
-    if not conversation_id:
-        raise ValueError("Missing conversation_id in raw conversation data")
-    
-    try:
-        # Load configurations
-        rubrics_cfg = load_unified_rubrics(rubrics)
-        # Determine knowledge source: overrides > kb_json > prompt file
-        if override_brand_prompt_text is not None and override_brand_policy is not None:
-            brand_prompt_text, brand_policy = override_brand_prompt_text, override_brand_policy
-        elif kb_json is not None:
-            brand_prompt_text, brand_policy = build_brand_from_kb_json(kb_json)
-        else:
-            brand_prompt_text, brand_policy = load_brand_prompt(brand_prompt_path)
-        
-        # Get diagnostics config if needed
-        diagnostics_cfg = None
-        if apply_diagnostics:
-            diagnostics_path = "config/diagnostics.yaml"
-            if os.path.exists(diagnostics_path):
-                import yaml
-                with open(diagnostics_path, 'r', encoding='utf-8') as f:
-                    diagnostics_cfg = yaml.safe_load(f)
-        
-        # Normalize messages (raw_conv already has "messages" key)
-        messages = normalize_messages(raw_conv)
-        
-        if not messages:
-            raise ValueError("No messages found after normalization")
-        
-        # Build transcript and compute metrics
-        transcript = build_transcript(messages)
-        metrics = compute_latency_metrics(messages)
-        additional_metrics = compute_additional_metrics(messages, brand_policy, brand_prompt_text)
-        policy_violations_count = compute_policy_violations_count(messages, brand_policy)
-        
-        additional_metrics["policy_violations"] = policy_violations_count
-        metrics.update(additional_metrics)
-        
-        # Add diagnostics if enabled
-        if apply_diagnostics and diagnostics_cfg:
-            or_hits = detect_operational_readiness(messages, brand_policy, brand_prompt_text)
-            rc_hits = detect_risk_compliance(messages, brand_policy)
-            diagnostics_hits = {
-                "operational_readiness": or_hits,
-                "risk_compliance": rc_hits
-            }
-            metrics["diagnostics"] = diagnostics_hits
-        
-        # Filter metrics for LLM
-        metrics_for_llm = filter_non_null_metrics(metrics)
-        
-        # Build prompts
-        system_prompt = build_system_prompt_unified(rubrics_cfg, brand_policy, brand_prompt_text)
-        user_prompt = build_user_instruction(metrics_for_llm, transcript, rubrics_cfg)
-        
-        # Call LLM
-        llm_response = call_llm(
-            api_key=llm_api_key,
-            model=model,
-            system_prompt=system_prompt,
-            user_prompt=user_prompt,
-            base_url=llm_base_url,
-            temperature=temperature
-        )
-        
-        # Process result
-        diagnostics_hits = metrics.get("diagnostics", {}) if apply_diagnostics else {}
-        
-        result = coerce_llm_json_unified(
-            llm_response,
+    if rubrics_cfg is None:
+        rubrics_cfg = current_rubrics(rubrics)
+    # Determine knowledge source: overrides > kb_json > prompt file
+    if override_brand_prompt_text is not None and override_brand_policy is not None:
+        brand_prompt_text, brand_policy = override_brand_prompt_text, override_brand_policy
+    elif kb_json is not None:
+        # KB compile một lần theo content hash, dùng lại giữa các request
+        artifact = get_brand_artifacts().from_kb_json(kb_json)
+        brand_prompt_text, brand_policy = artifact.brand_prompt_text, artifact.brand_policy
+    else:
+        brand_prompt_text, brand_policy = brand_prompt(brand_prompt_path)
+    if apply_diagnostics and diagnostics_cfg is None:
+        diagnostics_cfg = current_diagnostics()
+    
+    # Engine cần conversation_id để ghép result; raw thiếu id thì gán tạm theo vị trí
+    inline = [conv if conv.get("conversation_id") else {**conv, "conversation_id": f"unknown-{i}"}
+              for i, conv in enumerate(raw_conversations)]
+    # Field của format per-conversation cũ - gắn trong engine để stream_callback / result store cũng có
+    result_fields = {"brand_id": _brand_id_for(brand_prompt_path, kb_json),
+                     "brand_prompt_path": brand_prompt_path, "rubric_version": rubrics_cfg.get("version")}
+    
+    # Engine ghép payload theo conversation_id: raw trùng id chạy ở lượt sau, mỗi cái chấm độc lập
+    rounds: List[List[int]] = []
+    seen: Dict[str, int] = {}
+    for i, conv in enumerate(inline):
+        n = seen[str(conv["conversation_id"])] = seen.get(str(conv["conversation_id"]), -1) + 1
+        if n == len(rounds):
+            rounds.append([])
+        rounds[n].append(i)
+    
+    results: List[Optional[Dict[str, Any]]] = [None] * len(inline)
+    for positions in rounds:
+        round_results = await evaluate_conversations_high_speed(
+            conversation_ids=[inline[i] for i in positions],
+            base_url=None,  # mọi conversation đều inline
             rubrics_cfg=rubrics_cfg,
             brand_policy=brand_policy,
-            messages=messages,
-            transcript=transcript,
-            metrics=metrics,
-            diagnostics_cfg=diagnostics_cfg if apply_diagnostics else None,
-            diagnostics_hits=diagnostics_hits
+            brand_prompt_text=brand_prompt_text,
+            llm_api_key=llm_api_key,
+            llm_model=model,
+            temperature=temperature,
+            llm_base_url=llm_base_url,
+            apply_diagnostics=apply_diagnostics,
+            diagnostics_cfg=diagnostics_cfg,
+            max_concurrency=max_concurrency,
+            stream_callback=stream_callback,
+            result_store=result_store,
+            force_refresh=force_refresh,
+            result_fields=result_fields,
+            transcript_preview_chars=_TRANSCRIPT_PREVIEW_CHARS
         )
-        
-        # Extract brand_id from brand_prompt_path (best-effort). If kb_json used, try agent_name
-        brand_id = "unknown"
-        try:
-            if kb_json and kb_json.get("agent_name"):
-                brand_id = str(kb_json.get("agent_name")).strip()
-            elif brand_prompt_path:
-                brand_parts = brand_prompt_path.split(os.sep)
-                if "brands" in brand_parts:
-                    brand_idx = brand_parts.index("brands")
-                    if brand_idx + 1 < len(brand_parts):
-                        brand_id = brand_parts[brand_idx + 1]
-        except Exception:
-            pass
-        
-        # Return same format as evaluate_cli.py
-        return {
-            "conversation_id": conversation_id,
-            "brand_id": brand_id,
-            "brand_prompt_path": brand_prompt_path,
-            "rubric_version": rubrics_cfg["version"],
-            "evaluation_timestamp": datetime.utcnow().isoformat() + "Z",
-            "result": result.model_dump(),
-            "metrics": metrics,
-            "transcript_preview": transcript[:500] + "..." if len(transcript) > 500 else transcript
-        }
-        
-    except Exception as e:
-        logger.error(f"Error evaluating conversation {conversation_id}: {e}")
-        return {
-            "conversation_id": conversation_id,
-            "error": str(e),
-            "evaluation_timestamp": datetime.utcnow().isoformat() + "Z"
-        }
+        for i, result in zip(positions, round_results):
+            results[i] = result
+    
+    for result in results:
+        if "error" in result:
+            logger.error(f"Failed evaluation: {result.get('conversation_id')} - {result['error']}")
+    return results
 
-async def evaluate_many_raw_conversations(
-    raw_conversations: List[Dict[str, Any]],
+
+async def evaluate_raw_conversation(raw_conv: Dict[str, Any], brand_prompt_path: str, **kwargs) -> Dict[str, Any]:
+    """Một conversation raw trên engine async (kwargs như evaluate_many_raw_conversations)"""
+    if not raw_conv.get("conversation_id"):
+        raise ValueError("Missing conversation_id in raw conversation data")
+    kwargs.setdefault("max_concurrency", 1)
+    results = await evaluate_many_raw_conversations([raw_conv], brand_prompt_path, **kwargs)
+    return results[0]
+
+
+# Sync facade cho script - không gọi từ bên trong event loop đang chạy (dùng bản async)
+
+def evaluate_conversation_from_raw(
+    raw_conv: Dict[str, Any],
     brand_prompt_path: str,
     rubrics: str = "config/rubrics_unified.yaml",
     model: str = "gemini-2.5-flash",
@@ -453,84 +297,41 @@ async def evaluate_many_raw_conversations(
     apply_diagnostics: bool = True,
     llm_api_key: str = None,
     llm_base_url: str = None,
-    max_concurrency: int = 5,
-    stream_callback: Optional[callable] = None,
     kb_json: Optional[Dict[str, Any]] = None,
     override_brand_prompt_text: Optional[str] = None,
-    override_brand_policy: Optional[BrandPolicy] = None
-) -> List[Dict[str, Any]]:
+    override_brand_policy: Optional[BrandPolicy] = None,
+    result_store: Optional[Any] = None,
+    force_refresh: bool = False
+) -> Dict[str, Any]:
     """
-    Evaluate multiple conversations concurrently with error handling.
+    Evaluate a single conversation (synchronous facade over evaluate_raw_conversation).
     
-    Args:
-        raw_conversations: List of raw conversation dicts
-        brand_prompt_path: Path to brand prompt file
-        rubrics: Path to rubrics config file
-        model: LLM model name
-        temperature: LLM temperature
-        apply_diagnostics: Whether to apply diagnostics
-        llm_api_key: LLM API key
-        llm_base_url: LLM base URL
-        max_concurrency: Maximum concurrent evaluations
-        
     Returns:
-        List of evaluation results (errors included, processing continues)
+        Per-conversation result dict, or {"conversation_id", "error", ...} on failure
     """
-    semaphore = asyncio.Semaphore(max_concurrency)
-    
-    async def evaluate_single(raw_conv: Dict[str, Any]) -> Dict[str, Any]:
-        async with semaphore:
-            conversation_id = raw_conv.get("conversation_id", "unknown")
-            try:
-                logger.info(f"Starting evaluation: {conversation_id}")
-                
-                # Run in thread to avoid blocking
-                result = await asyncio.to_thread(
-                    evaluate_conversation_from_raw,
-                    raw_conv,
-                    brand_prompt_path,
-                    rubrics,
-                    model,
-                    temperature,
-                    apply_diagnostics,
-                    llm_api_key,
-                    llm_base_url,
-                    kb_json,
-                    override_brand_prompt_text,
-                    override_brand_policy
-                )
-                
-                if "error" not in result:
-                    logger.info(f"Completed evaluation: {conversation_id}")
-                else:
-                    logger.error(f"Failed evaluation: {conversation_id} - {result['error']}")
-                
-                # Emit per-item streaming callback if provided
-                if stream_callback:
-                    try:
-                        if asyncio.iscoroutinefunction(stream_callback):
-                            await stream_callback(result)
-                        else:
-                            # Offload sync callback to thread to avoid blocking event loop
-                            await asyncio.to_thread(stream_callback, result)
-                    except Exception:
-                        pass
+    if not raw_conv.get("conversation_id"):
+        raise ValueError("Missing conversation_id in raw conversation data")
+    try:
+        return asyncio.run(evaluate_raw_conversation(
+            raw_conv, brand_prompt_path, rubrics=rubrics, model=model, temperature=temperature,
+            apply_diagnostics=apply_diagnostics, llm_api_key=llm_api_key, llm_base_url=llm_base_url,
+            kb_json=kb_json, override_brand_prompt_text=override_brand_prompt_text,
+            override_brand_policy=override_brand_policy, result_store=result_store,
+            force_refresh=force_refresh
+        ))
+    except Exception as e:
+        logger.error(f"Error evaluating conversation {raw_conv.get('conversation_id')}: {e}")
+        return {
+            "conversation_id": raw_conv.get("conversation_id"),
+            "error": str(e),
+            "evaluation_timestamp": datetime.utcnow().isoformat() + "Z"
+        }
 
-                return result
-                
-            except Exception as e:
-                logger.error(f"Exception evaluating {conversation_id}: {e}")
-                return {
-                    "conversation_id": conversation_id,
-                    "error": str(e),
-                    "evaluation_timestamp": datetime.utcnow().isoformat() + "Z"
-                }
-    
-    # Run all evaluations concurrently
-    tasks = [evaluate_single(conv) for conv in raw_conversations]
-    results = await asyncio.gather(*tasks, return_exceptions=False)
-    
-    return results
+
+def evaluate_many_raw_conversations_sync(raw_conversations: List[Dict[str, Any]], brand_prompt_path: str,
+                                         **kwargs) -> List[Dict[str, Any]]:
+    """Synchronous facade over evaluate_many_raw_conversations"""
+    return asyncio.run(evaluate_many_raw_conversations(raw_conversations, brand_prompt_path, **kwargs))
 
 def make_summary_enhanced(results: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
@@ -613,16 +414,33 @@ def main():
     parser.add_argument("--bearer", help="Bearer token for API authentication")
     parser.add_argument("--page-size", type=int, default=100, help="Page size for API requests")
     parser.add_argument("--max-pages", type=int, default=20, help="Maximum pages to fetch")
+    parser.add_argument("--scan-limit", type=int,
+                       help="Consider only the N most recent conversations (e.g. random 50 from the last 2000)")
+    parser.add_argument("--page-concurrency", type=int, default=4, help="Pages fetched concurrently")
+    parser.add_argument("--rate-limit", type=float, default=10.0,
+                       help="Max list API requests per second (0 = unlimited)")
+    parser.add_argument("--stream-fetch", action="store_true",
+                       help="Evaluate while pages are still being fetched (head selection in page order, no sorting)")
+    parser.add_argument("--conversation-store",
+                       help="Local conversation store (SQLite): sync only new conversations, select from the store")
+    parser.add_argument("--offline", action="store_true",
+                       help="With --conversation-store: skip the sync, use stored conversations only")
     
     # Selection parameters
     parser.add_argument("--take", type=int, default=10, help="Number of conversations to select")
     parser.add_argument("--skip", type=int, default=0, help="Number of conversations to skip")
-    parser.add_argument("--strategy", choices=["head", "tail", "random", "newest", "oldest"], 
+    parser.add_argument("--strategy", choices=list(STRATEGIES), 
                        default="head", help="Selection strategy")
     parser.add_argument("--sort-by", choices=["created_at", "length"], default="created_at", 
                        help="Sort field")
     parser.add_argument("--order", choices=["asc", "desc"], default="desc", help="Sort order")
     parser.add_argument("--min-turns", type=int, default=0, help="Minimum number of turns required")
+    parser.add_argument("--max-turns", type=int, help="Maximum number of turns allowed")
+    parser.add_argument("--since", help="Only conversations created at/after this date or datetime")
+    parser.add_argument("--until", help="Only conversations created before this date or datetime")
+    parser.add_argument("--stratify-by", choices=list(STRATA), default="day",
+                       help="Stratum for --strategy stratified")
+    parser.add_argument("--seed", type=int, help="Seed for random/stratified sampling")
     
     # Evaluation parameters
     parser.add_argument("--rubrics", default="config/rubrics_unified.yaml", help="Path to rubrics config")
@@ -640,6 +458,29 @@ def main():
     parser.add_argument("--output-summary", help="Output summary JSON file path (e.g., summary.json)")
     parser.add_argument("--output-csv", help="Output CSV file path (optional)")
     parser.add_argument("--dry-run", action="store_true", help="Only show selected conversation IDs")
+    parser.add_argument("--triage", action="store_true",
+                        help="Skip the LLM for conversations that are not evaluable or already decided by rules "
+                             "(including a score ceiling below 50 after deterministic caps)")
+    parser.add_argument("--triage-auto-fail", action="append", default=[], metavar="DIAGNOSTIC_KEY",
+                        help="Zero-tolerance diagnostics hit scored as an automatic fail without the LLM "
+                             "(repeatable, e.g. forbidden_phone_collect); implies --triage")
+    parser.add_argument("--dispatch", choices=POLICIES, default="fifo",
+                        help="LLM dispatch order by estimated tokens: sjf (mean latency), ljf (makespan), fifo")
+    parser.add_argument("--max-inflight-tokens", type=int,
+                        help="Cap on the total estimated tokens of in-flight LLM calls")
+    
+    # Sequential audit: chấm theo wave đến khi CI đạt độ chính xác mục tiêu
+    parser.add_argument("--audit", action="store_true",
+                        help="Audit mode: evaluate selected conversations in random waves, stop once the CI target is met")
+    parser.add_argument("--audit-precision", type=float, default=2.0,
+                        help="Target CI half-width in points for avg total_score")
+    parser.add_argument("--audit-confidence", type=float, default=0.95, help="CI confidence level")
+    parser.add_argument("--audit-wave-size", type=int, default=20, help="Conversations evaluated per wave")
+    parser.add_argument("--audit-min-samples", type=int, default=30, help="Never stop before this many results")
+    parser.add_argument("--audit-per-criterion", action="store_true",
+                        help="Also require every criterion average to reach the target")
+    parser.add_argument("--audit-per-flow", action="store_true",
+                        help="Also require avg total_score of every (non-rare) flow to reach the target")
     
     args = parser.parse_args()
     
@@ -671,29 +512,48 @@ def main():
         bot_id=args.bot_id,
         bearer_token=bearer_token,
         page_size=args.page_size,
-        max_pages=args.max_pages
+        max_pages=args.max_pages,
+        typed_decode=True,
+        page_concurrency=args.page_concurrency,
+        rate_limit_per_second=args.rate_limit,
+        limit=args.scan_limit
     )
     
+    triage = TriageConfig(auto_fail_hits=tuple(args.triage_auto_fail)) \
+        if args.triage or args.triage_auto_fail else None
+    dispatch = DispatchConfig(policy=args.dispatch, max_inflight_tokens=args.max_inflight_tokens) \
+        if args.dispatch != "fifo" or args.max_inflight_tokens else None
+    
+    if args.stream_fetch and not args.dry_run:
+        return _stream_fetch_and_evaluate(args, fetch_config, brand_prompt_path, llm_api_key, triage, dispatch)
+    
     try:
         # Step 1: Fetch conversations
-        logger.info(f"Fetching conversations for bot_id={args.bot_id}")
-        conversations = fetch_conversations_with_messages(fetch_config)
-        
-        if not conversations:
-            logger.error("No conversations found")
-            return 1
-        
-        # Step 2: Select conversations
-        logger.info(f"Selecting conversations (take={args.take}, skip={args.skip}, strategy={args.strategy})")
-        selected_conversations = select_conversations(
-            conversations,
-            take=args.take,
-            skip=args.skip,
-            strategy=args.strategy,
-            sort_by=args.sort_by,
-            order=args.order,
-            min_turns=args.min_turns
-        )
+        query = SelectionQuery(take=args.take, skip=args.skip, strategy=args.strategy, sort_by=args.sort_by,
+                               order=args.order, min_turns=args.min_turns, max_turns=args.max_turns,
+                               since=args.since, until=args.until, stratify_by=args.stratify_by, seed=args.seed)
+        if args.conversation_store:
+            store = ConversationStore(args.conversation_store)
+            if not args.offline:
+                logger.info(f"Syncing new conversations for bot_id={args.bot_id} into {args.conversation_store}")
+                asyncio.run(sync_bot(store, fetch_config))
+            if not store.count(args.bot_id):
+                logger.error("No conversations found")
+                return 1
+            # Step 2: Select conversations (SQL trên index của store)
+            logger.info(f"Selecting conversations (take={args.take}, skip={args.skip}, strategy={args.strategy})")
+            selected_conversations = store.select(query, bot_id=args.bot_id)
+        else:
+            # Step 2: Select conversations while pages arrive (bounded reservoir, stops once complete)
+            logger.info(f"Fetching and selecting conversations for bot_id={args.bot_id} "
+                        f"(take={args.take}, skip={args.skip}, strategy={args.strategy})")
+            selected_conversations, scan = asyncio.run(stream_select(AsyncListFetcher(fetch_config), query))
+            logger.info(f"Scanned {scan['seen']} conversations in {scan['pages']} pages "
+                        f"(stopped early: {scan['stopped_early']})")
+            
+            if not scan["seen"]:
+                logger.error("No conversations found")
+                return 1
         
         if not selected_conversations:
             logger.error("No conversations selected after filtering")
@@ -709,24 +569,34 @@ def main():
         
         # Step 3: Evaluate conversations using HighSpeedBatchEvaluator
         logger.info(f"Evaluating {len(selected_conversations)} conversations (high-speed path)")
-        # Preload configs once
-        rubrics_cfg = load_unified_rubrics(args.rubrics)
-        brand_prompt_text, brand_policy = load_brand_prompt(brand_prompt_path)
-        diagnostics_cfg = None
-        if args.apply_diagnostics:
-            diagnostics_path = "config/diagnostics.yaml"
-            if os.path.exists(diagnostics_path):
-                import yaml
-                with open(diagnostics_path, 'r', encoding='utf-8') as f:
-                    diagnostics_cfg = yaml.safe_load(f)
+        # Configs qua registry (đã validate, load một lần)
+        rubrics_cfg = current_rubrics(args.rubrics)
+        brand_prompt_text, brand_policy = brand_prompt(brand_prompt_path)
+        diagnostics_cfg = current_diagnostics() if args.apply_diagnostics else None
 
-        # Extract conversation_ids
-        conversation_ids = [conv.get("conversation_id") for conv in selected_conversations if conv.get("conversation_id")]
-        # Build base_url for HighSpeed API client from list-base-url
+        # Conversation đã có đủ messages từ list API -> truyền inline, không fetch lại từng cái
+        inline_conversations = [conv for conv in selected_conversations if conv.get("conversation_id")]
         base_url = args.list_base_url
 
+        if args.audit:
+            audit_config = AuditConfig(
+                target_half_width=args.audit_precision, confidence=args.audit_confidence,
+                wave_size=args.audit_wave_size, min_samples=args.audit_min_samples,
+                per_criterion=args.audit_per_criterion, per_flow=args.audit_per_flow, seed=args.seed)
+            evaluator = HighSpeedBatchEvaluator(BatchConfig(max_concurrency=args.max_concurrency, triage=triage,
+                                                            dispatch=dispatch))
+            results, audit = asyncio.run(run_sequential_audit(
+                evaluator, inline_conversations, base_url, rubrics_cfg, brand_policy, brand_prompt_text,
+                llm_api_key, args.llm_model, args.temperature, args.llm_base_url,
+                args.apply_diagnostics, diagnostics_cfg, config=audit_config))
+            logger.info(f"Audit: avg total_score {audit['avg_total_score']['mean']} "
+                        f"±{audit['avg_total_score']['ci_half_width']} after {audit['evaluated']}/"
+                        f"{audit['population']} conversations ({audit['llm_calls_saved']} LLM calls saved)")
+            _write_outputs(args, results, audit)
+            return 0
+        
         results = asyncio.run(evaluate_conversations_high_speed(
-            conversation_ids=conversation_ids,
+            conversation_ids=inline_conversations,
             base_url=base_url,
             rubrics_cfg=rubrics_cfg,
             brand_policy=brand_policy,
@@ -739,71 +609,112 @@ def main():
             diagnostics_cfg=diagnostics_cfg,
             max_concurrency=args.max_concurrency,
             use_high_performance_api=True,
-            use_progressive_batching=True
+            use_progressive_batching=True,
+            triage=triage,
+            dispatch=dispatch
         ))
         
-        # Step 4: Create summary
-        summary = make_summary_enhanced(results)
-        
-        # Step 5: Output results
-        # Print to STDOUT as JSON array
-        print(json.dumps(results, indent=2, ensure_ascii=False))
-        
-        # Write to files if specified
-        if args.output_json:
-            with open(args.output_json, 'w', encoding='utf-8') as f:
-                json.dump(results, f, indent=2, ensure_ascii=False)
-            pass  # Results written
-        
-        if args.output_summary:
-            with open(args.output_summary, 'w', encoding='utf-8') as f:
-                json.dump(summary, f, indent=2, ensure_ascii=False)
-            pass  # Summary written
-        
-        if args.output_csv:
-            # Simple CSV output
-            import csv
-            with open(args.output_csv, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                # Header
-                writer.writerow([
-                    'conversation_id', 'brand_id', 'total_score', 'flow_type', 
-                    'policy_violations', 'error', 'evaluation_timestamp'
-                ])
-                # Data
-                for result in results:
-                    if "error" in result:
-                        writer.writerow([
-                            result.get('conversation_id', ''),
-                            result.get('brand_id', ''),
-                            '',
-                            '',
-                            '',
-                            result.get('error', ''),
-                            result.get('evaluation_timestamp', '')
-                        ])
-                    else:
-                        evaluation_result = result.get('result', {})
-                        writer.writerow([
-                            result.get('conversation_id', ''),
-                            result.get('brand_id', ''),
-                            evaluation_result.get('total_score', ''),
-                            evaluation_result.get('flow_type', ''),
-                            result.get('metrics', {}).get('policy_violations', ''),
-                            '',
-                            result.get('evaluation_timestamp', '')
-                        ])
-            pass  # CSV written
-        
-        # Log final stats
-        success_count = len([r for r in results if "error" not in r])
-        error_count = len(results) - success_count
-        
+        _write_outputs(args, results)
         return 0
         
     except Exception as e:
         logger.error(f"Fatal error: {e}")
         return 1
 
+def _stream_fetch_and_evaluate(args, fetch_config: FetchConfig, brand_prompt_path: str, llm_api_key: str,
+                               triage: Optional[TriageConfig] = None,
+                               dispatch: Optional[DispatchConfig] = None) -> int:
+    """--stream-fetch: conversation vào evaluator ngay khi trang của nó về"""
+    if args.strategy != "head" or args.sort_by != "created_at" or args.order != "desc":
+        logger.warning("--stream-fetch selects in page order; --strategy/--sort-by/--order are ignored")
+    if not args.min_turns:
+        fetch_config.limit = args.skip + args.take  # dừng fetch khi đủ
+    
+    async def run() -> List[Dict[str, Any]]:
+        fetcher = AsyncListFetcher(fetch_config)
+        evaluator = HighSpeedBatchEvaluator(BatchConfig(max_concurrency=args.max_concurrency, triage=triage,
+                                                        dispatch=dispatch))
+        source = stream_conversations(fetch_config, take=args.take, skip=args.skip,
+                                      min_turns=args.min_turns, fetcher=fetcher)
+        brand_prompt_text, brand_policy = brand_prompt(brand_prompt_path)
+        results = []
+        async for result in evaluator.iter_evaluate(
+            source, None, current_rubrics(args.rubrics), brand_policy, brand_prompt_text,
+            llm_api_key, args.llm_model, args.temperature, args.llm_base_url,
+            args.apply_diagnostics, current_diagnostics() if args.apply_diagnostics else None
+        ):
+            if not results:
+                logger.info(f"First evaluation after {fetcher.stats['first_page_seconds']}s (first page)")
+            results.append(result)
+        logger.info(f"List fetch: {fetcher.stats}")
+        return results
+    
+    try:
+        results = asyncio.run(run())
+        if not results:
+            logger.error("No conversations selected after filtering")
+            return 1
+        _write_outputs(args, results)
+        return 0
+    except Exception as e:
+        logger.error(f"Fatal error: {e}")
+        return 1
+
+def _write_outputs(args, results: List[Dict[str, Any]], audit: Optional[Dict[str, Any]] = None) -> None:
+    # Step 4: Create summary
+    summary = make_summary_enhanced(results)
+    if audit is not None:
+        summary["audit"] = audit
+    
+    # Step 5: Output results
+    # Print to STDOUT as JSON array
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    
+    # Write to files if specified
+    if args.output_json:
+        with open(args.output_json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        pass  # Results written
+    
+    if args.output_summary:
+        with open(args.output_summary, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        pass  # Summary written
+    
+    if args.output_csv:
+        # Simple CSV output
+        import csv
+        with open(args.output_csv, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            # Header
+            writer.writerow([
+                'conversation_id', 'brand_id', 'total_score', 'flow_type', 
+                'policy_violations', 'error', 'evaluation_timestamp'
+            ])
+            # Data
+            for result in results:
+                if "error" in result:
+                    writer.writerow([
+                        result.get('conversation_id', ''),
+                        result.get('brand_id', ''),
+                        '',
+                        '',
+                        '',
+                        result.get('error', ''),
+                        result.get('evaluation_timestamp', '')
+                    ])
+                else:
+                    evaluation_result = result.get('result', {})
+                    writer.writerow([
+                        result.get('conversation_id', ''),
+                        result.get('brand_id', ''),
+                        evaluation_result.get('total_score', ''),
+                        evaluation_result.get('flow_type', ''),
+                        result.get('metrics', {}).get('policy_violations', ''),
+                        '',
+                        result.get('evaluation_timestamp', '')
+                    ])
+        pass  # CSV written
+
 if __name__ == "__main__":
     sys.exit(main())